@@ -0,0 +1,522 @@
+"""Shared fixtures for the data-plane benchmarks.
+
+Benchmarks run against a throwaway SQLite database seeded through the data
+plane's own table definitions, a minimal keep-alive HTTP upstream and a
+lightweight load generator, so they need nothing beyond the gateway's
+requirements (Redis falls back to fakeredis when it is not running).
+"""
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+RAW_KEY = "bench_key_12345"
+TENANT_SLUG = "bench-tenant"
+API_SLUG = "bench-api"
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def seed_database(
+    path: str,
+    upstream_url: str,
+    requests_per_minute: int = 10**9,
+    max_connections: int | None = None,
+    extra_apis: dict[str, str] | None = None,
+) -> str:
+    """Create the gateway tables in a fresh SQLite file and seed one route
+    (plus ``extra_apis``, mapping API slug to upstream URL, for the same tenant).
+
+    Returns the ``DATABASE_URL`` to hand to the data plane.
+    """
+    import sqlalchemy
+
+    from data_plane.fastapi_app.tables import (
+        apis_api,
+        apis_apikey,
+        billing_plan,
+        metadata,
+        tenants_tenant,
+    )
+
+    if os.path.exists(path):
+        os.remove(path)
+    engine = sqlalchemy.create_engine(f"sqlite:///{path}")
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(tenants_tenant.insert().values(id=1, slug=TENANT_SLUG, is_active=True))
+        conn.execute(
+            apis_api.insert().values(
+                id=1, tenant_id=1, slug=API_SLUG, upstream_base_url=upstream_url, is_active=True
+            )
+        )
+        for slug, url in (extra_apis or {}).items():
+            conn.execute(
+                apis_api.insert().values(tenant_id=1, slug=slug, upstream_base_url=url, is_active=True)
+            )
+        conn.execute(
+            billing_plan.insert().values(
+                id=1,
+                requests_per_minute=requests_per_minute,
+                requests_per_month=None,
+                max_connections=max_connections,
+                is_active=True,
+            )
+        )
+        conn.execute(
+            apis_apikey.insert().values(
+                id=1,
+                tenant_id=1,
+                plan_id=1,
+                hashed_key=hashlib.sha256(RAW_KEY.encode()).hexdigest(),
+                is_active=True,
+            )
+        )
+    engine.dispose()
+    return f"sqlite:///{path}"
+
+
+def add_tenant(
+    path: str,
+    slug: str,
+    raw_key: str,
+    upstream_url: str,
+    scheduling_weight: int = 1,
+    requests_per_minute: int = 10**9,
+) -> None:
+    """Add a tenant with one API (slug ``API_SLUG``), its own plan and key to a
+    database created by ``seed_database``."""
+    import sqlalchemy
+
+    from data_plane.fastapi_app.tables import apis_api, apis_apikey, billing_plan, tenants_tenant
+
+    engine = sqlalchemy.create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        tenant_id = conn.execute(
+            tenants_tenant.insert().values(slug=slug, is_active=True)
+        ).inserted_primary_key[0]
+        conn.execute(
+            apis_api.insert().values(
+                tenant_id=tenant_id, slug=API_SLUG, upstream_base_url=upstream_url, is_active=True
+            )
+        )
+        plan_id = conn.execute(
+            billing_plan.insert().values(
+                requests_per_minute=requests_per_minute,
+                requests_per_month=None,
+                scheduling_weight=scheduling_weight,
+                is_active=True,
+            )
+        ).inserted_primary_key[0]
+        conn.execute(
+            apis_apikey.insert().values(
+                tenant_id=tenant_id,
+                plan_id=plan_id,
+                hashed_key=hashlib.sha256(raw_key.encode()).hexdigest(),
+                is_active=True,
+            )
+        )
+    engine.dispose()
+
+
+class _StubUpstream(asyncio.Protocol):
+    delay = 0.0
+    close_connections = False
+    body = b'{"ok": true}'
+    response = (
+        b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: "
+        + str(len(body)).encode()
+        + b"\r\n\r\n"
+        + body
+    )
+    closing_response = response.replace(b"\r\n\r\n", b"\r\nConnection: close\r\n\r\n", 1)
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.buffer = bytearray()
+        self.remaining = 0
+
+    def data_received(self, data):
+        # Request bodies are skipped rather than buffered, so large
+        # uploads don't make the stub the bottleneck.
+        self.buffer += data
+        while True:
+            if self.remaining:
+                consumed = min(self.remaining, len(self.buffer))
+                del self.buffer[:consumed]
+                self.remaining -= consumed
+                if self.remaining:
+                    return
+            else:
+                head_end = self.buffer.find(b"\r\n\r\n")
+                if head_end < 0:
+                    return
+                head = bytes(self.buffer[:head_end]).lower()
+                del self.buffer[:head_end + 4]
+                marker = head.find(b"content-length:")
+                if marker >= 0:
+                    self.remaining = int(head[marker + 15:].split(b"\r\n", 1)[0])
+                    if self.remaining:
+                        continue
+            if self.delay:
+                asyncio.get_running_loop().call_later(self.delay, self.respond)
+            else:
+                self.respond()
+
+    def respond(self):
+        if self.transport.is_closing():
+            return
+        if self.close_connections:
+            self.transport.write(self.closing_response)
+            self.transport.close()
+        else:
+            self.transport.write(self.response)
+
+
+def _run_stub_upstream(port: int, delay: float, close_connections: bool) -> None:
+    _StubUpstream.delay = delay
+    _StubUpstream.close_connections = close_connections
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        server = await loop.create_server(_StubUpstream, "127.0.0.1", port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def start_stub_upstream(port: int, delay: float = 0.0, close_connections: bool = False) -> multiprocessing.Process:
+    """Upstream answering every request with a small JSON body, ``delay``
+    seconds after it arrives; keep-alive unless ``close_connections``."""
+    process = multiprocessing.Process(
+        target=_run_stub_upstream, args=(port, delay, close_connections), daemon=True
+    )
+    process.start()
+    wait_for_port(port)
+    return process
+
+
+class _StubEventStream(asyncio.Protocol):
+    """Answers every request with a chunked ``text/event-stream`` that emits
+    one event per ``interval`` seconds (never, if ``interval`` is 0)."""
+
+    interval = 1.0
+    head = (
+        b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+        b"Cache-Control: no-cache\r\nTransfer-Encoding: chunked\r\n\r\n"
+    )
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.task = None
+
+    def data_received(self, data):
+        if self.task is None and b"\r\n\r\n" in data:
+            self.task = asyncio.get_running_loop().create_task(self.emit())
+
+    async def emit(self):
+        self.transport.write(self.head)
+        tick = 0
+        while self.interval and not self.transport.is_closing():
+            event = f"id: {tick}\ndata: tick {tick}\n\n".encode()
+            self.transport.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+            tick += 1
+            await asyncio.sleep(self.interval)
+
+    def connection_lost(self, exc):
+        if self.task:
+            self.task.cancel()
+
+
+def _run_stream_upstream(sse_port: int, ws_port: int, interval: float) -> None:
+    import websockets
+
+    _StubEventStream.interval = interval
+
+    async def echo(connection):
+        async for message in connection:
+            await connection.send(message)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        sse = await loop.create_server(_StubEventStream, "127.0.0.1", sse_port, backlog=4096)
+        async with sse, websockets.serve(echo, "127.0.0.1", ws_port, backlog=4096, compression=None):
+            await asyncio.Future()
+
+    asyncio.run(main())
+
+
+def start_stream_upstream(sse_port: int, ws_port: int, interval: float = 1.0) -> multiprocessing.Process:
+    """Stub upstream with an SSE endpoint on ``sse_port`` and a WebSocket echo on ``ws_port``."""
+    process = multiprocessing.Process(
+        target=_run_stream_upstream, args=(sse_port, ws_port, interval), daemon=True
+    )
+    process.start()
+    wait_for_port(sse_port)
+    wait_for_port(ws_port)
+    return process
+
+
+class _StubResolver(asyncio.DatagramProtocol):
+    """Answers A/AAAA queries from ``records`` (name -> addresses) after ``delay`` seconds."""
+
+    records: dict[str, list[str]] = {}
+    ttl = 60
+    delay = 0.0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        asyncio.get_running_loop().call_later(self.delay, self.answer, data, addr)
+
+    def answer(self, data, addr):
+        import dns.message
+        import dns.rcode
+        import dns.rdatatype
+        import dns.rrset
+
+        query = dns.message.from_wire(data)
+        response = dns.message.make_response(query)
+        question = query.question[0]
+        name = question.name.to_text(omit_final_dot=True)
+        if name not in self.records:
+            response.set_rcode(dns.rcode.NXDOMAIN)
+        else:
+            family = ":" if question.rdtype == dns.rdatatype.AAAA else "."
+            addresses = [address for address in self.records[name] if family in address]
+            if addresses:
+                response.answer.append(
+                    dns.rrset.from_text_list(question.name, self.ttl, "IN", question.rdtype, addresses)
+                )
+        self.transport.sendto(response.to_wire(), addr)
+
+
+def _run_stub_resolver(port: int, records: dict[str, list[str]], ttl: int, delay: float) -> None:
+    _StubResolver.records = records
+    _StubResolver.ttl = ttl
+    _StubResolver.delay = delay
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(_StubResolver, local_addr=("127.0.0.1", port))
+        await asyncio.Future()
+
+    asyncio.run(main())
+
+
+def start_stub_resolver(
+    port: int, records: dict[str, list[str]], ttl: int = 60, delay: float = 0.0
+) -> multiprocessing.Process:
+    """Stub DNS server on UDP ``port``; point the gateway at it with
+    ``GATEWAY_DNS_NAMESERVERS=127.0.0.1:<port>``."""
+    process = multiprocessing.Process(
+        target=_run_stub_resolver, args=(port, records, ttl, delay), daemon=True
+    )
+    process.start()
+    import dns.message
+    import dns.query
+
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            dns.query.udp(dns.message.make_query("ready.", "A"), "127.0.0.1", port=port, timeout=0.5)
+            return process
+        except dns.exception.Timeout:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Stub resolver on port {port} did not answer")
+
+
+def start_redis() -> tuple[str, object]:
+    """A local ``redis-server`` (on ``PATH``) or, failing that, fakeredis' TCP
+    server; returns its URL and a function stopping it."""
+    port = free_port()
+    if shutil.which("redis-server"):
+        process = subprocess.Popen(
+            ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no", "--loglevel", "warning"],
+            stdout=subprocess.DEVNULL,
+        )
+        wait_for_port(port)
+        return f"redis://127.0.0.1:{port}", process.terminate
+    # In its own process, so it doesn't compete with the benchmark for the
+    # GIL, and without Nagle's algorithm: it writes replies piecemeal, which
+    # otherwise stalls every pipelined reply on a delayed ACK.
+    process = subprocess.Popen(
+        [
+            sys.executable, "-c",
+            "import sys; from fakeredis import TcpFakeServer; "
+            "from fakeredis._tcp_server import TCPFakeRequestHandler; "
+            "TCPFakeRequestHandler.disable_nagle_algorithm = True; "
+            "TcpFakeServer(('127.0.0.1', int(sys.argv[1])), server_type='redis').serve_forever()",
+            str(port),
+        ],
+    )
+    wait_for_port(port)
+    print("redis-server not found, using fakeredis (expect far lower numbers)")
+    return f"redis://127.0.0.1:{port}", process.terminate
+
+
+def wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+@dataclass
+class LoadResult:
+    requests: int = 0
+    errors: int = 0
+    elapsed: float = 0.0
+    latencies: list[float] = field(default_factory=list)
+    statuses: dict[int, int] = field(default_factory=dict)
+
+    @property
+    def rps(self) -> float:
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, pct: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+        return ordered[index]
+
+    def merge(self, other: "LoadResult") -> None:
+        self.requests += other.requests
+        self.errors += other.errors
+        self.elapsed = max(self.elapsed, other.elapsed)
+        self.latencies.extend(other.latencies)
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+
+    def summary(self) -> str:
+        mean = statistics.fmean(self.latencies) if self.latencies else 0.0
+        return (
+            f"{self.requests} req in {self.elapsed:.2f}s = {self.rps:,.0f} req/s, "
+            f"mean {mean * 1000:.2f}ms, p50 {self.percentile(50) * 1000:.2f}ms, "
+            f"p99 {self.percentile(99) * 1000:.2f}ms, errors {self.errors}, statuses {self.statuses}"
+        )
+
+
+async def _read_response(reader: asyncio.StreamReader) -> int:
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head[9:12])
+    lowered = head.lower()
+    marker = lowered.find(b"content-length:")
+    if marker >= 0:
+        length = int(lowered[marker + 15:].split(b"\r\n", 1)[0])
+        await reader.readexactly(length)
+    elif b"transfer-encoding: chunked" in lowered:
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status
+
+
+async def _connection_loop(port, requests, start, deadline, result):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    sent = start
+    try:
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            writer.write(requests[sent % len(requests)])
+            sent += 1
+            try:
+                status = await _read_response(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                result.errors += 1
+                writer.close()
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                continue
+            result.latencies.append(time.perf_counter() - started)
+            result.requests += 1
+            result.statuses[status] = result.statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+def build_request(path: str, headers: dict[str, str] | None = None, method: str = "GET", body: bytes = b"") -> bytes:
+    lines = [f"{method} {path} HTTP/1.1", "Host: 127.0.0.1"]
+    for name, value in (headers or {}).items():
+        lines.append(f"{name}: {value}")
+    if body or method in ("POST", "PUT", "PATCH"):
+        lines.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+
+
+def profile_requests(path: str, count: int, weighted: bool = True, seed: int = 0) -> list[bytes]:
+    """``count`` proxy requests drawn from a traffic profile written by
+    ``manage.py generate_scale_data``, by each key's weight or uniformly."""
+    import csv
+    import random
+
+    with open(path, newline="") as file:
+        rows = list(csv.DictReader(file))
+    weights = [float(row["weight"]) for row in rows] if weighted else None
+    return [
+        build_request(f"/{row['tenant']}/{row['api']}/get", {"X-API-Key": row["api_key"]})
+        for row in random.Random(seed).choices(rows, weights=weights, k=count)
+    ]
+
+
+def _load_process(port, requests, connections, duration, queue):
+    async def main():
+        result = LoadResult()
+        started = time.monotonic()
+        deadline = started + duration
+        # Connections start at different points of the request list.
+        await asyncio.gather(
+            *(
+                _connection_loop(port, requests, index * len(requests) // connections, deadline, result)
+                for index in range(connections)
+            )
+        )
+        result.elapsed = time.monotonic() - started
+        return result
+
+    queue.put(asyncio.run(main()))
+
+
+def run_load(
+    port: int, request: bytes | list[bytes], connections: int = 64, duration: float = 10.0, processes: int = 1
+) -> LoadResult:
+    """Drive ``request`` (or each connection in turn through a list of them)
+    over keep-alive connections from ``processes`` clients."""
+    requests = request if isinstance(request, list) else [request]
+    queue = multiprocessing.Queue()
+    per_process = max(1, connections // processes)
+    clients = [
+        multiprocessing.Process(target=_load_process, args=(port, requests, per_process, duration, queue))
+        for _ in range(processes)
+    ]
+    for client in clients:
+        client.start()
+    total = LoadResult()
+    for _ in clients:
+        total.merge(queue.get())
+    for client in clients:
+        client.join()
+    return total
@@ -0,0 +1,132 @@
+"""Control-plane JSON endpoints under WSGI (``runserver``) vs. ASGI (uvicorn).
+
+Seeds a freshly migrated SQLite database with a tenant holding ``--apis``
+APIs and a month of usage rollups, sets live per-minute counters for them in
+Redis (``redis-server`` on ``PATH``, else fakeredis' TCP server, which
+spins a thread per open connection: pass ``--no-live`` to leave Redis out
+rather than measure that), then drives ``/usage/summary/`` and
+``/apis/`` with ``--connections`` concurrent logged-in clients against a
+single server process of each kind:
+
+* ``wsgi``: ``manage.py runserver`` (the previous deployment), a thread per
+  connection, each async view run on its own event loop.
+* ``asgi``: ``uvicorn control_plane.asgi:application``, one event loop.
+
+    python benchmarks/bench_asgi.py --connections 32 --duration 10
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import PROJECT_ROOT, build_request, free_port, run_load, start_redis, wait_for_port
+
+CONTROL_PLANE = os.path.join(PROJECT_ROOT, "control_plane")
+
+
+def _seed(apis: int) -> tuple[str, list[str]]:
+    """Returns the session cookie of the tenant's user and the names of the
+    APIs' usage counters."""
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from django.utils.timezone import now
+
+    from apis.models import API
+    from tenants.models import Tenant
+    from usage.models import DailyUsage
+
+    user = User.objects.create_user(username="bench", password="bench-password")
+    tenant = Tenant.objects.create(user=user, name="Bench", slug="bench")
+    created = API.objects.bulk_create(
+        API(tenant=tenant, name=f"API {index}", slug=f"api-{index}", upstream_base_url="http://upstream")
+        for index in range(apis)
+    )
+    today = now().date()
+    DailyUsage.objects.bulk_create(
+        DailyUsage(day=today.replace(day=day), tenant=tenant, api=api, requests=1000, updated_at=now())
+        for day in range(1, today.day + 1)
+        for api in created
+    )
+    client = Client()
+    client.force_login(user)
+    return client.cookies["sessionid"].value, [f"usage:{tenant.id}:{api.id}" for api in created]
+
+
+def _set_counters(redis_url: str, counters: list[str]) -> None:
+    import redis
+
+    minute = int(time.time() // 60)
+    client = redis.Redis.from_url(redis_url)
+    for counter in counters:
+        # Far enough ahead that the counters are live for the whole run.
+        for offset in range(-1, 60):
+            client.set(f"{counter}:{minute + offset}", 10, ex=3600)
+    client.close()
+
+
+def _serve(kind: str, port: int, env: dict) -> subprocess.Popen:
+    if kind == "wsgi":
+        command = [sys.executable, "manage.py", "runserver", "--noreload", f"127.0.0.1:{port}"]
+    else:
+        command = [
+            sys.executable, "-m", "uvicorn", "control_plane.asgi:application",
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log",
+        ]
+    server = subprocess.Popen(command, cwd=CONTROL_PLANE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port, timeout=60)
+    except RuntimeError:
+        server.kill()
+        raise
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--apis", type=int, default=20)
+    parser.add_argument("--no-live", action="store_true", help="Serve the summary without live counters.")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="gateway-bench-")
+    # Without REDIS_URL the servers' own cache stays in memory.
+    os.environ.pop("REDIS_URL", None)
+    os.environ.update(DATABASE_PATH=os.path.join(workdir, "db.sqlite3"), DEBUG="false", ALLOWED_HOSTS="127.0.0.1")
+    subprocess.run(
+        [sys.executable, "manage.py", "migrate", "--noinput"], cwd=CONTROL_PLANE, check=True, stdout=subprocess.DEVNULL
+    )
+    sys.path.insert(0, CONTROL_PLANE)
+    os.environ["DJANGO_SETTINGS_MODULE"] = "control_plane.settings"
+    import django
+
+    django.setup()
+    session, counters = _seed(args.apis)
+    headers = {"Cookie": f"sessionid={session}"}
+
+    for kind in ("wsgi", "asgi"):
+        # A fresh Redis per server, so connections left open by one run don't
+        # slow the next down.
+        redis_url, stop_redis = ("", lambda: None) if args.no_live else start_redis()
+        if redis_url:
+            _set_counters(redis_url, counters)
+        port = free_port()
+        # REDIS_URLS points the usage views at the gateway's counters.
+        server = _serve(kind, port, dict(os.environ, REDIS_URLS=redis_url))
+        try:
+            for path in ("/usage/summary/", "/apis/"):
+                result = run_load(
+                    port, build_request(path, headers), connections=args.connections, duration=args.duration
+                )
+                print(f"{kind:<5} {path:<16} {result.summary()}")
+        finally:
+            server.send_signal(signal.SIGINT)
+            server.wait(timeout=30)
+            stop_redis()
+
+
+if __name__ == "__main__":
+    main()
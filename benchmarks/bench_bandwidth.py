@@ -0,0 +1,192 @@
+"""Accuracy and cost of response shaping and byte quotas.
+
+Downloads through a single data-plane worker (fast path on), from a stub
+upstream serving bodies of any size, ``--concurrency`` at a time, as keys on
+plans with:
+
+* ``unmetered``: neither byte quotas nor shaping (large bodies are still
+  relayed as they arrive rather than read whole);
+* ``byte quotas``: all four byte quotas set, too high to reach, so every
+  request is checked and its bytes counted in Redis (a local ``redis-server``
+  if it is on ``PATH``, else fakeredis);
+* ``shaped``: ``max_bytes_per_second`` of each of ``--rates`` (MiB/s), with
+  bodies of ``--seconds`` at that rate.
+
+For each it reports the throughput of each download (for shaped ones, how
+far it is from the target), the worker's CPU time per GiB relayed and its
+peak RSS, which stays flat however large the bodies: none is held whole.
+
+    python benchmarks/bench_bandwidth.py --size 256 --rates 1 10 25
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import (
+    API_SLUG,
+    PROJECT_ROOT,
+    add_tenant,
+    free_port,
+    seed_database,
+    start_redis,
+    wait_for_port,
+)
+
+MiB = 1024 * 1024
+CHUNK = b"x" * (256 * 1024)
+NO_LIMIT = 10**15
+
+
+async def _serve_download(reader, writer):
+    """Answers ``GET /<bytes>`` with that many bytes, keep-alive."""
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            size = int(head.split(b" ", 2)[1].rsplit(b"/", 1)[1])
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\n"
+                         b"Content-Length: %d\r\n\r\n" % size)
+            while size > 0:
+                writer.write(CHUNK[:size])
+                size -= len(CHUNK)
+                await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        writer.close()
+
+
+def _run_upstream(port: int) -> None:
+    async def main():
+        server = await asyncio.start_server(_serve_download, "127.0.0.1", port, backlog=1024)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def _cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as fh:
+        fields = fh.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _peak_rss_mib(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as fh:
+        for line in fh:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+async def _download(port: int, tenant: str, key: str, size: int) -> float:
+    """Seconds to receive a ``size``-byte body."""
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"GET /{tenant}/{API_SLUG}/{size} HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+        f"X-API-Key: {key}\r\nConnection: close\r\n\r\n".encode()
+    )
+    head = await reader.readuntil(b"\r\n\r\n")
+    if not head.startswith(b"HTTP/1.1 200"):
+        raise RuntimeError(head.split(b"\r\n", 1)[0].decode())
+    received = 0
+    # Chunked framing adds a few bytes per chunk on top of the body.
+    while chunk := await reader.read(1024 * 1024):
+        received += len(chunk)
+    writer.close()
+    if received < size:
+        raise RuntimeError(f"Received {received} of {size} bytes")
+    return time.perf_counter() - started
+
+
+async def _measure(pid: int, port: int, label: str, tenant: str, size: int, target: float | None, args) -> None:
+    cpu = _cpu_seconds(pid)
+    timings = await asyncio.gather(
+        *(_download(port, tenant, f"{tenant}_key", size) for _ in range(args.concurrency))
+    )
+    cpu = _cpu_seconds(pid) - cpu
+    rates = [size / elapsed / MiB for elapsed in timings]
+    relayed = size * args.concurrency
+    line = (
+        f"{label:<18} {statistics.median(rates):>9,.1f} MiB/s per download"
+        f" {cpu / (relayed / 2**30):>7.2f} CPU s/GiB  peak RSS {_peak_rss_mib(pid):6.1f} MiB"
+    )
+    if target:
+        error = max(abs(rate / target - 1) for rate in rates)
+        line += f"  (target {target:g}, worst {error:.1%} off)"
+    print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=256, help="MiB per unshaped download.")
+    parser.add_argument("--rates", type=float, nargs="+", default=[1, 10, 25], help="Shaped rates, MiB/s.")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Length of each shaped download.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    upstream_port = free_port()
+    upstream = multiprocessing.Process(target=_run_upstream, args=(upstream_port,), daemon=True)
+    upstream.start()
+    wait_for_port(upstream_port)
+    redis_url, stop_redis = start_redis()
+
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    path = os.path.join(tempfile.mkdtemp(prefix="gateway-bench-"), "db.sqlite3")
+    database_url = seed_database(path, upstream_url)
+    import sqlalchemy
+
+    from data_plane.fastapi_app.tables import billing_plan
+
+    cases = [("unmetered", "unmetered", {}, args.size * MiB, None)]
+    cases.append((
+        "byte quotas", "quotas",
+        {f"bytes_{direction}_per_{window}": NO_LIMIT for direction in ("in", "out") for window in ("minute", "month")},
+        args.size * MiB, None,
+    ))
+    for rate in args.rates:
+        cases.append((
+            f"shaped {rate:g} MiB/s", f"shaped-{rate:g}".replace(".", "-"),
+            {"max_bytes_per_second": int(rate * MiB)}, int(rate * MiB * args.seconds), rate,
+        ))
+    engine = sqlalchemy.create_engine(f"sqlite:///{path}")
+    for _, tenant, plan, _, _ in cases:
+        add_tenant(path, tenant, f"{tenant}_key", upstream_url)
+        if plan:
+            with engine.begin() as conn:
+                plan_id = conn.execute(sqlalchemy.text("SELECT max(id) FROM billing_plan")).scalar()
+                conn.execute(billing_plan.update().where(billing_plan.c.id == plan_id).values(**plan))
+    engine.dispose()
+
+    port = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "data_plane.fastapi_app.server",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", "1", "--log-level", "warning", "--graceful-timeout", "5",
+        ],
+        cwd=PROJECT_ROOT,
+        env=dict(os.environ, DATABASE_URL=database_url, REDIS_URL=redis_url, GATEWAY_FAST_PATH="1"),
+    )
+    try:
+        wait_for_port(port)
+
+        async def run():
+            for label, tenant, _, size, target in cases:
+                await _measure(server.pid, port, label, tenant, size, target, args)
+
+        asyncio.run(run())
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+        upstream.terminate()
+        stop_redis()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Billing run time over a month of usage rollups.
+
+Seeds a freshly migrated SQLite database with ``--tenants`` tenants holding
+``--keys`` keys between them, one ``DailyUsage`` row per key and day of
+September 2026, then times ``run_billing --month 2026-09``: once from
+scratch, once with nothing changed and once after one tenant's usage moved.
+
+    python benchmarks/bench_billing.py --keys 100000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import PROJECT_ROOT
+
+DAYS = 30
+
+
+def _seed(path: str, tenants: int, keys: int) -> None:
+    db = sqlite3.connect(path)
+    joined = "2026-09-01 00:00:00"
+    db.executemany(
+        "INSERT INTO auth_user (id, password, is_superuser, username, first_name, last_name, email, "
+        "is_staff, is_active, date_joined) VALUES (?, '', 0, ?, '', '', '', 0, 1, ?)",
+        ((tenant, f"user{tenant}", joined) for tenant in range(1, tenants + 1)),
+    )
+    db.executemany(
+        "INSERT INTO tenants_tenant (id, user_id, name, slug, is_active, created_at) VALUES (?, ?, ?, ?, 1, ?)",
+        ((tenant, tenant, f"Tenant {tenant}", f"tenant-{tenant}", joined) for tenant in range(1, tenants + 1)),
+    )
+    db.executemany(
+        "INSERT INTO apis_api (id, tenant_id, name, slug, upstream_base_url, auth_header_name, is_active, "
+        "created_at) VALUES (?, ?, 'API', 'api', 'http://upstream', 'X-API-Key', 1, ?)",
+        ((tenant, tenant, joined) for tenant in range(1, tenants + 1)),
+    )
+    # Like keys created from the dashboard, every key has a plan of its own.
+    db.executemany(
+        "INSERT INTO billing_plan (id, name, requests_per_minute, requests_per_month, scheduling_weight, "
+        "redis_failure_policy, base_price, included_requests, overage_price_per_1000, is_active) "
+        "VALUES (?, 'Plan', 1000, 1000000, 1, 'local', '5.00', 10000, '0.4', 1)",
+        ((key,) for key in range(1, keys + 1)),
+    )
+    db.executemany(
+        "INSERT INTO billing_pricetier (plan_id, up_to, price_per_1000) VALUES (?, 100000, '0.5')",
+        ((key,) for key in range(1, keys + 1, 10)),
+    )
+    db.executemany(
+        "INSERT INTO apis_apikey (id, tenant_id, plan_id, hashed_key, is_active, created_at) "
+        "VALUES (?, ?, ?, ?, 1, ?)",
+        ((key, key % tenants + 1, key, f"{key:064x}", joined) for key in range(1, keys + 1)),
+    )
+    rng = random.Random(0)
+    db.executemany(
+        "INSERT INTO usage_dailyusage (day, tenant_id, api_id, api_key_id, client_id, requests, bytes_in, "
+        "bytes_out, updated_at) VALUES (?, ?, ?, ?, NULL, ?, ?, ?, ?)",
+        (
+            (f"2026-09-{day:02d}", key % tenants + 1, key % tenants + 1, key, requests, requests * 200,
+             requests * 2000, f"2026-09-{day:02d} 23:59:59")
+            for day in range(1, DAYS + 1)
+            for key in range(1, keys + 1)
+            for requests in (rng.randrange(5000),)
+        ),
+    )
+    db.commit()
+    db.close()
+
+
+def _run_billing(env: dict) -> tuple[float, str]:
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "manage.py", "run_billing", "--month", "2026-09"],
+        cwd=os.path.join(PROJECT_ROOT, "control_plane"), env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return time.perf_counter() - started, output.strip()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenants", type=int, default=1000)
+    parser.add_argument("--keys", type=int, default=100_000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="gateway-bench-")
+    path = os.path.join(workdir, "db.sqlite3")
+    env = dict(os.environ, DATABASE_PATH=path)
+    subprocess.run(
+        [sys.executable, "manage.py", "migrate", "--noinput"],
+        cwd=os.path.join(PROJECT_ROOT, "control_plane"), env=env, check=True, stdout=subprocess.DEVNULL,
+    )
+    started = time.perf_counter()
+    _seed(path, args.tenants, args.keys)
+    print(f"seeded {args.keys * DAYS:,} rollup rows in {time.perf_counter() - started:.1f}s")
+
+    for label in ("full", "unchanged"):
+        elapsed, output = _run_billing(env)
+        print(f"{label:<10} {elapsed:>6.1f}s  {output}")
+
+    db = sqlite3.connect(path)
+    db.execute("UPDATE usage_dailyusage SET requests = requests + 1, updated_at = '2026-10-01 00:00:00' "
+               "WHERE tenant_id = 1 AND day = '2026-09-30'")
+    db.commit()
+    db.close()
+    elapsed, output = _run_billing(env)
+    print(f"{'one tenant':<10} {elapsed:>6.1f}s  {output}")
+
+
+if __name__ == "__main__":
+    main()
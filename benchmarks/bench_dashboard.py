@@ -0,0 +1,176 @@
+"""Dashboard requests/s and SQLite write contention, uncached vs. cached.
+
+Seeds a freshly migrated SQLite database with a tenant holding ``--apis``
+APIs and ``--keys`` keys, then for each configuration runs ``--clients``
+processes loading the dashboard with a logged-in session while another
+process commits small batches of request events to the same file, as the
+event consumer does:
+
+* ``uncached``: database sessions and no cache (the previous settings).
+* ``cached``: the current settings, cached sessions and per-tenant fragments
+  in Redis (a local ``redis-server`` if one is on ``PATH``, else the
+  per-process memory cache).
+
+    python benchmarks/bench_dashboard.py --clients 4 --duration 10
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import PROJECT_ROOT, free_port, wait_for_port
+
+CONTROL_PLANE = os.path.join(PROJECT_ROOT, "control_plane")
+
+UNCACHED_SETTINGS = """\
+from control_plane.settings import *  # noqa: F401,F403
+
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+SESSION_ENGINE = "django.contrib.sessions.backends.db"
+"""
+
+
+def _setup(settings_module: str) -> None:
+    sys.path[:0] = [CONTROL_PLANE, os.environ["BENCH_SETTINGS_DIR"]]
+    os.environ["DJANGO_SETTINGS_MODULE"] = settings_module
+    import django
+
+    django.setup()
+
+
+def _seed(settings_module: str, apis: int, keys: int) -> None:
+    _setup(settings_module)
+    from django.contrib.auth.models import User
+
+    from apis.models import API, APIKey
+    from billing.models import Plan
+    from tenants.models import Tenant
+
+    user = User.objects.create_user(username="bench", password="bench-password")
+    tenant = Tenant.objects.create(user=user, name="Bench", slug="bench")
+    plan = Plan.objects.create(name="Bench", requests_per_minute=100, requests_per_month=100_000)
+    API.objects.bulk_create(
+        API(tenant=tenant, name=f"API {index}", slug=f"api-{index}", upstream_base_url="http://upstream")
+        for index in range(apis)
+    )
+    APIKey.objects.bulk_create(
+        APIKey(tenant=tenant, plan=plan, hashed_key=f"{index:064x}") for index in range(keys)
+    )
+
+
+def _client(settings_module: str, duration: float, counter) -> None:
+    _setup(settings_module)
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    client = Client(HTTP_HOST="localhost")
+    client.force_login(User.objects.get(username="bench"))
+    requests = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        response = client.get("/dashboard/")
+        assert response.status_code == 200, response.status_code
+        requests += 1
+    with counter.get_lock():
+        counter.value += requests
+
+
+def _writer(settings_module: str, label: str, duration: float, results) -> None:
+    _setup(settings_module)
+    from django.db import OperationalError, transaction
+
+    from apis.models import API
+    from usage.models import RequestEvent
+
+    api = API.objects.first()
+    commits, locked, batch = [], 0, 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                RequestEvent.objects.bulk_create(
+                    RequestEvent(
+                        stream_id=f"{label}-{batch}-{index}", day="2026-10-01", timestamp="2026-10-01T00:00:00Z",
+                        tenant_id=api.tenant_id, api=api, method="GET", status=200, latency_us=1000,
+                        bytes_in=0, bytes_out=0,
+                    )
+                    for index in range(100)
+                )
+        except OperationalError:
+            locked += 1
+        else:
+            commits.append(time.perf_counter() - started)
+        batch += 1
+        time.sleep(0.005)
+    results.put((commits, locked))
+
+
+def _run(label: str, settings_module: str, clients: int, duration: float) -> None:
+    context = multiprocessing.get_context("spawn")
+    counter = context.Value("q", 0)
+    results = context.Queue()
+    processes = [context.Process(target=_client, args=(settings_module, duration, counter)) for _ in range(clients)]
+    processes.append(context.Process(target=_writer, args=(settings_module, label, duration, results)))
+    for process in processes:
+        process.start()
+    commits, locked = results.get()
+    for process in processes:
+        process.join()
+    commits.sort()
+    p99 = commits[int(len(commits) * 0.99)] * 1000 if commits else float("nan")
+    print(
+        f"{label:<9} {counter.value / duration:>8,.0f} req/s   writer: {len(commits)} commits, "
+        f"median {statistics.median(commits) * 1000:.1f} ms, p99 {p99:.1f} ms, {locked} 'database is locked'"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--apis", type=int, default=50)
+    parser.add_argument("--keys", type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="gateway-bench-")
+    with open(os.path.join(workdir, "bench_uncached_settings.py"), "w") as settings_file:
+        settings_file.write(UNCACHED_SETTINGS)
+    os.environ.update(BENCH_SETTINGS_DIR=workdir, DATABASE_PATH=os.path.join(workdir, "db.sqlite3"))
+
+    redis_server = None
+    os.environ.pop("REDIS_URL", None)
+    if shutil.which("redis-server"):
+        port = free_port()
+        redis_server = subprocess.Popen(
+            ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"], stdout=subprocess.DEVNULL
+        )
+        wait_for_port(port)
+        os.environ["REDIS_URL"] = f"redis://127.0.0.1:{port}"
+    else:
+        print("redis-server not found, the cached run uses the per-process memory cache")
+
+    try:
+        subprocess.run(
+            [sys.executable, "manage.py", "migrate", "--noinput"],
+            cwd=CONTROL_PLANE, check=True, stdout=subprocess.DEVNULL,
+        )
+        seed = multiprocessing.get_context("spawn").Process(
+            target=_seed, args=("control_plane.settings", args.apis, args.keys)
+        )
+        seed.start()
+        seed.join()
+        _run("uncached", "bench_uncached_settings", args.clients, args.duration)
+        _run("cached", "control_plane.settings", args.clients, args.duration)
+    finally:
+        if redis_server is not None:
+            redis_server.terminate()
+
+
+if __name__ == "__main__":
+    main()
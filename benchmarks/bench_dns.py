@@ -0,0 +1,105 @@
+"""Upstream DNS resolution under connection churn.
+
+The upstream is registered by hostname (``upstream.bench.test``), served by
+a local stub resolver that answers after ``--resolver-delay`` seconds, and
+closes its connection after every response, so each proxied request opens a
+new upstream connection. Phases, each on a fresh single worker:
+
+* ``uncached``: TTLs clamped to 0, one DNS lookup per connection.
+* ``cached``: answers cached for their TTL.
+* ``resolver down``: the stub resolver is stopped after warm-up and the TTL
+  is 1s, so requests only succeed if stale answers are served.
+
+    python benchmarks/bench_dns.py --duration 10
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+
+from _common import (
+    API_SLUG,
+    PROJECT_ROOT,
+    RAW_KEY,
+    TENANT_SLUG,
+    build_request,
+    free_port,
+    run_load,
+    seed_database,
+    start_stub_resolver,
+    start_stub_upstream,
+    wait_for_port,
+)
+
+UPSTREAM_HOST = "upstream.bench.test"
+
+
+def _run_phase(label: str, env: dict, args, stop_resolver=None) -> None:
+    port = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "data_plane.fastapi_app.server",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", "1", "--log-level", "error",
+        ],
+        cwd=PROJECT_ROOT,
+        env=env,
+    )
+    try:
+        wait_for_port(port)
+        request = build_request(f"/{TENANT_SLUG}/{API_SLUG}/", {"X-API-Key": RAW_KEY})
+        run_load(port, request, connections=1, duration=1)
+        if stop_resolver is not None:
+            stop_resolver()
+        result = run_load(port, request, connections=args.connections, duration=args.duration)
+        print(f"{label:<14} {result.summary()}")
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--resolver-delay", type=float, default=0.02, help="Stub resolver response time in seconds.")
+    args = parser.parse_args()
+
+    upstream_port = free_port()
+    upstream = start_stub_upstream(upstream_port, close_connections=True)
+    records = {UPSTREAM_HOST: ["127.0.0.1"]}
+    resolvers = []
+
+    def start_resolver(ttl: int) -> str:
+        resolver_port = free_port()
+        resolvers.append(start_stub_resolver(resolver_port, records, ttl=ttl, delay=args.resolver_delay))
+        return f"127.0.0.1:{resolver_port}"
+
+    workdir = tempfile.mkdtemp(prefix="gateway-bench-")
+    database_url = seed_database(
+        os.path.join(workdir, "db.sqlite3"), f"http://{UPSTREAM_HOST}:{upstream_port}"
+    )
+    env = dict(os.environ, DATABASE_URL=database_url, REDIS_URL="redis://127.0.0.1:1")
+    try:
+        _run_phase(
+            "uncached",
+            dict(env, GATEWAY_DNS_NAMESERVERS=start_resolver(60), GATEWAY_DNS_MIN_TTL="0", GATEWAY_DNS_MAX_TTL="0"),
+            args,
+        )
+        _run_phase("cached", dict(env, GATEWAY_DNS_NAMESERVERS=start_resolver(60)), args)
+        _run_phase(
+            "resolver down",
+            dict(env, GATEWAY_DNS_NAMESERVERS=start_resolver(1), GATEWAY_DNS_MIN_TTL="1"),
+            args,
+            stop_resolver=lambda: resolvers[-1].terminate(),
+        )
+    finally:
+        upstream.terminate()
+        for resolver in resolvers:
+            resolver.terminate()
+
+
+if __name__ == "__main__":
+    main()
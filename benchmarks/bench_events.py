@@ -0,0 +1,95 @@
+"""Request event pipeline throughput, gateway to control-plane table.
+
+Uses a local ``redis-server`` (on ``PATH``) or, failing that, fakeredis' TCP
+server, which is much slower than Redis; pass ``--redis-url`` to use another.
+
+* ``produce``: ``--events`` request events recorded through the data plane's
+  ``EventRecorder`` and flushed to the stream in pipelined batches.
+* ``consume``: the control plane's ``consume_events --once`` reading them
+  into a freshly migrated SQLite database, timed from its own report.
+
+    python benchmarks/bench_events.py --events 500000
+"""
+import argparse
+import asyncio
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from _common import PROJECT_ROOT, start_redis
+
+STREAM = "bench:events"
+
+
+async def _produce(url: str, events: int, batch_size: int) -> float:
+    import redis.asyncio as redis
+
+    from data_plane.fastapi_app.events import EventRecorder
+    from data_plane.fastapi_app.metrics import Metrics
+
+    client = redis.from_url(url, decode_responses=True)
+    await client.delete(STREAM)
+    recorder = EventRecorder(
+        client, Metrics(), stream=STREAM, max_len=events * 2, batch_size=batch_size, max_buffer=events
+    )
+    auth = SimpleNamespace(tenant={"id": 1}, api={"id": 1}, key_id=1, client_id=None)
+    await recorder.start()
+    started = time.perf_counter()
+    for index in range(events):
+        recorder.record(auth, "GET", 200, 0.0042, 128, 2048)
+        if index % batch_size == 0:
+            # Yield like a busy worker would between requests.
+            await asyncio.sleep(0)
+    await recorder.aclose()
+    elapsed = time.perf_counter() - started
+    written = await client.xlen(STREAM)
+    await client.aclose()
+    assert written == events, f"{written} of {events} events reached the stream"
+    return events / elapsed
+
+
+def _consume(url: str, batch_size: int) -> tuple[int, float]:
+    workdir = tempfile.mkdtemp(prefix="gateway-bench-")
+    env = dict(os.environ, DATABASE_PATH=os.path.join(workdir, "db.sqlite3"))
+    manage = [sys.executable, "manage.py"]
+    cwd = os.path.join(PROJECT_ROOT, "control_plane")
+    subprocess.run(manage + ["migrate", "--noinput"], cwd=cwd, env=env, check=True, stdout=subprocess.DEVNULL)
+    output = subprocess.run(
+        manage + [
+            "consume_events", "--once", "--redis-url", url, "--stream", STREAM,
+            "--batch-size", str(batch_size),
+        ],
+        cwd=cwd, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    stored, elapsed = re.search(r"Stored (\d+) request events in ([\d.]+)s", output).groups()
+    return int(stored), float(elapsed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--redis-url", help="Use this Redis instead of starting one.")
+    parser.add_argument("--produce-batch", type=int, default=500)
+    parser.add_argument("--consume-batch", type=int, default=10_000)
+    args = parser.parse_args()
+
+    stop = None
+    url = args.redis_url
+    if url is None:
+        url, stop = start_redis()
+    try:
+        rate = asyncio.run(_produce(url, args.events, args.produce_batch))
+        print(f"produce  {rate:>10,.0f} events/s")
+        stored, elapsed = _consume(url, args.consume_batch)
+        print(f"consume  {stored / elapsed:>10,.0f} events/s  ({stored} stored in {elapsed:.1f}s)")
+    finally:
+        if stop is not None:
+            stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Noisy-neighbour latency with and without the fair-queuing scheduler.
+
+A noisy tenant (plan weight 1) floods the gateway over ``--noisy``
+connections while a quiet tenant (plan weight ``--weight``) sends requests
+over ``--quiet`` connections. The upstream answers after ``--delay`` seconds
+and the worker may only have ``--capacity`` requests at the upstream at
+once, so the gateway is saturated and the order in which it dispatches
+waiting requests decides the quiet tenant's latency:
+
+* ``fifo``: scheduler disabled, dispatch capacity enforced by the httpx pool
+  (first come, first served).
+* ``wfq``: weighted fair queuing across tenants with the same capacity.
+
+    python benchmarks/bench_fair_queuing.py --duration 10
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from _common import (
+    API_SLUG,
+    PROJECT_ROOT,
+    RAW_KEY,
+    TENANT_SLUG,
+    add_tenant,
+    build_request,
+    free_port,
+    run_load,
+    seed_database,
+    start_stub_upstream,
+    wait_for_port,
+)
+
+QUIET_SLUG = "quiet-tenant"
+QUIET_KEY = "quiet_key_12345"
+
+
+def _run_variant(label: str, env: dict, args) -> None:
+    port = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "data_plane.fastapi_app.server",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", "1", "--log-level", "warning",
+        ],
+        cwd=PROJECT_ROOT,
+        env=env,
+    )
+    try:
+        wait_for_port(port)
+        noisy = build_request(f"/{TENANT_SLUG}/{API_SLUG}/", {"X-API-Key": RAW_KEY})
+        quiet = build_request(f"/{QUIET_SLUG}/{API_SLUG}/", {"X-API-Key": QUIET_KEY})
+        # Warm up both routes before measuring.
+        run_load(port, quiet, connections=1, duration=1)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            noisy_load = pool.submit(run_load, port, noisy, args.noisy, args.duration)
+            quiet_load = pool.submit(run_load, port, quiet, args.quiet, args.duration)
+            noisy_result, quiet_result = noisy_load.result(), quiet_load.result()
+        print(f"{label}")
+        print(f"  noisy  {noisy_result.summary()}")
+        print(f"  quiet  {quiet_result.summary()}")
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--noisy", type=int, default=64, help="Noisy tenant connections.")
+    parser.add_argument("--quiet", type=int, default=2, help="Quiet tenant connections.")
+    parser.add_argument("--weight", type=int, default=10, help="Quiet tenant's plan scheduling weight.")
+    parser.add_argument("--capacity", type=int, default=4, help="Concurrent upstream requests per worker.")
+    parser.add_argument("--delay", type=float, default=0.05, help="Upstream response time in seconds.")
+    args = parser.parse_args()
+
+    upstream_port = free_port()
+    upstream = start_stub_upstream(upstream_port, delay=args.delay)
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    workdir = tempfile.mkdtemp(prefix="gateway-bench-")
+    db_path = os.path.join(workdir, "db.sqlite3")
+    database_url = seed_database(db_path, upstream_url)
+    add_tenant(db_path, QUIET_SLUG, QUIET_KEY, upstream_url, scheduling_weight=args.weight)
+
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        REDIS_URL="redis://127.0.0.1:1",
+        # Only the dispatch order is under test: no per-tenant bulkhead or
+        # shedding, and waits long enough that nothing times out.
+        GATEWAY_TENANT_MAX_IN_FLIGHT="0",
+        GATEWAY_API_MAX_IN_FLIGHT="0",
+        GATEWAY_ADAPTIVE_CONCURRENCY="false",
+        GATEWAY_IN_FLIGHT_QUEUE_TIMEOUT="60",
+        GATEWAY_UPSTREAM_MAX_CONNECTIONS=str(args.capacity),
+    )
+    try:
+        _run_variant("fifo", dict(env, GATEWAY_SCHEDULER_CAPACITY="0"), args)
+        _run_variant("wfq", dict(env, GATEWAY_SCHEDULER_CAPACITY=str(args.capacity)), args)
+    finally:
+        upstream.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""FastAPI router vs. the raw ASGI fast path on the same proxy workload.
+
+Runs a single data-plane worker with ``GATEWAY_FAST_PATH`` off and then on,
+and drives two workloads against each: a rejected request (missing
+``X-API-Key``), which isolates the framework's per-request overhead, and a
+fully proxied request to a stub upstream.
+
+    python benchmarks/bench_fast_path.py --duration 10
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+
+from _common import (
+    API_SLUG,
+    PROJECT_ROOT,
+    RAW_KEY,
+    TENANT_SLUG,
+    build_request,
+    free_port,
+    run_load,
+    seed_database,
+    start_stub_upstream,
+    wait_for_port,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--connections", type=int, default=64)
+    args = parser.parse_args()
+
+    upstream_port = free_port()
+    upstream = start_stub_upstream(upstream_port)
+    workdir = tempfile.mkdtemp(prefix="gateway-bench-")
+    database_url = seed_database(os.path.join(workdir, "db.sqlite3"), f"http://127.0.0.1:{upstream_port}")
+
+    path = f"/{TENANT_SLUG}/{API_SLUG}/get"
+    workloads = {
+        "401 missing key": build_request(path),
+        "200 proxied": build_request(path, {"X-API-Key": RAW_KEY}),
+    }
+
+    try:
+        for workload, request in workloads.items():
+            results = {}
+            for mode, flag in (("router", "0"), ("fast path", "1")):
+                port = free_port()
+                env = dict(
+                    os.environ,
+                    DATABASE_URL=database_url,
+                    REDIS_URL="redis://127.0.0.1:1",
+                    GATEWAY_FAST_PATH=flag,
+                )
+                server = subprocess.Popen(
+                    [
+                        sys.executable, "-m", "data_plane.fastapi_app.server",
+                        "--host", "127.0.0.1", "--port", str(port),
+                        "--workers", "1", "--log-level", "warning",
+                    ],
+                    cwd=PROJECT_ROOT,
+                    env=env,
+                )
+                try:
+                    wait_for_port(port)
+                    run_load(port, request, connections=8, duration=1.0)
+                    results[mode] = run_load(port, request, connections=args.connections, duration=args.duration)
+                finally:
+                    server.send_signal(signal.SIGTERM)
+                    server.wait(timeout=60)
+                print(f"[{workload}] {mode:>9}: {results[mode].summary()}")
+            gain = results["fast path"].rps / results["router"].rps - 1 if results["router"].rps else 0.0
+            print(f"[{workload}] fast path throughput change: {gain:+.1%}")
+    finally:
+        upstream.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Memory and lookup cost of the shared key index vs. a dict of key rows.
+
+Builds ``--keys`` keys, then reports:
+
+* ``dict``: Python heap held by a ``hashed_key -> row dict`` mapping (what
+  every worker would hold to authenticate without the database), measured
+  with ``tracemalloc``;
+* ``key index``: the index file's size, the Python heap it needs once
+  mapped, and the proportional set size (PSS) of the mapping summed over
+  ``--workers`` processes that each looked up every key, i.e. what the
+  pages cost the host when all workers share them;
+* lookup time per operation for hits and misses, both ways.
+
+    python benchmarks/bench_key_index.py --keys 1000000 --workers 4
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import _common  # noqa: F401  (puts the project on sys.path)
+
+from data_plane.fastapi_app.key_index import KeyIndex, write_key_index
+
+
+def _rows(keys: int) -> list[tuple]:
+    rows = [
+        (hashlib.sha256(f"key-{index}".encode()).hexdigest(), index + 1, index % 1000 + 1, index % 50 + 1, True)
+        for index in range(keys)
+    ]
+    rows.sort()
+    return rows
+
+
+def _mapping_pss(path: str) -> int:
+    """Bytes of PSS this process has in mappings of ``path``."""
+    total, inside = 0, False
+    with open("/proc/self/smaps") as smaps:
+        for line in smaps:
+            fields = line.split()
+            if "-" in fields[0] and len(fields) >= 5:
+                inside = fields[-1] == path
+            elif inside and fields[0] == "Pss:":
+                total += int(fields[1]) * 1024
+    return total
+
+
+def _worker(path: str, hashed_keys: list[str], barrier, results) -> None:
+    index = KeyIndex.open(path)
+    for hashed_key in hashed_keys:
+        index.get(hashed_key)
+    # Measure while every worker has the pages mapped.
+    barrier.wait()
+    results.put(_mapping_pss(path))
+    barrier.wait()
+
+
+def _per_op(lookup, hashed_keys: list[str]) -> float:
+    started = time.perf_counter()
+    for hashed_key in hashed_keys:
+        lookup(hashed_key)
+    return (time.perf_counter() - started) / len(hashed_keys) * 1e9
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    args = parser.parse_args()
+
+    rows = _rows(args.keys)
+    hashed_keys = [row[0] for row in rows]
+
+    tracemalloc.start()
+    rows_by_key = {
+        hashed_key: {"id": key_id, "tenant_id": tenant_id, "plan_id": plan_id, "hashed_key": hashed_key,
+                     "is_active": is_active}
+        for hashed_key, key_id, tenant_id, plan_id, is_active in rows
+    }
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="gateway-bench-"), "keys.idx")
+    started = time.perf_counter()
+    write_key_index(rows, path)
+    built = time.perf_counter() - started
+    tracemalloc.start()
+    index = KeyIndex.open(path)
+    index_heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    barrier = context.Barrier(args.workers)
+    workers = [
+        context.Process(target=_worker, args=(path, hashed_keys, barrier, results)) for _ in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    pss = sum(results.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+
+    per_million = 1_000_000 / args.keys
+    print(f"{args.keys:,} keys, index built in {built:.1f}s")
+    print(f"dict       {dict_bytes / 2**20:9.1f} MiB per worker   ({dict_bytes * per_million / 2**20:,.0f} MiB per million keys)")
+    print(
+        f"key index  {index.nbytes / 2**20:9.1f} MiB file, {index_heap / 1024:.1f} KiB heap per worker, "
+        f"{pss / 2**20:.1f} MiB PSS over {args.workers} workers   "
+        f"({index.nbytes * per_million / 2**20:,.0f} MiB per million keys)"
+    )
+
+    rng = random.Random(0)
+    hits = rng.sample(hashed_keys, min(args.lookups, len(hashed_keys)))
+    misses = [hashlib.sha256(f"missing-{index}".encode()).hexdigest() for index in range(len(hits))]
+    for label, keys in (("hit", hits), ("miss", misses)):
+        print(
+            f"lookup {label:<4}  dict {_per_op(rows_by_key.get, keys):7.0f} ns/op   "
+            f"key index {_per_op(index.get, keys):7.0f} ns/op"
+        )
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
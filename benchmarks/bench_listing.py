@@ -0,0 +1,131 @@
+"""Dashboard and API listing latency for a tenant with 100k keys.
+
+Seeds a freshly migrated SQLite database with one tenant holding ``--keys``
+keys and ``--apis`` APIs, then times (median of ``--repeat`` requests through
+Django's test client):
+
+* ``all keys``: loading every key with its plan, as the dashboard did before
+  it was paginated, rendered to the size of the old page;
+* the paginated dashboard's first page, with the cache cleared before every
+  request (``cold``) and not (``warm``);
+* a page deep into the listing by keyset cursor, and the query for it by
+  cursor and by ``OFFSET``;
+* a key search, and the ``/apis/`` JSON listing.
+
+    python benchmarks/bench_listing.py --keys 100000
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import PROJECT_ROOT
+
+CONTROL_PLANE = os.path.join(PROJECT_ROOT, "control_plane")
+
+
+def _time(fn, repeat: int, before=None) -> tuple[float, int]:
+    timings, size = [], 0
+    for _ in range(repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        size = fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--apis", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="gateway-bench-")
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "db.sqlite3")
+    os.environ.pop("REDIS_URL", None)
+    os.environ["DEBUG"] = "false"
+    subprocess.run(
+        [sys.executable, "manage.py", "migrate", "--noinput"], cwd=CONTROL_PLANE, check=True, stdout=subprocess.DEVNULL
+    )
+    sys.path.insert(0, CONTROL_PLANE)
+    os.environ["DJANGO_SETTINGS_MODULE"] = "control_plane.settings"
+    import django
+
+    django.setup()
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from django.template import Context, Template
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+
+    from apis.listing import Page, encode_cursor
+    from apis.models import API, APIKey
+    from billing.models import Plan
+    from tenants.models import Tenant
+
+    setup_test_environment()
+    user = User.objects.create_user(username="bench", password="bench-password")
+    tenant = Tenant.objects.create(user=user, name="Bench", slug="bench")
+    plans = [
+        Plan.objects.create(name=f"Plan {index}", requests_per_minute=100, requests_per_month=10**6)
+        for index in range(10)
+    ]
+    started = time.perf_counter()
+    API.objects.bulk_create(
+        (API(tenant=tenant, name=f"API {index}", slug=f"api-{index}", upstream_base_url="http://upstream")
+         for index in range(args.apis)),
+        batch_size=5000,
+    )
+    APIKey.objects.bulk_create(
+        (APIKey(tenant=tenant, plan=plans[index % 10], hashed_key=f"{index:064x}") for index in range(args.keys)),
+        batch_size=5000,
+    )
+    print(f"seeded {args.keys:,} keys and {args.apis:,} APIs in {time.perf_counter() - started:.1f}s")
+
+    client = Client()
+    client.force_login(user)
+    keys = APIKey.objects.filter(tenant=tenant).select_related("plan")
+    deep = args.keys - 100
+
+    # The rows the old dashboard rendered for every key.
+    old_rows = Template(
+        "{% for key in api_keys %}<tr class=\"table__row\"><td class=\"mono\" title=\"{{ key.hashed_key }}\">"
+        "...{{ key.hashed_key|slice:\"-8:\" }}</td><td><span class=\"pill pill--blue\">"
+        "{{ key.plan.requests_per_minute }} req/min</span><span>{{ key.plan.name }}</span></td>"
+        "<td>{{ key.created_at|date:\"M d, Y\" }}</td></tr>{% endfor %}"
+    )
+
+    def all_keys():
+        return len(old_rows.render(Context({"api_keys": list(keys)})))
+
+    def get(path, params=None):
+        def request():
+            response = client.get(path, params)
+            assert response.status_code == 200, response.status_code
+            return len(response.content)
+        return request
+
+    cursor = Page(keys).queryset[deep - 1 : deep].get()
+    cases = [
+        ("all keys (unpaginated)", all_keys, None),
+        ("dashboard, cold", get("/dashboard/"), cache.clear),
+        ("dashboard, warm", get("/dashboard/"), None),
+        ("deep page, keyset", get("/dashboard/", {"keys_after": encode_cursor(cursor)}), cache.clear),
+        # Just the query, for comparison with the keyset page's.
+        ("deep page, OFFSET query", lambda: len(list(Page(keys).queryset[deep : deep + 25])), None),
+        ("deep page, keyset query", lambda: len(Page(keys, encode_cursor(cursor)).items), None),
+        ("key search", get("/dashboard/", {"keys_q": "fffe"}), cache.clear),
+        ("/apis/ JSON", get("/apis/"), cache.clear),
+    ]
+    for label, fn, before in cases:
+        elapsed, size = _time(fn, args.repeat, before)
+        print(f"{label:<24} {elapsed:>9.1f} ms  {size:>10,} {'rows' if 'query' in label else 'bytes'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Cost of hierarchical quotas: one script call for every level vs. the two
+counters per request they replaced.
+
+Drives ``Counters`` against a local Redis (``redis-server`` if it is on
+``PATH``, else fakeredis' TCP server) over ``--subjects`` tenants, one key
+each, and reports per-check latency (one check at a time) and checks/s
+(``--concurrency`` at once) for:
+
+* ``two counters``: the key's minute and month counters as before, two
+  ``INCRBY`` + ``EXPIRE`` round trips one after the other;
+* ``key``: the same two limits through ``check_rate_limits``' one call;
+* ``key + api``, ``key + api + tenant``: with the API's and the tenant's
+  minute and month quotas set too (4 and 6 counters).
+
+    python benchmarks/bench_quotas.py --checks 20000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from _common import start_redis  # also puts the project on sys.path
+
+import redis.asyncio as redis
+
+from data_plane.fastapi_app.counters import ADMIT_SCRIPT, Counters
+from data_plane.fastapi_app.metrics import Metrics
+from data_plane.fastapi_app.proxy import MONTH_TTL, check_rate_limits
+from data_plane.fastapi_app.sharding import ShardedRedis, node_name
+
+PLAN = {"requests_per_minute": 10**9, "requests_per_month": 10**12, "redis_failure_policy": "local"}
+QUOTA = {"requests_per_minute": 10**9, "requests_per_month": 10**12}
+UNLIMITED = {"requests_per_minute": None, "requests_per_month": None}
+
+
+async def _two_counters(counters, subject: int) -> None:
+    current_time = time.gmtime()
+    base = f"rate_limit:{subject}"
+    await counters.incr(f"{base}:{int(time.time() // 60)}", ttl=60, policy="local")
+    await counters.incr(f"{base}:month:{current_time.tm_year}-{current_time.tm_mon}", ttl=MONTH_TTL, policy="local")
+
+
+def _hierarchical(api_quota, tenant_quota):
+    async def check(counters, subject: int) -> None:
+        tenant = {"id": subject, **tenant_quota}
+        await check_rate_limits(counters, tenant, {"id": 1, **api_quota}, "key:1", PLAN)
+    return check
+
+
+CASES = {
+    "two counters": _two_counters,
+    "key": _hierarchical(UNLIMITED, UNLIMITED),
+    "key + api": _hierarchical(QUOTA, UNLIMITED),
+    "key + api + tenant": _hierarchical(QUOTA, QUOTA),
+}
+
+
+async def _latency(counters, check, args) -> list[float]:
+    samples = []
+    for subject in range(args.checks):
+        started = time.perf_counter()
+        await check(counters, subject % args.subjects)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def _throughput(counters, check, args) -> float:
+    deadline = time.perf_counter() + args.duration
+    done = 0
+
+    async def worker(subject):
+        nonlocal done
+        while time.perf_counter() < deadline:
+            await check(counters, subject % args.subjects)
+            subject += args.concurrency
+            done += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(args.concurrency)))
+    return done / (time.perf_counter() - started)
+
+
+async def _run(url: str, args) -> None:
+    client = redis.from_url(url, decode_responses=True, max_connections=args.concurrency)
+    store = ShardedRedis({node_name(url): client})
+    # A generous budget: this measures Redis, not the local fallback.
+    counters = Counters(store, Metrics(), timeout=5.0)
+    print(f"{'':<20} {'p50':>9} {'p99':>9} {'checks/s':>10}")
+    for label, check in CASES.items():
+        await client.flushdb()
+        # Loaded once per node in production too (and fakeredis' TCP server
+        # drops the connection redis-py retries on after a NOSCRIPT reply).
+        await client.script_load(ADMIT_SCRIPT)
+        await _latency(counters, check, argparse.Namespace(checks=200, subjects=args.subjects))
+        samples = sorted(await _latency(counters, check, args))
+        rate = await _throughput(counters, check, args)
+        print(
+            f"{label:<20} {statistics.median(samples) * 1e6:>7,.0f}us "
+            f"{samples[int(len(samples) * 0.99)] * 1e6:>7,.0f}us {rate:>10,.0f}"
+        )
+    await store.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checks", type=int, default=20_000, help="Sequential checks timed for latency.")
+    parser.add_argument("--subjects", type=int, default=10_000, help="Distinct tenants.")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+    url, stop = start_redis()
+    try:
+        asyncio.run(_run(url, args))
+    finally:
+        stop()
+
+
+if __name__ == "__main__":
+    main()
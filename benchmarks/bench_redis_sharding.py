@@ -0,0 +1,146 @@
+"""Rate-limit counter throughput across sharded Redis nodes.
+
+Starts ``--max-nodes`` local ``redis-server`` instances (the binary must be
+on ``PATH``), then for 1, 2, ... nodes drives the data plane's own
+``check_rate_limits`` through ``Counters`` and ``ShardedRedis`` from
+``--processes`` client processes over ``--subjects`` distinct tenants (one
+API key each, the tenants' and APIs' own quotas unset) and reports checks/s and the spread of subjects across nodes. Finally adds one more node to a populated
+ring and reports how many counters the rebalance moved and how long it took.
+
+    python benchmarks/bench_redis_sharding.py --max-nodes 4 --duration 10
+"""
+import argparse
+import asyncio
+import multiprocessing
+import shutil
+import subprocess
+import time
+from collections import Counter
+
+from _common import free_port, wait_for_port
+
+PLAN = {"requests_per_minute": 10**9, "requests_per_month": 10**12, "redis_failure_policy": "local"}
+API = {"id": 1, "requests_per_minute": None, "requests_per_month": None}
+
+
+def _check(check_rate_limits, counters, subject: int):
+    # Quota counters are sharded by tenant: one tenant per subject.
+    tenant = {"id": subject, "requests_per_minute": None, "requests_per_month": None}
+    return check_rate_limits(counters, tenant, API, "key:1", PLAN)
+
+
+def _start_redis(port: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no", "--loglevel", "warning"],
+        stdout=subprocess.DEVNULL,
+    )
+    wait_for_port(port)
+    return process
+
+
+def _counters(store):
+    from data_plane.fastapi_app.counters import Counters
+    from data_plane.fastapi_app.metrics import Metrics
+
+    # A generous budget: this measures Redis throughput, not the local fallback.
+    return Counters(store, Metrics(), timeout=5.0)
+
+
+def _client_process(urls, subjects, offset, concurrency, duration, queue) -> None:
+    from data_plane.fastapi_app.proxy import check_rate_limits
+    from data_plane.fastapi_app.sharding import ShardedRedis
+
+    async def main():
+        store = ShardedRedis.from_urls(urls, decode_responses=True)
+        counters = _counters(store)
+        deadline = time.monotonic() + duration
+        done = 0
+
+        async def worker(index):
+            nonlocal done
+            subject = offset + index
+            while time.monotonic() < deadline:
+                await _check(check_rate_limits, counters, subject % subjects)
+                subject += concurrency
+                done += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker(index) for index in range(concurrency)))
+        elapsed = time.monotonic() - started
+        await store.close()
+        return done, elapsed
+
+    queue.put(asyncio.run(main()))
+
+
+def _measure(urls, args) -> float:
+    queue = multiprocessing.Queue()
+    clients = [
+        multiprocessing.Process(
+            target=_client_process,
+            args=(urls, args.subjects, index * args.concurrency, args.concurrency, args.duration, queue),
+        )
+        for index in range(args.processes)
+    ]
+    for client in clients:
+        client.start()
+    results = [queue.get() for _ in clients]
+    for client in clients:
+        client.join()
+    return sum(done for done, _ in results) / max(elapsed for _, elapsed in results)
+
+
+async def _rebalance(urls, extra_url, subjects: int) -> None:
+    from data_plane.fastapi_app.proxy import check_rate_limits
+    from data_plane.fastapi_app.sharding import ShardedRedis, rebalance
+
+    old = ShardedRedis.from_urls(urls, decode_responses=True)
+    new = ShardedRedis.from_urls(urls + [extra_url], decode_responses=True)
+    for client in new.clients.values():
+        await client.flushdb()
+    counters = _counters(old)
+    for subject in range(subjects):
+        await _check(check_rate_limits, counters, subject)
+    started = time.perf_counter()
+    moved = await rebalance(old, new)
+    elapsed = time.perf_counter() - started
+    print(
+        f"adding node {len(urls) + 1}: moved {moved} of {subjects * 2} counters "
+        f"({moved / (subjects * 2):.1%}, ideal {1 / (len(urls) + 1):.1%}) in {elapsed:.2f}s"
+    )
+    await old.close()
+    await new.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-nodes", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--concurrency", type=int, default=64, help="Coroutines per client process.")
+    parser.add_argument("--subjects", type=int, default=100_000, help="Distinct API keys.")
+    args = parser.parse_args()
+
+    if shutil.which("redis-server") is None:
+        raise SystemExit("redis-server is not on PATH")
+
+    from data_plane.fastapi_app.sharding import HashRing, node_name
+
+    ports = [free_port() for _ in range(args.max_nodes + 1)]
+    servers = [_start_redis(port) for port in ports]
+    urls = [f"redis://127.0.0.1:{port}" for port in ports]
+    try:
+        for count in range(1, args.max_nodes + 1):
+            ring = HashRing(node_name(url) for url in urls[:count])
+            spread = Counter(ring.node_for(f"quota:{subject}") for subject in range(args.subjects))
+            shares = ", ".join(f"{n / args.subjects:.0%}" for _, n in sorted(spread.items()))
+            rate = _measure(urls[:count], args)
+            print(f"{count} node(s): {rate:,.0f} checks/s  (subjects per node: {shares})")
+        asyncio.run(_rebalance(urls[:args.max_nodes], urls[args.max_nodes], min(args.subjects, 20_000)))
+    finally:
+        for server in servers:
+            server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Worker peak memory under concurrent large uploads.
+
+Sends ``--uploads`` concurrent POSTs of ``--size`` MiB through a single
+data-plane worker, once with bodies held in memory and once spooled to disk
+past the default threshold, and reports the worker's peak RSS (``VmHWM``)
+and upload throughput for each.
+
+    python benchmarks/bench_request_bodies.py --uploads 8 --size 100
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import (
+    API_SLUG,
+    PROJECT_ROOT,
+    RAW_KEY,
+    TENANT_SLUG,
+    free_port,
+    seed_database,
+    start_stub_upstream,
+    wait_for_port,
+)
+
+CHUNK = b"x" * (1024 * 1024)
+
+
+def _status_kb(pid: int, field: str) -> int:
+    with open(f"/proc/{pid}/status") as fh:
+        for line in fh:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+async def _upload(port: int, size_mib: int) -> int:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        (
+            f"POST /{TENANT_SLUG}/{API_SLUG}/upload HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+            f"X-API-Key: {RAW_KEY}\r\nContent-Type: application/octet-stream\r\n"
+            f"Content-Length: {size_mib * len(CHUNK)}\r\n\r\n"
+        ).encode()
+    )
+    for _ in range(size_mib):
+        writer.write(CHUNK)
+        await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    writer.close()
+    return int(head[9:12])
+
+
+async def _run_uploads(port: int, args) -> tuple[list[int], float]:
+    started = time.perf_counter()
+    statuses = await asyncio.gather(*(_upload(port, args.size) for _ in range(args.uploads)))
+    return statuses, time.perf_counter() - started
+
+
+def _run_variant(label: str, env: dict, args) -> None:
+    port = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "data_plane.fastapi_app.server",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", "1", "--log-level", "warning",
+        ],
+        cwd=PROJECT_ROOT,
+        env=env,
+    )
+    try:
+        wait_for_port(port)
+        baseline = _status_kb(server.pid, "VmRSS")
+        statuses, elapsed = asyncio.run(_run_uploads(port, args))
+        peak = _status_kb(server.pid, "VmHWM")
+        total_mib = args.uploads * args.size
+        print(
+            f"{label:<10} RSS {baseline / 1024:7.1f} MiB idle, peak {peak / 1024:7.1f} MiB; "
+            f"{total_mib} MiB in {elapsed:.2f}s = {total_mib / elapsed:,.0f} MiB/s; "
+            f"statuses {sorted(set(statuses))}"
+        )
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=8, help="Concurrent uploads.")
+    parser.add_argument("--size", type=int, default=100, help="Upload size in MiB.")
+    args = parser.parse_args()
+
+    upstream_port = free_port()
+    upstream = start_stub_upstream(upstream_port)
+    workdir = tempfile.mkdtemp(prefix="gateway-bench-")
+    database_url = seed_database(os.path.join(workdir, "db.sqlite3"), f"http://127.0.0.1:{upstream_port}")
+    body_limit = str(args.size * len(CHUNK))
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        REDIS_URL="redis://127.0.0.1:1",
+        GATEWAY_MAX_REQUEST_BODY=body_limit,
+        TMPDIR=workdir,
+    )
+    try:
+        _run_variant("in-memory", dict(env, GATEWAY_BODY_SPOOL_THRESHOLD=body_limit), args)
+        _run_variant("spooled", env, args)
+    finally:
+        upstream.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""End-to-end key revocation latency, control plane to gateway.
+
+Seeds a freshly migrated SQLite database with three tenants holding
+``--keys`` keys each, starts a gateway worker on it (config cache TTL
+``--ttl``) subscribed to a local Redis (``redis-server`` or fakeredis' TCP
+server) and sends ``--probes`` of each tenant's keys through it so they are
+cached. Then, per tenant, it times the control-plane operation and how long
+until every probe key is rejected:
+
+* ``row by row``: ``is_active = False`` and ``save()`` per key, as from the
+  Django admin before; nothing tells the gateway, so it waits for the TTL.
+* ``revoke_keys``: one ``UPDATE`` and one batched invalidation message.
+* ``suspend``: the tenant deactivated, likewise.
+
+    python benchmarks/bench_revocation.py --keys 20000
+"""
+import argparse
+import hashlib
+import http.client
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import API_SLUG, PROJECT_ROOT, free_port, start_redis, start_stub_upstream, wait_for_port
+
+CONTROL_PLANE = os.path.join(PROJECT_ROOT, "control_plane")
+TENANTS = ("row-by-row", "revoke-keys", "suspend")
+
+
+def _raw_key(tenant: str, index: int) -> str:
+    return f"{tenant}-{index}"
+
+
+def _seed(upstream_url: str, keys: int) -> dict:
+    from django.contrib.auth.models import User
+
+    from apis.models import API, APIKey
+    from billing.models import Plan
+    from tenants.models import Tenant
+
+    plan = Plan.objects.create(name="Bench", requests_per_minute=10**9, requests_per_month=10**9)
+    tenants = {}
+    for slug in TENANTS:
+        tenant = Tenant.objects.create(user=User.objects.create_user(username=slug), name=slug, slug=slug)
+        API.objects.create(tenant=tenant, name="API", slug=API_SLUG, upstream_base_url=upstream_url)
+        APIKey.objects.bulk_create(
+            (
+                APIKey(tenant=tenant, plan=plan, hashed_key=hashlib.sha256(_raw_key(slug, index).encode()).hexdigest())
+                for index in range(keys)
+            ),
+            batch_size=5000,
+        )
+        tenants[slug] = tenant
+    return tenants
+
+
+def _status(connection: http.client.HTTPConnection, tenant: str, raw_key: str) -> int:
+    connection.request("GET", f"/{tenant}/{API_SLUG}/", headers={"X-API-Key": raw_key})
+    response = connection.getresponse()
+    response.read()
+    return response.status
+
+
+def _rejected_after(connection, tenant: str, probes: list[str], started: float, timeout: float) -> float | None:
+    """Seconds from ``started`` until every probe key is refused, or None."""
+    # A slow operation can outlast the gateway's keep-alive timeout.
+    connection.close()
+    pending = list(probes)
+    while pending and time.perf_counter() - started < timeout:
+        pending = [raw_key for raw_key in pending if _status(connection, tenant, raw_key) == 200]
+    return None if pending else time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=20_000)
+    parser.add_argument("--probes", type=int, default=10)
+    parser.add_argument("--ttl", type=float, default=30.0, help="Gateway config cache TTL in seconds.")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="gateway-bench-")
+    path = os.path.join(workdir, "db.sqlite3")
+    redis_url, stop_redis = start_redis()
+    # REDIS_URLS (the gateway's nodes) carries the control plane's messages;
+    # without REDIS_URL its own cache stays in memory.
+    os.environ.pop("REDIS_URL", None)
+    os.environ.update(DATABASE_PATH=path, REDIS_URLS=redis_url, DEBUG="false")
+    subprocess.run(
+        [sys.executable, "manage.py", "migrate", "--noinput"], cwd=CONTROL_PLANE, check=True, stdout=subprocess.DEVNULL
+    )
+    sys.path.insert(0, CONTROL_PLANE)
+    os.environ["DJANGO_SETTINGS_MODULE"] = "control_plane.settings"
+    import django
+
+    django.setup()
+    from apis.models import APIKey
+    from apis.revocation import revoke_keys, suspend_tenants
+    from tenants.models import Tenant
+
+    upstream_port = free_port()
+    upstream = start_stub_upstream(upstream_port)
+    started = time.perf_counter()
+    tenants = _seed(f"http://127.0.0.1:{upstream_port}", args.keys)
+    print(f"seeded {len(TENANTS)} x {args.keys:,} keys in {time.perf_counter() - started:.1f}s")
+
+    port = free_port()
+    gateway = subprocess.Popen(
+        [
+            sys.executable, "-m", "data_plane.fastapi_app.server",
+            "--host", "127.0.0.1", "--port", str(port), "--workers", "1", "--log-level", "error",
+        ],
+        cwd=PROJECT_ROOT,
+        env=dict(
+            os.environ, DATABASE_URL=f"sqlite:///{path}", GATEWAY_CONFIG_CACHE_TTL=str(args.ttl), GATEWAY_WARMUP="off"
+        ),
+    )
+    try:
+        wait_for_port(port)
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        probes = {slug: [_raw_key(slug, index) for index in range(0, args.keys, args.keys // args.probes)]
+                  for slug in TENANTS}
+        for slug, raw_keys in probes.items():
+            for raw_key in raw_keys:
+                assert _status(connection, slug, raw_key) == 200
+        # Let the gateway's subscription settle before the first change.
+        time.sleep(1)
+
+        def row_by_row():
+            for key in APIKey.objects.filter(tenant=tenants["row-by-row"]):
+                key.is_active = False
+                key.save(update_fields=["is_active"])
+
+        operations = [
+            ("row by row", "row-by-row", row_by_row),
+            ("revoke_keys", "revoke-keys", lambda: revoke_keys(tenant=tenants["revoke-keys"])),
+            ("suspend", "suspend", lambda: suspend_tenants(Tenant.objects.filter(slug="suspend"))),
+        ]
+        for label, slug, operation in operations:
+            started = time.perf_counter()
+            operation()
+            committed = time.perf_counter() - started
+            rejected = _rejected_after(connection, slug, probes[slug], started, args.ttl + 5)
+            end_to_end = f"{rejected * 1000:9.1f} ms" if rejected is not None else "    never"
+            print(f"{label:<12} control plane {committed * 1000:9.1f} ms   all probes rejected after {end_to_end}")
+    finally:
+        gateway.send_signal(signal.SIGTERM)
+        gateway.wait(timeout=60)
+        upstream.terminate()
+        stop_redis()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Routing cost with 100k routes: the compiled routing table vs. SQL lookups.
+
+Seeds a SQLite database with ``--tenants`` tenants holding ``--routes``
+APIs between them, and gives every tenant a custom domain with ``/v1`` and
+``/v2`` prefixes routed to its first two APIs, then reports:
+
+* the time and Python heap to build the routing table (what each worker
+  does at startup), and to reload one tenant (what a change announcement
+  costs);
+* ns/op to resolve ``/{tenant_slug}/{api_slug}/...`` paths, custom-domain
+  paths and unknown paths in the table;
+* the tenant and API lookups by slug it replaced, two indexed queries per
+  request through ``databases`` (before the config cache's TTL cache, which
+  answered repeats from a dict).
+
+    python benchmarks/bench_routing.py --routes 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import _common  # noqa: F401  (puts the project on sys.path)
+
+import sqlalchemy
+from databases import Database
+
+from data_plane.fastapi_app.routing import RoutingTable
+from data_plane.fastapi_app.tables import apis_api, apis_route, apis_routehost, metadata, tenants_tenant
+
+
+def _seed(path: str, tenants: int, routes: int) -> None:
+    engine = sqlalchemy.create_engine(f"sqlite:///{path}")
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            tenants_tenant.insert(),
+            [{"id": index + 1, "slug": f"tenant-{index}", "is_active": True} for index in range(tenants)],
+        )
+        conn.execute(
+            apis_api.insert(),
+            [
+                {"id": index + 1, "tenant_id": index % tenants + 1, "slug": f"api-{index // tenants}",
+                 "upstream_base_url": "http://upstream", "is_active": True}
+                for index in range(routes)
+            ],
+        )
+        conn.execute(
+            apis_route.insert(),
+            [
+                {"api_id": version * tenants + index + 1, "host": f"api.tenant-{index}.example",
+                 "path_prefix": f"/v{version + 1}", "strip_prefix": True, "is_active": True}
+                for index in range(tenants)
+                for version in range(2)
+                if version * tenants + index < routes
+            ],
+        )
+        conn.execute(
+            apis_routehost.insert(),
+            [{"host": f"api.tenant-{index}.example", "tenant_id": index + 1} for index in range(min(tenants, routes))],
+        )
+    # The control plane's indexes: unique slugs for the old lookups, the
+    # route's foreign key for reloading a tenant and the unique route host.
+    with engine.begin() as conn:
+        conn.execute(sqlalchemy.text("CREATE UNIQUE INDEX tenant_slug ON tenants_tenant (slug)"))
+        conn.execute(sqlalchemy.text("CREATE UNIQUE INDEX api_tenant_slug ON apis_api (tenant_id, slug)"))
+        conn.execute(sqlalchemy.text("CREATE INDEX route_api ON apis_route (api_id)"))
+        conn.execute(sqlalchemy.text("CREATE UNIQUE INDEX route_host ON apis_routehost (host)"))
+
+
+def _per_op(fn, requests: list[tuple[str, str]]) -> float:
+    started = time.perf_counter()
+    for host, path in requests:
+        fn(host, path)
+    return (time.perf_counter() - started) / len(requests) * 1e9
+
+
+async def _sql_lookups(database: Database, requests: list[tuple[str, str]]) -> float:
+    started = time.perf_counter()
+    for _, path in requests:
+        _, tenant_slug, api_slug, _ = path.split("/", 3)
+        tenant = await database.fetch_one(
+            tenants_tenant.select().where((tenants_tenant.c.slug == tenant_slug) & (tenants_tenant.c.is_active == True))
+        )
+        await database.fetch_one(
+            apis_api.select().where(
+                (apis_api.c.tenant_id == tenant["id"]) & (apis_api.c.slug == api_slug) & (apis_api.c.is_active == True)
+            )
+        )
+    return (time.perf_counter() - started) / len(requests) * 1e9
+
+
+async def _run(args) -> None:
+    path = os.path.join(tempfile.mkdtemp(prefix="gateway-bench-"), "db.sqlite3")
+    _seed(path, args.tenants, args.routes)
+    database = Database(f"sqlite:///{path}")
+    await database.connect()
+
+    table = RoutingTable(database)
+    started = time.perf_counter()
+    count = await table.load()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    measured = RoutingTable(database)
+    await measured.load()
+    # Including the tenant and API rows it holds.
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del measured
+    print(f"load          {count:,} routes in {elapsed * 1000:,.0f} ms, {heap / 2**20:.1f} MiB heap")
+
+    await table.refresh([1])  # compiles the statements
+    started = time.perf_counter()
+    await table.refresh([args.tenants // 2])
+    print(f"refresh       one tenant in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+    rng = random.Random(1)
+    per_tenant = args.routes // args.tenants
+    slugs = [
+        ("gateway.example", f"/tenant-{rng.randrange(args.tenants)}/api-{rng.randrange(per_tenant)}/items/42")
+        for _ in range(args.lookups)
+    ]
+    domains = [
+        (f"api.tenant-{rng.randrange(args.tenants)}.example", f"/v{rng.randrange(2) + 1}/items/42")
+        for _ in range(args.lookups)
+    ]
+    misses = [("gateway.example", f"/nobody-{index}/api-0/items") for index in range(args.lookups)]
+    for label, requests in (("slug path", slugs), ("custom domain", domains), ("miss", misses)):
+        assert (table.resolve(*requests[0]) is None) == (label == "miss")
+        print(f"{label:<13} {_per_op(table.resolve, requests):>9,.0f} ns/op")
+
+    sample = slugs[: args.sql_lookups]
+    print(f"SQL lookups   {await _sql_lookups(database, sample):>9,.0f} ns/op (tenant + API by slug)")
+    await database.disconnect()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--routes", type=int, default=100_000, help="APIs, each reachable by slug path.")
+    parser.add_argument("--tenants", type=int, default=10_000)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--sql-lookups", type=int, default=5_000)
+    args = parser.parse_args()
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Loading a million keys, and proxying traffic spread over them.
+
+Runs ``manage.py generate_scale_data`` against a freshly migrated SQLite
+database (``--tenants`` tenants, ``--keys`` keys, Zipf ``--skew``), timing
+the load, then starts the multi-worker data plane on it with the key index
+and replays ``--requests`` requests drawn from the traffic profile against
+a stub upstream:
+
+* ``zipf``: keys drawn by their weight in the profile, so the hot keys stay
+  cached and the long tail is looked up in the index;
+* ``uniform``: every key equally likely, so most requests miss the cache.
+
+Redis is left unreachable, so each worker counts requests in its own
+fakeredis: with enough load, hot keys on small plans get 429s.
+
+    python benchmarks/bench_scale.py --keys 1000000 --tenants 10000
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import PROJECT_ROOT, free_port, profile_requests, run_load, start_stub_upstream, wait_for_port
+
+CONTROL_PLANE = os.path.join(PROJECT_ROOT, "control_plane")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenants", type=int, default=10_000)
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=50_000, help="Requests drawn from the profile.")
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="gateway-bench-")
+    database = os.path.join(workdir, "db.sqlite3")
+    profile = os.path.join(workdir, "keys.csv")
+    upstream_port = free_port()
+    upstream = start_stub_upstream(upstream_port)
+    env = dict(os.environ, DATABASE_PATH=database, DEBUG="false")
+    env.pop("REDIS_URL", None)
+    try:
+        subprocess.run(
+            [sys.executable, "manage.py", "migrate", "--noinput"],
+            cwd=CONTROL_PLANE, env=env, check=True, stdout=subprocess.DEVNULL,
+        )
+        started = time.perf_counter()
+        subprocess.run(
+            [
+                sys.executable, "manage.py", "generate_scale_data",
+                "--tenants", str(args.tenants), "--keys", str(args.keys), "--skew", str(args.skew),
+                "--upstream-url", f"http://127.0.0.1:{upstream_port}", "--profile", profile, "--seed", "1",
+            ],
+            cwd=CONTROL_PLANE, env=env, check=True,
+        )
+        print(f"generate_scale_data: {time.perf_counter() - started:.1f}s, database {os.path.getsize(database) / 2**20:.0f} MiB")
+
+        port = free_port()
+        server_env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{database}",
+            REDIS_URL="redis://127.0.0.1:1",
+            GATEWAY_KEY_INDEX=os.path.join(workdir, "keys.idx"),
+        )
+        server = subprocess.Popen(
+            [
+                sys.executable, "-m", "data_plane.fastapi_app.server",
+                "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(args.workers), "--log-level", "warning",
+            ],
+            cwd=PROJECT_ROOT,
+            env=server_env,
+        )
+        try:
+            wait_for_port(port, timeout=300)
+            for label, weighted in (("zipf", True), ("uniform", False)):
+                requests = profile_requests(profile, args.requests, weighted=weighted)
+                distinct = len(set(requests))
+                result = run_load(port, requests, connections=args.connections, duration=args.duration)
+                print(f"{label:<8} {distinct:>7,} distinct keys  {result.summary()}")
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+    finally:
+        upstream.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Gateway memory per long-lived connection (SSE and WebSocket).
+
+Opens ``--connections`` Server-Sent Events streams and then the same number
+of WebSockets through a single data-plane worker, first idle and then active
+(upstream events every ``--interval`` seconds; WebSocket echo round-trips at
+the same rate), and reports the worker's RSS growth per connection.
+
+    python benchmarks/bench_streaming.py --connections 2000
+"""
+import argparse
+import asyncio
+import os
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import (
+    PROJECT_ROOT,
+    RAW_KEY,
+    TENANT_SLUG,
+    free_port,
+    seed_database,
+    start_stream_upstream,
+    wait_for_port,
+)
+
+
+def _rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as fh:
+        for line in fh:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+async def _open_sse(port: int, api_slug: str):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        (
+            f"GET /{TENANT_SLUG}/{api_slug}/events HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+            f"X-API-Key: {RAW_KEY}\r\nAccept: text/event-stream\r\n\r\n"
+        ).encode()
+    )
+    head = await reader.readuntil(b"\r\n\r\n")
+    if not head.startswith(b"HTTP/1.1 200"):
+        raise RuntimeError(head.split(b"\r\n", 1)[0].decode())
+    return reader, writer
+
+
+async def _drain_sse(reader) -> int:
+    received = 0
+    try:
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                return received
+            received += len(chunk)
+    except (asyncio.CancelledError, ConnectionError):
+        return received
+
+
+async def _ws_ping_loop(ws, interval: float, stop: asyncio.Event) -> int:
+    round_trips = 0
+    while not stop.is_set():
+        await ws.send("ping")
+        await ws.recv()
+        round_trips += 1
+        await asyncio.sleep(interval)
+    return round_trips
+
+
+async def _open_in_batches(factory, count: int, batch: int = 200) -> list:
+    opened = []
+    for start in range(0, count, batch):
+        opened.extend(await asyncio.gather(*(factory() for _ in range(min(batch, count - start)))))
+    return opened
+
+
+def _report(pid: int, label: str, before: int, count: int) -> None:
+    after = _rss_kb(pid)
+    per = (after - before) / count if count else 0
+    print(f"{label:<18} {count:>6} conns  RSS {before / 1024:7.1f} -> {after / 1024:7.1f} MiB  {per:6.1f} KiB/conn")
+
+
+async def _measure_sse(pid: int, port: int, slug: str, label: str, args) -> None:
+    before = _rss_kb(pid)
+    streams = await _open_in_batches(lambda: _open_sse(port, slug), args.connections)
+    drains = [asyncio.create_task(_drain_sse(reader)) for reader, _ in streams]
+    await asyncio.sleep(args.hold)
+    _report(pid, label, before, len(streams))
+    for task in drains:
+        task.cancel()
+    received = sum(await asyncio.gather(*drains))
+    for _, writer in streams:
+        writer.close()
+    print(f"{'':<18} relayed {received / 1024:.0f} KiB of events")
+
+
+async def _measure_websocket(pid: int, port: int, args) -> None:
+    import websockets
+
+    headers = {"X-API-Key": RAW_KEY}
+    url = f"ws://127.0.0.1:{port}/{TENANT_SLUG}/ws/echo"
+    before = _rss_kb(pid)
+    sockets = await _open_in_batches(
+        lambda: websockets.connect(url, additional_headers=headers, compression=None, open_timeout=60),
+        args.connections,
+    )
+    await asyncio.sleep(args.hold)
+    _report(pid, "WebSocket idle", before, len(sockets))
+
+    stop = asyncio.Event()
+    started = time.monotonic()
+    loops = [asyncio.create_task(_ws_ping_loop(ws, args.interval, stop)) for ws in sockets]
+    await asyncio.sleep(args.hold)
+    _report(pid, "WebSocket active", before, len(sockets))
+    stop.set()
+    round_trips = sum(await asyncio.gather(*loops))
+    print(f"{'':<18} {round_trips / (time.monotonic() - started):,.0f} echo round-trips/s")
+    await asyncio.gather(*(ws.close() for ws in sockets))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=2000)
+    parser.add_argument("--hold", type=float, default=5.0, help="Seconds to hold each phase open.")
+    parser.add_argument("--interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, max(soft, args.connections * 4 + 1024))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+    idle_sse, idle_ws = free_port(), free_port()
+    active_sse, active_ws = free_port(), free_port()
+    upstreams = [
+        start_stream_upstream(idle_sse, idle_ws, interval=0),
+        start_stream_upstream(active_sse, active_ws, interval=args.interval),
+    ]
+    workdir = tempfile.mkdtemp(prefix="gateway-bench-")
+    database_url = seed_database(
+        os.path.join(workdir, "db.sqlite3"),
+        f"http://127.0.0.1:{idle_sse}",
+        extra_apis={
+            "sse-idle": f"http://127.0.0.1:{idle_sse}",
+            "sse-active": f"http://127.0.0.1:{active_sse}",
+            "ws": f"http://127.0.0.1:{active_ws}",
+        },
+    )
+
+    phases = {
+        "SSE idle": lambda pid, port: _measure_sse(pid, port, "sse-idle", "SSE idle", args),
+        "SSE active": lambda pid, port: _measure_sse(pid, port, "sse-active", "SSE active", args),
+        "WebSocket": lambda pid, port: _measure_websocket(pid, port, args),
+    }
+    env = dict(os.environ, DATABASE_URL=database_url, REDIS_URL="redis://127.0.0.1:1")
+    try:
+        # A fresh worker per phase, so one phase's freed memory doesn't hide
+        # the next phase's growth.
+        for measure in phases.values():
+            port = free_port()
+            server = subprocess.Popen(
+                [
+                    sys.executable, "-m", "data_plane.fastapi_app.server",
+                    "--host", "127.0.0.1", "--port", str(port),
+                    "--workers", "1", "--log-level", "warning", "--graceful-timeout", "5",
+                ],
+                cwd=PROJECT_ROOT,
+                env=env,
+            )
+            try:
+                wait_for_port(port)
+                asyncio.run(measure(server.pid, port))
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait(timeout=60)
+    finally:
+        for upstream in upstreams:
+            upstream.terminate()
+
+
+if __name__ == "__main__":
+    main()
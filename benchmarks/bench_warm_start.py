@@ -0,0 +1,154 @@
+"""Latency of the first requests after a data-plane worker starts.
+
+The upstream is registered by hostname and served by a stub resolver that
+answers after ``--resolver-delay`` seconds; the upstream itself takes
+``--connect-delay`` seconds to accept each new connection (simulating a TLS
+handshake or a distant upstream). For each phase a fresh single worker is
+started, ``/readyz`` is polled until it answers 200, and then ``--burst``
+clients each send one request at the same moment:
+
+* ``cold``: ``GATEWAY_WARMUP=off``, the worker starts with empty caches and pools.
+* ``warm``: ``GATEWAY_WARMUP=all`` with ``--burst`` pre-opened upstream connections.
+
+    python benchmarks/bench_warm_start.py --burst 16
+"""
+import argparse
+import asyncio
+import http.client
+import multiprocessing
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from _common import (
+    API_SLUG,
+    PROJECT_ROOT,
+    RAW_KEY,
+    TENANT_SLUG,
+    free_port,
+    seed_database,
+    start_stub_resolver,
+    wait_for_port,
+)
+
+UPSTREAM_HOST = "upstream.bench.test"
+
+
+def _run_slow_accept_upstream(port: int, connect_delay: float) -> None:
+    async def handle(reader, writer):
+        await asyncio.sleep(connect_delay)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 12\r\n\r\n{\"ok\": true}")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, "127.0.0.1", port)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def _wait_until_ready(port: int, timeout: float = 60.0) -> float:
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/readyz")
+            if connection.getresponse().status == 200:
+                return time.monotonic() - started
+        except OSError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError("Gateway never became ready")
+
+
+def _one_request(port: int) -> float:
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    started = time.perf_counter()
+    connection.request("GET", f"/{TENANT_SLUG}/{API_SLUG}/", headers={"X-API-Key": RAW_KEY})
+    response = connection.getresponse()
+    response.read()
+    elapsed = time.perf_counter() - started
+    connection.close()
+    if response.status != 200:
+        raise RuntimeError(f"Unexpected status {response.status}")
+    return elapsed
+
+
+def _run_phase(label: str, env: dict, args) -> None:
+    port = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "data_plane.fastapi_app.server",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", "1", "--log-level", "error",
+        ],
+        cwd=PROJECT_ROOT,
+        env=env,
+    )
+    try:
+        wait_for_port(port)
+        ready_after = _wait_until_ready(port)
+        with ThreadPoolExecutor(args.burst) as pool:
+            latencies = sorted(pool.map(lambda _: _one_request(port), range(args.burst)))
+        print(
+            f"{label:<5} ready after {ready_after * 1000:6.0f}ms  first {args.burst} requests: "
+            f"mean {statistics.mean(latencies) * 1000:6.1f}ms  max {latencies[-1] * 1000:6.1f}ms"
+        )
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--burst", type=int, default=16)
+    parser.add_argument("--resolver-delay", type=float, default=0.02, help="Stub resolver response time in seconds.")
+    parser.add_argument("--connect-delay", type=float, default=0.05, help="Upstream delay per new connection.")
+    args = parser.parse_args()
+
+    upstream_port = free_port()
+    upstream = multiprocessing.Process(
+        target=_run_slow_accept_upstream, args=(upstream_port, args.connect_delay), daemon=True
+    )
+    upstream.start()
+    wait_for_port(upstream_port)
+    resolver_port = free_port()
+    resolver = start_stub_resolver(resolver_port, {UPSTREAM_HOST: ["127.0.0.1"]}, delay=args.resolver_delay)
+
+    workdir = tempfile.mkdtemp(prefix="gateway-bench-")
+    database_url = seed_database(
+        os.path.join(workdir, "db.sqlite3"), f"http://{UPSTREAM_HOST}:{upstream_port}"
+    )
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        REDIS_URL="redis://127.0.0.1:1",
+        GATEWAY_DNS_NAMESERVERS=f"127.0.0.1:{resolver_port}",
+    )
+    try:
+        _run_phase("cold", dict(env, GATEWAY_WARMUP="off"), args)
+        _run_phase("warm", dict(env, GATEWAY_WARMUP="all", GATEWAY_WARMUP_CONNECTIONS=str(args.burst)), args)
+    finally:
+        upstream.terminate()
+        resolver.terminate()
+
+
+if __name__ == "__main__":
+    main()
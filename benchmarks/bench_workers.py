@@ -0,0 +1,104 @@
+"""Throughput scaling of the multi-worker data plane from 1 to N workers.
+
+Starts ``python -m data_plane.fastapi_app.server`` with an increasing worker
+count against a stub upstream, drives the proxy route with keep-alive clients
+and reports requests/sec, latency and the proportional set size (PSS) of the
+whole worker pool, which shows how much memory the preloaded app shares.
+
+    python benchmarks/bench_workers.py --max-workers 8 --duration 10
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+
+from _common import (
+    API_SLUG,
+    PROJECT_ROOT,
+    RAW_KEY,
+    TENANT_SLUG,
+    build_request,
+    free_port,
+    run_load,
+    seed_database,
+    start_stub_upstream,
+    wait_for_port,
+)
+
+
+def _pss_kb(pid: int) -> int:
+    total = 0
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as fh:
+            pids.extend(int(child) for child in fh.read().split())
+    except OSError:
+        pass
+    for member in pids:
+        try:
+            with open(f"/proc/{member}/smaps_rollup") as fh:
+                for line in fh:
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--connections", type=int, default=128)
+    parser.add_argument("--client-processes", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    args = parser.parse_args()
+
+    upstream_port = free_port()
+    upstream = start_stub_upstream(upstream_port)
+    workdir = tempfile.mkdtemp(prefix="gateway-bench-")
+    database_url = seed_database(os.path.join(workdir, "db.sqlite3"), f"http://127.0.0.1:{upstream_port}")
+
+    request = build_request(f"/{TENANT_SLUG}/{API_SLUG}/get", {"X-API-Key": RAW_KEY})
+    counts = sorted({1, *range(2, args.max_workers + 1, 2), args.max_workers})
+    baseline = None
+
+    print(f"{'workers':>7} {'req/s':>10} {'speedup':>8} {'p50 ms':>8} {'p99 ms':>8} {'PSS MiB':>8}")
+    try:
+        for workers in counts:
+            port = free_port()
+            env = dict(os.environ, DATABASE_URL=database_url, REDIS_URL="redis://127.0.0.1:1")
+            server = subprocess.Popen(
+                [
+                    sys.executable, "-m", "data_plane.fastapi_app.server",
+                    "--host", "127.0.0.1", "--port", str(port),
+                    "--workers", str(workers), "--log-level", "warning",
+                ],
+                cwd=PROJECT_ROOT,
+                env=env,
+            )
+            try:
+                wait_for_port(port)
+                run_load(port, request, connections=workers * 4, duration=1.0)
+                result = run_load(
+                    port, request,
+                    connections=args.connections,
+                    duration=args.duration,
+                    processes=args.client_processes,
+                )
+                pss = _pss_kb(server.pid) / 1024
+                baseline = baseline or result.rps
+                print(
+                    f"{workers:>7} {result.rps:>10,.0f} {result.rps / baseline:>7.2f}x "
+                    f"{result.percentile(50) * 1000:>8.2f} {result.percentile(99) * 1000:>8.2f} {pss:>8.1f}"
+                )
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait(timeout=60)
+    finally:
+        upstream.terminate()
+
+
+if __name__ == "__main__":
+    main()
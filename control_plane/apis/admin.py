@@ -1,5 +1,32 @@
 from django.contrib import admin
-from .models import API, APIKey
+from .models import API, APIKey, Client, Route
+from .revocation import revoke
 
 admin.site.register(API)
-admin.site.register(APIKey)
+
+
+@admin.action(description="Revoke selected (one UPDATE)")
+def revoke_selected(modeladmin, request, queryset):
+    revoked = revoke(queryset)
+    modeladmin.message_user(request, f"Revoked {revoked} {queryset.model._meta.verbose_name_plural}.")
+
+
+@admin.register(APIKey)
+class APIKeyAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "plan", "is_active", "created_at")
+    list_filter = ("is_active",)
+    actions = [revoke_selected]
+
+
+@admin.register(Client)
+class ClientAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "plan", "is_active", "created_at")
+    list_filter = ("is_active",)
+    actions = [revoke_selected]
+
+
+@admin.register(Route)
+class RouteAdmin(admin.ModelAdmin):
+    list_display = ("host", "path_prefix", "api", "strip_prefix", "is_active")
+    list_filter = ("is_active",)
+    search_fields = ("host",)
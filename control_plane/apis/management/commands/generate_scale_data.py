@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apis.scale_data import generate
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-load synthetic tenants, plans, APIs, clients and API keys with Zipf-skewed sizes and "
+        "key popularity, and write the raw keys as a traffic profile for the load benchmarks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenants", type=int, default=1_000)
+        parser.add_argument("--apis", type=int, help="Default: two per tenant.")
+        parser.add_argument("--keys", type=int, default=100_000)
+        parser.add_argument("--clients", type=int, default=0)
+        parser.add_argument("--plans", type=int, default=5)
+        parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent; 0 spreads everything evenly.")
+        parser.add_argument("--prefix", default="scale", help="Prefix of the tenants' slugs and the raw keys.")
+        parser.add_argument("--upstream-url", default="https://httpbin.org", help="Every API's upstream.")
+        parser.add_argument("--profile", default="scale_keys.csv", help="Where to write the traffic profile CSV.")
+        parser.add_argument("--seed", type=int, help="Seed for reproducible keys and skew.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            created = generate(
+                tenants=options["tenants"],
+                apis=options["apis"] if options["apis"] is not None else 2 * options["tenants"],
+                keys=options["keys"],
+                clients=options["clients"],
+                plans=options["plans"],
+                skew=options["skew"],
+                prefix=options["prefix"],
+                upstream_url=options["upstream_url"],
+                profile_path=options["profile"],
+                seed=options["seed"],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        summary = ", ".join(f"{count} {kind}" for kind, count in created.items())
+        self.stdout.write(f"Created {summary} in {time.perf_counter() - started:.1f}s")
+        self.stdout.write(f"Wrote the traffic profile to {options['profile']}")
@@ -0,0 +1,59 @@
+from datetime import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import get_current_timezone, is_naive, make_aware
+
+from apis.revocation import revoke_clients, revoke_keys, suspend_tenants
+from billing.models import Plan
+from tenants.models import Tenant
+
+
+def _datetime(value: str) -> datetime:
+    moment = datetime.fromisoformat(value)
+    return make_aware(moment, get_current_timezone()) if is_naive(moment) else moment
+
+
+class Command(BaseCommand):
+    help = (
+        "Revoke matching API keys and clients, or suspend a tenant, with one UPDATE each "
+        "and one message to the gateway."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", help="Slug of the tenant whose credentials to revoke.")
+        parser.add_argument("--plan", type=int, help="Revoke credentials on this plan ID, across tenants.")
+        parser.add_argument("--created-before", type=_datetime, help="Revoke credentials created before this date/time.")
+        parser.add_argument(
+            "--client", action="append", dest="clients", help="Revoke only this client ID (repeatable)."
+        )
+        parser.add_argument("--suspend", action="store_true", help="Suspend the --tenant instead.")
+
+    def handle(self, *args, **options):
+        tenant = plan = None
+        if options["tenant"]:
+            tenant = Tenant.objects.filter(slug=options["tenant"]).first()
+            if tenant is None:
+                raise CommandError(f"No tenant {options['tenant']!r}.")
+        if options["plan"] is not None:
+            plan = Plan.objects.filter(id=options["plan"]).first()
+            if plan is None:
+                raise CommandError(f"No plan {options['plan']}.")
+
+        started = time.perf_counter()
+        if options["suspend"]:
+            if tenant is None or plan or options["created_before"] or options["clients"]:
+                raise CommandError("--suspend takes only --tenant.")
+            suspended = suspend_tenants(Tenant.objects.filter(id=tenant.id))
+            self.stdout.write(f"Suspended {suspended} tenant in {(time.perf_counter() - started) * 1000:.1f}ms")
+            return
+
+        filters = dict(tenant=tenant, plan=plan, created_before=options["created_before"])
+        try:
+            keys = 0 if options["clients"] else revoke_keys(**filters)
+            clients = revoke_clients(client_ids=options["clients"], **filters)
+        except ValueError:
+            raise CommandError("Pass --tenant, --plan, --created-before or --client.")
+        self.stdout.write(
+            f"Revoked {keys} keys and {clients} clients in {(time.perf_counter() - started) * 1000:.1f}ms"
+        )
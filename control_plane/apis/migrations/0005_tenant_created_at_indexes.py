@@ -0,0 +1,23 @@
+# Generated by Django 5.2.10 on 2026-10-19 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0004_api_max_request_body_bytes'),
+        ('billing', '0006_pricing_and_invoices'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='api',
+            index=models.Index(fields=['tenant', 'created_at'], name='apis_api_tenant__b63012_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='apikey',
+            index=models.Index(fields=['tenant', 'created_at'], name='apis_apikey_tenant__43aadb_idx'),
+        ),
+    ]
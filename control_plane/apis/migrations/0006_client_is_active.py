@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-19 09:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0005_tenant_created_at_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+    ]
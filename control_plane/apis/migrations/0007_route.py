@@ -0,0 +1,29 @@
+# Generated by Django 5.2.10 on 2026-10-19 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0006_client_is_active'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Route',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('host', models.CharField(max_length=253)),
+                ('path_prefix', models.CharField(default='/', max_length=200)),
+                ('strip_prefix', models.BooleanField(default=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('api', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='routes', to='apis.api')),
+            ],
+            options={
+                'unique_together': {('host', 'path_prefix')},
+            },
+        ),
+    ]
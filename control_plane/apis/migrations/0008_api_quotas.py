@@ -0,0 +1,23 @@
+# Generated by Django 5.2.10 on 2026-10-19 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0007_route'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='api',
+            name='requests_per_minute',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='api',
+            name='requests_per_month',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
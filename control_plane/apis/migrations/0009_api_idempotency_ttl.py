@@ -0,0 +1,19 @@
+# Generated by Django 5.2.10 on 2026-10-19 10:48
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0008_api_quotas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='api',
+            name='idempotency_ttl',
+            field=models.PositiveIntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(86400)]),
+        ),
+    ]
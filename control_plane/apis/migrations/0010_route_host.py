@@ -0,0 +1,35 @@
+# Generated by Django 5.2.10 on 2026-10-19 11:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def claim_routed_hosts(apps, schema_editor):
+    # Each host goes to the tenant of its oldest route, as clean() decided.
+    Route = apps.get_model('apis', 'Route')
+    RouteHost = apps.get_model('apis', 'RouteHost')
+    owners = {}
+    for host, tenant_id in Route.objects.order_by('id').values_list('host', 'api__tenant_id'):
+        owners.setdefault(host, tenant_id)
+    RouteHost.objects.bulk_create(RouteHost(host=host, tenant_id=tenant_id) for host, tenant_id in owners.items())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0009_api_idempotency_ttl'),
+        ('tenants', '0002_tenant_quotas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteHost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('host', models.CharField(max_length=253, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='route_hosts', to='tenants.tenant')),
+            ],
+        ),
+        migrations.RunPython(claim_routed_hosts, migrations.RunPython.noop),
+    ]
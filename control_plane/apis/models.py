@@ -1,4 +1,6 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, transaction
 from tenants.models import Tenant
 import hashlib
 import secrets
@@ -10,15 +12,104 @@ class API(models.Model):
     slug = models.SlugField()
     upstream_base_url = models.URLField()
     auth_header_name = models.CharField(max_length=100, default='X-API-Key')
+    # Overrides the plan's body limit when lower; null means no per-API limit.
+    max_request_body_bytes = models.PositiveBigIntegerField(null=True, blank=True)
+    # Caps the traffic to this API from all of the tenant's keys and clients;
+    # null means no per-API limit.
+    requests_per_minute = models.PositiveIntegerField(null=True, blank=True)
+    requests_per_month = models.PositiveBigIntegerField(null=True, blank=True)
+    # Seconds the gateway replays the response to a POST, PUT, PATCH or
+    # DELETE with an Idempotency-Key header to repeats of it; null disables.
+    idempotency_ttl = models.PositiveIntegerField(
+        null=True, blank=True, validators=[MinValueValidator(1), MaxValueValidator(24 * 60 * 60)]
+    )
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ("tenant", "slug")
+        # Listings page through a tenant's APIs newest first.
+        indexes = [models.Index(fields=["tenant", "created_at"])]
 
     def __str__(self):
         return f"{self.tenant.slug}/{self.slug}"
 
+
+HOST_TAKEN = "This hostname is routed by another tenant."
+
+
+class RouteHost(models.Model):
+    """The tenant a hostname used by custom-domain routes belongs to: the
+    first one to route it, until its last route on the host is gone. One row
+    per host, so the database settles two tenants claiming it at once."""
+    host = models.CharField(max_length=253, unique=True)
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name="route_hosts")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def claim(cls, host: str, tenant_id: int) -> bool:
+        """Claim ``host`` for ``tenant_id``; False if another tenant has it."""
+        owner, _ = cls.objects.get_or_create(host=host, defaults={"tenant_id": tenant_id})
+        return owner.tenant_id == tenant_id
+
+    @classmethod
+    def release(cls, host: str) -> None:
+        """Free ``host`` once no route uses it."""
+        if not Route.objects.filter(host=host).exists():
+            cls.objects.filter(host=host).delete()
+
+    def __str__(self):
+        return f"{self.host} ({self.tenant.slug})"
+
+
+class Route(models.Model):
+    """Sends requests for ``host``, one of the tenant's own domains, whose
+    path starts with ``path_prefix`` to ``api``. Every API is also reachable
+    on any host at ``/{tenant_slug}/{api_slug}/``."""
+    api = models.ForeignKey(API, on_delete=models.CASCADE, related_name="routes")
+    host = models.CharField(max_length=253)
+    path_prefix = models.CharField(max_length=200, default="/")
+    # Whether the upstream sees the path without the prefix.
+    strip_prefix = models.BooleanField(default=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("host", "path_prefix")
+
+    @staticmethod
+    def normalize_host(host: str) -> str:
+        return host.strip().lower().rstrip(".")
+
+    def clean(self):
+        self.host = self.normalize_host(self.host)
+        self.path_prefix = "/" + "/".join(part for part in self.path_prefix.split("/") if part)
+        if not self.host or "/" in self.host or ":" in self.host:
+            raise ValidationError({"host": "Enter a hostname without scheme, port or path."})
+        # A hostname belongs to the first tenant that routes it. ``save``
+        # enforces this too; checking here reports it as a form error.
+        if self.api_id is None:
+            return
+        taken = RouteHost.objects.filter(host=self.host).exclude(tenant_id=self.api.tenant_id)
+        if taken.exists():
+            raise ValidationError({"host": HOST_TAKEN})
+
+    def save(self, *args, **kwargs):
+        # Saves that skip ``clean`` (the ORM, the shell) must not claim
+        # ``Example.com`` alongside ``example.com``.
+        self.host = self.normalize_host(self.host)
+        with transaction.atomic():
+            if not RouteHost.claim(self.host, self.api.tenant_id):
+                raise ValidationError({"host": HOST_TAKEN})
+            previous = Route.objects.filter(pk=self.pk).values_list("host", flat=True).first() if self.pk else None
+            super().save(*args, **kwargs)
+            if previous is not None and previous != self.host:
+                RouteHost.release(previous)
+
+    def __str__(self):
+        return f"{self.host}{self.path_prefix} -> {self.api}"
+
+
 class APIKey(models.Model):
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE)
     plan = models.ForeignKey(Plan, on_delete=models.PROTECT)
@@ -26,6 +117,9 @@ class APIKey(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["tenant", "created_at"])]
+
     @staticmethod
     def generate_key():
         raw_key = secrets.token_urlsafe(32)
@@ -40,6 +134,7 @@ class Client(models.Model):
     plan = models.ForeignKey(Plan, on_delete=models.PROTECT)
     client_id = models.CharField(max_length=100, unique=True)
     name = models.CharField(max_length=100)
+    is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -0,0 +1,61 @@
+"""Announcing configuration changes to the gateway.
+
+Gateway workers cache tenant, API, key and plan rows for a few seconds. A
+JSON message on the ``gateway:config`` Redis channel (``GATEWAY_CONFIG_CHANNEL``)
+makes every worker drop one tenant's entries at once. Send one per batch of
+changes, not one per row. Messages go out after the surrounding transaction
+commits, so workers never reload the old rows. Without Redis, or while it is
+down, nothing is sent and changes reach the gateway when its entries expire.
+"""
+import json
+import logging
+import os
+
+import redis
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = os.environ.get("GATEWAY_CONFIG_CHANNEL", "gateway:config")
+
+_client = None
+
+
+def gateway_redis_urls() -> list[str]:
+    """The gateway's Redis nodes, as configured for the data plane."""
+    urls = [url.strip() for url in os.environ.get("REDIS_URLS", "").split(",") if url.strip()]
+    if not urls and os.environ.get("REDIS_URL"):
+        urls = [os.environ["REDIS_URL"]]
+    return urls
+
+
+def gateway_redis_url() -> str | None:
+    # The gateway's first Redis node carries its event stream and this channel.
+    urls = gateway_redis_urls()
+    return urls[0] if urls else None
+
+
+def _publish(message: dict) -> None:
+    global _client
+    url = gateway_redis_url()
+    if not url:
+        return
+    if _client is None:
+        _client = redis.Redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0)
+    try:
+        _client.publish(CHANNEL, json.dumps(message))
+    except (redis.RedisError, OSError) as exc:
+        logger.warning(f"Could not announce configuration change {message}: {exc!r}")
+
+
+def notify_tenant_changed(tenant_id: int, change: str, **details) -> None:
+    message = {"tenant_id": tenant_id, "change": change, **details}
+    transaction.on_commit(lambda: _publish(message))
+
+
+def notify_tenants_changed(tenant_ids: list[int], change: str, **details) -> None:
+    """One message for a change spanning several tenants. A ``kinds`` list
+    limits what workers drop to those cache entry kinds (``api_key``,
+    ``client``, ...); without it they drop everything cached for the tenants."""
+    message = {"tenant_ids": list(tenant_ids), "change": change, **details}
+    transaction.on_commit(lambda: _publish(message))
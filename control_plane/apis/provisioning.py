@@ -0,0 +1,61 @@
+"""Minting API keys in bulk against shared plans."""
+from django.db import transaction
+
+from billing.models import Plan
+from tenants.cache import invalidate_tenant_cache
+
+from .models import APIKey
+from .notifications import notify_tenant_changed
+
+MAX_BULK_KEYS = 50_000
+BATCH_SIZE = 5_000
+
+
+def shared_plan(name: str, requests_per_minute: int, requests_per_month: int) -> Plan:
+    """The oldest active plan with this name and these limits, created if
+    there is none, so keys minted with the same settings share one row."""
+    plan = (
+        Plan.objects.filter(
+            name=name,
+            requests_per_minute=requests_per_minute,
+            requests_per_month=requests_per_month,
+            is_active=True,
+        )
+        .order_by("id")
+        .first()
+    )
+    if plan is None:
+        plan = Plan.objects.create(
+            name=name,
+            requests_per_minute=requests_per_minute,
+            requests_per_month=requests_per_month,
+            is_active=True,
+        )
+    return plan
+
+
+def tenant_plan(tenant, plan_id: int) -> Plan | None:
+    """``plan_id`` if one of the tenant's keys or clients already uses it."""
+    for related in ("apikey", "client"):
+        plan = Plan.objects.filter(id=plan_id, is_active=True, **{f"{related}__tenant": tenant}).first()
+        if plan is not None:
+            return plan
+    return None
+
+
+def provision_keys(tenant, plan: Plan, count: int) -> list[tuple[int, str]]:
+    """Create ``count`` keys in one transaction; returns ``(key_id, raw_key)``
+    pairs. The raw keys exist only in the returned list.
+
+    ``bulk_create`` sends no signals, so the tenant's dashboard cache and the
+    gateway are told once for the whole batch.
+    """
+    minted = [APIKey.generate_key() for _ in range(count)]
+    with transaction.atomic():
+        keys = APIKey.objects.bulk_create(
+            [APIKey(tenant=tenant, plan=plan, hashed_key=hashed_key) for _, hashed_key in minted],
+            batch_size=BATCH_SIZE,
+        )
+        transaction.on_commit(lambda: invalidate_tenant_cache(tenant.id))
+        notify_tenant_changed(tenant.id, "keys_created", count=count)
+    return [(key.id, raw_key) for key, (raw_key, _) in zip(keys, minted)]
@@ -0,0 +1,69 @@
+"""Revoking keys and clients, and suspending tenants, in bulk.
+
+Each operation is a single ``UPDATE`` of the matching rows, however many
+there are, followed by one dashboard cache invalidation and one message to
+the gateway naming every affected tenant and the kind of cached row to drop
+(``QuerySet.update()`` sends no signals). Gateway workers then evict just
+those tenants' entries of that kind.
+"""
+from django.db import transaction
+
+from tenants.cache import invalidate_tenant_cache
+
+from .models import APIKey, Client
+from .notifications import notify_tenants_changed
+
+# The gateway's config cache kind holding each model's rows.
+_CACHE_KINDS = {APIKey: "api_key", Client: "client"}
+
+
+def _deactivate(queryset, tenant_field: str, change: str, kinds: list[str] | None) -> int:
+    queryset = queryset.filter(is_active=True)
+    with transaction.atomic():
+        tenant_ids = sorted(set(queryset.values_list(tenant_field, flat=True)))
+        if not tenant_ids:
+            return 0
+        updated = queryset.update(is_active=False)
+        transaction.on_commit(lambda: invalidate_tenant_cache(*tenant_ids))
+        notify_tenants_changed(tenant_ids, change, kinds=kinds, count=updated)
+    return updated
+
+
+def revoke(queryset) -> int:
+    """Deactivate the active keys or clients in ``queryset``; returns how many."""
+    kind = _CACHE_KINDS[queryset.model]
+    return _deactivate(queryset, "tenant_id", f"{kind}s_revoked", [kind])
+
+
+def _matching(queryset, tenant, plan, **filters):
+    if tenant is None and plan is None and not any(value is not None for value in filters.values()):
+        # Revoking every credential of every tenant is never what was meant.
+        raise ValueError("Pass at least one filter.")
+    if tenant is not None:
+        queryset = queryset.filter(tenant=tenant)
+    if plan is not None:
+        queryset = queryset.filter(plan=plan)
+    return queryset.filter(**{name: value for name, value in filters.items() if value is not None})
+
+
+def revoke_keys(*, tenant=None, plan=None, created_before=None) -> int:
+    """Revoke the keys of ``tenant``, on ``plan`` and/or created before a datetime."""
+    return revoke(_matching(APIKey.objects.all(), tenant, plan, created_at__lt=created_before))
+
+
+def revoke_clients(*, tenant=None, plan=None, client_ids=None, created_before=None) -> int:
+    """Revoke the clients of ``tenant``, on ``plan``, with these client IDs
+    and/or created before a datetime."""
+    return revoke(
+        _matching(Client.objects.all(), tenant, plan, client_id__in=client_ids, created_at__lt=created_before)
+    )
+
+
+def suspend_tenants(queryset) -> int:
+    """Deactivate the tenants in ``queryset``; the gateway drops all their entries."""
+    return _deactivate(queryset, "id", "tenant_suspended", None)
+
+
+def reinstate_tenants(queryset) -> int:
+    # Only rows that were found are cached, so the gateway needs no message.
+    return queryset.filter(is_active=False).update(is_active=True)
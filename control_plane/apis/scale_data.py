@@ -0,0 +1,200 @@
+"""Synthetic tenants, plans, APIs, clients and keys for capacity tests.
+
+Rows are written with one ``executemany`` per batch and explicit primary
+keys, bypassing model instances (``bulk_create`` builds one per row and is
+several times slower at a million keys), and skewed like real traffic:
+tenants' sizes and keys' popularity both follow a Zipf distribution, so a
+few tenants own most of the APIs and keys and a few keys carry most of the
+requests.
+
+Raw keys exist only in the traffic profile written alongside: a CSV of
+``api_key,tenant,api,weight`` rows, where ``weight`` is the key's share of
+requests, for the load benchmarks to replay.
+"""
+import csv
+import hashlib
+import random
+
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from billing.models import Plan
+from tenants.models import Tenant
+
+from .models import API, APIKey, Client
+from .notifications import notify_tenants_changed
+
+BATCH_SIZE = 10_000
+# Per-minute limits cycled over the generated plans.
+PLAN_LIMITS = (60, 600, 6_000, 60_000, 600_000)
+
+
+def zipf_weights(count: int, skew: float) -> list[float]:
+    """Weight of each rank (the first is the heaviest), normalized to 1."""
+    weights = [1 / (rank ** skew) for rank in range(1, count + 1)]
+    total = sum(weights)
+    return [weight / total for weight in weights]
+
+
+def allocate(total: int, weights: list[float], minimum: int = 0) -> list[int]:
+    """Split ``total`` by ``weights`` (largest remainders first), giving each
+    share at least ``minimum``."""
+    spare = total - minimum * len(weights)
+    exact = [weight * spare for weight in weights]
+    counts = [int(share) for share in exact]
+    by_remainder = sorted(range(len(weights)), key=lambda index: counts[index] - exact[index])
+    for index in by_remainder[:spare - sum(counts)]:
+        counts[index] += 1
+    return [count + minimum for count in counts]
+
+
+def _next_id(model) -> int:
+    return (model.objects.aggregate(top=Max("pk"))["top"] or 0) + 1
+
+
+def _insert(model, columns: list[str], rows) -> None:
+    """Insert ``rows`` (tuples of ``columns``' values) into ``model``'s table;
+    every other field gets its default, or the current time for
+    ``auto_now_add`` fields."""
+    now = timezone.now()
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    constants = []
+    for name, field in fields.items():
+        if name in columns:
+            continue
+        value = now if getattr(field, "auto_now_add", False) else field.get_default()
+        constants.append((field.column, field.get_db_prep_save(value, connection)))
+    names = [fields[name].column for name in columns] + [column for column, _ in constants]
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        connection.ops.quote_name(model._meta.db_table),
+        ", ".join(connection.ops.quote_name(name) for name in names),
+        ", ".join(["%s"] * len(names)),
+    )
+    tail = tuple(value for _, value in constants)
+    with connection.cursor() as cursor:
+        batch = []
+        for row in rows:
+            batch.append(row + tail)
+            if len(batch) == BATCH_SIZE:
+                cursor.executemany(sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+
+
+def generate(
+    *,
+    tenants: int,
+    apis: int,
+    keys: int,
+    clients: int = 0,
+    plans: int = 5,
+    skew: float = 1.0,
+    prefix: str = "scale",
+    upstream_url: str = "https://httpbin.org",
+    profile_path: str | None = None,
+    seed: int | None = None,
+) -> dict[str, int]:
+    """Create the rows in one transaction and write the traffic profile to
+    ``profile_path``; returns how many of each were created."""
+    if tenants < 1 or plans < 1:
+        raise ValueError("Need at least one tenant and one plan.")
+    if apis < tenants:
+        raise ValueError("Need at least one API per tenant.")
+    if Tenant.objects.filter(slug__startswith=f"{prefix}-").exists():
+        raise ValueError(f"Tenants prefixed {prefix!r} already exist.")
+    rng = random.Random(seed)
+    tenant_weights = zipf_weights(tenants, skew)
+    apis_per_tenant = allocate(apis, tenant_weights, minimum=1)
+    keys_per_tenant = allocate(keys, tenant_weights)
+    clients_per_tenant = allocate(clients, tenant_weights)
+
+    with transaction.atomic():
+        plan_ids = [
+            plan.id
+            for plan in Plan.objects.bulk_create(
+                Plan(
+                    name=f"{prefix} {PLAN_LIMITS[index % len(PLAN_LIMITS)]}/min",
+                    requests_per_minute=PLAN_LIMITS[index % len(PLAN_LIMITS)],
+                    requests_per_month=PLAN_LIMITS[index % len(PLAN_LIMITS)] * 60 * 24 * 31,
+                )
+                for index in range(plans)
+            )
+        ]
+        first_user, first_tenant, first_api = _next_id(User), _next_id(Tenant), _next_id(API)
+        first_key, first_client = _next_id(APIKey), _next_id(Client)
+
+        # Tenants' users can't log in: set a password in the admin to use one.
+        _insert(
+            User,
+            ["id", "username", "password"],
+            ((first_user + index, f"{prefix}-{index}", "!") for index in range(tenants)),
+        )
+        _insert(
+            Tenant,
+            ["id", "user_id", "name", "slug"],
+            (
+                (first_tenant + index, first_user + index, f"Scale tenant {index}", f"{prefix}-{index}")
+                for index in range(tenants)
+            ),
+        )
+        api_rows, tenant_apis = [], []
+        for index, count in enumerate(apis_per_tenant):
+            slugs = [f"api-{number}" for number in range(count)]
+            tenant_apis.append(slugs)
+            for slug in slugs:
+                api_rows.append((first_api + len(api_rows), first_tenant + index, slug, slug, upstream_url))
+        _insert(API, ["id", "tenant_id", "name", "slug", "upstream_base_url"], api_rows)
+        _insert(
+            Client,
+            ["id", "tenant_id", "plan_id", "client_id", "name"],
+            (
+                (first_client + number, first_tenant + index, rng.choice(plan_ids), f"{prefix}-client-{number}",
+                 f"Client {number}")
+                for number, index in enumerate(
+                    index for index, count in enumerate(clients_per_tenant) for _ in range(count)
+                )
+            ),
+        )
+
+        minted = []
+        for index, count in enumerate(keys_per_tenant):
+            for _ in range(count):
+                raw_key = f"{prefix}_{rng.getrandbits(160):040x}"
+                minted.append((hashlib.sha256(raw_key.encode()).hexdigest(), raw_key, index))
+        # In hash order the unique index on hashed_key is appended to, not
+        # split page by page.
+        minted.sort()
+        _insert(
+            APIKey,
+            ["id", "tenant_id", "plan_id", "hashed_key"],
+            (
+                (first_key + number, first_tenant + index, rng.choice(plan_ids), hashed_key)
+                for number, (hashed_key, _, index) in enumerate(minted)
+            ),
+        )
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [User, Tenant, API, Client, APIKey]):
+                cursor.execute(sql)
+        # Inserts send no signals: have running gateways route the new APIs.
+        notify_tenants_changed(
+            list(range(first_tenant, first_tenant + tenants)), "tenants_created", kinds=["route"]
+        )
+
+    if profile_path:
+        # Popularity is independent of tenant size: shuffle who gets which rank.
+        order = list(range(len(minted)))
+        rng.shuffle(order)
+        popularity = zipf_weights(len(minted), skew)
+        with open(profile_path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["api_key", "tenant", "api", "weight"])
+            for rank, position in enumerate(order):
+                _, raw_key, index = minted[position]
+                writer.writerow(
+                    [raw_key, f"{prefix}-{index}", rng.choice(tenant_apis[index]), f"{popularity[rank]:.6g}"]
+                )
+    return {"tenants": tenants, "plans": plans, "apis": len(api_rows), "clients": clients, "keys": len(minted)}
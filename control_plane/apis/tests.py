@@ -1,3 +1,290 @@
+import csv
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.test import TestCase
+from django.urls import reverse
+from django.utils.timezone import now
+
+from apis.listing import Page, search_keys
+from apis.models import API, APIKey, Client, Route, RouteHost
+from apis.revocation import reinstate_tenants, revoke_clients, revoke_keys, suspend_tenants
+from apis.scale_data import allocate, generate
+from billing.models import Plan
+from tenants.models import Tenant
+
+
+class ListingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="erin", password="password123")
+        self.tenant = Tenant.objects.create(user=self.user, name="Erin Tenant", slug="erin-tenant")
+        self.plan = Plan.objects.create(name="Gold", requests_per_minute=10, requests_per_month=1000)
+        created_at = now()
+        for index in range(7):
+            API.objects.create(
+                tenant=self.tenant, name=f"Service {index}", slug=f"service-{index}", upstream_base_url="http://upstream"
+            )
+        # Rows sharing a timestamp are ordered by ID.
+        API.objects.filter(tenant=self.tenant).update(created_at=created_at)
+        API.objects.filter(slug="service-0").update(created_at=created_at - timedelta(days=1))
+
+    def test_pages_cover_every_row_once(self):
+        seen = []
+        after = None
+        while True:
+            page = Page(API.objects.filter(tenant=self.tenant), after, limit=3)
+            seen.extend(api.slug for api in page)
+            after = page.next_cursor
+            if after is None:
+                break
+        self.assertEqual(seen, [f"service-{index}" for index in (6, 5, 4, 3, 2, 1, 0)])
+
+    def test_search_keys_matches_hash_ends_and_plan(self):
+        key = APIKey.objects.create(tenant=self.tenant, plan=self.plan, hashed_key="ab" + "0" * 60 + "cd")
+        keys = APIKey.objects.filter(tenant=self.tenant)
+        self.assertEqual(list(search_keys(keys, "AB")), [key])
+        self.assertEqual(list(search_keys(keys, "0cd")), [key])
+        self.assertEqual(list(search_keys(keys, "gold")), [key])
+        self.assertEqual(list(search_keys(keys, "silver")), [])
+
+    def test_list_apis_json(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("list-apis"), {"limit": 5})
+        body = response.json()
+        self.assertEqual(body["count"], 7)
+        self.assertEqual(len(body["apis"]), 5)
+
+        response = self.client.get(reverse("list-apis"), {"limit": 5, "after": body["next"]})
+        self.assertEqual([api["slug"] for api in response.json()["apis"]], ["service-1", "service-0"])
+        self.assertIsNone(response.json()["next"])
+
+        response = self.client.get(reverse("list-apis"), {"q": "service-3"})
+        self.assertEqual([api["slug"] for api in response.json()["apis"]], ["service-3"])
+        self.assertEqual(self.client.get(reverse("list-apis"), {"after": "!!"}).status_code, 400)
+
+    def test_create_key_json(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post(reverse("create-key")).status_code, 404)
+        Plan.objects.create(name="Free", requests_per_minute=1, requests_per_month=100)
+        self.assertEqual(self.client.get(reverse("create-key")).status_code, 405)
+
+        raw_key = self.client.post(reverse("create-key")).json()["api_key"]
+        key = APIKey.objects.get(tenant=self.tenant)
+        self.assertEqual(key.hashed_key, hashlib.sha256(raw_key.encode()).hexdigest())
+
+
+class RevocationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="frank", password="password123")
+        self.tenant = Tenant.objects.create(user=self.user, name="Frank Tenant", slug="frank-tenant")
+        other = User.objects.create_user(username="grace", password="password123")
+        self.other = Tenant.objects.create(user=other, name="Grace Tenant", slug="grace-tenant")
+        self.gold = Plan.objects.create(name="Gold", requests_per_minute=10, requests_per_month=1000)
+        self.free = Plan.objects.create(name="Free", requests_per_minute=1, requests_per_month=100)
+        for index, (tenant, plan) in enumerate(
+            [(self.tenant, self.gold), (self.tenant, self.free), (self.other, self.gold), (self.other, self.free)]
+        ):
+            APIKey.objects.create(tenant=tenant, plan=plan, hashed_key=f"{index:064x}")
+            Client.objects.create(tenant=tenant, plan=plan, client_id=f"client-{index}", name=f"Client {index}")
+
+    def revoke(self, fn, *args, **kwargs):
+        with patch("apis.notifications._publish") as publish, self.captureOnCommitCallbacks(execute=True):
+            count = fn(*args, **kwargs)
+        return count, [call.args[0] for call in publish.call_args_list]
+
+    def test_revoke_by_plan_spans_tenants_in_one_message(self):
+        count, messages = self.revoke(revoke_keys, plan=self.gold)
+        self.assertEqual(count, 2)
+        self.assertEqual(
+            messages,
+            [{"tenant_ids": [self.tenant.id, self.other.id], "change": "api_keys_revoked",
+              "kinds": ["api_key"], "count": 2}],
+        )
+        self.assertEqual(set(APIKey.objects.filter(is_active=True).values_list("plan", flat=True)), {self.free.id})
+        # Nothing left to revoke: no UPDATE and no message.
+        self.assertEqual(self.revoke(revoke_keys, plan=self.gold), (0, []))
+
+    def test_revoke_by_tenant_date_and_client(self):
+        APIKey.objects.filter(plan=self.free).update(created_at=now() - timedelta(days=30))
+        count, _ = self.revoke(revoke_keys, tenant=self.tenant, created_before=now() - timedelta(days=1))
+        self.assertEqual(count, 1)
+        self.assertFalse(APIKey.objects.get(tenant=self.tenant, plan=self.free).is_active)
+
+        count, messages = self.revoke(revoke_clients, client_ids=["client-1", "client-2"])
+        self.assertEqual(count, 2)
+        self.assertEqual(messages[0]["kinds"], ["client"])
+        self.assertEqual(set(Client.objects.filter(is_active=False).values_list("client_id", flat=True)),
+                         {"client-1", "client-2"})
+
+        with self.assertRaises(ValueError):
+            revoke_keys()
+
+    def test_suspend_and_reinstate_tenant(self):
+        count, messages = self.revoke(suspend_tenants, Tenant.objects.filter(id=self.tenant.id))
+        self.assertEqual(count, 1)
+        self.assertEqual(messages, [{"tenant_ids": [self.tenant.id], "change": "tenant_suspended", "kinds": None,
+                                     "count": 1}])
+        self.assertEqual(reinstate_tenants(Tenant.objects.all()), 1)
+        self.assertTrue(Tenant.objects.get(id=self.tenant.id).is_active)
+
+    def test_single_key_changes_are_announced(self):
+        key = APIKey.objects.get(tenant=self.tenant, plan=self.gold)
+        with patch("apis.notifications._publish") as publish, self.captureOnCommitCallbacks(execute=True):
+            key.is_active = False
+            key.save()
+            key.delete()
+        message = {"tenant_id": self.tenant.id, "change": "key_changed", "kinds": ["api_key"]}
+        self.assertEqual([call.args[0] for call in publish.call_args_list], [message, message])
+
+        with patch("apis.notifications._publish") as publish, self.captureOnCommitCallbacks(execute=True):
+            APIKey.objects.create(tenant=self.tenant, plan=self.gold, hashed_key="f" * 64)
+        publish.assert_not_called()
+
+    def test_revoke_endpoint_is_scoped_to_tenant(self):
+        self.client.force_login(self.user)
+        with patch("apis.notifications._publish"):
+            response = self.client.post(
+                reverse("revoke-credentials"), {"plan_id": self.gold.id}, content_type="application/json"
+            )
+        self.assertEqual(response.json(), {"success": True, "revoked_keys": 1, "revoked_clients": 1})
+        self.assertEqual(APIKey.objects.filter(is_active=False).get().tenant, self.tenant)
+        self.assertTrue(APIKey.objects.get(tenant=self.other, plan=self.gold).is_active)
+
+        response = self.client.post(
+            reverse("revoke-credentials"), {"created_before": "soon"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class RouteTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="irene", password="password123")
+        self.tenant = Tenant.objects.create(user=self.user, name="Irene Tenant", slug="irene-tenant")
+        other = User.objects.create_user(username="jack", password="password123")
+        self.other = Tenant.objects.create(user=other, name="Jack Tenant", slug="jack-tenant")
+        self.api = API.objects.create(tenant=self.tenant, name="Orders", slug="orders", upstream_base_url="http://orders")
+        self.other_api = API.objects.create(tenant=self.other, name="Users", slug="users",
+                                            upstream_base_url="http://users")
+        self.client.force_login(self.user)
+
+    def add(self, **data):
+        with patch("apis.notifications._publish"):
+            return self.client.post(reverse("routes"), data, content_type="application/json")
+
+    def test_create_normalizes_and_lists(self):
+        response = self.add(api="orders", host="API.Irene.example.", path_prefix="v1//orders/")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["route"]["host"], "api.irene.example")
+        self.assertEqual(response.json()["route"]["path_prefix"], "/v1/orders")
+
+        routes = self.client.get(reverse("routes")).json()["routes"]
+        self.assertEqual([(route["api"], route["path_prefix"]) for route in routes], [("orders", "/v1/orders")])
+        self.assertEqual(self.add(api="users", host="api.irene.example").status_code, 400)
+        self.assertEqual(self.add(api="orders", host="api.irene.example:8443").status_code, 400)
+        # The same host and prefix again.
+        self.assertEqual(self.add(api="orders", host="api.irene.example", path_prefix="/v1/orders").status_code, 400)
+
+    def test_host_belongs_to_first_tenant(self):
+        Route.objects.create(api=self.other_api, host="shared.example")
+        response = self.add(api="orders", host="shared.example", path_prefix="/orders")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("host", response.json()["errors"])
+
+    def test_host_ownership_is_enforced_on_save(self):
+        with patch("apis.notifications._publish"):
+            Route.objects.create(api=self.other_api, host="shared.example")
+            # Without clean(), as the admin's bulk edits or a racing POST would.
+            with self.assertRaises(ValidationError):
+                Route.objects.create(api=self.api, host="shared.example", path_prefix="/orders")
+            self.assertEqual(Route.objects.filter(host="shared.example").count(), 1)
+
+            # The host is free again once its last route is gone.
+            Route.objects.filter(host="shared.example").delete()
+            route = Route.objects.create(api=self.api, host="shared.example")
+            self.assertEqual(RouteHost.objects.get(host="shared.example").tenant, self.tenant)
+            route.host = "orders.irene.example"
+            route.save()
+        self.assertEqual(list(RouteHost.objects.values_list("host", flat=True)), ["orders.irene.example"])
+
+    def test_save_normalizes_host(self):
+        with patch("apis.notifications._publish"):
+            Route.objects.create(api=self.other_api, host="shared.example")
+            with self.assertRaises(ValidationError):
+                Route.objects.create(api=self.api, host=" Shared.Example. ", path_prefix="/orders")
+            route = Route.objects.create(api=self.other_api, host="Users.Jack.Example.")
+        self.assertEqual(route.host, "users.jack.example")
+        self.assertTrue(RouteHost.objects.filter(host="users.jack.example", tenant=self.other).exists())
+
+    def test_changes_are_announced(self):
+        with patch("apis.notifications._publish") as publish, self.captureOnCommitCallbacks(execute=True):
+            route = Route.objects.create(api=self.api, host="api.irene.example")
+            self.api.save()
+        messages = [call.args[0] for call in publish.call_args_list]
+        self.assertEqual(len(messages), 2)
+        self.assertTrue(all(message.get("kinds") == ["route"] for message in messages))
+
+        response = self.client.post(reverse("delete-route", args=[route.id + 1]))
+        self.assertEqual(response.status_code, 404)
+        with patch("apis.notifications._publish"):
+            self.assertEqual(self.client.post(reverse("delete-route", args=[route.id])).json(), {"success": True})
+        self.assertFalse(Route.objects.exists())
+
+
+class IdempotencyTTLTest(TestCase):
+    def test_ttl_is_optional_and_bounded(self):
+        user = User.objects.create_user(username="kate", password="password123")
+        tenant = Tenant.objects.create(user=user, name="Kate Tenant", slug="kate-tenant")
+        api = API(tenant=tenant, name="Payments", slug="payments", upstream_base_url="https://payments.example.com")
+        api.full_clean()
+        api.idempotency_ttl = 24 * 60 * 60
+        api.full_clean()
+        for ttl in (0, 24 * 60 * 60 + 1):
+            api.idempotency_ttl = ttl
+            with self.assertRaises(ValidationError):
+                api.full_clean()
+
+
+class ScaleDataTest(TestCase):
+    def test_allocate_is_exact_and_skewed(self):
+        self.assertEqual(allocate(10, [0.5, 0.3, 0.2]), [5, 3, 2])
+        self.assertEqual(allocate(7, [0.6, 0.3, 0.1], minimum=2), [3, 2, 2])
+
+    def test_generate_matches_profile(self):
+        existing = User.objects.create_user(username="henry", password="password123")
+        Tenant.objects.create(user=existing, name="Henry Tenant", slug="henry-tenant")
+        with tempfile.TemporaryDirectory() as workdir:
+            profile = os.path.join(workdir, "keys.csv")
+            created = generate(tenants=4, apis=6, keys=50, clients=3, plans=2, profile_path=profile, seed=1)
+            with open(profile, newline="") as file:
+                rows = list(csv.DictReader(file))
+
+        self.assertEqual(created, {"tenants": 4, "plans": 2, "apis": 6, "clients": 3, "keys": 50})
+        tenants = Tenant.objects.filter(slug__startswith="scale-")
+        self.assertEqual(tenants.count(), 4)
+        sizes = [APIKey.objects.filter(tenant=tenant).count() for tenant in tenants.order_by("id")]
+        self.assertEqual(sum(sizes), 50)
+        self.assertEqual(sizes, sorted(sizes, reverse=True))
+        self.assertEqual(Client.objects.filter(tenant__in=tenants).count(), 3)
+        self.assertFalse(User.objects.get(username="scale-0").has_usable_password())
+
+        # Every raw key in the profile authenticates for its tenant and API.
+        self.assertEqual(len(rows), 50)
+        weights = [float(row["weight"]) for row in rows]
+        self.assertEqual(weights, sorted(weights, reverse=True))
+        for row in rows:
+            key = APIKey.objects.get(hashed_key=hashlib.sha256(row["api_key"].encode()).hexdigest())
+            self.assertEqual(key.tenant.slug, row["tenant"])
+            self.assertTrue(API.objects.filter(tenant=key.tenant, slug=row["api"]).exists())
 
-# Create your tests here.
+        # New rows get IDs after the generated ones.
+        self.assertGreater(APIKey.objects.create(tenant=existing.tenant, plan=key.plan, hashed_key="f" * 64).id,
+                           APIKey.objects.exclude(hashed_key="f" * 64).order_by("-id")[0].id)
+        with self.assertRaises(ValueError):
+            generate(tenants=1, apis=1, keys=1)
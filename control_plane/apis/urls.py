@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path("", views.list_apis, name="list-apis"),
+    path("keys/", views.create_api_key, name="create-key"),
+    path("revoke/", views.revoke_credentials, name="revoke-credentials"),
+    path("routes/", views.routes, name="routes"),
+    path("routes/<int:route_id>/delete/", views.delete_route, name="delete-route"),
+]
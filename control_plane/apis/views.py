@@ -1,18 +1,29 @@
-from django.shortcuts import render
+import json
+from datetime import datetime
+
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
 from django.http import JsonResponse
-from .models import APIKey,API
+from django.utils.timezone import get_current_timezone, is_naive, make_aware
+from django.views.decorators.http import require_POST
+from .listing import PAGE_SIZE, Page, acached_count, filter_active, search_apis
+from .models import APIKey,API,Route
+from .provisioning import tenant_plan
+from .revocation import revoke_clients, revoke_keys
 from tenants.models import Tenant
 from billing.models import Plan
 
 @login_required
-def create_api_key(request):
-    tenant = Tenant.objects.get(user=request.user)
-    plan = Plan.objects.get(name="Free")  # or from POST data
+@require_POST
+async def create_api_key(request):
+    tenant = await Tenant.objects.filter(user=await request.auser()).afirst()
+    plan = await Plan.objects.filter(name="Free", is_active=True).order_by("id").afirst()  # or from POST data
+    if tenant is None or plan is None:
+        return JsonResponse({"error": "No tenant or no Free plan"}, status=404)
 
     raw_key, hashed_key = APIKey.generate_key()
 
-    APIKey.objects.create(
+    await APIKey.objects.acreate(
         tenant=tenant,
         plan=plan,
         hashed_key=hashed_key
@@ -24,17 +35,124 @@ def create_api_key(request):
     })
 
 @login_required
-def list_apis(request):
-    tenant = Tenant.objects.get(user=request.user)
-    apis = API.objects.filter(tenant=tenant)
+async def list_apis(request):
+    tenant = await Tenant.objects.aget(user=await request.auser())
+    apis = API.objects.filter(tenant=tenant).only("name", "slug", "upstream_base_url", "is_active", "created_at")
+    filtered = filter_active(apis, request.GET.get("status"))
+    q = request.GET.get("q", "").strip()
+    if q:
+        filtered = search_apis(filtered, q)
+
+    try:
+        limit = int(request.GET.get("limit", PAGE_SIZE))
+        page = await Page(filtered, request.GET.get("after"), limit).aload()
+    except (ValueError, ValidationError):
+        return JsonResponse({"error": "Invalid limit or cursor"}, status=400)
 
     data = [
         {
             "name": api.name,
             "slug": api.slug,
-            "upstream_base_url": api.upstream_base_url
+            "upstream_base_url": api.upstream_base_url,
+            "is_active": api.is_active,
         }
-        for api in apis
+        for api in page
     ]
 
-    return JsonResponse({"apis": data})
+    return JsonResponse(
+        {"apis": data, "next": page.next_cursor, "count": await acached_count(tenant.id, "apis", apis)}
+    )
+
+
+@login_required
+@require_POST
+def revoke_credentials(request):
+    """Revoke the tenant's keys and clients matching ``plan_id``,
+    ``created_before`` and/or ``client_ids`` (all of them if none is given)."""
+    try:
+        tenant = request.user.tenant
+    except Tenant.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'No tenant'}, status=404)
+
+    try:
+        data = json.loads(request.body or b'{}')
+        created_before = data.get('created_before')
+        if created_before is not None:
+            created_before = datetime.fromisoformat(created_before)
+            if is_naive(created_before):
+                created_before = make_aware(created_before, get_current_timezone())
+        client_ids = data.get('client_ids')
+        if client_ids is not None and not (isinstance(client_ids, list) and all(isinstance(c, str) for c in client_ids)):
+            raise ValueError
+        plan = None
+        if data.get('plan_id') is not None:
+            plan = tenant_plan(tenant, int(data['plan_id']))
+            if plan is None:
+                return JsonResponse({'success': False, 'error': 'Unknown plan'}, status=400)
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
+        return JsonResponse(
+            {'success': False, 'error': 'Expected plan_id, created_before (ISO date/time) and/or client_ids (list).'},
+            status=400,
+        )
+
+    filters = dict(tenant=tenant, plan=plan, created_before=created_before)
+    return JsonResponse({
+        'success': True,
+        'revoked_keys': 0 if client_ids is not None else revoke_keys(**filters),
+        'revoked_clients': revoke_clients(client_ids=client_ids, **filters),
+    })
+
+
+def _route_json(route):
+    return {
+        'id': route.id,
+        'api': route.api.slug,
+        'host': route.host,
+        'path_prefix': route.path_prefix,
+        'strip_prefix': route.strip_prefix,
+        'is_active': route.is_active,
+    }
+
+
+@login_required
+def routes(request):
+    """List the tenant's custom-domain routes, or add one from ``api`` (slug),
+    ``host``, ``path_prefix`` and ``strip_prefix``."""
+    try:
+        tenant = request.user.tenant
+    except Tenant.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'No tenant'}, status=404)
+
+    if request.method != 'POST':
+        tenant_routes = Route.objects.filter(api__tenant=tenant).select_related('api').order_by('host', 'path_prefix')
+        return JsonResponse({'success': True, 'routes': [_route_json(route) for route in tenant_routes]})
+
+    try:
+        data = json.loads(request.body or b'{}')
+        api = API.objects.filter(tenant=tenant, slug=data['api']).first()
+        route = Route(
+            api=api,
+            host=str(data['host']),
+            path_prefix=str(data.get('path_prefix') or '/'),
+            strip_prefix=bool(data.get('strip_prefix', True)),
+        )
+    except (json.JSONDecodeError, AttributeError, KeyError, TypeError):
+        return JsonResponse({'success': False, 'error': 'Expected api, host and optionally path_prefix.'}, status=400)
+    if api is None:
+        return JsonResponse({'success': False, 'error': 'Unknown API'}, status=400)
+    try:
+        route.full_clean()
+        # Re-checks the host, which another tenant may have just claimed.
+        route.save()
+    except ValidationError as exc:
+        return JsonResponse({'success': False, 'errors': exc.message_dict}, status=400)
+    return JsonResponse({'success': True, 'route': _route_json(route)}, status=201)
+
+
+@login_required
+@require_POST
+def delete_route(request, route_id):
+    deleted, _ = Route.objects.filter(id=route_id, api__tenant__user=request.user).delete()
+    if not deleted:
+        return JsonResponse({'success': False, 'error': 'Route not found'}, status=404)
+    return JsonResponse({'success': True})
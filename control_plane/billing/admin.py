@@ -1,5 +1,18 @@
 from django.contrib import admin
-from .models import Plan
+from .models import Invoice, Plan, PriceTier
 
-admin.site.register(Plan)
 
+class PriceTierInline(admin.TabularInline):
+    model = PriceTier
+    extra = 0
+
+
+@admin.register(Plan)
+class PlanAdmin(admin.ModelAdmin):
+    inlines = [PriceTierInline]
+
+
+@admin.register(Invoice)
+class InvoiceAdmin(admin.ModelAdmin):
+    list_display = ("tenant", "period_start", "period_end", "requests", "total", "computed_at")
+    list_filter = ("period_start",)
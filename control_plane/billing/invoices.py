@@ -0,0 +1,177 @@
+"""Billing runs: an invoice per tenant for a period, priced from ``DailyUsage``.
+
+The database aggregates the period's rollups in one grouped query, per tenant
+and billing subject (the client when requests carried a client ID, otherwise
+the key), joined to the subject's current plan. Python only prices the
+aggregated rows, and writes them back with ``bulk_create``, so a run costs
+one pass over the rollups however many keys there are.
+
+Runs are idempotent and incremental: a tenant's invoice for a period is
+replaced, never added to, and only tenants whose usage changed since their
+invoice was computed are redone. ``force`` redoes every tenant, e.g. after a
+price change.
+"""
+from dataclasses import dataclass
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, Max, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+
+from usage.models import DailyUsage
+from usage.rollups import roll_up_events
+
+from .models import Invoice, InvoiceLine, Plan, PriceTier
+
+CENT = Decimal("0.01")
+# Tenants per DELETE, to stay under the database's query parameter limit.
+DELETE_CHUNK = 500
+
+
+@dataclass
+class BillingRun:
+    period_start: date
+    period_end: date
+    events_rolled_up: int = 0
+    invoices: int = 0
+    lines: int = 0
+    # Tenants whose invoice was already up to date.
+    unchanged: int = 0
+    total: Decimal = Decimal(0)
+
+
+class Pricing:
+    """A plan's prices, with per-request rather than per-1000 rates."""
+
+    def __init__(self, plan: Plan, tiers: list[PriceTier]):
+        self.base_price = plan.base_price
+        self.included_requests = plan.included_requests
+        self.tiers = [(tier.up_to, tier.price_per_1000 / 1000) for tier in tiers]
+        self.overage_price = plan.overage_price_per_1000 / 1000
+
+    def usage_charge(self, requests: int) -> Decimal:
+        charge = Decimal(0)
+        billed_up_to = self.included_requests
+        for up_to, price in self.tiers:
+            if requests <= billed_up_to:
+                return charge
+            if up_to > billed_up_to:
+                charge += (min(requests, up_to) - billed_up_to) * price
+                billed_up_to = up_to
+        if requests > billed_up_to:
+            charge += (requests - billed_up_to) * self.overage_price
+        return charge
+
+
+def load_pricing(plan_ids) -> dict[int, Pricing]:
+    tiers = {}
+    # Few plans have tiers, so loading all of them beats a huge IN list.
+    for tier in PriceTier.objects.all():
+        tiers.setdefault(tier.plan_id, []).append(tier)
+    plans = Plan.objects.only("base_price", "included_requests", "overage_price_per_1000").in_bulk(plan_ids)
+    return {plan_id: Pricing(plan, tiers.get(plan_id, [])) for plan_id, plan in plans.items()}
+
+
+def aggregate_usage(period_start: date, period_end: date):
+    """Yields ``(tenant_id, key_id, client_id, plan_id, requests, bytes_in,
+    bytes_out, updated_at)`` per billing subject, ordered by tenant."""
+    return (
+        DailyUsage.objects.filter(day__gte=period_start, day__lt=period_end)
+        .annotate(
+            billed_key=Case(When(client__isnull=True, then=F("api_key"))),
+            billed_plan=Coalesce("client__plan", "api_key__plan"),
+        )
+        .values("tenant", "billed_key", "client", "billed_plan")
+        .annotate(
+            total_requests=Sum("requests"),
+            total_bytes_in=Sum("bytes_in"),
+            total_bytes_out=Sum("bytes_out"),
+            last_updated=Max("updated_at"),
+        )
+        .order_by("tenant")
+        .values_list(
+            "tenant", "billed_key", "client", "billed_plan",
+            "total_requests", "total_bytes_in", "total_bytes_out", "last_updated",
+        )
+        .iterator(chunk_size=10_000)
+    )
+
+
+def run_billing(period_start: date, period_end: date, force: bool = False) -> BillingRun:
+    """Roll up new request events, then (re)compute the period's invoices."""
+    run = BillingRun(period_start, period_end)
+    while rolled_up := roll_up_events():
+        run.events_rolled_up += rolled_up
+
+    rows = list(aggregate_usage(period_start, period_end))
+    current = dict(
+        Invoice.objects.filter(period_start=period_start, period_end=period_end).values_list(
+            "tenant_id", "usage_updated_at"
+        )
+    )
+    usage_updated = {}
+    for row in rows:
+        tenant_id, updated_at = row[0], row[7]
+        if tenant_id not in usage_updated or updated_at > usage_updated[tenant_id]:
+            usage_updated[tenant_id] = updated_at
+    stale = {
+        tenant_id
+        for tenant_id, updated_at in usage_updated.items()
+        if force or tenant_id not in current or current[tenant_id] < updated_at
+    }
+    run.unchanged = len(usage_updated) - len(stale)
+    pricing = load_pricing({row[3] for row in rows if row[0] in stale and row[3] is not None})
+
+    computed_at = now()
+    invoices = {}
+    lines = []
+    for tenant_id, key_id, client_id, plan_id, requests, bytes_in, bytes_out, _ in rows:
+        if tenant_id not in stale or plan_id not in pricing:
+            # Usage of a key or client that has since been deleted isn't billed.
+            continue
+        invoice = invoices.get(tenant_id)
+        if invoice is None:
+            invoice = invoices[tenant_id] = Invoice(
+                tenant_id=tenant_id,
+                period_start=period_start,
+                period_end=period_end,
+                usage_updated_at=usage_updated[tenant_id],
+                computed_at=computed_at,
+            )
+        prices = pricing[plan_id]
+        base_amount = prices.base_price.quantize(CENT, ROUND_HALF_UP)
+        usage_amount = prices.usage_charge(requests).quantize(CENT, ROUND_HALF_UP)
+        line = InvoiceLine(
+            invoice=invoice,
+            api_key_id=key_id,
+            client_id=client_id,
+            plan_id=plan_id,
+            requests=requests,
+            bytes_in=bytes_in,
+            bytes_out=bytes_out,
+            base_amount=base_amount,
+            usage_amount=usage_amount,
+            amount=base_amount + usage_amount,
+        )
+        lines.append(line)
+        invoice.requests += requests
+        invoice.total += line.amount
+
+    stale_ids = sorted(stale)
+    with transaction.atomic():
+        for index in range(0, len(stale_ids), DELETE_CHUNK):
+            replaced = Invoice.objects.filter(
+                period_start=period_start, period_end=period_end, tenant_id__in=stale_ids[index : index + DELETE_CHUNK]
+            )
+            InvoiceLine.objects.filter(invoice__in=replaced).delete()
+            replaced.delete()
+        # Sets the invoices' primary keys, which the lines pick up when saved.
+        Invoice.objects.bulk_create(invoices.values())
+        InvoiceLine.objects.bulk_create(lines, batch_size=5_000)
+
+    run.invoices = len(invoices)
+    run.lines = len(lines)
+    run.total = sum((invoice.total for invoice in invoices.values()), Decimal(0))
+    return run
@@ -0,0 +1,42 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import now
+
+from billing.invoices import run_billing
+
+
+def _month_period(month: str) -> tuple[date, date]:
+    year, number = (int(part) for part in month.split("-"))
+    start = date(year, number, 1)
+    end = date(year + 1, 1, 1) if number == 12 else date(year, number + 1, 1)
+    return start, end
+
+
+class Command(BaseCommand):
+    help = "Compute (or bring up to date) every tenant's invoice for a billing period."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", help="Calendar month to bill, as YYYY-MM (default: the current month).")
+        parser.add_argument("--start", type=date.fromisoformat, help="First day of a custom period.")
+        parser.add_argument("--end", type=date.fromisoformat, help="Day after the last day of a custom period.")
+        parser.add_argument("--force", action="store_true", help="Recompute invoices that are up to date too.")
+
+    def handle(self, *args, **options):
+        if options["start"] or options["end"]:
+            if not (options["start"] and options["end"]) or options["month"]:
+                raise CommandError("Pass either --month or both --start and --end.")
+            period_start, period_end = options["start"], options["end"]
+        else:
+            try:
+                period_start, period_end = _month_period(options["month"] or now().strftime("%Y-%m"))
+            except ValueError:
+                raise CommandError("--month must look like 2026-09.")
+        if period_end <= period_start:
+            raise CommandError("The period must end after it starts.")
+
+        run = run_billing(period_start, period_end, force=options["force"])
+        self.stdout.write(
+            f"Billed {period_start}..{period_end}: {run.invoices} invoices, {run.lines} lines, "
+            f"total {run.total} ({run.unchanged} unchanged, {run.events_rolled_up} new events rolled up)"
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-19 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plan',
+            name='max_connections',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
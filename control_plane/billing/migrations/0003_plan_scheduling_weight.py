@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-19 08:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_plan_max_connections'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plan',
+            name='scheduling_weight',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
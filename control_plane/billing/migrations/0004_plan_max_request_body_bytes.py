@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-19 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_plan_scheduling_weight'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plan',
+            name='max_request_body_bytes',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
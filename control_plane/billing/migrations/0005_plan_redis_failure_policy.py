@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-19 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0004_plan_max_request_body_bytes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plan',
+            name='redis_failure_policy',
+            field=models.CharField(choices=[('local', 'Enforce limits per gateway worker'), ('open', 'Allow requests'), ('closed', 'Reject requests')], default='local', max_length=10),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.10 on 2026-10-19 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0006_pricing_and_invoices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plan',
+            name='bytes_in_per_minute',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='plan',
+            name='bytes_in_per_month',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='plan',
+            name='bytes_out_per_minute',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='plan',
+            name='bytes_out_per_month',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='plan',
+            name='max_bytes_per_second',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -4,7 +4,87 @@ class Plan(models.Model):
     name = models.CharField(max_length=50)
     requests_per_minute = models.IntegerField()
     requests_per_month = models.IntegerField()
+    # Concurrent long-lived connections (WebSocket / SSE); null means unlimited.
+    max_connections = models.IntegerField(null=True, blank=True)
+    # Share of upstream dispatch capacity when the gateway is saturated.
+    scheduling_weight = models.PositiveIntegerField(default=1)
+    # Largest request body the gateway accepts, in bytes; null means the gateway default.
+    max_request_body_bytes = models.PositiveBigIntegerField(null=True, blank=True)
+    # Request and response body bytes per key or client; null means unlimited.
+    bytes_in_per_minute = models.PositiveBigIntegerField(null=True, blank=True)
+    bytes_in_per_month = models.PositiveBigIntegerField(null=True, blank=True)
+    bytes_out_per_minute = models.PositiveBigIntegerField(null=True, blank=True)
+    bytes_out_per_month = models.PositiveBigIntegerField(null=True, blank=True)
+    # Rate each response is relayed to the client at, in bytes per second; null means unshaped.
+    max_bytes_per_second = models.PositiveBigIntegerField(null=True, blank=True)
+    # What the gateway does with this plan's requests while Redis is unreachable.
+    redis_failure_policy = models.CharField(
+        max_length=10,
+        choices=[
+            ("local", "Enforce limits per gateway worker"),
+            ("open", "Allow requests"),
+            ("closed", "Reject requests"),
+        ],
+        default="local",
+    )
+    # Pricing per billing period for each key or client on the plan: a flat
+    # base price, a number of free requests, graduated tiers above those
+    # (PriceTier) and an overage price above the last tier.
+    base_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    included_requests = models.PositiveBigIntegerField(default=0)
+    overage_price_per_1000 = models.DecimalField(max_digits=12, decimal_places=6, default=0)
     is_active = models.BooleanField(default=True)
 
     def __str__(self):
         return self.name
+
+
+class PriceTier(models.Model):
+    """Price of the requests in a period up to ``up_to`` (counting all of
+    them, included ones too) and above the previous tier's bound."""
+    plan = models.ForeignKey(Plan, on_delete=models.CASCADE, related_name="tiers")
+    up_to = models.PositiveBigIntegerField()
+    price_per_1000 = models.DecimalField(max_digits=12, decimal_places=6)
+
+    class Meta:
+        ordering = ["plan", "up_to"]
+        unique_together = ("plan", "up_to")
+
+    def __str__(self):
+        return f"{self.plan} up to {self.up_to}: {self.price_per_1000}/1000"
+
+
+class Invoice(models.Model):
+    tenant = models.ForeignKey("tenants.Tenant", on_delete=models.CASCADE)
+    period_start = models.DateField()
+    # Exclusive.
+    period_end = models.DateField()
+    requests = models.PositiveBigIntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Latest DailyUsage change included; later changes make the invoice stale.
+    usage_updated_at = models.DateTimeField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("tenant", "period_start", "period_end")
+
+    def __str__(self):
+        return f"{self.tenant} {self.period_start}..{self.period_end}: {self.total}"
+
+
+class InvoiceLine(models.Model):
+    """Charges for one key, or one client, under its current plan. Requests
+    made with a client ID are billed to the client rather than the key."""
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name="lines")
+    api_key = models.ForeignKey("apis.APIKey", on_delete=models.DO_NOTHING, db_constraint=False, null=True)
+    client = models.ForeignKey("apis.Client", on_delete=models.DO_NOTHING, db_constraint=False, null=True)
+    plan = models.ForeignKey(Plan, on_delete=models.DO_NOTHING, db_constraint=False)
+    requests = models.PositiveBigIntegerField()
+    bytes_in = models.PositiveBigIntegerField()
+    bytes_out = models.PositiveBigIntegerField()
+    base_amount = models.DecimalField(max_digits=14, decimal_places=2)
+    usage_amount = models.DecimalField(max_digits=14, decimal_places=2)
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.invoice_id}: {self.amount}"
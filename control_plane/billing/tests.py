@@ -1,3 +1,122 @@
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from itertools import count
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+
+from apis.models import API, APIKey, Client
+from billing.invoices import Pricing, run_billing
+from billing.models import Invoice, InvoiceLine, Plan, PriceTier
+from tenants.models import Tenant
+from usage.models import RequestEvent
+
+PERIOD = (date(2026, 9, 1), date(2026, 10, 1))
+_stream_ids = count(1)
+
+
+def add_events(api_key, number, day=date(2026, 9, 15), client=None):
+    RequestEvent.objects.bulk_create(
+        RequestEvent(
+            stream_id=f"1760000000000-{next(_stream_ids)}",
+            day=day,
+            timestamp=datetime(day.year, day.month, day.day, tzinfo=timezone.utc),
+            tenant_id=api_key.tenant_id,
+            api=API.objects.get(tenant_id=api_key.tenant_id),
+            api_key=api_key,
+            client=client,
+            method="GET",
+            status=200,
+            latency_us=1000,
+            bytes_in=10,
+            bytes_out=100,
+        )
+        for _ in range(number)
+    )
+
+
+class PricingTest(TestCase):
+    def test_graduated_tiers_and_overage(self):
+        plan = Plan.objects.create(
+            name="Tiered",
+            requests_per_minute=100,
+            requests_per_month=1_000_000,
+            base_price=Decimal("10.00"),
+            included_requests=1000,
+            overage_price_per_1000=Decimal("1"),
+        )
+        PriceTier.objects.create(plan=plan, up_to=3000, price_per_1000=Decimal("5"))
+        PriceTier.objects.create(plan=plan, up_to=5000, price_per_1000=Decimal("2"))
+        pricing = Pricing(plan, list(plan.tiers.all()))
+
+        self.assertEqual(pricing.usage_charge(500), 0)
+        self.assertEqual(pricing.usage_charge(2000), Decimal("5"))
+        # 2000 at 5/1000, 2000 at 2/1000, 1000 at 1/1000.
+        self.assertEqual(pricing.usage_charge(6000), Decimal("15"))
+
+
+class BillingRunTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="owner", password="password")
+        self.tenant = Tenant.objects.create(user=user, name="Acme", slug="acme")
+        API.objects.create(tenant=self.tenant, name="Orders", slug="orders", upstream_base_url="http://upstream")
+        self.plan = Plan.objects.create(
+            name="Metered",
+            requests_per_minute=100,
+            requests_per_month=1_000_000,
+            base_price=Decimal("1.00"),
+            included_requests=10,
+            overage_price_per_1000=Decimal("100"),
+        )
+        self.key = APIKey.objects.create(tenant=self.tenant, plan=self.plan, hashed_key="a" * 64)
+
+    def test_bills_keys_and_clients_separately(self):
+        client_plan = Plan.objects.create(name="Client", requests_per_minute=100, requests_per_month=1000)
+        client = Client.objects.create(tenant=self.tenant, plan=client_plan, client_id="mobile", name="Mobile")
+        add_events(self.key, 20)
+        add_events(self.key, 3, day=date(2026, 9, 16))
+        add_events(self.key, 5, client=client)
+        add_events(self.key, 7, day=date(2026, 10, 1))
+
+        run = run_billing(*PERIOD)
+
+        self.assertEqual(run.events_rolled_up, 35)
+        invoice = Invoice.objects.get(tenant=self.tenant)
+        self.assertEqual(invoice.requests, 28)
+        key_line = InvoiceLine.objects.get(invoice=invoice, api_key=self.key)
+        self.assertEqual(key_line.requests, 23)
+        self.assertEqual(key_line.bytes_out, 2300)
+        # 13 requests over the included 10, at 0.10 each.
+        self.assertEqual(key_line.amount, Decimal("2.30"))
+        client_line = InvoiceLine.objects.get(invoice=invoice, client=client)
+        self.assertEqual((client_line.requests, client_line.amount), (5, Decimal("0.00")))
+        self.assertEqual(invoice.total, Decimal("2.30"))
+
+    def test_rerun_is_idempotent_and_incremental(self):
+        add_events(self.key, 20)
+        run_billing(*PERIOD)
+
+        run = run_billing(*PERIOD)
+        self.assertEqual((run.invoices, run.unchanged), (0, 1))
+
+        add_events(self.key, 10)
+        run = run_billing(*PERIOD)
+        self.assertEqual(run.invoices, 1)
+        self.assertEqual(Invoice.objects.count(), 1)
+        self.assertEqual(InvoiceLine.objects.count(), 1)
+        self.assertEqual(Invoice.objects.get().requests, 30)
+
+    def test_billing_run_view_is_staff_only(self):
+        url = reverse("billing-run")
+        body = {"period_start": "2026-09-01", "period_end": "2026-10-01"}
+        self.client.force_login(self.tenant.user)
+        response = self.client.post(url, body, content_type="application/json")
+        self.assertEqual(response.status_code, 403)
 
-# Create your tests here.
+        add_events(self.key, 20)
+        staff = User.objects.create_user(username="staff", password="password", is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.post(url, body, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["invoices"], 1)
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path("runs/", views.create_billing_run, name="billing-run"),
+    path("invoices/", views.my_invoices, name="my-invoices"),
+]
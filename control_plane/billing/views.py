@@ -1,3 +1,65 @@
-from django.shortcuts import render
+from datetime import date
+import json
 
-# Create your views here.
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET, require_POST
+
+from billing.invoices import run_billing
+from billing.models import Invoice
+from tenants.models import Tenant
+
+
+@login_required
+@require_POST
+def create_billing_run(request):
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Staff only'}, status=403)
+
+    try:
+        data = json.loads(request.body or b'{}')
+        period_start = date.fromisoformat(data.get('period_start') or '')
+        period_end = date.fromisoformat(data.get('period_end') or '')
+    except (json.JSONDecodeError, TypeError, ValueError):
+        return JsonResponse(
+            {'success': False, 'error': 'period_start and period_end must be ISO dates (YYYY-MM-DD).'}, status=400
+        )
+    if period_end <= period_start:
+        return JsonResponse({'success': False, 'error': 'The period must end after it starts.'}, status=400)
+
+    run = run_billing(period_start, period_end, force=bool(data.get('force')))
+    return JsonResponse({
+        'success': True,
+        'period_start': period_start.isoformat(),
+        'period_end': period_end.isoformat(),
+        'invoices': run.invoices,
+        'lines': run.lines,
+        'unchanged': run.unchanged,
+        'events_rolled_up': run.events_rolled_up,
+        'total': str(run.total),
+    })
+
+
+@login_required
+@require_GET
+def my_invoices(request):
+    try:
+        tenant = request.user.tenant
+    except Tenant.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'No tenant'}, status=404)
+
+    invoices = Invoice.objects.filter(tenant=tenant).order_by('-period_start')
+    return JsonResponse({
+        'success': True,
+        'invoices': [
+            {
+                'id': invoice.id,
+                'period_start': invoice.period_start.isoformat(),
+                'period_end': invoice.period_end.isoformat(),
+                'requests': invoice.requests,
+                'total': str(invoice.total),
+                'computed_at': invoice.computed_at.isoformat(),
+            }
+            for invoice in invoices
+        ],
+    })
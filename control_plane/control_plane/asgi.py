@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+
+Serve it with uvicorn (``uvicorn control_plane.asgi:application``): the JSON
+endpoints under ``/apis/`` and ``/usage/`` are async views and wait on the
+database and Redis without holding a thread. With ``DEBUG`` on, static files
+are served too, as ``runserver`` does.
 """
 
 import os
@@ -14,3 +19,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'control_plane.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.DEBUG:
+    from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+
+    application = ASGIStaticFilesHandler(application)
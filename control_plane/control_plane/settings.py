@@ -68,6 +68,32 @@ DATABASES = {
     }
 }
 
+# Cache — Redis when REDIS_URL is set (Docker), otherwise per-process memory,
+# so local development and tests don't need Redis.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+            # Keeps clear of the data plane's counters in the same Redis.
+            'KEY_PREFIX': 'control_plane',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Sessions are read from the cache and only fall back to (and are written
+# through to) the database, which the data plane reads from too.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Seconds the dashboard's per-tenant fragments are cached; they are also
+# dropped whenever the tenant's APIs or keys change.
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', '600'))
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -23,5 +23,8 @@ urlpatterns = [
     path('register/', tenants_views.register_view, name='register'),
     path('admin/', admin.site.urls),
     path('dashboard/',include('tenants.urls')),
+    path('apis/', include('apis.urls')),
+    path('billing/', include('billing.urls')),
+    path('usage/', include('usage.urls')),
     path('login/', tenants_views.login_view, name='login'),
 ]
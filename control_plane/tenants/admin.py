@@ -1,4 +1,18 @@
 from django.contrib import admin
+from apis.revocation import reinstate_tenants, suspend_tenants
 from .models import Tenant
 
-admin.site.register(Tenant)
\ No newline at end of file
+
+@admin.register(Tenant)
+class TenantAdmin(admin.ModelAdmin):
+    list_display = ("name", "slug", "requests_per_minute", "requests_per_month", "is_active", "created_at")
+    list_filter = ("is_active",)
+    actions = ["suspend", "reinstate"]
+
+    @admin.action(description="Suspend selected tenants")
+    def suspend(self, request, queryset):
+        self.message_user(request, f"Suspended {suspend_tenants(queryset)} tenants.")
+
+    @admin.action(description="Reinstate selected tenants")
+    def reinstate(self, request, queryset):
+        self.message_user(request, f"Reinstated {reinstate_tenants(queryset)} tenants.")
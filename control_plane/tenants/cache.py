@@ -0,0 +1,34 @@
+"""Per-tenant dashboard fragments and counts kept in the cache.
+
+Everything cached for a tenant is keyed with the tenant's cache version
+(``tenant_cache_version``): the dashboard and "My APIs" templates pass it to
+``{% cache %}`` and ``apis.listing.cached_count`` puts it in its keys. A
+cached page therefore skips the API and key queries entirely, and changing
+the version drops all of it at once, whichever pages and filters were
+cached. The version changes whenever one of the tenant's APIs or keys (or a
+plan they use) is saved or deleted; see ``tenants.signals``. Bulk
+``QuerySet.update()`` calls send no signals and must call
+``invalidate_tenant_cache`` themselves.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def _version_key(tenant_id) -> str:
+    return f"tenant:{tenant_id}:cache_version"
+
+
+def tenant_cache_version(tenant_id) -> int:
+    # A timestamp rather than a counter, so a version that was evicted never
+    # comes back with the same value.
+    return cache.get_or_set(_version_key(tenant_id), time.time_ns, None)
+
+
+async def atenant_cache_version(tenant_id) -> int:
+    return await cache.aget_or_set(_version_key(tenant_id), time.time_ns, None)
+
+
+def invalidate_tenant_cache(*tenant_ids) -> None:
+    version = time.time_ns()
+    cache.set_many({_version_key(tenant_id): version for tenant_id in tenant_ids}, None)
@@ -5,6 +5,10 @@ class Tenant(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
+    # Caps the traffic of all the tenant's keys and clients together, over
+    # and above their plans' limits; null means no tenant-wide limit.
+    requests_per_minute = models.PositiveIntegerField(null=True, blank=True)
+    requests_per_month = models.PositiveBigIntegerField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
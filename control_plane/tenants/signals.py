@@ -0,0 +1,70 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apis.models import API, APIKey, Client, Route, RouteHost
+from apis.notifications import notify_tenant_changed, notify_tenants_changed
+from billing.models import Plan
+from tenants.cache import invalidate_tenant_cache
+from tenants.models import Tenant
+
+
+@receiver([post_save, post_delete], sender=API)
+@receiver([post_save, post_delete], sender=APIKey)
+def drop_tenant_cache(sender, instance, **kwargs):
+    invalidate_tenant_cache(instance.tenant_id)
+
+
+@receiver(post_save, sender=Plan)
+def drop_plan_cache(sender, instance, created, **kwargs):
+    # The keys table shows each key's plan name and limit.
+    if not created:
+        tenant_ids = APIKey.objects.filter(plan=instance).values_list("tenant_id", flat=True).distinct()
+        invalidate_tenant_cache(*tenant_ids)
+
+
+# Gateway workers compile every tenant's APIs and routes into a routing
+# table and reload a tenant's when told it changed.
+@receiver([post_save, post_delete], sender=API)
+def announce_api_change(sender, instance, **kwargs):
+    notify_tenant_changed(instance.tenant_id, "routes_changed", kinds=["route"])
+
+
+@receiver(post_delete, sender=Route)
+def release_route_host(sender, instance, **kwargs):
+    RouteHost.release(instance.host)
+
+
+@receiver([post_save, post_delete], sender=Route)
+def announce_route_change(sender, instance, **kwargs):
+    # Gone when the route is deleted with its API, which announces itself.
+    tenant_id = API.objects.filter(id=instance.api_id).values_list("tenant_id", flat=True).first()
+    if tenant_id is not None:
+        notify_tenant_changed(tenant_id, "routes_changed", kinds=["route"])
+
+
+# Gateway workers authenticate keys from a cache and a key index snapshot,
+# and look a tenant's keys up in the database once told they changed.
+@receiver([post_save, post_delete], sender=APIKey)
+def announce_key_change(sender, instance, created=False, **kwargs):
+    # New keys are neither cached nor indexed yet, so they are found anyway.
+    if not created:
+        notify_tenant_changed(instance.tenant_id, "key_changed", kinds=["api_key"])
+
+
+# Workers cache each tenant's plans alongside its keys and clients. Plans
+# can't be deleted while in use, so only edits need announcing.
+@receiver(post_save, sender=Plan)
+def announce_plan_change(sender, instance, created, **kwargs):
+    if created:
+        return
+    tenant_ids = set(APIKey.objects.filter(plan=instance).values_list("tenant_id", flat=True).distinct())
+    tenant_ids.update(Client.objects.filter(plan=instance).values_list("tenant_id", flat=True).distinct())
+    if tenant_ids:
+        notify_tenants_changed(sorted(tenant_ids), "plan_changed", kinds=["plan"], plan_id=instance.id)
+
+
+@receiver(post_save, sender=Tenant)
+def announce_tenant_change(sender, instance, created, **kwargs):
+    # The tenant's slug or status may have changed its routes.
+    if not created:
+        notify_tenant_changed(instance.id, "routes_changed", kinds=["route"])
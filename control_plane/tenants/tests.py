@@ -60,8 +60,16 @@ class TenantViewsTest(TestCase):
         self.client.force_login(user)
         response = self.client.get(reverse('register'))
         self.assertRedirects(response, reverse('tenant-dashboard'))
+import hashlib
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from apis.models import API, APIKey, Client
+from billing.models import Plan
 from tenants.models import Tenant
 
 
@@ -104,3 +112,117 @@ class LogoutViewTests(TestCase):
         self.client.login(username="carol", password="password123")
         response = self.client.post(reverse("logout"))
         self.assertRedirects(response, reverse("login"))
+
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="dave", password="password123")
+        self.tenant = Tenant.objects.create(user=self.user, name="Dave Tenant", slug="dave-tenant")
+        API.objects.create(tenant=self.tenant, name="Orders", slug="orders", upstream_base_url="http://upstream")
+        self.client.force_login(self.user)
+
+    def test_cached_dashboard_skips_api_and_key_queries(self):
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(reverse("tenant-dashboard"))
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(reverse("tenant-dashboard"))
+
+        self.assertContains(response, "Orders")
+        self.assertLess(len(second), len(first))
+        self.assertFalse(any("apis_api" in query["sql"] for query in second.captured_queries))
+
+    def test_fragments_are_dropped_when_apis_change(self):
+        self.client.get(reverse("tenant-dashboard"))
+        self.client.get(reverse("my-apis"))
+        API.objects.create(tenant=self.tenant, name="Billing", slug="billing", upstream_base_url="http://upstream")
+
+        self.assertContains(self.client.get(reverse("tenant-dashboard")), "Billing")
+        self.assertContains(self.client.get(reverse("my-apis")), "Billing")
+
+    def test_keys_are_paginated_and_searchable(self):
+        plan = Plan.objects.create(name="Bulk", requests_per_minute=10, requests_per_month=1000)
+        APIKey.objects.bulk_create(
+            APIKey(tenant=self.tenant, plan=plan, hashed_key=f"{index:064x}") for index in range(30)
+        )
+
+        response = self.client.get(reverse("tenant-dashboard"))
+        self.assertEqual(len(response.context["keys_page"].items), 25)
+        next_cursor = response.context["keys_page"].next_cursor
+        self.assertContains(response, f"keys_after={next_cursor}")
+
+        response = self.client.get(reverse("tenant-dashboard"), {"keys_after": next_cursor})
+        self.assertEqual(len(response.context["keys_page"].items), 5)
+
+        response = self.client.get(reverse("tenant-dashboard"), {"keys_q": "1d"})
+        self.assertEqual([key.hashed_key[-2:] for key in response.context["keys_page"]], ["1d"])
+
+
+class BulkKeyProvisioningTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="frank", password="password123")
+        self.tenant = Tenant.objects.create(user=self.user, name="Frank Tenant", slug="frank-tenant")
+        self.client.force_login(self.user)
+
+    def post(self, **data):
+        return self.client.post(reverse("bulk-create-api-keys"), data, content_type="application/json")
+
+    def test_mints_keys_on_one_shared_plan(self):
+        with patch("apis.notifications._publish") as publish, self.captureOnCommitCallbacks(execute=True):
+            response = self.post(count=30, plan_name="Partner", requests_per_minute=60, requests_per_month=10000)
+
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(rows[0], "key_id,api_key")
+        self.assertEqual(len(rows), 31)
+        key_id, raw_key = rows[1].split(",")
+        key = APIKey.objects.get(id=key_id)
+        self.assertEqual(key.hashed_key, hashlib.sha256(raw_key.encode()).hexdigest())
+        self.assertEqual(APIKey.objects.filter(tenant=self.tenant).count(), 30)
+        self.assertEqual(Plan.objects.count(), 1)
+        publish.assert_called_once_with({"tenant_id": self.tenant.id, "change": "keys_created", "count": 30})
+
+        # Same settings share the plan; so does passing its ID.
+        self.post(count=2, plan_name="Partner", requests_per_minute=60, requests_per_month=10000)
+        self.post(count=3, plan_id=key.plan_id)
+        self.assertEqual(Plan.objects.count(), 1)
+        self.assertEqual(APIKey.objects.filter(plan=key.plan).count(), 35)
+
+    def test_rejects_other_tenants_plans_and_bad_counts(self):
+        other = Plan.objects.create(name="Other", requests_per_minute=1, requests_per_month=1)
+        self.assertEqual(self.post(count=1, plan_id=other.id).status_code, 400)
+        self.assertEqual(self.post(count=0, plan_id=other.id).json()["errors"]["count"], "Count must be between 1 and 50000.")
+        self.assertFalse(APIKey.objects.exists())
+
+    def test_plan_edit_evicts_it_for_tenants_using_it(self):
+        plan = Plan.objects.create(name="Partner", requests_per_minute=60, requests_per_month=10000)
+        other_user = User.objects.create_user(username="fiona", password="password123")
+        other = Tenant.objects.create(user=other_user, name="Fiona Tenant", slug="fiona-tenant")
+        with patch("apis.notifications._publish"):
+            APIKey.objects.create(tenant=self.tenant, plan=plan, hashed_key="a" * 64)
+            Client.objects.create(tenant=other, plan=plan, client_id="fiona-app", name="App")
+
+        plan.requests_per_minute = 120
+        with patch("apis.notifications._publish") as publish, self.captureOnCommitCallbacks(execute=True):
+            plan.save()
+        publish.assert_called_once_with({
+            "tenant_ids": sorted([self.tenant.id, other.id]),
+            "change": "plan_changed",
+            "kinds": ["plan"],
+            "plan_id": plan.id,
+        })
+
+
+class TenantQuotaTests(TestCase):
+    def test_quota_change_reloads_gateway_routes(self):
+        user = User.objects.create_user(username="grace", password="password123")
+        tenant = Tenant.objects.create(user=user, name="Grace Tenant", slug="grace-tenant")
+        self.assertIsNone(tenant.requests_per_minute)
+
+        # The gateway reads tenants' and APIs' quotas from its routing table.
+        tenant.requests_per_minute = 600
+        with patch("apis.notifications._publish") as publish, self.captureOnCommitCallbacks(execute=True):
+            tenant.save()
+        publish.assert_called_once_with({"tenant_id": tenant.id, "change": "routes_changed", "kinds": ["route"]})
+        self.assertEqual(Tenant.objects.get(id=tenant.id).requests_per_minute, 600)
@@ -8,4 +8,5 @@ urlpatterns = [
     path("api/new/", views.register_api, name="register-api"),
     path("api/create/", views.create_api, name="create-api"),
     path("key/create/", views.create_api_key, name="create-api-key"),
+    path("key/bulk/", views.bulk_create_api_keys, name="bulk-create-api-keys"),
 ]
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
@@ -5,15 +6,17 @@ from django.core.validators import URLValidator
 from django.db import IntegrityError
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.views.decorators.http import require_POST
 from django.contrib import messages
 from django.utils.text import slugify
 import json
 
+from apis.listing import Page, cached_count, filter_active, search_apis, search_keys
 from apis.models import API, APIKey
-from billing.models import Plan
+from apis.provisioning import MAX_BULK_KEYS, provision_keys, shared_plan, tenant_plan
+from tenants.cache import tenant_cache_version
 from tenants.models import Tenant
 
 
@@ -31,7 +34,8 @@ def _parse_json_body(request) -> dict:
 def _get_field(request, name: str) -> str:
     if request.headers.get('content-type', '').startswith('application/json'):
         data = _parse_json_body(request)
-        return (data.get(name) or '').strip()
+        value = data.get(name)
+        return '' if value is None else str(value).strip()
     return (request.POST.get(name) or '').strip()
 
 
@@ -131,6 +135,14 @@ def login_view(request):
 
     return render(request, "tenants/login.html")
 
+def _page(queryset, after):
+    # A stale or mangled cursor in a link just starts the listing over.
+    try:
+        return Page(queryset, after)
+    except ValidationError:
+        return Page(queryset)
+
+
 @login_required
 def tenant_dashboard(request):
     try:
@@ -138,14 +150,29 @@ def tenant_dashboard(request):
     except Tenant.DoesNotExist:
         return render(request, "tenants/no_tenant.html")
 
-    apis = API.objects.filter(tenant=tenant)
-    api_keys = APIKey.objects.filter(tenant=tenant).select_related('plan')
+    apis = API.objects.filter(tenant=tenant).only('name', 'slug', 'upstream_base_url', 'created_at')
+    api_keys = (
+        APIKey.objects.filter(tenant=tenant)
+        .select_related('plan')
+        .only('hashed_key', 'is_active', 'created_at', 'plan__name', 'plan__requests_per_minute')
+    )
+    keys_q = request.GET.get('keys_q', '').strip()
+    keys_status = request.GET.get('keys_status', '')
+    filtered_keys = filter_active(api_keys, keys_status)
+    if keys_q:
+        filtered_keys = search_keys(filtered_keys, keys_q)
 
     context = {
         'tenant': tenant,
-        'apis': apis,
-        'api_keys': api_keys,
-        'fastapi_base_url': 'http://localhost:7000'
+        'apis_page': _page(apis, request.GET.get('apis_after')),
+        'keys_page': _page(filtered_keys, request.GET.get('keys_after')),
+        'api_count': cached_count(tenant.id, 'apis', apis),
+        'key_count': cached_count(tenant.id, 'keys', api_keys),
+        'keys_q': keys_q,
+        'keys_status': keys_status,
+        'fastapi_base_url': 'http://localhost:7000',
+        'cache_version': tenant_cache_version(tenant.id),
+        'dashboard_cache_timeout': settings.DASHBOARD_CACHE_TIMEOUT,
     }
 
     return render(request, "tenants/dashboard.html", context)
@@ -158,11 +185,17 @@ def my_apis(request):
     except Tenant.DoesNotExist:
         return render(request, "tenants/no_tenant.html")
 
-    apis = API.objects.filter(tenant=tenant)
+    apis = API.objects.filter(tenant=tenant).only('name', 'slug', 'upstream_base_url', 'created_at')
+    q = request.GET.get('q', '').strip()
+    filtered_apis = search_apis(apis, q) if q else apis
     context = {
         'tenant': tenant,
-        'apis': apis,
+        'apis_page': _page(filtered_apis, request.GET.get('after')),
+        'api_count': cached_count(tenant.id, 'apis', apis),
+        'q': q,
         'fastapi_base_url': 'http://localhost:7000',
+        'cache_version': tenant_cache_version(tenant.id),
+        'dashboard_cache_timeout': settings.DASHBOARD_CACHE_TIMEOUT,
     }
 
     return render(request, "tenants/my_apis.html", context)
@@ -272,12 +305,7 @@ def create_api_key(request):
             messages.error(request, 'Failed to create API Key.')
             return redirect('tenant-dashboard')
 
-        plan = Plan.objects.create(
-            name=plan_name,
-            requests_per_minute=rpm,
-            requests_per_month=rpmth,
-            is_active=True,
-        )
+        plan = shared_plan(plan_name, rpm, rpmth)
 
         raw_key, hashed_key = APIKey.generate_key()
         APIKey.objects.create(
@@ -298,3 +326,60 @@ def create_api_key(request):
             return JsonResponse({'success': False, 'error': str(e)}, status=400)
         messages.error(request, str(e))
         return redirect('tenant-dashboard')
+
+
+def _key_rows(keys):
+    yield 'key_id,api_key\n'
+    for index in range(0, len(keys), 1000):
+        yield ''.join(f'{key_id},{raw_key}\n' for key_id, raw_key in keys[index:index + 1000])
+
+
+@login_required
+@require_POST
+def bulk_create_api_keys(request):
+    """Mint ``count`` keys on one plan and stream them back as CSV.
+
+    The plan is either ``plan_id``, one already used by the tenant's keys or
+    clients, or ``plan_name`` with ``requests_per_minute`` and
+    ``requests_per_month``, shared with any plan that has the same settings.
+    """
+    try:
+        tenant = request.user.tenant
+    except Tenant.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'No tenant'}, status=404)
+
+    try:
+        count = _get_int_field(request, 'count')
+        plan_id = _get_int_field(request, 'plan_id')
+        errors = {}
+        if count is None or not 1 <= count <= MAX_BULK_KEYS:
+            errors['count'] = f'Count must be between 1 and {MAX_BULK_KEYS}.'
+
+        plan = None
+        if plan_id is not None:
+            plan = tenant_plan(tenant, plan_id)
+            if plan is None:
+                errors['plan_id'] = 'Unknown plan.'
+        else:
+            plan_name = _get_field(request, 'plan_name')
+            rpm = _get_int_field(request, 'requests_per_minute')
+            rpmth = _get_int_field(request, 'requests_per_month')
+            if not plan_name:
+                errors['plan_name'] = 'Plan name (or plan_id) is required.'
+            if rpm is None or rpm < 1:
+                errors['requests_per_minute'] = 'Requests per minute must be >= 1.'
+            if rpmth is None or rpmth < 1:
+                errors['requests_per_month'] = 'Requests per month must be >= 1.'
+            if not errors:
+                plan = shared_plan(plan_name, rpm, rpmth)
+
+        if errors:
+            return JsonResponse({'success': False, 'errors': errors}, status=400)
+    except ValidationError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    keys = provision_keys(tenant, plan, count)
+    response = StreamingHttpResponse(_key_rows(keys), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{tenant.slug}-api-keys.csv"'
+    response['X-Plan-ID'] = str(plan.id)
+    return response
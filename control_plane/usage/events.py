@@ -0,0 +1,154 @@
+"""Reading the gateway's request event stream into ``RequestEvent`` rows.
+
+The data plane appends one entry per proxied request to a Redis Stream
+(``gateway:events`` by default), with a single field ``e`` holding
+``|``-separated values::
+
+    timestamp_ms|tenant_id|api_id|key_id|client_id|method|status|latency_us|bytes_in|bytes_out
+
+``EventConsumer`` reads them through a consumer group, so several
+``consume_events`` processes can share the stream, bulk-inserts each batch
+and only then acknowledges it. Entries delivered to a consumer that died
+before acknowledging them are picked up again when it restarts under the same
+name; the unique ``stream_id`` keeps them from being stored twice. Entries
+every group has processed are trimmed from the stream.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+
+from django.db import connection, transaction
+from django.utils.timezone import now
+from redis.exceptions import ResponseError
+
+from .models import RequestEvent
+
+logger = logging.getLogger(__name__)
+
+
+# RequestEvent fields in the order ``EventParser`` returns their values.
+EVENT_COLUMNS = (
+    "stream_id", "day", "timestamp", "tenant", "api", "api_key", "client",
+    "method", "status", "latency_us", "bytes_in", "bytes_out",
+)
+
+
+class EventParser:
+    """Turns stream entries into values for ``EVENT_COLUMNS``, adapted for the
+    database by ``ops`` (``connection.ops``, looked up once: it's a thread-local
+    proxy). Entries arrive in time order and at high rates many share a
+    millisecond, so the previous entry's adapted timestamp is reused."""
+
+    def __init__(self, ops):
+        self.ops = ops
+        self._last_ms = None
+        self._last_times = None
+
+    def __call__(self, stream_id: str, data: dict) -> tuple:
+        (
+            timestamp_ms, tenant_id, api_id, key_id, client_id,
+            method, status, latency_us, bytes_in, bytes_out,
+        ) = data["e"].split("|")
+        if timestamp_ms != self._last_ms:
+            timestamp = datetime.fromtimestamp(int(timestamp_ms) / 1000, tz=timezone.utc)
+            self._last_times = (
+                self.ops.adapt_datefield_value(timestamp.date()),
+                self.ops.adapt_datetimefield_value(timestamp),
+            )
+            self._last_ms = timestamp_ms
+        return (
+            stream_id,
+            *self._last_times,
+            int(tenant_id),
+            int(api_id),
+            int(key_id) if key_id else None,
+            int(client_id) if client_id else None,
+            method,
+            int(status),
+            int(latency_us),
+            int(bytes_in),
+            int(bytes_out),
+        )
+
+
+def store_events(rows: list[tuple]) -> None:
+    """Insert parsed events, skipping stream IDs that are already stored.
+
+    Plain ``executemany`` rather than ``bulk_create``: building a model
+    instance per event would make the ORM, not the database, the bottleneck.
+    """
+    meta = RequestEvent._meta
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(meta.get_field(name).column) for name in EVENT_COLUMNS)
+    placeholders = ", ".join(["%s"] * len(EVENT_COLUMNS))
+    sql = f"INSERT INTO {quote(meta.db_table)} ({columns}) VALUES ({placeholders}) ON CONFLICT DO NOTHING"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def _stream_id_key(stream_id: str) -> tuple[int, int]:
+    ms, _, seq = stream_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class EventConsumer:
+    def __init__(self, redis_client, stream: str, group: str, consumer: str, batch_size: int = 10_000):
+        self.redis = redis_client
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer
+        self.batch_size = batch_size
+        # Start with whatever this consumer was delivered but never acknowledged.
+        self._recovering = True
+
+    def ensure_group(self) -> None:
+        try:
+            self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+    def consume(self, block_ms: int | None = None) -> int:
+        """Store and acknowledge one batch; returns how many entries it held."""
+        start = "0" if self._recovering else ">"
+        reply = self.redis.xreadgroup(
+            self.group,
+            self.consumer,
+            {self.stream: start},
+            count=self.batch_size,
+            block=None if self._recovering else block_ms,
+        )
+        entries = reply[0][1] if reply else []
+        if self._recovering and not entries:
+            self._recovering = False
+            return self.consume(block_ms)
+        if not entries:
+            return 0
+
+        parse = EventParser(connection.ops)
+        rows = []
+        for stream_id, data in entries:
+            try:
+                rows.append(parse(stream_id, data))
+            except (KeyError, ValueError) as exc:
+                logger.warning(f"Skipping malformed request event {stream_id}: {exc!r}")
+        store_events(rows)
+        self.redis.xack(self.stream, self.group, *(stream_id for stream_id, _ in entries))
+        return len(entries)
+
+    def trim(self) -> None:
+        """Drop entries every consumer group has processed."""
+        bounds = []
+        for group in self.redis.xinfo_groups(self.stream):
+            if group["pending"]:
+                bounds.append(self.redis.xpending(self.stream, group["name"])["min"])
+            else:
+                bounds.append(group["last-delivered-id"])
+        if bounds:
+            self.redis.xtrim(self.stream, minid=min(bounds, key=_stream_id_key), approximate=True)
+
+
+def prune_events(retain_days: int) -> int:
+    """Delete events from days older than ``retain_days``; returns how many rows went."""
+    cutoff = now().date() - timedelta(days=retain_days)
+    deleted, _ = RequestEvent.objects.filter(day__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,52 @@
+"""Reading the gateway's live request counters from Redis.
+
+The data plane counts each API's requests per minute in ``usage:{tenant_id}
+:{api_id}:{minute}`` keys, sharded over its Redis nodes (``REDIS_URLS``) by a
+hash ring the control plane doesn't replicate. Instead every node is asked
+for all the keys at once, concurrently, and the counts are added up: a key
+lives on one node and is missing from the others.
+"""
+import asyncio
+import logging
+import time
+import weakref
+
+import redis.asyncio as redis
+
+from apis.notifications import gateway_redis_urls
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT = 1.0
+
+# Clients are bound to the event loop they were created on: one set per loop.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, list]" = weakref.WeakKeyDictionary()
+
+
+def _nodes() -> list:
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        _clients[loop] = [
+            redis.Redis.from_url(url, socket_timeout=TIMEOUT, socket_connect_timeout=TIMEOUT)
+            for url in gateway_redis_urls()
+        ]
+    return _clients[loop]
+
+
+async def minute_counts(tenant_id: int, api_ids: list[int], minutes: int = 2) -> dict[int, list[int]] | None:
+    """Requests per API for the last ``minutes`` minutes, current first, or
+    None without Redis (or while it is unreachable)."""
+    nodes = _nodes()
+    if not nodes:
+        return None
+    current = int(time.time() // 60)
+    keys = [f"usage:{tenant_id}:{api_id}:{current - offset}" for api_id in api_ids for offset in range(minutes)]
+    if not keys:
+        return {}
+    try:
+        replies = await asyncio.gather(*(node.mget(keys) for node in nodes))
+    except (redis.RedisError, OSError) as exc:
+        logger.warning(f"Could not read live usage counters: {exc!r}")
+        return None
+    totals = [sum(int(values[index] or 0) for values in replies) for index in range(len(keys))]
+    return {api_id: totals[position * minutes:(position + 1) * minutes] for position, api_id in enumerate(api_ids)}
@@ -0,0 +1,54 @@
+import os
+import socket
+import time
+
+import redis
+from django.core.management.base import BaseCommand
+
+from apis.notifications import gateway_redis_url
+from usage.events import EventConsumer, prune_events
+
+
+class Command(BaseCommand):
+    help = "Store the gateway's request events (read from its Redis Stream) as RequestEvent rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--redis-url", default=gateway_redis_url() or "redis://localhost:6379")
+        parser.add_argument("--stream", default=os.environ.get("GATEWAY_EVENTS_STREAM", "gateway:events"))
+        parser.add_argument("--group", default="control-plane")
+        parser.add_argument(
+            "--consumer",
+            default=socket.gethostname(),
+            help="Name within the group; reuse it after a restart to pick up unacknowledged events.",
+        )
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--block-ms", type=int, default=1000)
+        parser.add_argument("--retain-days", type=int, default=0, help="Delete events older than this (0 keeps all).")
+        parser.add_argument("--once", action="store_true", help="Exit once the stream is drained.")
+
+    def handle(self, *args, **options):
+        client = redis.Redis.from_url(options["redis_url"], decode_responses=True)
+        consumer = EventConsumer(
+            client, options["stream"], options["group"], options["consumer"], options["batch_size"]
+        )
+        consumer.ensure_group()
+
+        stored = 0
+        started = time.monotonic()
+        last_maintenance = 0.0
+        try:
+            while True:
+                count = consumer.consume(block_ms=None if options["once"] else options["block_ms"])
+                stored += count
+                if time.monotonic() - last_maintenance > 10 or (options["once"] and not count):
+                    consumer.trim()
+                    if options["retain_days"]:
+                        prune_events(options["retain_days"])
+                    last_maintenance = time.monotonic()
+                if options["once"] and not count:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"Stored {stored} request events in {elapsed:.1f}s")
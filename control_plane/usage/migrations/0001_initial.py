@@ -0,0 +1,38 @@
+# Generated by Django 5.2.10 on 2026-10-19 08:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('apis', '0004_api_max_request_body_bytes'),
+        ('tenants', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stream_id', models.CharField(max_length=32, unique=True)),
+                ('day', models.DateField()),
+                ('timestamp', models.DateTimeField()),
+                ('method', models.CharField(max_length=10)),
+                ('status', models.PositiveSmallIntegerField()),
+                ('latency_us', models.PositiveIntegerField()),
+                ('bytes_in', models.PositiveBigIntegerField()),
+                ('bytes_out', models.PositiveBigIntegerField()),
+                ('api', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='apis.api')),
+                ('api_key', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='apis.apikey')),
+                ('client', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='apis.client')),
+                ('tenant', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='tenants.tenant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'tenant'], name='usage_reque_day_40532b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.10 on 2026-10-19 09:04
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0004_api_max_request_body_bytes'),
+        ('tenants', '0001_initial'),
+        ('usage', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('requests', models.PositiveBigIntegerField(default=0)),
+                ('bytes_in', models.PositiveBigIntegerField(default=0)),
+                ('bytes_out', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField()),
+                ('api', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='apis.api')),
+                ('api_key', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='apis.apikey')),
+                ('client', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='apis.client')),
+                ('tenant', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='tenants.tenant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(models.F('day'), models.F('tenant'), models.F('api'), django.db.models.functions.comparison.Coalesce('api_key', 0), django.db.models.functions.comparison.Coalesce('client', 0), name='usage_dailyusage_unique_row')],
+            },
+        ),
+    ]
@@ -1,3 +1,72 @@
 from django.db import models
+from django.db.models.functions import Coalesce
+from apis.models import API, APIKey, Client
+from tenants.models import Tenant
 
-# Create your models here.
+
+class RequestEvent(models.Model):
+    """One proxied request, as recorded by the gateway's request event stream.
+
+    Rows are never updated and are pruned a whole ``day`` at a time, so
+    ``day`` leads the index and acts as the table's partition key. Foreign keys
+    aren't enforced: events outlive the tenants, APIs and keys they refer to.
+    """
+    # Redis Stream entry ID; unique so redelivered entries aren't stored twice.
+    stream_id = models.CharField(max_length=32, unique=True)
+    day = models.DateField()
+    timestamp = models.DateTimeField()
+    tenant = models.ForeignKey(Tenant, on_delete=models.DO_NOTHING, db_constraint=False)
+    api = models.ForeignKey(API, on_delete=models.DO_NOTHING, db_constraint=False)
+    api_key = models.ForeignKey(APIKey, on_delete=models.DO_NOTHING, db_constraint=False, null=True)
+    client = models.ForeignKey(Client, on_delete=models.DO_NOTHING, db_constraint=False, null=True)
+    method = models.CharField(max_length=10)
+    status = models.PositiveSmallIntegerField()
+    latency_us = models.PositiveIntegerField()
+    bytes_in = models.PositiveBigIntegerField()
+    bytes_out = models.PositiveBigIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=["day", "tenant"])]
+
+    def __str__(self):
+        return f"{self.method} {self.status} ({self.stream_id})"
+
+
+class DailyUsage(models.Model):
+    """Requests and bytes per day, API, key and client, rolled up from
+    ``RequestEvent`` by ``usage.rollups.roll_up_events``. Billing reads these
+    rather than the events."""
+    day = models.DateField()
+    tenant = models.ForeignKey(Tenant, on_delete=models.DO_NOTHING, db_constraint=False)
+    api = models.ForeignKey(API, on_delete=models.DO_NOTHING, db_constraint=False)
+    api_key = models.ForeignKey(APIKey, on_delete=models.DO_NOTHING, db_constraint=False, null=True)
+    client = models.ForeignKey(Client, on_delete=models.DO_NOTHING, db_constraint=False, null=True)
+    requests = models.PositiveBigIntegerField(default=0)
+    bytes_in = models.PositiveBigIntegerField(default=0)
+    bytes_out = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            # Coalesced so that rows without a key or client still conflict.
+            models.UniqueConstraint(
+                "day",
+                "tenant",
+                "api",
+                Coalesce("api_key", 0),
+                Coalesce("client", 0),
+                name="usage_dailyusage_unique_row",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.tenant_id}/{self.api_id}: {self.requests}"
+
+
+class RollupCheckpoint(models.Model):
+    """Highest ``RequestEvent`` ID already counted in ``DailyUsage``."""
+    name = models.CharField(max_length=50, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_event_id}"
@@ -0,0 +1,58 @@
+"""Rolling request events up into ``DailyUsage``.
+
+Each run counts the events stored since the last one (by ``RequestEvent`` ID,
+tracked in a ``RollupCheckpoint``) with a single ``INSERT ... SELECT ...
+GROUP BY`` and adds the counts to the existing rows, so the work is
+proportional to the new events, not to the period. Pruning old events doesn't
+affect rollups already made. Event IDs are assigned in commit order on SQLite,
+so no event is committed below the checkpoint after it has moved past it.
+"""
+from django.db import connection, transaction
+from django.utils.timezone import now
+
+from .models import DailyUsage, RequestEvent, RollupCheckpoint
+
+CHECKPOINT = "daily_usage"
+
+# DailyUsage columns filled from RequestEvent, with the aggregate for each.
+_GROUP_COLUMNS = ("day", "tenant_id", "api_id", "api_key_id", "client_id")
+_SUM_COLUMNS = {"requests": "COUNT(*)", "bytes_in": "SUM(bytes_in)", "bytes_out": "SUM(bytes_out)"}
+
+
+def roll_up_events(max_events: int = 5_000_000) -> int:
+    """Add events stored since the last run to ``DailyUsage``, at most
+    ``max_events`` of them; returns how many were rolled up.
+
+    Safe to run from several processes: moving the checkpoint is a
+    compare-and-set in the same transaction as the insert, so a run that
+    raced another one changes nothing.
+    """
+    checkpoint, _ = RollupCheckpoint.objects.get_or_create(name=CHECKPOINT)
+    start = checkpoint.last_event_id
+    pending = RequestEvent.objects.filter(id__gt=start).order_by("id").values_list("id", flat=True)
+    end = pending[max_events - 1 : max_events].first() or pending.last()
+    if end is None:
+        return 0
+
+    quote = connection.ops.quote_name
+    table = quote(DailyUsage._meta.db_table)
+    group = ", ".join(quote(column) for column in _GROUP_COLUMNS)
+    sums = ", ".join(_SUM_COLUMNS.values())
+    columns = ", ".join(quote(column) for column in (*_GROUP_COLUMNS, *_SUM_COLUMNS, "updated_at"))
+    updates = ", ".join(
+        f"{quote(column)} = {table}.{quote(column)} + excluded.{quote(column)}" for column in _SUM_COLUMNS
+    )
+    sql = (
+        f"INSERT INTO {table} ({columns}) "
+        f"SELECT {group}, {sums}, %s FROM {quote(RequestEvent._meta.db_table)} "
+        f"WHERE id > %s AND id <= %s GROUP BY {group} "
+        f"ON CONFLICT (day, tenant_id, api_id, COALESCE(api_key_id, 0), COALESCE(client_id, 0)) "
+        f"DO UPDATE SET {updates}, updated_at = excluded.updated_at"
+    )
+    with transaction.atomic():
+        moved = RollupCheckpoint.objects.filter(name=CHECKPOINT, last_event_id=start).update(last_event_id=end)
+        if not moved:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [connection.ops.adapt_datetimefield_value(now()), start, end])
+        return RequestEvent.objects.filter(id__gt=start, id__lte=end).count()
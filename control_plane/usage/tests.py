@@ -1,3 +1,100 @@
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+import fakeredis
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.urls import reverse
+from django.utils.timezone import now
+
+from apis.models import API
+from tenants.models import Tenant
+from usage.events import EventConsumer, EventParser, store_events
+from usage.models import DailyUsage, RequestEvent
+
+STREAM = "gateway:events"
+
+
+class EventConsumerTest(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        self.consumer = EventConsumer(self.redis, STREAM, "control-plane", "worker-1", batch_size=2)
+        self.consumer.ensure_group()
+
+    def add_event(self, status=200, client_id=""):
+        return self.redis.xadd(STREAM, {"e": f"1760000000000|1|2|3|{client_id}|GET|{status}|1500|10|20"})
+
+    def test_consume_stores_and_acknowledges_events(self):
+        self.add_event()
+        self.add_event(status=404, client_id="7")
+        self.add_event(status=500)
+
+        self.assertEqual(self.consumer.consume(), 2)
+        self.assertEqual(self.consumer.consume(), 1)
+        self.assertEqual(self.consumer.consume(), 0)
+
+        self.assertEqual(RequestEvent.objects.count(), 3)
+        event = RequestEvent.objects.get(status=404)
+        self.assertEqual(event.tenant_id, 1)
+        self.assertEqual(event.api_key_id, 3)
+        self.assertEqual(event.client_id, 7)
+        self.assertEqual(event.latency_us, 1500)
+        self.assertEqual(str(event.day), "2025-10-09")
+        self.assertEqual(self.redis.xpending(STREAM, "control-plane")["pending"], 0)
+
+    def test_redelivered_events_are_not_stored_twice(self):
+        stream_id = self.add_event()
+        # Stored by a consumer that crashed before acknowledging the entry.
+        store_events([EventParser(connection.ops)(stream_id, self.redis.xrange(STREAM)[0][1])])
+
+        self.assertEqual(self.consumer.consume(), 1)
+        self.assertEqual(RequestEvent.objects.count(), 1)
+        self.assertEqual(self.redis.xpending(STREAM, "control-plane")["pending"], 0)
+
+    def test_trim_drops_processed_entries(self):
+        for _ in range(4):
+            self.add_event()
+        self.consumer.consume()
+        self.consumer.consume()
+        self.add_event()
+
+        self.consumer.trim()
+        # The last delivered entry is kept along with the undelivered one.
+        self.assertEqual(self.redis.xlen(STREAM), 2)
+
+
+class UsageSummaryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="hana", password="password123")
+        self.tenant = Tenant.objects.create(user=self.user, name="Hana Tenant", slug="hana-tenant")
+        self.api = API.objects.create(tenant=self.tenant, name="Orders", slug="orders", upstream_base_url="http://upstream")
+        quiet = API.objects.create(tenant=self.tenant, name="Quiet", slug="quiet", upstream_base_url="http://upstream")
+        today = now().date()
+        for day, requests in ((today, 7), (today.replace(day=1) - timedelta(days=1), 100)):
+            DailyUsage.objects.create(
+                day=day, tenant=self.tenant, api=quiet, requests=requests, bytes_in=10, bytes_out=20, updated_at=now()
+            )
+        self.client.force_login(self.user)
+
+    def test_without_redis_reports_rollups_only(self):
+        with patch("usage.live._nodes", lambda: []):
+            body = self.client.get(reverse("usage-summary")).json()
+        self.assertEqual(body["month_to_date_requests"], 7)
+        self.assertIsNone(body["live"])
+
+    def test_adds_counters_from_every_node(self):
+        servers = [fakeredis.FakeServer(), fakeredis.FakeServer()]
+        minute = int(time.time() // 60)
+        fakeredis.FakeRedis(server=servers[0]).set(f"usage:{self.tenant.id}:{self.api.id}:{minute}", 3)
+        fakeredis.FakeRedis(server=servers[1]).set(f"usage:{self.tenant.id}:{self.api.id}:{minute - 1}", 5)
+        nodes = lambda: [fakeredis.FakeAsyncRedis(server=server) for server in servers]  # noqa: E731
 
-# Create your tests here.
+        with patch("usage.live._nodes", nodes):
+            live = self.client.get(reverse("usage-summary")).json()["live"]
+        self.assertEqual(live["requests_this_minute"], 3)
+        self.assertEqual(live["requests_last_minute"], 5)
+        self.assertEqual(
+            live["apis"], [{"slug": "orders", "requests_this_minute": 3, "requests_last_minute": 5}]
+        )
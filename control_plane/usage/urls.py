@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path("summary/", views.usage_summary, name="usage-summary"),
+]
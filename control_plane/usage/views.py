@@ -1,21 +1,48 @@
 from django.contrib.auth.decorators import login_required
+from django.db.models import Max, Sum
 from django.http import JsonResponse
 from django.utils.timezone import now
-from .models import UsageDaily
+from django.views.decorators.http import require_GET
+
+from apis.models import API
 from tenants.models import Tenant
 
+from .live import minute_counts
+from .models import DailyUsage
+
+
 @login_required
-def usage_summary(request):
-    tenant = Tenant.objects.get(user=request.user)
-    current_month = now().date().replace(day=1)
+@require_GET
+async def usage_summary(request):
+    user = await request.auser()
+    try:
+        tenant = await Tenant.objects.aget(user=user)
+    except Tenant.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'No tenant'}, status=404)
 
-    usage = UsageDaily.objects.filter(
-        api_key__tenant=tenant,
-        date__gte=current_month
+    current_month = now().date().replace(day=1)
+    month = await DailyUsage.objects.filter(tenant=tenant, day__gte=current_month).aaggregate(
+        requests=Sum('requests'), bytes_in=Sum('bytes_in'), bytes_out=Sum('bytes_out'), updated_at=Max('updated_at')
     )
+    apis = [api async for api in API.objects.filter(tenant=tenant, is_active=True).only('id', 'slug')]
+    counts = await minute_counts(tenant.id, [api.id for api in apis])
 
-    total = sum(u.request_count for u in usage)
-
+    live = None
+    if counts is not None:
+        live = {
+            'requests_this_minute': sum(count[0] for count in counts.values()),
+            'requests_last_minute': sum(count[1] for count in counts.values()),
+            'apis': [
+                {'slug': api.slug, 'requests_this_minute': counts[api.id][0], 'requests_last_minute': counts[api.id][1]}
+                for api in apis
+                if any(counts[api.id])
+            ],
+        }
     return JsonResponse({
-        "month_to_date_requests": total
+        'success': True,
+        'month_to_date_requests': month['requests'] or 0,
+        'month_to_date_bytes_in': month['bytes_in'] or 0,
+        'month_to_date_bytes_out': month['bytes_out'] or 0,
+        'rolled_up_at': month['updated_at'].isoformat() if month['updated_at'] else None,
+        'live': live,
     })
@@ -0,0 +1,117 @@
+"""Byte quotas and per-connection throughput shaping.
+
+Besides request counts, a plan can cap the body bytes each key or client
+sends (``bytes_in_per_minute``, ``bytes_in_per_month``) and receives
+(``bytes_out_per_minute``, ``bytes_out_per_month``), and the rate each of
+its responses is relayed at (``max_bytes_per_second``).
+
+Byte counters sit next to the request counters (``quota:*`` keys on the
+tenant's Redis node), and ``check_rate_limits`` checks them in the same
+script call: a request is rejected with 429 once one of them has reached its
+limit. Bytes are counted as they pass rather than when a request ends: the
+request body once it has been read, the response body as it is relayed,
+added to Redis every ``FLUSH_BYTES`` and when the response ends, so other
+requests see a long download's usage while it runs. A response already under
+way is never cut off, so a quota can be overshot by what the responses in
+flight when it fills up still send.
+
+Shaping is a token bucket per response, refilled at ``max_bytes_per_second``
+and holding up to ``BURST_SECONDS`` of it: the relay waits before each chunk
+until the bucket covers it. The upstream is read no faster than the client is
+served, so a shaped response holds one chunk in the gateway, not its body.
+"""
+import asyncio
+import time
+
+from .counters import MONTH_TTL, quota_windows
+
+FLUSH_BYTES = 1024 * 1024
+BURST_SECONDS = 0.1
+CHUNK_SIZE = 64 * 1024
+
+# Plan field prefix and the 429 details of its minute and month quotas.
+DIRECTIONS = (
+    ("bytes_in", "Request bandwidth limit exceeded", "Monthly request bandwidth limit exceeded"),
+    ("bytes_out", "Response bandwidth limit exceeded", "Monthly response bandwidth limit exceeded"),
+)
+
+
+def byte_quotas(key_base: str, plan, minute: int, month: str) -> list[tuple[str, str, int, int, str]]:
+    """``(direction, key, limit, ttl, detail)`` for each byte quota ``plan``
+    sets, under the subject's ``key_base``."""
+    quotas = []
+    for direction, minute_detail, month_detail in DIRECTIONS:
+        if plan[f"{direction}_per_minute"] is not None:
+            quotas.append(
+                (direction, f"{key_base}:{direction}:{minute}", plan[f"{direction}_per_minute"], 60, minute_detail)
+            )
+        if plan[f"{direction}_per_month"] is not None:
+            quotas.append(
+                (direction, f"{key_base}:{direction}:{month}", plan[f"{direction}_per_month"], MONTH_TTL, month_detail)
+            )
+    return quotas
+
+
+class ByteMeter:
+    """The bytes one request moves, added to its plan's byte quotas."""
+
+    def __init__(self, counters, key_base: str, plan, flush_bytes: int = FLUSH_BYTES):
+        self.counters = counters
+        self.key_base = key_base
+        self.plan = plan
+        self.flush_bytes = flush_bytes
+        self.pending = {"bytes_in": 0, "bytes_out": 0}
+
+    @classmethod
+    def for_request(cls, counters, auth) -> "ByteMeter | None":
+        """A meter for ``auth``'s request, or None if its plan has no byte quotas."""
+        if not byte_quotas("", auth.plan, 0, ""):
+            return None
+        return cls(counters, f"quota:{auth.tenant['id']}:{auth.subject}", auth.plan)
+
+    def add(self, direction: str, amount: int) -> bool:
+        """Count ``amount`` bytes; returns whether it is time to ``flush``."""
+        self.pending[direction] += amount
+        return self.pending["bytes_in"] + self.pending["bytes_out"] >= self.flush_bytes
+
+    async def flush(self) -> None:
+        minute, month = quota_windows()
+        increments = [
+            (key, self.pending[direction], ttl)
+            for direction, key, _, ttl, _ in byte_quotas(self.key_base, self.plan, minute, month)
+            if self.pending[direction]
+        ]
+        self.pending = {"bytes_in": 0, "bytes_out": 0}
+        await self.counters.incr_many(increments)
+
+
+class TokenBucket:
+    def __init__(self, rate: int, burst: int | None = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate * BURST_SECONDS))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    @classmethod
+    def for_plan(cls, plan) -> "TokenBucket | None":
+        rate = plan["max_bytes_per_second"]
+        return cls(rate) if rate else None
+
+    async def consume(self, amount: int) -> None:
+        """Take ``amount`` bytes' worth, waiting until the bucket has refilled
+        enough. Chunks larger than the burst are let through once the bucket
+        has paid for them, so it goes into debt rather than splitting them."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+async def shaped(content: bytes, bucket: TokenBucket):
+    """Yield a buffered body in ``CHUNK_SIZE`` pieces at ``bucket``'s rate."""
+    for start in range(0, len(content), CHUNK_SIZE):
+        chunk = content[start:start + CHUNK_SIZE]
+        await bucket.consume(len(chunk))
+        yield chunk
@@ -0,0 +1,126 @@
+"""Request body size limits and spooling.
+
+Bodies are read while enforcing the tightest of the gateway default, the
+plan's and the API's ``max_request_body_bytes``, so an oversized upload fails
+with 413 as soon as it crosses the limit (or before a byte is read, when its
+``Content-Length`` already does). Up to ``spool_threshold`` bytes stay in
+memory; larger bodies spill to a temporary file and are streamed to the
+upstream from there, so a worker's memory doesn't grow with upload size and a
+retried request replays the body from disk rather than from the client. Once
+a body is past the threshold, its file reads and writes (the rollover
+included) run in a worker thread so a slow disk doesn't stall the event loop.
+"""
+import asyncio
+import tempfile
+from dataclasses import dataclass
+
+from fastapi import HTTPException
+from starlette.requests import ClientDisconnect
+
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class BodyLimits:
+    max_size: int
+    spool_threshold: int
+
+    def limit_for(self, auth) -> int | None:
+        limits = [
+            limit
+            for limit in (
+                self.max_size,
+                auth.plan["max_request_body_bytes"],
+                auth.api["max_request_body_bytes"],
+            )
+            if limit
+        ]
+        return min(limits) if limits else None
+
+
+class SpooledBody:
+    def __init__(self, spool_threshold: int):
+        self.spool_threshold = spool_threshold
+        self.size = 0
+        self._file = tempfile.SpooledTemporaryFile(max_size=spool_threshold)
+
+    @property
+    def in_memory(self) -> bool:
+        # SpooledTemporaryFile never rolls over when max_size is 0.
+        return self.spool_threshold <= 0 or self.size <= self.spool_threshold
+
+    async def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.in_memory:
+            self._file.write(chunk)
+        else:
+            # The write that crosses the threshold rolls the buffer to disk.
+            await asyncio.to_thread(self._file.write, chunk)
+
+    @property
+    def content(self):
+        """What to hand httpx: the bytes, or this object to stream from disk."""
+        if self.in_memory:
+            self._file.seek(0)
+            return self._file.read()
+        return self
+
+    async def __aiter__(self):
+        # A fresh pass over the file each time, so httpx can resend it.
+        if self.in_memory:
+            self._file.seek(0)
+            while chunk := self._file.read(CHUNK_SIZE):
+                yield chunk
+            return
+        await asyncio.to_thread(self._file.seek, 0)
+        while chunk := await asyncio.to_thread(self._file.read, CHUNK_SIZE):
+            yield chunk
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail="Request body too large")
+
+
+def declared_length(raw_headers) -> int | None:
+    for name, value in raw_headers:
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+async def receive_chunks(receive):
+    """Yield the request body chunks from an ASGI ``receive`` callable; raises
+    ``ClientDisconnect`` if the client goes away first, like ``Request.stream``."""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ClientDisconnect()
+        yield message.get("body", b"")
+        if not message.get("more_body", False):
+            return
+
+
+async def read_body(scope, chunks, limit: int | None, spool_threshold: int) -> SpooledBody:
+    length = declared_length(scope["headers"])
+    if limit is not None and length is not None and length > limit:
+        raise _too_large()
+
+    body = SpooledBody(spool_threshold)
+    try:
+        async for chunk in chunks:
+            await body.write(chunk)
+            if limit is not None and body.size > limit:
+                raise _too_large()
+        # Never forward part of a body as if it were the whole of it.
+        if length is not None and body.size < length:
+            raise HTTPException(status_code=400, detail="Incomplete request body")
+    except BaseException:
+        body.close()
+        raise
+    return body
@@ -0,0 +1,318 @@
+"""Concurrency limits and adaptive load shedding.
+
+Two layers protect a worker:
+
+* ``KeyedConcurrencyLimiter`` is a bulkhead: at most ``limit`` requests per
+  tenant (and per API) are talking to upstreams at once. Further requests wait
+  in a bounded FIFO queue and are rejected with 429 once the queue is full or
+  their wait times out, so one tenant's slow upstream can't pin thousands of
+  coroutines or the shared httpx pool.
+* ``AdaptiveConcurrencyLimiter`` caps the worker's total in-flight requests at
+  a limit that follows observed latency (a gradient controller in the style
+  of Netflix's concurrency-limits): while short-term latency stays near the
+  long-term baseline the limit grows, and once requests start queueing in the
+  event loop latency rises, the limit shrinks and excess requests get an
+  immediate 503 instead of making every request slower.
+
+Between the two, ``FairScheduler`` decides who gets the worker's upstream
+dispatch capacity when it is saturated: waiting requests are ordered by
+weighted fair queuing across tenants, with weights from the plan's
+``scheduling_weight``, so a noisy tenant can't starve everyone else.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+RETRY_AFTER = {"Retry-After": "1"}
+
+
+class _KeyState:
+    __slots__ = ("in_flight", "waiters")
+
+    def __init__(self):
+        self.in_flight = 0
+        self.waiters: deque[asyncio.Future] = deque()
+
+
+class KeyedConcurrencyLimiter:
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float, metrics):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.metrics = metrics
+        self._states: dict[object, _KeyState] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit > 0
+
+    def in_flight(self) -> int:
+        return sum(state.in_flight for state in self._states.values())
+
+    def queued(self) -> int:
+        return sum(len(state.waiters) for state in self._states.values())
+
+    def _reject(self, reason: str):
+        self.metrics.inc("gateway_concurrency_rejected_total", scope=self.name, reason=reason)
+        return HTTPException(status_code=429, detail="Too many concurrent requests", headers=RETRY_AFTER)
+
+    async def acquire(self, key) -> None:
+        if not self.enabled:
+            return
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _KeyState()
+        if state.in_flight < self.limit and not state.waiters:
+            state.in_flight += 1
+            return
+        if len(state.waiters) >= self.max_queue:
+            raise self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        state.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._reject("queue_timeout")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed to us just as we were cancelled.
+                self.release(key)
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    state.waiters.remove(waiter)
+                except ValueError:
+                    pass
+            self._discard_if_idle(key, state)
+
+    def release(self, key) -> None:
+        if not self.enabled:
+            return
+        state = self._states.get(key)
+        if state is None:
+            return
+        # Hand the slot straight to the next live waiter so it can't be stolen.
+        while state.waiters:
+            waiter = state.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        state.in_flight -= 1
+        self._discard_if_idle(key, state)
+
+    def _discard_if_idle(self, key, state: _KeyState) -> None:
+        if state.in_flight <= 0 and not state.waiters and self._states.get(key) is state:
+            del self._states[key]
+
+
+class AdaptiveConcurrencyLimiter:
+    def __init__(
+        self,
+        metrics,
+        initial_limit: int = 200,
+        min_limit: int = 20,
+        max_limit: int = 2000,
+        tolerance: float = 1.5,
+        smoothing: float = 0.2,
+        short_window: int = 10,
+        long_window: int = 600,
+        enabled: bool = True,
+    ):
+        self.metrics = metrics
+        self.enabled = enabled
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self._short_alpha = 2 / (short_window + 1)
+        self._long_alpha = 2 / (long_window + 1)
+        self.short_rtt = 0.0
+        self.long_rtt = 0.0
+        self.in_flight = 0
+
+    def acquire(self) -> None:
+        """Admit a request or raise a 503."""
+        if self.enabled and self.in_flight >= int(self.limit):
+            self.metrics.inc("gateway_concurrency_rejected_total", scope="adaptive", reason="overload")
+            raise HTTPException(status_code=503, detail="Service overloaded", headers=RETRY_AFTER)
+        self.in_flight += 1
+
+    def release(self, sent_at: float | None = None) -> None:
+        """``sent_at`` is when the request went to the upstream
+        (``time.perf_counter()``), None if it never did. Only that round
+        trip is sampled: time spent reading the client's body or queued
+        for dispatch says nothing about upstream congestion."""
+        in_flight = self.in_flight
+        self.in_flight -= 1
+        if sent_at is not None and self.enabled:
+            self._update(time.perf_counter() - sent_at, in_flight)
+
+    def _update(self, rtt: float, in_flight: int) -> None:
+        if self.long_rtt == 0.0:
+            self.short_rtt = self.long_rtt = rtt
+            return
+        self.short_rtt += self._short_alpha * (rtt - self.short_rtt)
+        self.long_rtt += self._long_alpha * (rtt - self.long_rtt)
+
+        # Let the baseline recover quickly after a sustained latency shift.
+        if self.long_rtt / self.short_rtt > 2:
+            self.long_rtt *= 0.95
+
+        # Don't grow the limit while traffic isn't using it.
+        if in_flight < self.limit / 2:
+            return
+
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / self.short_rtt))
+        new_limit = self.limit * gradient + math.sqrt(self.limit)
+        new_limit = self.limit * (1 - self.smoothing) + new_limit * self.smoothing
+        self.limit = max(self.min_limit, min(self.max_limit, new_limit))
+
+
+class FairScheduler:
+    """Self-clocked weighted fair queuing over upstream dispatch slots.
+
+    Each request gets a finish tag ``max(virtual_time, flow's last tag) +
+    1 / weight`` and, once all ``capacity`` slots are busy, waits in a heap
+    ordered by that tag. A flow (tenant) with weight 10 therefore gets ten
+    dispatches for every one of a weight-1 flow while both are backlogged,
+    and an idle flow doesn't bank credit: its next tag starts at the current
+    virtual time.
+    """
+
+    PRUNE_THRESHOLD = 10_000
+
+    def __init__(self, capacity: int, max_queue: int, queue_timeout: float, metrics):
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.metrics = metrics
+        self.in_flight = 0
+        self.virtual_time = 0.0
+        self._last_finish: dict[object, float] = {}
+        self._heap: list[tuple[float, int, asyncio.Future]] = []
+        self._queued = 0
+        self._seq = itertools.count()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def queued(self) -> int:
+        return self._queued
+
+    def _tag(self, flow, weight: int) -> float:
+        start = max(self.virtual_time, self._last_finish.get(flow, 0.0))
+        finish = start + 1.0 / max(1, weight or 1)
+        self._last_finish[flow] = finish
+        if len(self._last_finish) > self.PRUNE_THRESHOLD:
+            # Flows whose tag is behind the clock would restart at it anyway.
+            self._last_finish = {
+                key: tag for key, tag in self._last_finish.items() if tag > self.virtual_time
+            }
+        return finish
+
+    def _reject(self, reason: str):
+        self.metrics.inc("gateway_concurrency_rejected_total", scope="scheduler", reason=reason)
+        return HTTPException(status_code=503, detail="Service overloaded", headers=RETRY_AFTER)
+
+    async def acquire(self, flow, weight: int) -> None:
+        if not self.enabled:
+            return
+        finish = self._tag(flow, weight)
+        if self.in_flight < self.capacity and not self._queued:
+            self.in_flight += 1
+            self.virtual_time = finish
+            return
+        if self._queued >= self.max_queue:
+            raise self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (finish, next(self._seq), waiter))
+        self._queued += 1
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._reject("queue_timeout")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed to us just as we were cancelled.
+                self.release()
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                # Still in the heap; skipped when it reaches the top.
+                self._queued -= 1
+
+    def release(self) -> None:
+        if not self.enabled:
+            return
+        while self._heap:
+            finish, _, waiter = heapq.heappop(self._heap)
+            if waiter.done():
+                continue
+            self._queued -= 1
+            self.virtual_time = finish
+            waiter.set_result(None)
+            return
+        self.in_flight -= 1
+
+
+class ConcurrencyControl:
+    """The per-worker limiters the proxy routes go through."""
+
+    def __init__(
+        self,
+        metrics,
+        adaptive: AdaptiveConcurrencyLimiter,
+        tenants: KeyedConcurrencyLimiter,
+        apis: KeyedConcurrencyLimiter,
+        scheduler: FairScheduler,
+    ):
+        self.adaptive = adaptive
+        self.tenants = tenants
+        self.apis = apis
+        self.scheduler = scheduler
+
+        metrics.describe("gateway_concurrency_rejected_total", "Requests shed by concurrency limits.")
+        metrics.gauge("gateway_concurrency_limit", lambda: self.adaptive.limit, "Current adaptive in-flight limit.")
+        metrics.gauge("gateway_in_flight", lambda: [
+            ({"scope": "adaptive"}, self.adaptive.in_flight),
+            ({"scope": "tenant"}, self.tenants.in_flight()),
+            ({"scope": "api"}, self.apis.in_flight()),
+            ({"scope": "scheduler"}, self.scheduler.in_flight),
+        ], "Requests currently in flight.")
+        metrics.gauge("gateway_queue_depth", lambda: [
+            ({"scope": "tenant"}, self.tenants.queued()),
+            ({"scope": "api"}, self.apis.queued()),
+            ({"scope": "scheduler"}, self.scheduler.queued()),
+        ], "Requests waiting for a concurrency slot.")
+
+    @asynccontextmanager
+    async def upstream_slot(self, tenant_id, api_id, weight: int = 1):
+        await self.tenants.acquire(tenant_id)
+        try:
+            await self.apis.acquire(api_id)
+            try:
+                await self.scheduler.acquire(tenant_id, weight)
+            except BaseException:
+                self.apis.release(api_id)
+                raise
+        except BaseException:
+            self.tenants.release(tenant_id)
+            raise
+        try:
+            yield
+        finally:
+            self.scheduler.release()
+            self.apis.release(api_id)
+            self.tenants.release(tenant_id)
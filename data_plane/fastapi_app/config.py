@@ -12,3 +12,220 @@ def get_database_url() -> str:
 
 def get_redis_url() -> str:
     return os.environ.get("REDIS_URL", "redis://localhost:6379")
+
+
+def get_redis_urls() -> list[str]:
+    """Redis nodes to shard counters across; defaults to the single ``REDIS_URL``."""
+    urls = [url.strip() for url in os.environ.get("REDIS_URLS", "").split(",") if url.strip()]
+    return urls or [get_redis_url()]
+
+
+def get_redis_timeout() -> float:
+    """Latency budget for each Redis call, in seconds."""
+    return float(os.environ.get("GATEWAY_REDIS_TIMEOUT", "0.05"))
+
+
+def get_redis_failure_threshold() -> int:
+    return max(1, int(os.environ.get("GATEWAY_REDIS_FAILURE_THRESHOLD", "3")))
+
+
+def get_redis_probe_interval() -> float:
+    return float(os.environ.get("GATEWAY_REDIS_PROBE_INTERVAL", "1.0"))
+
+
+def get_redis_startup_fallback() -> str:
+    """``fakeredis`` (development) or ``local``: count locally and keep probing Redis."""
+    return os.environ.get("GATEWAY_REDIS_STARTUP_FALLBACK", "fakeredis").lower()
+
+
+def get_bind_host() -> str:
+    return os.environ.get("GATEWAY_HOST", "0.0.0.0")
+
+
+def get_bind_port() -> int:
+    return int(os.environ.get("GATEWAY_PORT", "7000"))
+
+
+def get_worker_count(default: int = 1) -> int:
+    """Worker processes serving this host. ``server`` sets ``GATEWAY_WORKERS``
+    for its workers; without it the app is one process (plain ``uvicorn``)."""
+    workers = os.environ.get("GATEWAY_WORKERS")
+    if workers:
+        return max(1, int(workers))
+    return default
+
+
+def get_fast_path_enabled() -> bool:
+    return os.environ.get("GATEWAY_FAST_PATH", "false").lower() in ("true", "1", "yes")
+
+
+def get_ws_max_size() -> int:
+    return int(os.environ.get("GATEWAY_WS_MAX_SIZE", str(1024 * 1024)))
+
+
+def get_ws_max_queue() -> int:
+    return int(os.environ.get("GATEWAY_WS_MAX_QUEUE", "16"))
+
+
+def get_upstream_max_connections() -> int:
+    # Long-lived SSE streams each hold an upstream connection.
+    return int(os.environ.get("GATEWAY_UPSTREAM_MAX_CONNECTIONS", "10000"))
+
+
+def get_dns_cache_enabled() -> bool:
+    return os.environ.get("GATEWAY_DNS_CACHE", "true").lower() in ("true", "1", "yes")
+
+
+def get_dns_nameservers() -> list[str]:
+    """``host[:port]`` DNS servers for upstream lookups; empty means ``resolv.conf``."""
+    return [ns.strip() for ns in os.environ.get("GATEWAY_DNS_NAMESERVERS", "").split(",") if ns.strip()]
+
+
+def get_dns_ttl_bounds() -> tuple[float, float, float]:
+    """Minimum and maximum cache TTL, and how long stale answers may be served."""
+    return (
+        float(os.environ.get("GATEWAY_DNS_MIN_TTL", "5")),
+        float(os.environ.get("GATEWAY_DNS_MAX_TTL", "300")),
+        float(os.environ.get("GATEWAY_DNS_STALE_TTL", "3600")),
+    )
+
+
+def get_upstream_retries() -> int:
+    return int(os.environ.get("GATEWAY_UPSTREAM_RETRIES", "1"))
+
+
+def get_max_request_body() -> int:
+    """Gateway-wide request body limit in bytes; 0 leaves it to plans and APIs."""
+    return int(os.environ.get("GATEWAY_MAX_REQUEST_BODY", str(100 * 1024 * 1024)))
+
+
+def get_body_spool_threshold() -> int:
+    return int(os.environ.get("GATEWAY_BODY_SPOOL_THRESHOLD", str(1024 * 1024)))
+
+
+def get_tenant_max_in_flight() -> int:
+    return int(os.environ.get("GATEWAY_TENANT_MAX_IN_FLIGHT", "256"))
+
+
+def get_api_max_in_flight() -> int:
+    return int(os.environ.get("GATEWAY_API_MAX_IN_FLIGHT", "128"))
+
+
+def get_in_flight_queue_size() -> int:
+    return int(os.environ.get("GATEWAY_IN_FLIGHT_QUEUE_SIZE", "128"))
+
+
+def get_in_flight_queue_timeout() -> float:
+    return float(os.environ.get("GATEWAY_IN_FLIGHT_QUEUE_TIMEOUT", "2.0"))
+
+
+def get_scheduler_capacity() -> int:
+    """Upstream dispatches per worker before fair queuing kicks in; 0 disables it."""
+    return int(os.environ.get("GATEWAY_SCHEDULER_CAPACITY", "512"))
+
+
+def get_scheduler_queue_size() -> int:
+    return int(os.environ.get("GATEWAY_SCHEDULER_QUEUE_SIZE", "1024"))
+
+
+def get_adaptive_concurrency_enabled() -> bool:
+    return os.environ.get("GATEWAY_ADAPTIVE_CONCURRENCY", "true").lower() in ("true", "1", "yes")
+
+
+def get_adaptive_concurrency_limits() -> tuple[int, int, int]:
+    """Initial, minimum and maximum adaptive in-flight limit per worker."""
+    return (
+        int(os.environ.get("GATEWAY_ADAPTIVE_INITIAL_LIMIT", "200")),
+        int(os.environ.get("GATEWAY_ADAPTIVE_MIN_LIMIT", "20")),
+        int(os.environ.get("GATEWAY_ADAPTIVE_MAX_LIMIT", "2000")),
+    )
+
+
+def get_events_enabled() -> bool:
+    return os.environ.get("GATEWAY_EVENTS", "true").lower() in ("true", "1", "yes")
+
+
+def get_events_stream() -> str:
+    return os.environ.get("GATEWAY_EVENTS_STREAM", "gateway:events")
+
+
+def get_events_max_len() -> int:
+    """Approximate cap on the request event stream's length."""
+    return int(os.environ.get("GATEWAY_EVENTS_MAX_LEN", "1000000"))
+
+
+def get_events_batch_size() -> int:
+    return int(os.environ.get("GATEWAY_EVENTS_BATCH_SIZE", "500"))
+
+
+def get_events_buffer() -> int:
+    """Request events a worker holds while Redis is slow or the stream is full."""
+    return int(os.environ.get("GATEWAY_EVENTS_BUFFER", "100000"))
+
+
+def get_config_cache_ttl() -> float:
+    """Seconds tenant, API, key and plan lookups are cached; 0 disables the cache."""
+    return float(os.environ.get("GATEWAY_CONFIG_CACHE_TTL", "10"))
+
+
+def get_config_channel() -> str:
+    """Redis channel the control plane announces configuration changes on."""
+    return os.environ.get("GATEWAY_CONFIG_CHANNEL", "gateway:config")
+
+
+def get_key_index_path() -> str | None:
+    """File holding the shared API key index (see ``key_index``); unset disables it."""
+    return os.environ.get("GATEWAY_KEY_INDEX") or None
+
+
+def get_key_index_reload_interval() -> float:
+    """Seconds between checks for a rebuilt key index file."""
+    return float(os.environ.get("GATEWAY_KEY_INDEX_RELOAD", "30"))
+
+
+def get_key_index_max_age() -> float:
+    """Seconds a key index is trusted after it was built; workers rebuild it
+    once it is half that old. 0 trusts it indefinitely."""
+    return float(os.environ.get("GATEWAY_KEY_INDEX_MAX_AGE", "300"))
+
+
+def get_routes_reload_interval() -> float:
+    """Seconds between full rebuilds of the routing table; 0 disables them."""
+    return float(os.environ.get("GATEWAY_ROUTES_RELOAD", "60"))
+
+
+def get_idempotency_max_body() -> int:
+    """Largest response body, in bytes, stored for ``Idempotency-Key`` replays."""
+    return int(os.environ.get("GATEWAY_IDEMPOTENCY_MAX_BODY", str(1024 * 1024)))
+
+
+def get_idempotency_wait() -> float:
+    """Seconds a duplicate request waits for the one in flight before a 409."""
+    return float(os.environ.get("GATEWAY_IDEMPOTENCY_WAIT", "10"))
+
+
+def get_admin_token() -> str | None:
+    """Bearer token for ``/admin/profile`` and key for signed profile headers; unset disables both."""
+    return os.environ.get("GATEWAY_ADMIN_TOKEN") or None
+
+
+def get_slow_callback_threshold() -> float:
+    """Seconds the event loop may be held before its stack is logged; 0 disables monitoring."""
+    return float(os.environ.get("GATEWAY_SLOW_CALLBACK", "0.1"))
+
+
+def get_warmup_mode() -> str:
+    """``hot`` (most-used keys and APIs), ``all`` or ``off``."""
+    return os.environ.get("GATEWAY_WARMUP", "hot").lower()
+
+
+def get_warmup_top() -> int:
+    return int(os.environ.get("GATEWAY_WARMUP_TOP", "100"))
+
+
+def get_warmup_connections() -> int:
+    return int(os.environ.get("GATEWAY_WARMUP_CONNECTIONS", "2"))
+
+
+def get_warmup_timeout() -> float:
+    return float(os.environ.get("GATEWAY_WARMUP_TIMEOUT", "10"))
@@ -0,0 +1,206 @@
+"""Key, client and plan lookups for ``authorize``, cached for a short TTL.
+Tenants and APIs are resolved in the routing table instead (see ``routing``).
+
+The control plane owns this configuration, so cached rows are only trusted
+for ``ttl`` seconds (``GATEWAY_CONFIG_CACHE_TTL``): a key revoked or a plan
+changed in the dashboard reaches the gateway within that time. Only rows that
+were found are cached, so new keys and clients work immediately. A TTL
+of 0 sends every lookup to the database.
+
+With ``GATEWAY_KEY_INDEX`` set, key lookups are answered from a shared
+memory-mapped snapshot of every key instead (see ``key_index``), as long as
+it is no older than ``GATEWAY_KEY_INDEX_MAX_AGE``.
+
+The control plane also publishes a message on a Redis channel
+(``GATEWAY_CONFIG_CHANNEL``) after each batch of changes to one or more
+tenants; ``listen_for_changes`` drops those tenants' entries as soon as it
+arrives, so the TTL only matters while Redis is unreachable.
+"""
+import asyncio
+import json
+import logging
+import time
+
+from redis.exceptions import RedisError
+
+from .tables import apis_apikey, apis_client, billing_plan
+
+logger = logging.getLogger(__name__)
+
+# Cache key kinds whose second element is the tenant ID. Plans are shared
+# between tenants but cached per tenant using them, so the control plane can
+# evict an edited plan by naming those tenants.
+_TENANT_SCOPED = ("api_key", "client", "plan")
+
+
+class ConfigCache:
+    def __init__(
+        self, database, ttl: float = 10.0, max_entries: int = 100_000, key_index=None, key_index_max_age: float = 0
+    ):
+        self.database = database
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # A ``KeyIndex`` snapshot answering key lookups without the database,
+        # except for tenants whose keys changed since it was built: tenant_id
+        # -> when the change was announced (``time.time()``).
+        self.key_index = key_index
+        # Past this age (``built_at`` + ``key_index_max_age``) the snapshot may
+        # hold changes no worker heard about, so it is not used at all.
+        self.key_index_max_age = key_index_max_age
+        self._index_stale: dict[int, float] = {}
+        # (kind, *lookup) -> (expires_at, row)
+        self._entries: dict[tuple, tuple[float, object]] = {}
+        # tenant_id -> kind -> cache keys, so evicting a tenant touches only
+        # its own entries.
+        self._by_tenant: dict[int, dict[str, set[tuple]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _owner(cache_key: tuple) -> int | None:
+        if cache_key[0] in _TENANT_SCOPED:
+            return cache_key[1]
+        return None
+
+    def put(self, cache_key: tuple, row) -> None:
+        if self.ttl <= 0:
+            return
+        self._discard(cache_key)
+        if len(self._entries) >= self.max_entries:
+            # Dicts keep insertion order, so this drops the oldest entry.
+            self._discard(next(iter(self._entries)))
+        self._entries[cache_key] = (time.monotonic() + self.ttl, row)
+        owner = self._owner(cache_key)
+        if owner is not None:
+            self._by_tenant.setdefault(owner, {}).setdefault(cache_key[0], set()).add(cache_key)
+
+    def _discard(self, cache_key: tuple) -> None:
+        entry = self._entries.pop(cache_key, None)
+        if entry is None:
+            return
+        owner = self._owner(cache_key)
+        indexed = self._by_tenant.get(owner)
+        if indexed is None:
+            return
+        keys = indexed.get(cache_key[0], set())
+        keys.discard(cache_key)
+        if not keys:
+            indexed.pop(cache_key[0], None)
+            if not indexed:
+                del self._by_tenant[owner]
+
+    def use_key_index(self, key_index) -> None:
+        """Replace the key index; tenants changed since it was built stay stale."""
+        previous, self.key_index = self.key_index, key_index
+        self._index_stale = {
+            tenant_id: changed_at
+            for tenant_id, changed_at in self._index_stale.items()
+            if changed_at >= key_index.built_at
+        }
+        if previous is not None:
+            previous.close()
+
+    def evict_tenant(self, tenant_id: int, kinds=None) -> int:
+        """Drop ``tenant_id``'s cached rows of ``kinds`` (all of them if None);
+        returns how many. Takes time proportional to the rows dropped."""
+        if self.key_index is not None and (kinds is None or "api_key" in kinds):
+            self._index_stale[tenant_id] = time.time()
+        indexed = self._by_tenant.get(tenant_id)
+        if not indexed:
+            return 0
+        stale = [
+            cache_key
+            for kind in (list(indexed) if kinds is None else kinds)
+            for cache_key in indexed.get(kind, ())
+        ]
+        for cache_key in stale:
+            self._discard(cache_key)
+        return len(stale)
+
+    async def _fetch(self, cache_key: tuple, query):
+        entry = self._entries.get(cache_key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        row = await self.database.fetch_one(query)
+        if row is not None:
+            self.put(cache_key, row)
+        else:
+            self._discard(cache_key)
+        return row
+
+    def _index_usable(self, tenant_id: int) -> bool:
+        if self.key_index is None or tenant_id in self._index_stale:
+            return False
+        return not self.key_index_max_age or time.time() - self.key_index.built_at <= self.key_index_max_age
+
+    async def api_key(self, tenant_id: int, hashed_key: str):
+        if self._index_usable(tenant_id):
+            row = self.key_index.get(hashed_key)
+            if row is not None and row["tenant_id"] == tenant_id and row["is_active"]:
+                return row
+        query = apis_apikey.select().where(
+            (apis_apikey.c.hashed_key == hashed_key) &
+            (apis_apikey.c.tenant_id == tenant_id) &
+            (apis_apikey.c.is_active == True)
+        )
+        return await self._fetch(("api_key", tenant_id, hashed_key), query)
+
+    async def client(self, tenant_id: int, client_id: str):
+        query = apis_client.select().where(
+            (apis_client.c.client_id == client_id) &
+            (apis_client.c.tenant_id == tenant_id) &
+            (apis_client.c.is_active == True)
+        )
+        return await self._fetch(("client", tenant_id, client_id), query)
+
+    async def plan(self, tenant_id: int, plan_id: int):
+        """``plan_id`` as used by one of ``tenant_id``'s keys or clients."""
+        query = billing_plan.select().where(billing_plan.c.id == plan_id)
+        return await self._fetch(("plan", tenant_id, plan_id), query)
+
+
+async def listen_for_changes(
+    cache: ConfigCache, redis_client, channel: str, retry_interval: float = 1.0, routes=None
+) -> None:
+    """Evict the tenants named on ``channel`` until cancelled.
+
+    Messages are JSON objects with a ``tenant_id`` or a list of
+    ``tenant_ids``, and optionally the ``kinds`` of entries to drop (the
+    default is all of them), so one bulk revocation is one message. Those
+    tenants' entries in the ``routes`` table are reloaded too when ``kinds``
+    is unset or includes ``route``. After a Redis error the
+    subscription is retried every ``retry_interval`` seconds; changes
+    published in between reach the cache when its entries expire.
+    """
+    failing = False
+    while True:
+        try:
+            async with redis_client.pubsub() as pubsub:
+                await pubsub.subscribe(channel)
+                if failing:
+                    logger.info(f"Resubscribed to configuration changes on {channel}")
+                failing = False
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    try:
+                        change = json.loads(message["data"])
+                        tenant_ids = change["tenant_ids"] if "tenant_ids" in change else [change["tenant_id"]]
+                        kinds = change.get("kinds")
+                        tenant_ids = [int(tenant_id) for tenant_id in tenant_ids]
+                        for tenant_id in tenant_ids:
+                            cache.evict_tenant(tenant_id, kinds)
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        logger.warning(f"Ignoring malformed configuration change: {message['data']!r}")
+                        continue
+                    if routes is not None and (kinds is None or "route" in kinds):
+                        try:
+                            await routes.refresh(tenant_ids)
+                        except Exception as exc:
+                            logger.warning(f"Could not reload routes of tenants {tenant_ids}: {exc!r}")
+        except (RedisError, OSError) as exc:
+            if not failing:
+                logger.warning(f"Configuration change subscription failed, relying on the cache TTL: {exc!r}")
+            failing = True
+            await asyncio.sleep(retry_interval)
@@ -0,0 +1,326 @@
+"""Rate-limit, usage and connection counters with a runtime Redis fallback.
+
+``Counters.incr`` counts in Redis, each call bounded by a strict latency
+budget. A node that times out or errors ``failure_threshold`` times in a row
+is marked down, and until it recovers its keys are counted in this worker's
+memory instead. Local counts stand in for the whole pool, so they are scaled
+by the worker count: with 4 workers each one admits a quarter of a plan's
+limit. What a request does while its node is down follows its plan's
+``redis_failure_policy``:
+
+* ``local`` (default): enforce limits with the scaled local counters.
+* ``open``: let requests through without counting them against limits.
+* ``closed``: reject them with 503.
+
+A background probe pings down nodes; once one answers, the counts taken
+locally in the meantime are added onto its keys (so usage and quotas stay
+accurate) and traffic switches back to it.
+
+``Counters.admit`` checks one request against several limits at once, each
+a counter with its own window: one script call on the node that holds them
+all counts the request in every counter, or in none if any is already at
+its limit. ``Counters.incr_many`` adds to several of a subject's counters in
+one round trip, for what is only known once a request is under way (the
+bytes it moves).
+"""
+import asyncio
+import logging
+import time
+
+from fastapi import HTTPException
+from redis.exceptions import RedisError, TimeoutError as RedisTimeoutError
+
+from .concurrency import RETRY_AFTER
+
+logger = logging.getLogger(__name__)
+
+LOCAL = "local"
+FAIL_OPEN = "open"
+FAIL_CLOSED = "closed"
+
+MONTH_TTL = 60 * 60 * 24 * 32
+
+# KEYS[i] is limited to ARGV[2i - 1] and expires ARGV[2i] seconds after its
+# last request (0: it is only checked, not counted). Returns 0 once the
+# request is counted in all of them, or the (1-based) position of the first
+# one at its limit, counting it in none.
+ADMIT_SCRIPT = """
+for i = 1, #KEYS do
+    if tonumber(redis.call('GET', KEYS[i]) or '0') >= tonumber(ARGV[2 * i - 1]) then
+        return i
+    end
+end
+for i = 1, #KEYS do
+    if tonumber(ARGV[2 * i]) > 0 then
+        redis.call('INCR', KEYS[i])
+        redis.call('EXPIRE', KEYS[i], ARGV[2 * i])
+    end
+end
+return 0
+"""
+
+
+def quota_windows() -> tuple[int, str]:
+    """Suffixes of this minute's and this month's quota counters."""
+    current_time = time.gmtime()
+    return int(time.time() // 60), f"month:{current_time.tm_year}-{current_time.tm_mon}"
+
+
+class LocalCounters:
+    PRUNE_EVERY = 1000
+
+    def __init__(self):
+        # key -> [value, expires_at or None, node]
+        self._counters: dict[str, list] = {}
+        self._ops = 0
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    def incr(self, key: str, amount: int, ttl: int | None, node: str) -> int:
+        now = time.monotonic()
+        self._ops += 1
+        if self._ops % self.PRUNE_EVERY == 0:
+            self._prune(now)
+        counter = self._counters.get(key)
+        if counter is None or (counter[1] is not None and counter[1] <= now):
+            counter = self._counters[key] = [0, None, node]
+        counter[0] += amount
+        counter[1] = now + ttl if ttl else None
+        return counter[0]
+
+    def value(self, key: str) -> int:
+        counter = self._counters.get(key)
+        if counter is None or (counter[1] is not None and counter[1] <= time.monotonic()):
+            return 0
+        return counter[0]
+
+    def _prune(self, now: float) -> None:
+        expired = [key for key, (_, expires, _) in self._counters.items() if expires is not None and expires <= now]
+        for key in expired:
+            del self._counters[key]
+
+    def take(self, node: str) -> list[tuple[str, int, float | None]]:
+        """Remove and return ``(key, value, seconds left)`` for ``node``'s live counters."""
+        now = time.monotonic()
+        taken = []
+        for key, (value, expires, owner) in list(self._counters.items()):
+            if owner != node:
+                continue
+            del self._counters[key]
+            if expires is None or expires > now:
+                taken.append((key, value, None if expires is None else expires - now))
+        return taken
+
+    def restore(self, counters: list[tuple[str, int, float | None]], node: str) -> None:
+        for key, value, ttl in counters:
+            self.incr(key, value, int(ttl) + 1 if ttl is not None else None, node)
+
+
+class _NodeHealth:
+    __slots__ = ("up", "failures")
+
+    def __init__(self):
+        self.up = True
+        self.failures = 0
+
+
+class Counters:
+    def __init__(
+        self,
+        redis_client,
+        metrics,
+        workers: int = 1,
+        timeout: float = 0.05,
+        failure_threshold: int = 3,
+        probe_interval: float = 1.0,
+    ):
+        self.redis = redis_client
+        self.metrics = metrics
+        self.workers = workers
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.local = LocalCounters()
+        self._health = {name: _NodeHealth() for name in redis_client.clients}
+        self._scripts: dict[str, object] = {}
+        self._probe_task: asyncio.Task | None = None
+
+        metrics.describe("gateway_redis_errors_total", "Redis calls that timed out or failed.")
+        metrics.describe("gateway_counters_degraded_total", "Counter updates made while Redis was down.")
+        metrics.gauge("gateway_redis_up", lambda: [
+            ({"node": name}, 1 if health.up else 0) for name, health in self._health.items()
+        ], "Whether the gateway is counting in each Redis node.")
+        metrics.gauge("gateway_local_counters", lambda: len(self.local), "Counters held locally until Redis recovers.")
+
+    def is_up(self, name: str) -> bool:
+        return self._health[name].up
+
+    def mark_down(self, name: str) -> None:
+        health = self._health[name]
+        if health.up:
+            logger.warning(f"Redis node {name} is down, counting locally")
+        health.up = False
+        health.failures = self.failure_threshold
+
+    def _failed(self, name: str, health: _NodeHealth, exc: Exception) -> None:
+        reason = "timeout" if isinstance(exc, asyncio.TimeoutError) else "error"
+        self.metrics.inc("gateway_redis_errors_total", node=name, reason=reason)
+        health.failures += 1
+        if health.failures >= self.failure_threshold:
+            self.mark_down(name)
+
+    async def incr(self, key: str, amount: int = 1, ttl: int | None = None, policy: str | None = None) -> int | None:
+        """Add ``amount`` to ``key`` (refreshing its TTL) and return the new count.
+
+        Returns ``None`` when the count is unknown and the plan fails open.
+        """
+        name = self.redis.node_name_for_key(key)
+        health = self._health[name]
+        if health.up:
+            try:
+                count = await asyncio.wait_for(self._redis_incr(name, key, amount, ttl), self.timeout)
+                health.failures = 0
+                return count
+            except (RedisError, OSError, asyncio.TimeoutError) as exc:
+                self._failed(name, health, exc)
+
+        policy = policy or LOCAL
+        self.metrics.inc("gateway_counters_degraded_total", policy=policy)
+        if policy == FAIL_CLOSED and amount > 0:
+            raise HTTPException(status_code=503, detail="Rate limiting unavailable", headers=RETRY_AFTER)
+        count = self.local.incr(key, amount, ttl, name)
+        if policy == FAIL_OPEN:
+            return None
+        return count * self.workers
+
+    async def incr_many(self, increments: list[tuple[str, int, int | None]]) -> None:
+        """Add each ``(key, amount, ttl)`` in ``increments`` in one round trip.
+
+        The keys must share a subject, and so a node. While it is down they
+        are counted locally whatever the plan's policy: what they count has
+        already happened.
+        """
+        if not increments:
+            return
+        name = self.redis.node_name_for_key(increments[0][0])
+        health = self._health[name]
+        if health.up:
+            try:
+                await asyncio.wait_for(self._redis_incr_many(name, increments), self.timeout)
+                health.failures = 0
+                return
+            except (RedisError, OSError, asyncio.TimeoutError) as exc:
+                self._failed(name, health, exc)
+
+        self.metrics.inc("gateway_counters_degraded_total", policy=LOCAL)
+        for key, amount, ttl in increments:
+            self.local.incr(key, amount, ttl, name)
+
+    async def admit(self, limits: list[tuple[str, int, int | None]], policy: str | None = None) -> int | None:
+        """Count a request against every ``(key, limit, ttl)`` in ``limits``
+        unless one of them has reached its limit; a ``ttl`` of ``None`` only
+        checks its counter (one ``incr_many`` adds to).
+
+        Returns the index of the first counter at its limit (the request is
+        counted in none), or ``None`` when it was counted in all of them (or
+        the plan fails open). The keys must share a subject, and so a node.
+        """
+        if not limits:
+            return None
+        name = self.redis.node_name_for_key(limits[0][0])
+        health = self._health[name]
+        # Whether the script may have run although no answer came back.
+        maybe_counted = False
+        if health.up:
+            try:
+                exceeded = await asyncio.wait_for(self._redis_admit(name, limits), self.timeout)
+                health.failures = 0
+                return exceeded - 1 if exceeded else None
+            except (RedisError, OSError, asyncio.TimeoutError) as exc:
+                self._failed(name, health, exc)
+                maybe_counted = isinstance(exc, (asyncio.TimeoutError, RedisTimeoutError))
+
+        policy = policy or LOCAL
+        self.metrics.inc("gateway_counters_degraded_total", policy=policy)
+        if policy == FAIL_CLOSED:
+            raise HTTPException(status_code=503, detail="Rate limiting unavailable", headers=RETRY_AFTER)
+        if policy == LOCAL:
+            for index, (key, limit, ttl) in enumerate(limits):
+                if ttl is None:
+                    exceeded = self.local.value(key) * self.workers >= limit
+                else:
+                    exceeded = (self.local.value(key) + 1) * self.workers > limit
+                if exceeded:
+                    return index
+        if maybe_counted:
+            # Counting it locally too would add it to the node twice once the
+            # local counts are merged; missing one request is the lesser error.
+            return None
+        for key, _, ttl in limits:
+            if ttl is not None:
+                self.local.incr(key, 1, ttl, name)
+        return None
+
+    async def _redis_admit(self, name: str, limits: list[tuple[str, int, int | None]]) -> int:
+        script = self._scripts.get(name)
+        if script is None:
+            script = self._scripts[name] = self.redis.clients[name].register_script(ADMIT_SCRIPT)
+        args = [value for _, limit, ttl in limits for value in (limit, ttl or 0)]
+        return int(await script(keys=[key for key, _, _ in limits], args=args))
+
+    async def _redis_incr(self, name: str, key: str, amount: int, ttl: int | None) -> int:
+        client = self.redis.clients[name]
+        if ttl is None:
+            return await client.incrby(key, amount)
+        async with client.pipeline(transaction=False) as pipe:
+            count, _ = await pipe.incrby(key, amount).expire(key, ttl).execute()
+        return count
+
+    async def _redis_incr_many(self, name: str, increments: list[tuple[str, int, int | None]]) -> None:
+        async with self.redis.clients[name].pipeline(transaction=False) as pipe:
+            for key, amount, ttl in increments:
+                pipe.incrby(key, amount)
+                if ttl is not None:
+                    pipe.expire(key, ttl)
+            await pipe.execute()
+
+    async def start(self) -> None:
+        self._probe_task = asyncio.create_task(self._probe())
+
+    async def aclose(self) -> None:
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            await asyncio.gather(self._probe_task, return_exceptions=True)
+
+    async def _probe(self) -> None:
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            for name, health in self._health.items():
+                if not health.up:
+                    await self._try_recover(name, health)
+
+    async def _try_recover(self, name: str, health: _NodeHealth) -> None:
+        client = self.redis.clients[name]
+        try:
+            await asyncio.wait_for(client.ping(), self.timeout)
+        except (RedisError, OSError, asyncio.TimeoutError):
+            return
+
+        counters = self.local.take(name)
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for key, value, ttl in counters:
+                    pipe.incrby(key, value)
+                    if ttl is not None:
+                        pipe.expire(key, max(1, int(ttl) + 1))
+                await asyncio.wait_for(pipe.execute(), max(self.timeout, self.probe_interval))
+        except (RedisError, OSError, asyncio.TimeoutError) as exc:
+            # Keep them for the next attempt rather than losing the counts.
+            logger.warning(f"Reconciling counters with Redis node {name} failed: {exc!r}")
+            self.local.restore(counters, name)
+            return
+
+        health.up = True
+        health.failures = 0
+        logger.info(f"Redis node {name} is back; reconciled {len(counters)} local counters")
@@ -0,0 +1,138 @@
+"""Per-request events for billing and analytics, appended to a Redis Stream.
+
+``EventRecorder.record`` only formats the event and appends it to an
+in-memory buffer; a background task flushes the buffer with pipelined
+``XADD``s (``batch_size`` per round trip) to the stream on the first Redis
+node, where the control plane's ``consume_events`` command reads them.
+
+Each entry has a single field ``e`` holding ``|``-separated values, in
+``EVENT_FIELDS`` order (``consume_events`` parses the same layout)::
+
+    timestamp_ms|tenant_id|api_id|key_id|client_id|method|status|latency_us|bytes_in|bytes_out
+
+Backpressure: the stream is capped at about ``max_len`` entries. Once it is
+more than ``HIGH_WATER`` full (the consumers are behind), flushing pauses and
+events wait in the buffer; when the buffer holds ``max_buffer`` events, new
+ones are dropped and counted in ``gateway_events_dropped_total``, so requests
+never wait on the pipeline. Events also wait in the buffer while Redis is
+unreachable.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+EVENT_FIELDS = (
+    "timestamp_ms", "tenant_id", "api_id", "key_id", "client_id",
+    "method", "status", "latency_us", "bytes_in", "bytes_out",
+)
+HIGH_WATER = 0.8
+
+
+class EventRecorder:
+    def __init__(
+        self,
+        redis_client,
+        metrics,
+        stream: str = "gateway:events",
+        max_len: int = 1_000_000,
+        batch_size: int = 500,
+        max_buffer: int = 100_000,
+        flush_interval: float = 0.1,
+        timeout: float = 1.0,
+        enabled: bool = True,
+    ):
+        self.enabled = enabled
+        self.redis = redis_client
+        self.metrics = metrics
+        self.stream = stream
+        self.max_len = max_len
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.paused = False
+        self._failing = False
+        self._closing = False
+        self._buffer: deque[str] = deque()
+        self._batch_ready = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+        metrics.describe("gateway_events_total", "Request events written to the Redis Stream.")
+        metrics.describe("gateway_events_dropped_total", "Request events dropped because the buffer was full.")
+        metrics.gauge("gateway_events_buffered", lambda: len(self._buffer), "Request events waiting to be written.")
+        metrics.gauge("gateway_events_paused", lambda: 1 if self.paused else 0, "Whether writing is paused for backpressure.")
+
+    def record(self, auth, method: str, status: int, latency: float, bytes_in: int, bytes_out: int) -> None:
+        if not self.enabled:
+            return
+        if len(self._buffer) >= self.max_buffer:
+            self.metrics.inc("gateway_events_dropped_total")
+            return
+        self._buffer.append(
+            f"{int(time.time() * 1000)}|{auth.tenant['id']}|{auth.api['id']}|{auth.key_id or ''}|{auth.client_id or ''}"
+            f"|{method}|{status}|{int(latency * 1_000_000)}|{bytes_in}|{bytes_out}"
+        )
+        if len(self._buffer) >= self.batch_size:
+            self._batch_ready.set()
+
+    async def start(self) -> None:
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def aclose(self) -> None:
+        if self._task is None:
+            return
+        # Let the flusher finish its current write and drain the buffer rather
+        # than cancelling it mid-pipeline, which could write a batch twice.
+        self._closing = True
+        self._batch_ready.set()
+        await self._task
+        if self._buffer:
+            logger.warning(f"Dropping {len(self._buffer)} request events on shutdown")
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            try:
+                await self._flush()
+            except (RedisError, OSError, asyncio.TimeoutError) as exc:
+                if not self._failing:
+                    logger.warning(f"Writing request events failed, buffering until Redis recovers: {exc!r}")
+                self._failing = True
+            else:
+                self._failing = False
+
+    async def _flush(self) -> None:
+        if self.paused:
+            length = await asyncio.wait_for(self.redis.xlen(self.stream), self.timeout)
+            self.paused = length > self.max_len * HIGH_WATER
+            if self.paused:
+                return
+            logger.info("Request event stream drained, resuming writes")
+
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for event in batch:
+                        pipe.xadd(self.stream, {"e": event}, maxlen=self.max_len, approximate=True)
+                    pipe.xlen(self.stream)
+                    replies = await asyncio.wait_for(pipe.execute(), self.timeout)
+            except BaseException:
+                # Put them back in order for the next attempt.
+                self._buffer.extendleft(reversed(batch))
+                raise
+            self.metrics.inc("gateway_events_total", len(batch))
+            if replies[-1] > self.max_len * HIGH_WATER:
+                logger.warning(f"Request event stream {self.stream} is {replies[-1]} entries long, pausing writes")
+                self.paused = True
+                return
@@ -0,0 +1,233 @@
+"""Raw ASGI fast path for the proxy route.
+
+``ProxyFastPathMiddleware`` answers proxied requests straight from the ASGI
+scope: it resolves the host and path in the routing table (see ``routing``),
+reads ``X-API-Key``/``X-Client-ID`` from the raw header list and writes the
+response messages itself, skipping FastAPI's routing, dependency injection,
+``Request``/``Response`` objects and ``BackgroundTasks``. Authorization and
+rate limiting are shared with ``proxy.proxy_request``, and errors are rendered
+exactly like FastAPI renders ``HTTPException`` so clients cannot tell the two
+paths apart. Anything the fast path does not handle (the app's own and
+unrouted paths, other methods, event streams, websockets, lifespan) falls
+through to the wrapped app, as do requests the API replays by
+``Idempotency-Key`` (see ``idempotency``). Large and shaped responses are
+relayed chunk by chunk like the app relays them (see ``streaming``).
+
+Enable it with ``GATEWAY_FAST_PATH=1``.
+"""
+import json
+import logging
+import time
+from contextlib import aclosing
+
+import httpx
+from fastapi import HTTPException
+from starlette.requests import ClientDisconnect
+
+from .bandwidth import ByteMeter, TokenBucket
+from .bodies import read_body, receive_chunks
+from .headers import forward_request_headers, forward_response_headers
+from .profiling import PROFILE_HEADER
+from .proxy import PROXY_METHODS, authorize, build_upstream_request, build_upstream_url, send_upstream
+from .streaming import relay_body, should_stream
+from .usage import record_usage
+
+logger = logging.getLogger(__name__)
+
+PROXY_METHOD_SET = frozenset(PROXY_METHODS)
+# Served by the app's own routers, whatever a custom domain routes.
+APP_PATHS = frozenset({"/healthz", "/readyz", "/metrics", "/admin/profile"})
+
+
+def _error_body(detail: str) -> bytes:
+    # Matches FastAPI's JSONResponse rendering of ``{"detail": ...}``.
+    return json.dumps(
+        {"detail": detail}, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+async def _send_response(send, status: int, headers: list[tuple[bytes, bytes]], body: bytes) -> None:
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_chunks(send, status: int, headers: list[tuple[bytes, bytes]], chunks) -> None:
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    # Closed here even if the client goes away mid-body, releasing the upstream.
+    async with aclosing(chunks):
+        async for chunk in chunks:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _send_error(send, exc: HTTPException) -> None:
+    body = _error_body(exc.detail)
+    headers = [
+        (k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in (exc.headers or {}).items()
+    ]
+    headers.append((b"content-length", str(len(body)).encode("latin-1")))
+    headers.append((b"content-type", b"application/json"))
+    await _send_response(send, exc.status_code, headers, body)
+
+
+def _accepts_event_stream(raw_headers) -> bool:
+    # Event streams need the router's streaming response path.
+    for name, value in raw_headers:
+        if name == b"accept" and b"text/event-stream" in value:
+            return True
+    return False
+
+
+class ProxyFastPathMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in PROXY_METHOD_SET:
+            await self.app(scope, receive, send)
+            return
+        if scope["path"] in APP_PATHS or _accepts_event_stream(scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+
+        api_key = None
+        client_id = None
+        idempotency_key = None
+        profile_header = None
+        host = ""
+        for name, value in scope["headers"]:
+            if name == b"x-api-key":
+                api_key = value.decode("latin-1")
+            elif name == b"x-client-id":
+                client_id = value.decode("latin-1")
+            elif name == b"host":
+                host = value.decode("latin-1")
+            elif name == b"idempotency-key":
+                idempotency_key = value.decode("latin-1")
+            elif name == PROFILE_HEADER:
+                profile_header = value.decode("latin-1")
+
+        services = scope["app"].state.services
+        profile = services.profiler.request_profile(profile_header)
+        resolved = services.routes.resolve(host, scope["path"])
+        if resolved is None:
+            await self.app(scope, receive, send)
+            return
+        route, path = resolved
+        profile.mark("route")
+        if services.idempotency.applies(route.api, scope["method"], idempotency_key):
+            await self.app(scope, receive, send)
+            return
+        concurrency = services.concurrency
+        try:
+            if not api_key:
+                raise HTTPException(status_code=401, detail="Missing X-API-Key header")
+
+            concurrency.adaptive.acquire()
+            sent_at = None
+            body = None
+            meter = None
+            streamed = False
+            try:
+                auth = await authorize(services, route, api_key, client_id)
+                profile.mark("auth")
+
+                upstream_url = build_upstream_url(auth.api, path, scope.get("query_string", b""))
+
+                body = await read_body(
+                    scope,
+                    receive_chunks(receive),
+                    services.body_limits.limit_for(auth),
+                    services.body_limits.spool_threshold,
+                )
+                meter = ByteMeter.for_request(services.counters, auth)
+                if meter is not None:
+                    meter.add("bytes_in", body.size)
+                bucket = TokenBucket.for_plan(auth.plan)
+                profile.mark("body")
+
+                async with concurrency.upstream_slot(
+                    auth.tenant["id"], auth.api["id"], auth.plan["scheduling_weight"] or 1
+                ):
+                    profile.mark("queue")
+                    try:
+                        upstream_request = build_upstream_request(
+                            services.http_client,
+                            scope["method"],
+                            upstream_url,
+                            forward_request_headers(scope),
+                            body,
+                        )
+                        sending = time.perf_counter()
+                        upstream_response = await send_upstream(
+                            services.http_client, upstream_request, services.upstream_retries, stream=True
+                        )
+                    except httpx.RequestError as exc:
+                        logger.error(f"Upstream request failed: {exc}")
+                        raise HTTPException(status_code=502, detail="Upstream service unavailable")
+                    sent_at = sending
+                    profile.mark("upstream")
+                    latency = time.perf_counter() - sent_at
+                    streamed = should_stream(upstream_response, bucket, services.body_limits.spool_threshold)
+                    if not streamed:
+                        try:
+                            content = await upstream_response.aread()
+                        except httpx.RequestError as exc:
+                            logger.error(f"Upstream request failed: {exc}")
+                            raise HTTPException(status_code=502, detail="Upstream service unavailable")
+                        finally:
+                            await upstream_response.aclose()
+                        profile.mark("response")
+                        services.events.record(
+                            auth, scope["method"], upstream_response.status_code, latency, body.size, len(content)
+                        )
+            except BaseException:
+                # The body read counts against the byte quotas even if the
+                # request then failed.
+                if meter is not None:
+                    await meter.flush()
+                raise
+            finally:
+                if body is not None:
+                    body.close()
+                concurrency.adaptive.release(sent_at)
+        except HTTPException as exc:
+            await _send_error(send, exc)
+            return
+        except ClientDisconnect:
+            # Gone before its body arrived: nothing was sent upstream, and
+            # there is no one left to answer.
+            logger.info(f"Client disconnected while sending {scope['method']} {scope['path']}")
+            return
+
+        status = upstream_response.status_code
+        response_headers = forward_response_headers(upstream_response.headers.raw)
+        profile.finish(response_headers, f"{scope['method']} {scope['path']}")
+        if streamed:
+            # Outside the in-flight limits, as in ``proxy_request``.
+            bytes_in = body.size
+            await _send_chunks(
+                send,
+                status,
+                response_headers,
+                relay_body(
+                    upstream_response,
+                    meter,
+                    bucket,
+                    on_close=lambda bytes_out: services.events.record(
+                        auth, scope["method"], status, latency, bytes_in, bytes_out
+                    ),
+                ),
+            )
+        else:
+            if not (status < 200 or status in (204, 304)):
+                response_headers.append((b"content-length", str(len(content)).encode("latin-1")))
+            try:
+                await _send_response(send, status, response_headers, content)
+                if meter is not None:
+                    meter.add("bytes_out", len(content))
+            finally:
+                if meter is not None:
+                    await meter.flush()
+
+        await record_usage(services.counters, auth.tenant["id"], auth.api["id"])
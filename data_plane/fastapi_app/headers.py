@@ -0,0 +1,111 @@
+"""Header forwarding between clients and upstreams.
+
+Both directions work on raw ``(name, value)`` byte pairs, the representation
+ASGI servers hand us and httpx accepts, so repeated headers (``Cookie``,
+``Accept``, ``Set-Cookie``...) survive in order and no per-request dict is
+built. Hop-by-hop headers from RFC 9110 section 7.6.1, plus any header the
+sender lists in ``Connection``, are dropped on the way through.
+"""
+
+HOP_BY_HOP_HEADERS = frozenset({
+    b"connection",
+    b"keep-alive",
+    b"proxy-connection",
+    b"proxy-authenticate",
+    b"proxy-authorization",
+    b"te",
+    b"trailer",
+    b"transfer-encoding",
+    b"upgrade",
+})
+
+# Headers httpx or the ASGI server regenerate for the new hop, gateway
+# credentials that must not leak upstream, and the single-valued forwarding
+# headers the gateway replaces with its own instead of passing on (or
+# duplicating) whatever the client claimed.
+SKIPPED_REQUEST_HEADERS = HOP_BY_HOP_HEADERS | {
+    b"host",
+    b"content-length",
+    b"x-api-key",
+    b"x-forwarded-proto",
+    b"x-forwarded-host",
+}
+
+# The proxied body is re-framed and already decoded by httpx.
+SKIPPED_RESPONSE_HEADERS = HOP_BY_HOP_HEADERS | {b"content-length", b"content-encoding"}
+
+
+def _connection_tokens(raw_headers) -> frozenset[bytes] | None:
+    tokens = None
+    for name, value in raw_headers:
+        if name.lower() == b"connection":
+            if tokens is None:
+                tokens = set()
+            tokens.update(token.strip().lower() for token in value.split(b","))
+    return frozenset(tokens) if tokens else None
+
+
+def _filter(raw_headers, skipped: frozenset[bytes]) -> list[tuple[bytes, bytes]]:
+    nominated = _connection_tokens(raw_headers)
+    if nominated:
+        skipped = skipped | nominated
+    return [(name, value) for name, value in raw_headers if name.lower() not in skipped]
+
+
+def _forwarded_node(host: str) -> str:
+    # RFC 7239: IPv6 addresses are bracketed and the node quoted.
+    return f'"[{host}]"' if ":" in host else host
+
+
+def forward_request_headers(scope) -> list[tuple[bytes, bytes]]:
+    """Headers to send upstream for the request described by an ASGI ``scope``.
+
+    Drops hop-by-hop and gateway-only headers. ``X-Forwarded-For`` and
+    ``Forwarded`` extend any values set by proxies in front of the gateway;
+    ``X-Forwarded-Proto`` and ``X-Forwarded-Host`` are replaced with what the
+    gateway itself saw.
+    """
+    raw_headers = scope["headers"]
+    headers = []
+    host = b""
+    prior_xff = b""
+    prior_forwarded = b""
+    nominated = _connection_tokens(raw_headers)
+    skipped = SKIPPED_REQUEST_HEADERS | nominated if nominated else SKIPPED_REQUEST_HEADERS
+
+    for name, value in raw_headers:
+        if name == b"host":
+            host = value
+        elif name == b"x-forwarded-for":
+            prior_xff = prior_xff + b", " + value if prior_xff else value
+            continue
+        elif name == b"forwarded":
+            prior_forwarded = prior_forwarded + b", " + value if prior_forwarded else value
+            continue
+        if name not in skipped:
+            headers.append((name, value))
+
+    client = scope.get("client")
+    client_host = client[0] if client else "unknown"
+    scheme = scope.get("scheme", "http")
+
+    xff = client_host.encode("latin-1")
+    headers.append((b"x-forwarded-for", prior_xff + b", " + xff if prior_xff else xff))
+    headers.append((b"x-forwarded-proto", scheme.encode("latin-1")))
+    if host:
+        headers.append((b"x-forwarded-host", host))
+
+    forwarded = f"for={_forwarded_node(client_host)};proto={scheme}".encode("latin-1")
+    if host:
+        forwarded += b';host="' + host + b'"'
+    headers.append((b"forwarded", prior_forwarded + b", " + forwarded if prior_forwarded else forwarded))
+    return headers
+
+
+def forward_response_headers(raw_headers) -> list[tuple[bytes, bytes]]:
+    """ASGI response headers from an upstream's raw header list.
+
+    Names are lowercased as ASGI requires; repeated headers such as
+    ``Set-Cookie`` are kept as separate entries.
+    """
+    return [(name.lower(), value) for name, value in _filter(raw_headers, SKIPPED_RESPONSE_HEADERS)]
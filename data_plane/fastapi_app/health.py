@@ -0,0 +1,26 @@
+"""Liveness and readiness probes.
+
+``/healthz`` answers as soon as the worker is serving. ``/readyz`` answers
+``503`` until the worker has finished warming up (see ``warmup``) and while
+its database is disconnected, so load balancers only send it traffic once it
+can serve it quickly.
+"""
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+router = APIRouter()
+
+
+@router.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readyz(request: Request):
+    services = request.app.state.services
+    if not services.ready.is_set():
+        return JSONResponse({"status": "warming up"}, status_code=503)
+    if not services.database.is_connected:
+        return JSONResponse({"status": "database unavailable"}, status_code=503)
+    return {"status": "ready"}
@@ -0,0 +1,241 @@
+"""Replaying responses to retried requests that carry an ``Idempotency-Key``.
+
+For APIs with an ``idempotency_ttl``, a POST, PUT, PATCH or DELETE with an
+``Idempotency-Key`` header reaches the upstream once per key: the first
+request claims the key in Redis, and its response (status, headers and body
+up to ``max_body`` bytes) is stored under it for ``idempotency_ttl``
+seconds. Repeats get the stored response, marked ``Idempotent-Replayed:
+true``. A repeat that arrives while the first request is still in flight
+waits for it, for up to ``wait`` seconds (then 409), instead of sending the
+request again; in the same worker it waits on the request itself, otherwise
+it polls Redis.
+
+Keys are scoped to the API key or client that sent them, and tied to the
+request's method, path, query and body: reusing one for a different request
+is a 422. Responses that aren't stored (5xx, or bodies over ``max_body``)
+release the key, so a retry goes upstream again; so does a failed request.
+Records are plain strings under ``idempotency:*``, on the node the key
+hashes to; they aren't moved when Redis nodes are added, so a retry may then
+reach the upstream again. While that node is down requests go through
+without idempotency.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import secrets
+from dataclasses import dataclass, field
+
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+UNSAFE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+MAX_KEY_LENGTH = 255
+# How long a claim outlives a worker that died holding it.
+PENDING_TTL = 60
+REPLAYED_HEADER = (b"idempotent-replayed", b"true")
+
+# Deletes a claim only if it is still the one this request made.
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+@dataclass
+class StoredResponse:
+    status: int
+    headers: list[tuple[bytes, bytes]]
+    body: bytes
+
+
+@dataclass
+class Claim:
+    redis_key: str
+    node: str
+    marker: str
+    fingerprint: str
+    ttl: int
+    waiters: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+    @property
+    def finished(self) -> bool:
+        return self.waiters.done()
+
+
+async def fingerprint(method: str, target: str, body) -> str:
+    """Hash of what makes two requests the same one; ``body`` is a
+    ``SpooledBody``, read from memory or disk."""
+    digest = hashlib.sha256(f"{method} {target}\n".encode("latin-1", "replace"))
+    async for chunk in body:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode(response: StoredResponse, request_fingerprint: str) -> str:
+    return json.dumps({
+        "fingerprint": request_fingerprint,
+        "status": response.status,
+        "headers": [[name.decode("latin-1"), value.decode("latin-1")] for name, value in response.headers],
+        "body": base64.b64encode(response.body).decode("ascii"),
+    }, separators=(",", ":"))
+
+
+def _decode(record: dict) -> StoredResponse:
+    return StoredResponse(
+        status=record["status"],
+        headers=[(name.encode("latin-1"), value.encode("latin-1")) for name, value in record["headers"]],
+        body=base64.b64decode(record["body"]),
+    )
+
+
+class IdempotencyStore:
+    def __init__(
+        self,
+        redis_client,
+        counters,
+        metrics,
+        max_body: int = 1024 * 1024,
+        wait: float = 10.0,
+        timeout: float = 1.0,
+        poll_interval: float = 0.05,
+    ):
+        self.redis = redis_client
+        self.counters = counters
+        self.metrics = metrics
+        self.max_body = max_body
+        self.wait = wait
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        # Claims held by this worker's requests, for duplicates to wait on.
+        self._claims: dict[str, Claim] = {}
+        self._release_scripts: dict[str, object] = {}
+
+        metrics.describe(
+            "gateway_idempotency_requests_total",
+            "Requests with an Idempotency-Key, by outcome: stored, replayed, not_stored, conflict, mismatch, "
+            "unavailable.",
+        )
+        metrics.describe("gateway_idempotency_stored_bytes_total", "Response bytes stored for replay.")
+        metrics.gauge("gateway_idempotency_in_flight", lambda: len(self._claims),
+                      "Idempotency keys claimed by requests still in flight in this worker.")
+
+    @staticmethod
+    def applies(api, method: str, idempotency_key: str | None) -> bool:
+        return bool(idempotency_key) and method in UNSAFE_METHODS and bool(api["idempotency_ttl"])
+
+    async def begin(
+        self, auth, idempotency_key: str, method: str, target: str, body
+    ) -> tuple[Claim | None, StoredResponse | None]:
+        """Claim ``idempotency_key`` for this request, or get the response
+        stored under it (waiting while another request holds it).
+
+        Returns ``(claim, None)`` to go upstream and then ``complete`` or
+        ``release`` the claim, ``(None, response)`` to replay, or ``(None,
+        None)`` to go upstream without idempotency (Redis unavailable).
+        """
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail="Idempotency-Key too long")
+        key_hash = hashlib.sha256(idempotency_key.encode("utf-8", "replace")).hexdigest()[:32]
+        redis_key = f"idempotency:{auth.tenant['id']}:{auth.subject}:{key_hash}"
+        node = self.redis.node_name_for_key(redis_key)
+        if not self.counters.is_up(node):
+            self._count("unavailable")
+            return None, None
+        request_fingerprint = await fingerprint(method, target, body)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait
+        delay = self.poll_interval
+        try:
+            while True:
+                marker = json.dumps({"fingerprint": request_fingerprint, "token": secrets.token_hex(8)})
+                client = self.redis.clients[node]
+                if await asyncio.wait_for(client.set(redis_key, marker, nx=True, ex=PENDING_TTL), self.timeout):
+                    claim = Claim(redis_key, node, marker, request_fingerprint, auth.api["idempotency_ttl"])
+                    self._claims[redis_key] = claim
+                    return claim, None
+
+                raw = await asyncio.wait_for(client.get(redis_key), self.timeout)
+                record = json.loads(raw) if raw else None
+                if record is not None:
+                    if record["fingerprint"] != request_fingerprint:
+                        self._count("mismatch")
+                        raise HTTPException(
+                            status_code=422, detail="Idempotency-Key was used for a different request"
+                        )
+                    if "status" in record:
+                        self._count("replayed")
+                        return None, _decode(record)
+
+                # In flight (or released just now): wait for it, then look again.
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self._count("conflict")
+                    raise HTTPException(
+                        status_code=409,
+                        detail="A request with this Idempotency-Key is in progress",
+                        headers={"Retry-After": "1"},
+                    )
+                local = self._claims.get(redis_key)
+                if local is not None:
+                    try:
+                        await asyncio.wait_for(asyncio.shield(local.waiters), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    await asyncio.sleep(min(delay, remaining))
+                    delay = min(delay * 2, 0.5)
+        except (RedisError, OSError, asyncio.TimeoutError, ValueError) as exc:
+            logger.warning(f"Idempotency store unavailable, sending the request without it: {exc!r}")
+            self._count("unavailable")
+            return None, None
+
+    async def complete(self, claim: Claim, response: StoredResponse) -> None:
+        """Store ``response`` for the claimed key, or release the key if it
+        shouldn't be replayed."""
+        if response.status >= 500 or len(response.body) > self.max_body:
+            self._count("not_stored")
+            await self.release(claim)
+            return
+        try:
+            record = _encode(response, claim.fingerprint)
+            await asyncio.wait_for(
+                self.redis.clients[claim.node].set(claim.redis_key, record, ex=claim.ttl), self.timeout
+            )
+        except (RedisError, OSError, asyncio.TimeoutError) as exc:
+            logger.warning(f"Storing an idempotent response failed: {exc!r}")
+            self._count("unavailable")
+            self._finish(claim)
+            return
+        self._count("stored")
+        self.metrics.inc("gateway_idempotency_stored_bytes_total", len(record))
+        self._finish(claim)
+
+    async def release(self, claim: Claim) -> None:
+        """Give the key up without a response, so a retry goes upstream."""
+        try:
+            script = self._release_scripts.get(claim.node)
+            if script is None:
+                script = self._release_scripts[claim.node] = self.redis.clients[claim.node].register_script(
+                    RELEASE_SCRIPT
+                )
+            await asyncio.wait_for(script(keys=[claim.redis_key], args=[claim.marker]), self.timeout)
+        except (RedisError, OSError, asyncio.TimeoutError) as exc:
+            # It expires after PENDING_TTL; duplicates wait until then.
+            logger.warning(f"Releasing an idempotency key failed: {exc!r}")
+        self._finish(claim)
+
+    def _finish(self, claim: Claim) -> None:
+        if self._claims.get(claim.redis_key) is claim:
+            del self._claims[claim.redis_key]
+        if not claim.waiters.done():
+            claim.waiters.set_result(None)
+
+    def _count(self, result: str) -> None:
+        self.metrics.inc("gateway_idempotency_requests_total", result=result)
@@ -0,0 +1,263 @@
+"""A read-only, memory-mapped index of every API key, shared by all workers.
+
+Caching millions of key rows as Python objects costs about a kilobyte each
+per worker. This index stores them in one file of fixed-width columns:
+
+* a 32-byte header: magic, key count, build time (``time.time()``);
+* the SHA-256 digests of ``apis_apikey.hashed_key``, sorted, 32 bytes each;
+* parallel int64 columns of key, tenant and plan IDs, and one byte per key
+  for ``is_active``;
+* a fan-out table of 65,537 uint32 offsets by the digest's first two bytes,
+  so a lookup only searches the few digests sharing that prefix.
+
+That is 57 bytes per key plus 256 KiB. Workers ``mmap`` the file read-only,
+so the kernel keeps one copy of its pages for all of them.
+
+The index is a snapshot. ``ConfigCache`` stops trusting it for a tenant as
+soon as a change to that tenant's keys is announced, and looks its keys up
+in the database until the next build; keys created since the build are not
+in it and are looked up the same way. Announcements can be missed (a worker
+restarted after one, or Redis was down), so an index older than
+``GATEWAY_KEY_INDEX_MAX_AGE`` is not used at all, and workers rebuild it
+once it is half that old: whichever worker takes ``<path>.lock`` first
+rebuilds it, the others wait for the new file. It can also be rebuilt with::
+
+    python -m data_plane.fastapi_app.key_index /var/lib/gateway/keys.idx
+
+which writes a new file and renames it over the old one; running workers
+pick it up within ``GATEWAY_KEY_INDEX_RELOAD`` seconds.
+"""
+import argparse
+import asyncio
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import time
+from array import array
+
+from .tables import apis_apikey
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"GWKEYS01"
+HEADER = struct.Struct("<8sQd8x")
+DIGEST_SIZE = 32
+FANOUT_SIZE = 65537
+
+
+class KeyIndex:
+    def __init__(self, buffer, path: str | None = None):
+        magic, count, built_at = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path or 'buffer'} is not a key index")
+        self.path = path
+        self.built_at = built_at
+        self._buffer = buffer
+        self._count = count
+        offset = HEADER.size
+        self._digests_offset = offset
+        offset += count * DIGEST_SIZE
+        view = memoryview(buffer)
+        columns = []
+        for fmt, width, length in (("q", 8, count), ("q", 8, count), ("q", 8, count), ("I", 4, FANOUT_SIZE)):
+            column = view[offset:offset + width * length].cast(fmt)
+            columns.append(column)
+            offset += width * length
+        self._ids, self._tenant_ids, self._plan_ids, self._fanout = columns
+        self._active = view[offset:offset + count]
+        self._views = [view, *columns, self._active]
+
+    @classmethod
+    def open(cls, path: str) -> "KeyIndex":
+        with open(path, "rb") as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, path)
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._buffer)
+
+    def get(self, hashed_key: str) -> dict | None:
+        """The key's row (the ``apis_apikey`` columns the gateway reads), or None."""
+        try:
+            digest = bytes.fromhex(hashed_key)
+        except ValueError:
+            return None
+        if len(digest) != DIGEST_SIZE:
+            return None
+        prefix = (digest[0] << 8) | digest[1]
+        base = self._digests_offset
+        end = base + self._fanout[prefix + 1] * DIGEST_SIZE
+        # Digests are uniformly spread, so the bucket holds about count / 65536
+        # of them: one C-level search of it beats a binary search in Python.
+        found = self._buffer.find(digest, base + self._fanout[prefix] * DIGEST_SIZE, end)
+        while found != -1 and (found - base) % DIGEST_SIZE:
+            found = self._buffer.find(digest, found + 1, end)
+        if found == -1:
+            return None
+        position = (found - base) // DIGEST_SIZE
+        return {
+            "id": self._ids[position],
+            "tenant_id": self._tenant_ids[position],
+            "plan_id": self._plan_ids[position],
+            "hashed_key": hashed_key,
+            "is_active": bool(self._active[position]),
+        }
+
+    def close(self) -> None:
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+
+class KeyIndexWriter:
+    """Collects keys in ascending ``hashed_key`` order, then writes the index."""
+
+    def __init__(self):
+        self.digests = bytearray()
+        self.ids, self.tenant_ids, self.plan_ids = array("q"), array("q"), array("q")
+        self.active = bytearray()
+        self.fanout = array("I", bytes(4 * FANOUT_SIZE))
+        self._previous = b""
+
+    def add(self, hashed_key: str, key_id: int, tenant_id: int, plan_id: int, is_active: bool) -> None:
+        digest = bytes.fromhex(hashed_key)
+        if len(digest) != DIGEST_SIZE or digest <= self._previous:
+            raise ValueError(f"Key digests must be unique SHA-256 hex in ascending order, got {hashed_key!r}")
+        self._previous = digest
+        self.digests += digest
+        self.ids.append(key_id)
+        self.tenant_ids.append(tenant_id)
+        self.plan_ids.append(plan_id)
+        self.active.append(1 if is_active else 0)
+        self.fanout[((digest[0] << 8) | digest[1]) + 1] += 1
+
+    def write(self, path: str, built_at: float | None = None) -> int:
+        """Write the index to ``path`` atomically; returns the key count."""
+        fanout = array("I", self.fanout)
+        for prefix in range(1, FANOUT_SIZE):
+            fanout[prefix] += fanout[prefix - 1]
+        count = len(self.ids)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(HEADER.pack(MAGIC, count, time.time() if built_at is None else built_at))
+            file.write(self.digests)
+            for column in (self.ids, self.tenant_ids, self.plan_ids, fanout):
+                column.tofile(file)
+            file.write(self.active)
+        os.replace(temporary, path)
+        return count
+
+
+def write_key_index(rows, path: str, built_at: float | None = None) -> int:
+    """Write ``(hashed_key, id, tenant_id, plan_id, is_active)`` rows, sorted
+    by ``hashed_key``, to ``path``; returns the key count."""
+    writer = KeyIndexWriter()
+    for row in rows:
+        writer.add(*row)
+    return writer.write(path, built_at)
+
+
+async def build_key_index(database, path: str) -> int:
+    """Snapshot every key in ``database`` into the index at ``path``."""
+    built_at = time.time()
+    writer = KeyIndexWriter()
+    # The control plane stores lowercase hex, which sorts like the digests.
+    query = apis_apikey.select().order_by(apis_apikey.c.hashed_key)
+    async for row in database.iterate(query):
+        writer.add(row["hashed_key"], row["id"], row["tenant_id"], row["plan_id"], row["is_active"])
+    return writer.write(path, built_at)
+
+
+def built_at(path: str) -> float:
+    """When the index at ``path`` was built, or 0 if there is none."""
+    try:
+        with open(path, "rb") as file:
+            magic, _, built = HEADER.unpack(file.read(HEADER.size))
+    except (OSError, struct.error):
+        return 0.0
+    return built if magic == MAGIC else 0.0
+
+
+async def refresh_key_index(path: str, max_age: float) -> bool:
+    """Rebuild the index at ``path`` if it is older than ``max_age`` seconds
+    and no other process is rebuilding it; returns whether this one did."""
+    with open(f"{path}.lock", "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        # Another worker may have rebuilt it just before the lock was free.
+        if time.time() - built_at(path) <= max_age:
+            return False
+        started = time.monotonic()
+        # On its own connection and loop, so requests keep being served.
+        try:
+            count = await asyncio.to_thread(asyncio.run, build_key_index_file(path))
+        except Exception as exc:
+            logger.warning(f"Could not rebuild the key index at {path}: {exc!r}")
+            return False
+        logger.info(f"Rebuilt the key index at {path}: {count} keys in {time.monotonic() - started:.1f}s")
+        return True
+
+
+async def watch_key_index(cache, path: str, interval: float, max_age: float = 0) -> None:
+    """Swap in a rebuilt index whenever the file at ``path`` is replaced, and
+    rebuild it once it is half ``max_age`` old."""
+    current = None
+    failing = False
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if max_age and time.time() - built_at(path) > max_age / 2:
+                await refresh_key_index(path, max_age / 2)
+            stat = os.stat(path)
+            if (stat.st_ino, stat.st_mtime_ns) == current:
+                continue
+            index = KeyIndex.open(path)
+        except (OSError, ValueError) as exc:
+            if not failing:
+                logger.warning(f"Could not reload the key index at {path}: {exc!r}")
+            failing = True
+            continue
+        failing = False
+        current = (stat.st_ino, stat.st_mtime_ns)
+        if cache.key_index is not None and index.built_at == cache.key_index.built_at:
+            index.close()
+            continue
+        cache.use_key_index(index)
+        logger.info(f"Loaded {len(index)} keys from {path}")
+
+
+async def build_key_index_file(path: str) -> int:
+    """``build_key_index`` from a fresh connection to ``DATABASE_URL``."""
+    from databases import Database
+
+    from .config import get_database_url
+
+    database = Database(get_database_url())
+    await database.connect()
+    try:
+        return await build_key_index(database, path)
+    finally:
+        await database.disconnect()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build the gateway's API key index from DATABASE_URL.")
+    parser.add_argument("path", help="Index file to (re)write.")
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    count = asyncio.run(build_key_index_file(args.path))
+    print(f"Indexed {count} keys into {args.path} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
+import asyncio
 import logging
+import os
 from contextlib import asynccontextmanager
 
 import httpx
@@ -6,8 +8,68 @@ from databases import Database
 from fastapi import FastAPI
 import redis.asyncio as redis
 
-from .config import get_database_url, get_redis_url
+from .bodies import BodyLimits
+from .concurrency import (
+    AdaptiveConcurrencyLimiter,
+    ConcurrencyControl,
+    FairScheduler,
+    KeyedConcurrencyLimiter,
+)
+from .config import (
+    get_adaptive_concurrency_enabled,
+    get_admin_token,
+    get_adaptive_concurrency_limits,
+    get_api_max_in_flight,
+    get_body_spool_threshold,
+    get_config_cache_ttl,
+    get_config_channel,
+    get_database_url,
+    get_dns_cache_enabled,
+    get_dns_nameservers,
+    get_dns_ttl_bounds,
+    get_events_batch_size,
+    get_events_buffer,
+    get_events_enabled,
+    get_events_max_len,
+    get_events_stream,
+    get_idempotency_max_body,
+    get_idempotency_wait,
+    get_in_flight_queue_size,
+    get_in_flight_queue_timeout,
+    get_key_index_max_age,
+    get_key_index_path,
+    get_key_index_reload_interval,
+    get_max_request_body,
+    get_redis_failure_threshold,
+    get_redis_probe_interval,
+    get_redis_startup_fallback,
+    get_redis_timeout,
+    get_redis_urls,
+    get_routes_reload_interval,
+    get_scheduler_capacity,
+    get_scheduler_queue_size,
+    get_slow_callback_threshold,
+    get_tenant_max_in_flight,
+    get_upstream_max_connections,
+    get_upstream_retries,
+    get_warmup_connections,
+    get_warmup_mode,
+    get_warmup_timeout,
+    get_warmup_top,
+    get_worker_count,
+)
+from .config_cache import ConfigCache, listen_for_changes
+from .counters import Counters
+from .events import EventRecorder
+from .idempotency import IdempotencyStore
+from .key_index import KeyIndex, build_key_index, watch_key_index
+from .metrics import Metrics
+from .profiling import Profiler
+from .resolver import CachedDNSTransport, DNSCache, build_resolver
+from .routing import RoutingTable, reload_routes
+from .sharding import ShardedRedis
 from .state import AppState
+from .warmup import warm_up
 
 logger = logging.getLogger(__name__)
 
@@ -20,28 +82,175 @@ async def lifespan(app: FastAPI):
     database = Database(database_url)
     await database.connect()
 
-    http_client = httpx.AsyncClient()
+    metrics = Metrics()
 
-    redis_url = get_redis_url()
+    redis_urls = get_redis_urls()
+    redis_client = ShardedRedis.from_urls(redis_urls, decode_responses=True)
+    redis_down = False
     try:
-        client = redis.from_url(redis_url, decode_responses=True)
-        await client.ping()
-        logger.info(f"Connected to Redis at {redis_url}")
-        redis_client = client
-    except (redis.ConnectionError, OSError, ConnectionRefusedError) as e:
-        logger.warning(f"Redis not available ({e}), falling back to fakeredis")
-        import fakeredis.aioredis
+        await asyncio.wait_for(redis_client.ping(), max(get_redis_timeout(), 1.0))
+        logger.info(f"Connected to Redis at {', '.join(redis_urls)}")
+    except (redis.RedisError, OSError, asyncio.TimeoutError) as e:
+        if get_redis_startup_fallback() == "local":
+            logger.warning(f"Redis not available ({e}), counting locally until it recovers")
+            redis_down = True
+        else:
+            logger.warning(f"Redis not available ({e}), falling back to fakeredis")
+            import fakeredis.aioredis
 
-        redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+            await redis_client.close()
+            redis_client = ShardedRedis({"fakeredis": fakeredis.aioredis.FakeRedis(decode_responses=True)})
+
+    counters = Counters(
+        redis_client,
+        metrics,
+        workers=get_worker_count(),
+        timeout=get_redis_timeout(),
+        failure_threshold=get_redis_failure_threshold(),
+        probe_interval=get_redis_probe_interval(),
+    )
+    if redis_down:
+        for name in redis_client.clients:
+            counters.mark_down(name)
+    await counters.start()
+
+    # Request events go to the first node's stream, where the control plane reads them.
+    events = EventRecorder(
+        next(iter(redis_client.clients.values())),
+        metrics,
+        stream=get_events_stream(),
+        max_len=get_events_max_len(),
+        batch_size=get_events_batch_size(),
+        max_buffer=get_events_buffer(),
+        enabled=get_events_enabled(),
+    )
+    await events.start()
+
+    limits = httpx.Limits(max_connections=get_upstream_max_connections(), max_keepalive_connections=100)
+    dns_cache = None
+    if get_dns_cache_enabled():
+        min_ttl, max_ttl, stale_ttl = get_dns_ttl_bounds()
+        dns_cache = DNSCache(
+            build_resolver(get_dns_nameservers()),
+            metrics,
+            min_ttl=min_ttl,
+            max_ttl=max_ttl,
+            stale_ttl=stale_ttl,
+        )
+        http_client = httpx.AsyncClient(transport=CachedDNSTransport(dns_cache, limits))
+    else:
+        http_client = httpx.AsyncClient(limits=limits)
+
+    initial_limit, min_limit, max_limit = get_adaptive_concurrency_limits()
+    queue_size = get_in_flight_queue_size()
+    queue_timeout = get_in_flight_queue_timeout()
+    concurrency = ConcurrencyControl(
+        metrics,
+        adaptive=AdaptiveConcurrencyLimiter(
+            metrics,
+            initial_limit=initial_limit,
+            min_limit=min_limit,
+            max_limit=max_limit,
+            enabled=get_adaptive_concurrency_enabled(),
+        ),
+        tenants=KeyedConcurrencyLimiter("tenant", get_tenant_max_in_flight(), queue_size, queue_timeout, metrics),
+        apis=KeyedConcurrencyLimiter("api", get_api_max_in_flight(), queue_size, queue_timeout, metrics),
+        scheduler=FairScheduler(get_scheduler_capacity(), get_scheduler_queue_size(), queue_timeout, metrics),
+    )
+
+    key_index_path = get_key_index_path()
+    key_index = await _open_key_index(database, key_index_path) if key_index_path else None
+    config_cache = ConfigCache(
+        database, get_config_cache_ttl(), key_index=key_index, key_index_max_age=get_key_index_max_age()
+    )
+    routes = RoutingTable(database)
+    logger.info(f"Loaded {await routes.load()} routes")
+    # Announced on the first node, like the request event stream.
+    config_listener = asyncio.create_task(
+        listen_for_changes(
+            config_cache, next(iter(redis_client.clients.values())), get_config_channel(), routes=routes
+        )
+    )
+    key_index_watcher = None
+    if key_index_path:
+        key_index_watcher = asyncio.create_task(
+            watch_key_index(config_cache, key_index_path, get_key_index_reload_interval(), get_key_index_max_age())
+        )
+    routes_reloader = None
+    if get_routes_reload_interval() > 0:
+        routes_reloader = asyncio.create_task(reload_routes(routes, get_routes_reload_interval()))
+
+    profiler = Profiler(get_admin_token(), metrics, slow_callback=get_slow_callback_threshold())
+    profiler.start()
 
-    app.state.services = AppState(database=database, http_client=http_client, redis_client=redis_client)
+    app.state.services = AppState(
+        database=database,
+        http_client=http_client,
+        redis_client=redis_client,
+        counters=counters,
+        events=events,
+        metrics=metrics,
+        concurrency=concurrency,
+        body_limits=BodyLimits(get_max_request_body(), get_body_spool_threshold()),
+        upstream_retries=get_upstream_retries(),
+        config_cache=config_cache,
+        routes=routes,
+        idempotency=IdempotencyStore(
+            redis_client, counters, metrics, max_body=get_idempotency_max_body(), wait=get_idempotency_wait()
+        ),
+        profiler=profiler,
+        ready=asyncio.Event(),
+    )
+    warmup_task = asyncio.create_task(_warm_up(app.state.services))
 
     try:
         yield
     finally:
+        background = [
+            task for task in (warmup_task, config_listener, key_index_watcher, routes_reloader) if task is not None
+        ]
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        await profiler.aclose()
+        if config_cache.key_index is not None:
+            config_cache.key_index.close()
         await database.disconnect()
+        await events.aclose()
+        await counters.aclose()
         try:
             await redis_client.close()
         except Exception:
             pass
         await http_client.aclose()
+        if dns_cache is not None:
+            await dns_cache.aclose()
+
+
+async def _open_key_index(database, path: str) -> KeyIndex | None:
+    try:
+        if not os.path.exists(path):
+            # The server builds it before starting workers; this covers
+            # running the app under plain uvicorn.
+            await build_key_index(database, path)
+        index = KeyIndex.open(path)
+    except (OSError, ValueError) as exc:
+        logger.warning(f"Key index at {path} unavailable ({exc!r}), looking keys up in the database")
+        return None
+    logger.info(f"Loaded {len(index)} keys from {path}")
+    return index
+
+
+async def _warm_up(services: AppState) -> None:
+    mode = get_warmup_mode()
+    try:
+        if mode != "off":
+            await asyncio.wait_for(
+                warm_up(services, mode, get_warmup_top(), get_warmup_connections()),
+                get_warmup_timeout(),
+            )
+    except asyncio.TimeoutError:
+        logger.warning("Warm-up timed out, serving anyway")
+    except Exception as exc:
+        logger.warning(f"Warm-up failed ({exc!r}), serving anyway")
+    services.ready.set()
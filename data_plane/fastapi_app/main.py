@@ -2,15 +2,27 @@ import logging
 
 from fastapi import FastAPI
 
+from .config import get_fast_path_enabled
+from .fast_path import ProxyFastPathMiddleware
+from .health import router as health_router
 from .lifespan import lifespan
+from .metrics import router as metrics_router
+from .profiling import router as profiling_router
 from .proxy import router as proxy_router
+from .websocket import router as websocket_router
 
 logging.basicConfig(level=logging.INFO)
 
 
 def create_app() -> FastAPI:
     app = FastAPI(lifespan=lifespan)
+    app.include_router(health_router)
+    app.include_router(metrics_router)
+    app.include_router(profiling_router)
     app.include_router(proxy_router)
+    app.include_router(websocket_router)
+    if get_fast_path_enabled():
+        app.add_middleware(ProxyFastPathMiddleware)
     return app
 
 
@@ -0,0 +1,71 @@
+"""In-process metrics, exposed in Prometheus text format at ``GET /metrics``.
+
+Each worker keeps its own counters; scrape every worker (or sum the series)
+when running more than one.
+"""
+from collections import defaultdict
+
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+
+router = APIRouter()
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class Metrics:
+    def __init__(self):
+        self._counters: dict[str, dict[tuple, float]] = defaultdict(lambda: defaultdict(float))
+        self._gauges: dict[str, object] = {}
+        self._help: dict[str, str] = {}
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        self._counters[name][_labels(labels)] += amount
+
+    def counter(self, name: str, **labels) -> float:
+        return self._counters[name][_labels(labels)]
+
+    def gauge(self, name: str, callback, help_text: str = "") -> None:
+        """Register ``callback`` to be read at scrape time.
+
+        It returns a number, or a list of ``(labels_dict, number)`` pairs.
+        """
+        self._gauges[name] = callback
+        if help_text:
+            self._help[name] = help_text
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def render(self) -> str:
+        lines = []
+        for name in sorted(self._counters):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(self._counters[name].items()):
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for name in sorted(self._gauges):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} gauge")
+            value = self._gauges[name]()
+            if isinstance(value, list):
+                for labels, sample in value:
+                    lines.append(f"{name}{_format_labels(_labels(labels))} {sample:g}")
+            else:
+                lines.append(f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+@router.get("/metrics")
+async def metrics_endpoint(request: Request):
+    return PlainTextResponse(request.app.state.services.metrics.render())
@@ -0,0 +1,266 @@
+"""Profiling a live worker: stack sampling, per-request stage timings and
+event-loop stall detection.
+
+* ``POST /admin/profile?seconds=10&interval=0.01``, with ``Authorization:
+  Bearer <GATEWAY_ADMIN_TOKEN>``, samples the event loop thread's stack every
+  ``interval`` seconds for ``seconds`` (up to ``MAX_SECONDS``) from a
+  background thread while the worker keeps serving, and answers with folded
+  stacks (``frame;frame;frame count`` per line), the input of
+  ``flamegraph.pl``, speedscope or inferno. One profile runs per worker at a
+  time; ``X-Gateway-Worker`` names the worker that answered. Samples taken
+  while the loop waits for I/O end in the selector, so the profile shows how
+  busy the worker was too.
+* A proxied request with ``X-Gateway-Profile: <expires>.<signature>`` (an
+  HMAC of the expiry under the admin token; ``python -m
+  data_plane.fastapi_app.profiling sign --ttl 300`` makes one) gets a
+  ``Server-Timing`` header with the time each stage of the hot path took,
+  which is logged as well. Other requests pay a no-op call per stage.
+* A heartbeat task runs on the loop every ``tick`` and a watchdog thread
+  checks on it: when the loop has been held for more than
+  ``GATEWAY_SLOW_CALLBACK`` seconds, the watchdog logs the loop thread's
+  stack and current task, that is, the coroutine blocking it, and the
+  heartbeat logs how long the stall lasted once the loop is back.
+
+Without ``GATEWAY_ADMIN_TOKEN`` the endpoint answers 404 and profile headers
+are ignored.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+MAX_SECONDS = 60.0
+PROFILE_HEADER = b"x-gateway-profile"
+
+
+def sign(token: str, expires: int) -> str:
+    """An ``X-Gateway-Profile`` value valid until ``expires`` (Unix time)."""
+    signature = hmac.new(token.encode(), str(expires).encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def verify(token: str, value: str) -> bool:
+    expires, _, _ = value.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(sign(token, int(expires)), value)
+
+
+class RequestProfile:
+    """Time between successive ``mark`` calls, one per stage of a request."""
+
+    __slots__ = ("started", "last", "stages")
+
+    def __init__(self):
+        self.started = self.last = time.perf_counter()
+        self.stages: list[tuple[str, float]] = []
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def finish(self, headers: list, label: str) -> None:
+        """Append the ``Server-Timing`` header to ``headers`` and log it."""
+        timings = [*self.stages, ("total", self.last - self.started)]
+        value = ", ".join(f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in timings)
+        headers.append((b"server-timing", value.encode("latin-1")))
+        logger.info(f"Profiled {label}: {value}")
+
+
+class _NoProfile:
+    __slots__ = ()
+
+    def mark(self, stage: str) -> None:
+        pass
+
+    def finish(self, headers: list, label: str) -> None:
+        pass
+
+
+NO_PROFILE = _NoProfile()
+
+
+def _source(filename: str) -> str:
+    """``filename`` relative to the ``sys.path`` entry it was imported from."""
+    best = ""
+    for entry in sys.path:
+        if entry and filename.startswith(entry.rstrip(os.sep) + os.sep) and len(entry) > len(best):
+            best = entry.rstrip(os.sep) + os.sep
+    return filename[len(best):]
+
+
+def _fold(frame, labels: dict) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        label = labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            label = labels[code] = f"{name} ({_source(code.co_filename)}:{code.co_firstlineno})"
+        names.append(label)
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+def _sample(thread_id: int, interval: float, stop: threading.Event, stacks: Counter) -> None:
+    labels: dict = {}
+    while not stop.wait(interval):
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            stacks[_fold(frame, labels)] += 1
+
+
+class LoopMonitor:
+    def __init__(self, metrics, slow_callback: float, tick: float = 0.05):
+        self.metrics = metrics
+        self.slow_callback = slow_callback
+        self.tick = min(tick, slow_callback / 2)
+        self.lag = 0.0
+        self._beat = time.monotonic()
+        self._reported = False
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._stop = threading.Event()
+        self._watchdog: threading.Thread | None = None
+
+        metrics.describe("gateway_event_loop_stalls_total", "Times the event loop was held longer than GATEWAY_SLOW_CALLBACK.")
+        metrics.describe("gateway_event_loop_lag_seconds_total", "Total time the loop ran its heartbeat late.")
+        metrics.gauge("gateway_event_loop_lag_seconds", lambda: self.lag, "How late the loop ran its last heartbeat.")
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="gateway-loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def aclose(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            now = time.monotonic()
+            self.lag = max(0.0, now - self._beat - self.tick)
+            self._beat = now
+            if self.lag:
+                self.metrics.inc("gateway_event_loop_lag_seconds_total", self.lag)
+            if self.lag > self.slow_callback:
+                self.metrics.inc("gateway_event_loop_stalls_total")
+                logger.warning(f"Event loop was blocked for {self.lag:.3f}s")
+            self._reported = False
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.tick):
+            if self._reported or time.monotonic() - self._beat - self.tick <= self.slow_callback:
+                continue
+            self._reported = True
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            task = asyncio.current_task(self._loop)
+            stack = "".join(traceback.format_stack(frame))
+            logger.warning(
+                f"Event loop blocked for over {self.slow_callback}s in task {task.get_name() if task else None} "
+                f"({task.get_coro().__qualname__ if task else 'no task'}):\n{stack}"
+            )
+
+
+class Profiler:
+    def __init__(self, token: str | None, metrics, slow_callback: float = 0.1):
+        self.token = token
+        self.monitor = LoopMonitor(metrics, slow_callback) if slow_callback > 0 else None
+        self._sampling = False
+
+    def request_profile(self, header: str | None):
+        """A ``RequestProfile`` if ``header`` is a valid ``X-Gateway-Profile``, else ``NO_PROFILE``."""
+        if header is None or not self.token or not verify(self.token, header):
+            return NO_PROFILE
+        return RequestProfile()
+
+    async def sample(self, seconds: float, interval: float) -> Counter:
+        """Folded stacks of the loop thread, sampled for ``seconds``."""
+        if self._sampling:
+            raise HTTPException(status_code=409, detail="A profile is already running")
+        self._sampling = True
+        stacks: Counter = Counter()
+        stop = threading.Event()
+        sampler = threading.Thread(
+            target=_sample, args=(threading.get_ident(), interval, stop, stacks), name="gateway-profiler", daemon=True
+        )
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            stop.set()
+            await asyncio.to_thread(sampler.join)
+            self._sampling = False
+        return stacks
+
+    def start(self) -> None:
+        if self.monitor is not None:
+            self.monitor.start()
+
+    async def aclose(self) -> None:
+        if self.monitor is not None:
+            await self.monitor.aclose()
+
+
+async def require_admin(request: Request) -> None:
+    token = request.app.state.services.profiler.token
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    expected = f"Bearer {token}".encode()
+    if not hmac.compare_digest(request.headers.get("authorization", "").encode(), expected):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+
+@router.post("/admin/profile", dependencies=[Depends(require_admin)])
+async def profile_endpoint(
+    request: Request,
+    seconds: float = Query(10.0, gt=0, le=MAX_SECONDS),
+    interval: float = Query(0.01, ge=0.001, le=1.0),
+):
+    stacks = await request.app.state.services.profiler.sample(seconds, interval)
+    body = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+    return PlainTextResponse(
+        body, headers={"X-Gateway-Worker": str(os.getpid()), "X-Gateway-Samples": str(sum(stacks.values()))}
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Make an X-Gateway-Profile header value.")
+    parser.add_argument("command", choices=["sign"])
+    parser.add_argument("--ttl", type=int, default=300, help="Seconds the value stays valid.")
+    args = parser.parse_args()
+    token = os.environ.get("GATEWAY_ADMIN_TOKEN")
+    if not token:
+        parser.error("GATEWAY_ADMIN_TOKEN is not set")
+    print(sign(token, int(time.time()) + args.ttl))
+
+
+if __name__ == "__main__":
+    main()
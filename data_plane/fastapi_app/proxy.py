@@ -1,157 +1,364 @@
 import hashlib
 import logging
 import time
+from dataclasses import dataclass
 
 import httpx
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
-from fastapi.responses import Response
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 
+from .bandwidth import ByteMeter, TokenBucket, byte_quotas, shaped
+from .bodies import SpooledBody, read_body
+from .counters import MONTH_TTL, quota_windows
 from .dependencies import get_api_key
-from .tables import apis_api, apis_apikey, apis_client, billing_plan, tenants_tenant
+from .headers import forward_request_headers, forward_response_headers
+from .idempotency import REPLAYED_HEADER, StoredResponse
+from .routing import Route
+from .streaming import (
+    is_event_stream,
+    relay_upstream_response,
+    should_stream,
+    stream_upstream_response,
+    wants_event_stream,
+)
 from .usage import record_usage
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+PROXY_METHODS = ["GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS"]
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+STREAM_TIMEOUT = httpx.Timeout(5.0, read=None)
 
-@router.api_route(
-    "/{tenant_slug}/{api_slug}/{path:path}",
-    methods=["GET", "POST", "PUT", "DELETE", "PATCH", "HEAD", "OPTIONS"],
-)
-async def proxy_request(
-    tenant_slug: str,
-    api_slug: str,
-    path: str,
-    request: Request,
-    background_tasks: BackgroundTasks,
-    api_key: str = Depends(get_api_key),
-):
-    services = request.app.state.services
-    database = services.database
-    http_client = services.http_client
-    redis_client = services.redis_client
 
-    hashed_key = hashlib.sha256(api_key.encode()).hexdigest()
+@dataclass
+class AuthContext:
+    tenant: object
+    api: object
+    plan: object
+    key_id: int | None = None
+    client_id: int | None = None
+
+    @property
+    def subject(self) -> str:
+        """Whom the plan's quotas count: the client, if there is one, else the key."""
+        return f"client:{self.client_id}" if self.client_id else f"key:{self.key_id}"
 
-    # Check Tenant
-    query = tenants_tenant.select().where(
-        (tenants_tenant.c.slug == tenant_slug) & (tenants_tenant.c.is_active == True)
-    )
-    tenant = await database.fetch_one(query)
-    if not tenant:
-        raise HTTPException(status_code=404, detail="Tenant not found")
-
-    # Check API
-    query = apis_api.select().where(
-        (apis_api.c.tenant_id == tenant["id"]) &
-        (apis_api.c.slug == api_slug) &
-        (apis_api.c.is_active == True)
-    )
-    api = await database.fetch_one(query)
-    if not api:
-        raise HTTPException(status_code=404, detail="API not found")
+
+def resolve_route(services, host: str, path: str) -> tuple[Route, str]:
+    """The route for a request's ``Host`` header and path, and the path to
+    send upstream; raises a 404 ``HTTPException`` if there is none."""
+    resolved = services.routes.resolve(host, path)
+    if resolved is None:
+        raise HTTPException(status_code=404, detail=services.routes.not_found_detail(host, path))
+    return resolved
+
+
+async def authorize(services, route: Route, api_key: str, client_id: str | None):
+    """Resolve the key, client and plan for a request to ``route`` and
+    enforce its rate limits.
+
+    Raises ``HTTPException`` with the gateway's status codes and details, so
+    the FastAPI routes and the raw ASGI fast path report identical errors.
+    """
+    config = services.config_cache
+
+    hashed_key = hashlib.sha256(api_key.encode()).hexdigest()
+    tenant = route.tenant
+    api = route.api
 
     # Check API Key
-    query = apis_apikey.select().where(
-        (apis_apikey.c.hashed_key == hashed_key) &
-        (apis_apikey.c.tenant_id == tenant["id"]) &
-        (apis_apikey.c.is_active == True)
-    )
-    key_record = await database.fetch_one(query)
+    key_record = await config.api_key(tenant["id"], hashed_key)
 
     if not key_record:
         raise HTTPException(status_code=403, detail="Invalid or inactive API Key")
 
     # Check for X-Client-ID
-    client_id = request.headers.get("X-Client-ID")
     active_plan = None
     client_record = None
 
     if client_id:
-        query = apis_client.select().where(
-            (apis_client.c.client_id == client_id) &
-            (apis_client.c.tenant_id == tenant["id"])
-        )
-        client_record = await database.fetch_one(query)
+        client_record = await config.client(tenant["id"], client_id)
         if not client_record:
             raise HTTPException(status_code=403, detail="Invalid Client ID")
 
-        query = billing_plan.select().where(billing_plan.c.id == client_record["plan_id"])
-        active_plan = await database.fetch_one(query)
+        active_plan = await config.plan(tenant["id"], client_record["plan_id"])
 
     # Get API Key Plan if no client plan
     if not active_plan:
-        query = billing_plan.select().where(billing_plan.c.id == key_record["plan_id"])
-        active_plan = await database.fetch_one(query)
+        active_plan = await config.plan(tenant["id"], key_record["plan_id"])
 
     if not active_plan or not active_plan["is_active"]:
         raise HTTPException(status_code=403, detail="Plan invalid")
 
+    auth = AuthContext(
+        tenant=tenant,
+        api=api,
+        plan=active_plan,
+        key_id=key_record["id"],
+        client_id=client_record["id"] if client_record else None,
+    )
+
     # Rate Limiting
-    if client_record:
-        rate_limit_key_base = f"rate_limit_client:{client_record['id']}"
-    else:
-        rate_limit_key_base = f"rate_limit:{key_record['id']}"
+    await check_rate_limits(services.counters, tenant, api, auth.subject, active_plan)
+    return auth
+
+
+async def check_rate_limits(counters, tenant, api, subject: str, active_plan) -> None:
+    """Count the request against the plan's limits for ``subject`` (the key
+    or client) and the API's and tenant's own, if they have any.
 
-    # Minute Limit
-    current_minute = int(time.time() // 60)
-    rate_limit_key_min = f"{rate_limit_key_base}:{current_minute}"
+    Every level's minute and month windows are checked and counted by one
+    atomic call on the tenant's Redis node: a request rejected at any level
+    counts against none of them. The plan's byte quotas are only checked
+    there; a ``ByteMeter`` counts the bytes as they pass.
+    """
+    current_minute, current_month = quota_windows()
 
-    request_count_min = await redis_client.incr(rate_limit_key_min)
-    if request_count_min == 1:
-        await redis_client.expire(rate_limit_key_min, 60)
+    limits, details = [], []
+    # Narrowest first, so a key over its own limit is told so.
+    for level, limited, minute_detail, month_detail in (
+        (subject, active_plan, "Rate limit exceeded", "Monthly rate limit exceeded"),
+        (f"api:{api['id']}", api, "API rate limit exceeded", "API monthly rate limit exceeded"),
+        ("tenant", tenant, "Tenant rate limit exceeded", "Tenant monthly rate limit exceeded"),
+    ):
+        key_base = f"quota:{tenant['id']}:{level}"
+        if limited["requests_per_minute"] is not None:
+            limits.append((f"{key_base}:{current_minute}", limited["requests_per_minute"], 60))
+            details.append(minute_detail)
+        if limited["requests_per_month"] is not None:
+            limits.append((f"{key_base}:{current_month}", limited["requests_per_month"], MONTH_TTL))
+            details.append(month_detail)
+        if level == subject:
+            for _, key, limit, _, detail in byte_quotas(key_base, active_plan, current_minute, current_month):
+                limits.append((key, limit, None))
+                details.append(detail)
 
-    if request_count_min > active_plan["requests_per_minute"]:
-        raise HTTPException(status_code=429, detail="Rate limit exceeded")
+    # None also when Redis is down and the plan fails open.
+    exceeded = await counters.admit(limits, policy=active_plan["redis_failure_policy"])
+    if exceeded is not None:
+        raise HTTPException(status_code=429, detail=details[exceeded])
 
-    # Monthly Limit
-    if active_plan["requests_per_month"] is not None:
-        current_time = time.gmtime()
-        current_month_str = f"{current_time.tm_year}-{current_time.tm_mon}"
-        rate_limit_key_month = f"{rate_limit_key_base}:month:{current_month_str}"
 
-        request_count_month = await redis_client.incr(rate_limit_key_month)
-        if request_count_month == 1:
-            await redis_client.expire(rate_limit_key_month, 60 * 60 * 24 * 32)
+def request_target(scope) -> str:
+    """The path and query string, as ``Idempotency-Key`` fingerprints see them."""
+    query_string = scope.get("query_string", b"").decode("latin-1")
+    return f"{scope['path']}?{query_string}" if query_string else scope["path"]
 
-        if request_count_month > active_plan["requests_per_month"]:
-            raise HTTPException(status_code=429, detail="Monthly rate limit exceeded")
 
+def build_upstream_url(api, path: str, query_string: bytes = b"") -> str:
     # Ensure upstream_base_url doesn't have trailing slash and path doesn't have leading slash duplication
     upstream_base = api["upstream_base_url"].rstrip("/")
     target_path = path.lstrip("/")
-    upstream_url = f"{upstream_base}/{target_path}"
+    # The raw query string, so repeated and oddly encoded parameters reach
+    # the upstream exactly as the client sent them.
+    if query_string:
+        return f"{upstream_base}/{target_path}?{query_string.decode('latin-1')}"
+    return f"{upstream_base}/{target_path}"
 
-    # Construct headers
-    headers = dict(request.headers)
-    headers.pop("host", None)
-    headers.pop("content-length", None)
-    headers.pop("x-api-key", None)
 
+def build_upstream_request(
+    http_client: httpx.AsyncClient, method: str, url: str, headers: list, body: SpooledBody, **kwargs
+) -> httpx.Request:
+    if not body.in_memory:
+        # httpx would send a streamed body chunked; many upstreams refuse that.
+        headers.append((b"content-length", str(body.size).encode("latin-1")))
+    return http_client.build_request(method=method, url=url, headers=headers, content=body.content, **kwargs)
+
+
+async def send_upstream(
+    http_client: httpx.AsyncClient, upstream_request: httpx.Request, retries: int, stream: bool = False
+) -> httpx.Response:
+    """Send ``upstream_request``, retrying failures that are safe to retry.
+
+    A failed connect never reached the upstream, so any method is retried; a
+    pooled connection the upstream closed under us only for idempotent ones.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return await http_client.send(upstream_request, stream=stream)
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError) as exc:
+            retryable = (
+                not isinstance(exc, httpx.RemoteProtocolError)
+                or upstream_request.method in IDEMPOTENT_METHODS
+            )
+            if attempt == retries or not retryable:
+                raise
+            logger.warning(f"Retrying upstream request after error: {exc!r}")
+
+
+# Registered last: every path the other routers don't claim is looked up
+# in the routing table.
+@router.api_route(
+    "/{path:path}",
+    methods=PROXY_METHODS,
+)
+async def proxy_request(
+    request: Request,
+    background_tasks: BackgroundTasks,
+):
+    services = request.app.state.services
+    http_client = services.http_client
+    concurrency = services.concurrency
+
+    profile = services.profiler.request_profile(request.headers.get("X-Gateway-Profile"))
+    label = f"{request.method} {request.scope['path']}"
+    concurrency.adaptive.acquire()
+    # When the upstream was sent the request, once it answered.
+    sent_at = None
+    body = None
+    meter = None
+    claim = None
     try:
-        body = await request.body()
-        upstream_response = await http_client.request(
-            method=request.method,
-            url=upstream_url,
-            headers=headers,
-            content=body,
-            params=request.query_params,
-        )
+        route, path = resolve_route(services, request.headers.get("host", ""), request.scope["path"])
+        profile.mark("route")
+        # Checked once the route exists, so unknown paths stay 404s.
+        api_key = await get_api_key(request)
+        auth = await authorize(services, route, api_key, request.headers.get("X-Client-ID"))
+        profile.mark("auth")
+
+        upstream_url = build_upstream_url(auth.api, path, request.scope.get("query_string", b""))
 
-        background_tasks.add_task(record_usage, redis_client, tenant["id"], api["id"])
+        headers = forward_request_headers(request.scope)
 
-        excluded_headers = {"content-encoding", "content-length", "transfer-encoding", "connection"}
-        response_headers = {
-            k: v for k, v in upstream_response.headers.items()
-            if k.lower() not in excluded_headers
-        }
+        # Event streams stay open indefinitely, so don't apply the read timeout.
+        event_stream = wants_event_stream(request.headers)
+        timeout = STREAM_TIMEOUT if event_stream else httpx.USE_CLIENT_DEFAULT
 
-        return Response(
-            content=upstream_response.content,
-            status_code=upstream_response.status_code,
-            headers=response_headers,
+        body = await read_body(
+            request.scope,
+            request.stream(),
+            services.body_limits.limit_for(auth),
+            services.body_limits.spool_threshold,
         )
-    except httpx.RequestError as exc:
-        logger.error(f"Upstream request failed: {exc}")
-        raise HTTPException(status_code=502, detail="Upstream service unavailable")
+        meter = ByteMeter.for_request(services.counters, auth)
+        if meter is not None:
+            meter.add("bytes_in", body.size)
+        bucket = TokenBucket.for_plan(auth.plan)
+        profile.mark("body")
+
+        idempotency_key = request.headers.get("Idempotency-Key")
+        if not event_stream and services.idempotency.applies(auth.api, request.method, idempotency_key):
+            claim, stored = await services.idempotency.begin(
+                auth, idempotency_key, request.method, request_target(request.scope), body
+            )
+            profile.mark("idempotency")
+            if stored is not None:
+                if meter is not None:
+                    meter.add("bytes_out", len(stored.body))
+                    background_tasks.add_task(meter.flush)
+                response = buffered_response(stored.status, [*stored.headers, REPLAYED_HEADER], stored.body, bucket)
+                profile.finish(response.raw_headers, label)
+                return response
+
+        async with concurrency.upstream_slot(
+            auth.tenant["id"], auth.api["id"], auth.plan["scheduling_weight"] or 1
+        ):
+            profile.mark("queue")
+            try:
+                upstream_request = build_upstream_request(
+                    http_client,
+                    request.method,
+                    upstream_url,
+                    headers,
+                    body,
+                    timeout=timeout,
+                )
+                sending = time.perf_counter()
+                upstream_response = await send_upstream(
+                    http_client, upstream_request, services.upstream_retries, stream=True
+                )
+            except httpx.RequestError as exc:
+                logger.error(f"Upstream request failed: {exc}")
+                raise HTTPException(status_code=502, detail="Upstream service unavailable")
+            sent_at = sending
+            profile.mark("upstream")
+
+            background_tasks.add_task(record_usage, services.counters, auth.tenant["id"], auth.api["id"])
+
+            # Long-lived streams are bounded by the plan's connection limit,
+            # not the in-flight limits, so they give their slot back here.
+            if is_event_stream(upstream_response):
+                latency = time.perf_counter() - sent_at
+                bytes_in = body.size
+                response = await stream_upstream_response(
+                    services,
+                    auth,
+                    upstream_response,
+                    on_close=lambda bytes_out: services.events.record(
+                        auth, request.method, upstream_response.status_code, latency, bytes_in, bytes_out
+                    ),
+                    meter=meter,
+                    bucket=bucket,
+                )
+                profile.finish(response.raw_headers, label)
+                return response
+            # Large and shaped bodies are relayed as they arrive, likewise
+            # outside the in-flight limits; a body to store for replay is
+            # read whole (storing it is capped anyway).
+            if claim is None and should_stream(upstream_response, bucket, services.body_limits.spool_threshold):
+                latency = time.perf_counter() - sent_at
+                bytes_in = body.size
+                response = relay_upstream_response(
+                    upstream_response,
+                    meter=meter,
+                    bucket=bucket,
+                    on_close=lambda bytes_out: services.events.record(
+                        auth, request.method, upstream_response.status_code, latency, bytes_in, bytes_out
+                    ),
+                )
+                profile.finish(response.raw_headers, label)
+                return response
+
+            try:
+                content = await upstream_response.aread()
+            except httpx.RequestError as exc:
+                logger.error(f"Upstream request failed: {exc}")
+                raise HTTPException(status_code=502, detail="Upstream service unavailable")
+            finally:
+                await upstream_response.aclose()
+            profile.mark("response")
+            response_headers = forward_response_headers(upstream_response.headers.raw)
+            if claim is not None:
+                await services.idempotency.complete(
+                    claim, StoredResponse(upstream_response.status_code, response_headers, content)
+                )
+            services.events.record(
+                auth,
+                request.method,
+                upstream_response.status_code,
+                time.perf_counter() - sent_at,
+                body.size,
+                len(content),
+            )
+            if meter is not None:
+                meter.add("bytes_out", len(content))
+                background_tasks.add_task(meter.flush)
+    except BaseException:
+        # The body was read (and sent upstream, maybe several times) even if
+        # the request then failed, and background tasks only run on success.
+        if meter is not None:
+            await meter.flush()
+        raise
+    finally:
+        if claim is not None and not claim.finished:
+            await services.idempotency.release(claim)
+        if body is not None:
+            body.close()
+        concurrency.adaptive.release(sent_at)
+
+    response = buffered_response(upstream_response.status_code, response_headers, content, bucket)
+    profile.finish(response.raw_headers, label)
+    return response
+
+
+def buffered_response(status: int, headers: list, content: bytes, bucket: TokenBucket | None) -> Response:
+    """A response for a body read whole, shaped by ``bucket`` if there is one."""
+    if bucket is None or not content:
+        response = Response(content=content, status_code=status)
+    else:
+        response = StreamingResponse(shaped(content, bucket), status_code=status)
+        headers = [*headers, (b"content-length", str(len(content)).encode("latin-1"))]
+    response.raw_headers.extend(headers)
+    return response
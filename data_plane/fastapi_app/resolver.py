@@ -0,0 +1,252 @@
+"""Cached, asynchronous DNS resolution for upstream connections.
+
+httpx resolves upstream hostnames with ``getaddrinfo`` in a worker thread on
+every new connection. ``CachedDNSBackend`` plugs into the httpcore pool
+behind the shared client and resolves through ``DNSCache`` instead:
+
+* A and AAAA records are looked up concurrently with dnspython's asyncio
+  resolver and cached for their TTL (clamped to ``min_ttl``/``max_ttl``).
+* Once most of the TTL has passed, the next request triggers a background
+  refresh, so a busy hostname never waits on a lookup.
+* If the resolver fails after an entry expired, the stale addresses keep
+  being served for up to ``stale_ttl`` seconds.
+* Each connection starts from the next address (IPv4 before IPv6), and
+  connect errors fall through to the remaining addresses.
+
+Names the DNS servers don't know (``localhost``, ``/etc/hosts`` entries),
+and any name whose lookup fails with no stale addresses to serve, fall back
+to the system resolver.
+"""
+import asyncio
+import ipaddress
+import logging
+import socket
+import time
+from dataclasses import dataclass, field
+
+import dns.asyncresolver
+import dns.resolver
+import httpcore
+import httpx
+
+logger = logging.getLogger(__name__)
+
+REFRESH_AFTER = 0.8
+SYSTEM_RESOLVER_TTL = 30.0
+
+
+@dataclass
+class _Entry:
+    ipv4: list[str]
+    ipv6: list[str]
+    fetched: float
+    ttl: float
+    turn: int = field(default=0)
+    failed_at: float | None = field(default=None)
+
+    def addresses(self) -> list[str]:
+        turn = self.turn
+        self.turn += 1
+        rotated = []
+        for family in (self.ipv4, self.ipv6):
+            if family:
+                offset = turn % len(family)
+                rotated.extend(family[offset:] + family[:offset])
+        return rotated
+
+
+def _is_ip_address(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+def build_resolver(nameservers: list[str]) -> dns.asyncresolver.Resolver:
+    """A resolver for ``host[:port]`` nameservers, or the system's ``resolv.conf``."""
+    if not nameservers:
+        return dns.asyncresolver.Resolver()
+    resolver = dns.asyncresolver.Resolver(configure=False)
+    addresses, ports = [], set()
+    for nameserver in nameservers:
+        host, _, port = nameserver.rpartition(":") if nameserver.count(":") == 1 else (nameserver, "", "")
+        addresses.append(host)
+        ports.add(int(port or 53))
+    if len(ports) > 1:
+        raise ValueError("All DNS nameservers must use the same port")
+    resolver.nameservers = addresses
+    resolver.port = ports.pop()
+    return resolver
+
+
+class DNSCache:
+    def __init__(
+        self,
+        resolver: dns.asyncresolver.Resolver,
+        metrics,
+        min_ttl: float = 5.0,
+        max_ttl: float = 300.0,
+        stale_ttl: float = 3600.0,
+        lookup_timeout: float = 2.0,
+    ):
+        self.resolver = resolver
+        self.metrics = metrics
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.stale_ttl = stale_ttl
+        self.lookup_timeout = lookup_timeout
+        self._entries: dict[str, _Entry] = {}
+        self._lookups: dict[str, asyncio.Future] = {}
+        self._refreshes: set[asyncio.Task] = set()
+
+        metrics.describe("gateway_dns_lookups_total", "Upstream hostname resolutions by outcome.")
+
+    async def resolve(self, host: str) -> list[str]:
+        """Addresses to try for ``host``, rotated for each call."""
+        if _is_ip_address(host):
+            return [host]
+
+        entry = self._entries.get(host)
+        now = time.monotonic()
+        if entry is not None:
+            age = now - entry.fetched
+            if age < entry.ttl:
+                if age > entry.ttl * REFRESH_AFTER:
+                    self._refresh_in_background(host)
+                self.metrics.inc("gateway_dns_lookups_total", result="hit")
+                return entry.addresses()
+            if entry.failed_at is not None and age < entry.ttl + self.stale_ttl:
+                # The resolver is failing; retry it without making requests wait.
+                self._refresh_in_background(host)
+                self.metrics.inc("gateway_dns_lookups_total", result="stale")
+                return entry.addresses()
+
+        try:
+            entry = await self._lookup(host)
+        except OSError as exc:
+            if entry is None or now - entry.fetched > entry.ttl + self.stale_ttl:
+                self.metrics.inc("gateway_dns_lookups_total", result="error")
+                raise
+            logger.warning(f"{exc}; serving stale addresses")
+            entry.failed_at = time.monotonic()
+            self.metrics.inc("gateway_dns_lookups_total", result="stale")
+            return entry.addresses()
+        self.metrics.inc("gateway_dns_lookups_total", result="miss")
+        return entry.addresses()
+
+    def _refresh_in_background(self, host: str) -> None:
+        if host in self._lookups:
+            return
+        task = asyncio.create_task(self._refresh(host))
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshes.discard)
+
+    async def _refresh(self, host: str) -> None:
+        try:
+            await self._lookup(host)
+            self.metrics.inc("gateway_dns_lookups_total", result="refresh")
+        except OSError as exc:
+            logger.warning(f"Background DNS refresh for {host} failed: {exc}")
+
+    async def _lookup(self, host: str) -> _Entry:
+        # Concurrent misses for one host share a single lookup.
+        pending = self._lookups.get(host)
+        if pending is None:
+            pending = self._lookups[host] = asyncio.ensure_future(self._query(host))
+            pending.add_done_callback(lambda done: self._lookup_done(host, done))
+        entry = await asyncio.shield(pending)
+        previous = self._entries.get(host)
+        if previous is not None and previous is not entry:
+            entry.turn = previous.turn
+        self._entries[host] = entry
+        return entry
+
+    def _lookup_done(self, host: str, lookup: asyncio.Future) -> None:
+        self._lookups.pop(host, None)
+        if not lookup.cancelled():
+            # Retrieve it so a failure nobody waited for isn't logged as unhandled.
+            lookup.exception()
+
+    async def _query(self, host: str) -> _Entry:
+        answers = await asyncio.gather(
+            *(self._query_type(host, rdtype) for rdtype in ("A", "AAAA")), return_exceptions=True
+        )
+        ipv4, ipv6, ttls = [], [], []
+        for addresses, answer in zip((ipv4, ipv6), answers):
+            if isinstance(answer, dns.resolver.Answer) and answer.rrset is not None:
+                addresses.extend(rdata.address for rdata in answer.rrset)
+                ttls.append(answer.rrset.ttl)
+        if ipv4 or ipv6:
+            ttl = max(self.min_ttl, min(self.max_ttl, min(ttls)))
+            return _Entry(ipv4, ipv6, time.monotonic(), ttl)
+
+        failures = [answer for answer in answers if isinstance(answer, BaseException)]
+        reason = repr(failures[0]) if failures else "no addresses"
+        unknown = failures and all(isinstance(failure, dns.resolver.NXDOMAIN) for failure in failures)
+        if not unknown and self._has_stale(host):
+            # ``resolve`` serves the stale addresses and retries in the background.
+            raise OSError(f"DNS lookup for {host} failed: {reason}")
+        try:
+            return await self._query_system(host)
+        except OSError as exc:
+            raise OSError(f"DNS lookup for {host} failed: {reason}; system resolver: {exc}") from exc
+
+    def _has_stale(self, host: str) -> bool:
+        entry = self._entries.get(host)
+        return entry is not None and time.monotonic() - entry.fetched <= entry.ttl + self.stale_ttl
+
+    async def _query_type(self, host: str, rdtype: str):
+        return await self.resolver.resolve(
+            host, rdtype, search=True, raise_on_no_answer=False, lifetime=self.lookup_timeout
+        )
+
+    async def _query_system(self, host: str) -> _Entry:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        ipv4 = [info[4][0] for info in infos if info[0] == socket.AF_INET]
+        ipv6 = [info[4][0] for info in infos if info[0] == socket.AF_INET6]
+        return _Entry(list(dict.fromkeys(ipv4)), list(dict.fromkeys(ipv6)), time.monotonic(), SYSTEM_RESOLVER_TTL)
+
+    async def aclose(self) -> None:
+        for task in list(self._refreshes):
+            task.cancel()
+        await asyncio.gather(*self._refreshes, return_exceptions=True)
+
+
+class CachedDNSBackend(httpcore.AsyncNetworkBackend):
+    def __init__(self, cache: DNSCache, backend: httpcore.AsyncNetworkBackend | None = None):
+        self.cache = cache
+        self.backend = backend or httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        try:
+            addresses = await self.cache.resolve(host)
+        except OSError as exc:
+            raise httpcore.ConnectError(str(exc)) from exc
+        for index, address in enumerate(addresses):
+            try:
+                return await self.backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout):
+                if index == len(addresses) - 1:
+                    raise
+                logger.warning(f"Connecting to {host} at {address} failed, trying the next address")
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self.backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self.backend.sleep(seconds)
+
+
+class CachedDNSTransport(httpx.AsyncHTTPTransport):
+    """``httpx.AsyncHTTPTransport`` whose connection pool resolves through ``cache``."""
+
+    def __init__(self, cache: DNSCache, limits: httpx.Limits):
+        super().__init__(limits=limits)
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            network_backend=CachedDNSBackend(cache),
+        )
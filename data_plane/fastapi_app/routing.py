@@ -0,0 +1,225 @@
+"""Resolving a request's host and path to its tenant and API, in memory.
+
+Every active API is reachable on any host at ``/{tenant_slug}/{api_slug}/``,
+and at the routes its tenant maps to it (``apis.models.Route``): one of the
+tenant's own hostnames plus a path prefix such as ``/v1``. A route is only
+loaded if its tenant owns the host (``apis.models.RouteHost``), so one host
+never serves two tenants, whatever the route rows say. Workers compile
+all of them into a dict of hostnames, each holding a trie of path segments,
+and one trie of ``/{tenant_slug}/{api_slug}`` paths, so resolving a request
+is a dict lookup per path segment with no I/O. The longest matching prefix
+wins; a path with no route on its host falls back to the tenant/API paths.
+
+The table is built when a worker starts. The control plane announces
+changes to a tenant's APIs and routes on ``GATEWAY_CONFIG_CHANNEL`` and
+``listen_for_changes`` reloads just that tenant's; a full rebuild every
+``GATEWAY_ROUTES_RELOAD`` seconds catches changes announced while Redis was
+unreachable.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+
+from .tables import apis_api, apis_route, apis_routehost, tenants_tenant
+
+logger = logging.getLogger(__name__)
+
+# Tenant IDs per query when reloading some tenants (SQLite's variable limit).
+CHUNK_SIZE = 500
+
+
+@dataclass(frozen=True, slots=True)
+class Route:
+    tenant: object
+    api: object
+    # Whether the upstream sees the path without the matched prefix.
+    strip_prefix: bool = True
+
+
+class _Node:
+    __slots__ = ("children", "route")
+
+    def __init__(self):
+        self.children: dict[str, _Node] = {}
+        self.route: Route | None = None
+
+
+def _hostname(host: str) -> str:
+    host = host.lower()
+    if ":" in host and not host.endswith("]"):
+        host = host.rsplit(":", 1)[0]
+    return host.rstrip(".")
+
+
+def _prefix_segments(prefix: str) -> tuple[str, ...]:
+    return tuple(part for part in prefix.split("/") if part)
+
+
+def _match(root: _Node, segments: list[str]) -> tuple[Route, int] | None:
+    """The route of the longest prefix of ``segments[1:]`` (``segments[0]``
+    is the empty string before the path's leading slash) and where its
+    remainder starts."""
+    node, best = root, None
+    if node.route is not None:
+        best = (node.route, 1)
+    for position in range(1, len(segments)):
+        node = node.children.get(segments[position])
+        if node is None:
+            break
+        if node.route is not None:
+            best = (node.route, position + 1)
+    return best
+
+
+class RoutingTable:
+    def __init__(self, database):
+        self.database = database
+        self._lock = asyncio.Lock()
+        self._swap({}, _Node(), {})
+
+    def _swap(self, hosts: dict[str, _Node], slugs: _Node, owned: dict) -> None:
+        self._hosts = hosts
+        self._slugs = slugs
+        # tenant_id -> (hostname, or None for the tenant/API paths, segments)
+        # of its routes, so reloading a tenant touches only its own.
+        self._owned: dict[int, list[tuple[str | None, tuple[str, ...]]]] = owned
+
+    def __len__(self) -> int:
+        return sum(len(routes) for routes in self._owned.values())
+
+    def resolve(self, host: str, path: str) -> tuple[Route, str] | None:
+        """The route for a request and the path to send upstream, or None."""
+        segments = path.split("/")
+        trie = self._hosts.get(_hostname(host)) if self._hosts else None
+        if trie is not None:
+            found = _match(trie, segments)
+            if found is not None:
+                route, position = found
+                return route, "/".join(segments[position:] if route.strip_prefix else segments[1:])
+        found = _match(self._slugs, segments)
+        if found is None:
+            return None
+        return found[0], "/".join(segments[found[1]:])
+
+    def not_found_detail(self, host: str, path: str) -> str:
+        # Matches the errors of the tenant and API lookups this replaced, and
+        # the framework's own for paths that weren't /{tenant}/{api}/... then.
+        if _hostname(host) in self._hosts:
+            return "API not found"
+        segments = path.split("/", 3)
+        if len(segments) < 4 or not segments[1] or not segments[2]:
+            return "Not Found"
+        if segments[1] in self._slugs.children:
+            return "API not found"
+        return "Tenant not found"
+
+    @staticmethod
+    def _add(hosts, slugs, owned, tenant, api, routes) -> None:
+        entries = owned.setdefault(tenant["id"], [])
+        paths = [(None, (tenant["slug"], api["slug"]), Route(tenant, api))]
+        paths.extend(
+            (_hostname(row["host"]), _prefix_segments(row["path_prefix"]), Route(tenant, api, row["strip_prefix"]))
+            for row in routes
+        )
+        for host, segments, route in paths:
+            node = slugs if host is None else hosts.setdefault(host, _Node())
+            for segment in segments:
+                node = node.children.setdefault(segment, _Node())
+            node.route = route
+            entries.append((host, segments))
+
+    def _remove(self, tenant_id: int) -> None:
+        for host, segments in self._owned.pop(tenant_id, ()):
+            root = self._slugs if host is None else self._hosts.get(host)
+            if root is None:
+                continue
+            trail = [root]
+            for segment in segments:
+                node = trail[-1].children.get(segment)
+                if node is None:
+                    break
+                trail.append(node)
+            else:
+                # The path may have been taken over by another tenant since.
+                if trail[-1].route is not None and trail[-1].route.tenant["id"] == tenant_id:
+                    trail[-1].route = None
+            # Prune the nodes left with nothing under them.
+            for depth in range(len(trail) - 1, 0, -1):
+                node = trail[depth]
+                if node.route is not None or node.children:
+                    break
+                del trail[depth - 1].children[segments[depth - 1]]
+            if host is not None and not root.children and root.route is None:
+                del self._hosts[host]
+
+    async def _fetch(self, tenant_ids: list[int] | None):
+        tenants = tenants_tenant.select().where(tenants_tenant.c.is_active == True)
+        apis = apis_api.select().where(apis_api.c.is_active == True)
+        owned_routes = apis_route.join(apis_api, apis_api.c.id == apis_route.c.api_id).join(
+            apis_routehost,
+            (apis_routehost.c.host == apis_route.c.host) & (apis_routehost.c.tenant_id == apis_api.c.tenant_id),
+        )
+        routes = apis_route.select().select_from(owned_routes).where(apis_route.c.is_active == True)
+        if tenant_ids is None:
+            return (
+                await self.database.fetch_all(tenants),
+                await self.database.fetch_all(apis),
+                await self.database.fetch_all(routes),
+            )
+        tenant_rows, api_rows, route_rows = [], [], []
+        for start in range(0, len(tenant_ids), CHUNK_SIZE):
+            chunk = tenant_ids[start:start + CHUNK_SIZE]
+            tenant_rows += await self.database.fetch_all(tenants.where(tenants_tenant.c.id.in_(chunk)))
+            chunk_apis = await self.database.fetch_all(apis.where(apis_api.c.tenant_id.in_(chunk)))
+            api_rows += chunk_apis
+            api_ids = [row["id"] for row in chunk_apis]
+            for offset in range(0, len(api_ids), CHUNK_SIZE):
+                route_rows += await self.database.fetch_all(
+                    routes.where(apis_route.c.api_id.in_(api_ids[offset:offset + CHUNK_SIZE]))
+                )
+        return tenant_rows, api_rows, route_rows
+
+    @staticmethod
+    def _group(tenant_rows, api_rows, route_rows):
+        """(tenant, api, routes) for every active API of an active tenant."""
+        tenants = {row["id"]: row for row in tenant_rows}
+        routes_by_api: dict[int, list] = {}
+        for row in route_rows:
+            routes_by_api.setdefault(row["api_id"], []).append(row)
+        for api in api_rows:
+            tenant = tenants.get(api["tenant_id"])
+            if tenant is not None:
+                yield tenant, api, routes_by_api.get(api["id"], ())
+
+    async def load(self) -> int:
+        """Rebuild the whole table; returns how many routes it holds."""
+        async with self._lock:
+            hosts, slugs, owned = {}, _Node(), {}
+            for tenant, api, routes in self._group(*await self._fetch(None)):
+                self._add(hosts, slugs, owned, tenant, api, routes)
+            self._swap(hosts, slugs, owned)
+        return len(self)
+
+    async def refresh(self, tenant_ids: list[int]) -> None:
+        """Reload these tenants' routes (dropping them if they are gone)."""
+        async with self._lock:
+            rows = self._group(*await self._fetch(sorted(set(tenant_ids))))
+            for tenant_id in tenant_ids:
+                self._remove(tenant_id)
+            for tenant, api, routes in rows:
+                self._add(self._hosts, self._slugs, self._owned, tenant, api, routes)
+
+
+async def reload_routes(routes: RoutingTable, interval: float) -> None:
+    """Rebuild ``routes`` from the database every ``interval`` seconds."""
+    failing = False
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await routes.load()
+        except Exception as exc:
+            if not failing:
+                logger.warning(f"Could not reload the routing table, serving the previous one: {exc!r}")
+            failing = True
+            continue
+        failing = False
@@ -0,0 +1,249 @@
+"""Production entry point for the data plane.
+
+Runs the gateway as a pre-forked pool of uvicorn workers. The app is imported
+once in the master so every worker inherits the imported modules and the
+FastAPI app object through copy-on-write pages instead of importing them
+again. What the app loads at startup (the routing table, config cache and
+database and Redis connections) is loaded by each worker's lifespan after the
+fork, since connections can't cross it. On platforms with ``SO_REUSEPORT``
+each worker binds its own listening socket and the kernel balances new
+connections across them; elsewhere the workers share a single socket bound
+by the master.
+
+A worker that dies is restarted. One that dies within ``MIN_UPTIME`` seconds
+of starting is restarted after a delay that doubles each time, and after
+``MAX_CRASHES`` such deaths in a row the pool shuts down and exits with an
+error instead of respawning a worker that can't start forever.
+
+Usage::
+
+    python -m data_plane.fastapi_app.server --workers 4 --port 7000
+"""
+import argparse
+import asyncio
+import gc
+import importlib.util
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+from uvicorn.main import STARTUP_FAILURE
+
+from .config import (
+    get_bind_host,
+    get_bind_port,
+    get_key_index_path,
+    get_worker_count,
+    get_ws_max_queue,
+    get_ws_max_size,
+)
+
+logger = logging.getLogger(__name__)
+
+HAS_REUSEPORT = hasattr(socket, "SO_REUSEPORT")
+
+POLL_INTERVAL = 0.5
+MIN_UPTIME = 10.0
+RESPAWN_DELAY = 0.5
+MAX_RESPAWN_DELAY = 30.0
+MAX_CRASHES = 5
+
+
+def _pick_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def _pick_http() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def _bind_socket(host: str, port: int, reuse_port: bool) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    # An explicit IPPROTO_TCP is what makes asyncio enable TCP_NODELAY on the
+    # accepted connections; with proto 0 small responses stall on delayed ACKs.
+    sock = socket.socket(family, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def _build_config(app, args: argparse.Namespace) -> uvicorn.Config:
+    return uvicorn.Config(
+        app,
+        loop=args.loop,
+        http=args.http,
+        lifespan="on",
+        log_level=args.log_level,
+        access_log=args.access_log,
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=int(args.graceful_timeout),
+        ws_max_size=get_ws_max_size(),
+        ws_max_queue=get_ws_max_queue(),
+    )
+
+
+def _run_worker(app, args: argparse.Namespace, shared_sock: socket.socket | None) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    sock = shared_sock or _bind_socket(args.host, args.port, reuse_port=True)
+    server = uvicorn.Server(_build_config(app, args))
+    server.run(sockets=[sock])
+    if not server.started:
+        # As ``uvicorn.run`` does, so the master can tell a failed startup.
+        sys.exit(STARTUP_FAILURE)
+
+
+def _build_key_index(path: str) -> None:
+    from .key_index import build_key_index_file
+
+    started = time.monotonic()
+    try:
+        count = asyncio.run(build_key_index_file(path))
+    except Exception as exc:
+        logger.warning(f"Could not build the key index at {path}: {exc!r}")
+        return
+    logger.info(f"Indexed {count} keys into {path} in {time.monotonic() - started:.1f}s")
+
+
+class _WorkerSlot:
+    """One place in the pool: its current process and how often the
+    processes in it died right after starting."""
+
+    __slots__ = ("process", "started", "crashes", "respawn_at")
+
+    def __init__(self):
+        self.process: multiprocessing.Process | None = None
+        self.started = 0.0
+        self.crashes = 0
+        self.respawn_at = 0.0
+
+
+def _respawn_delay(crashes: int) -> float:
+    return 0.0 if not crashes else min(MAX_RESPAWN_DELAY, RESPAWN_DELAY * 2 ** (crashes - 1))
+
+
+def serve(args: argparse.Namespace) -> None:
+    # Preload: import the app (and everything it pulls in) before forking so
+    # the workers share those code and module pages, then move the surviving
+    # objects into the permanent GC generation so collections in the workers
+    # don't dirty them. Per-worker state is built after the fork (lifespan).
+    from .main import app
+
+    logging.getLogger().setLevel(args.log_level.upper())
+    key_index_path = get_key_index_path()
+    if key_index_path is not None:
+        # Built once here; the workers map the same file.
+        _build_key_index(key_index_path)
+    # Workers scale their local rate-limit counters by the pool size.
+    os.environ["GATEWAY_WORKERS"] = str(args.workers)
+    gc.collect()
+    gc.freeze()
+
+    reuse_port = HAS_REUSEPORT and not args.no_reuse_port
+    shared_sock = None if reuse_port else _bind_socket(args.host, args.port, reuse_port=False)
+
+    logger.info(
+        f"Starting {args.workers} data-plane worker(s) on {args.host}:{args.port} "
+        f"(loop={args.loop}, http={args.http}, reuse_port={reuse_port})"
+    )
+
+    if args.workers == 1:
+        _run_worker(app, args, shared_sock)
+        return
+
+    ctx = multiprocessing.get_context("fork")
+    slots = [_WorkerSlot() for _ in range(args.workers)]
+    stopping = False
+    failed = False
+
+    def spawn() -> multiprocessing.Process:
+        process = ctx.Process(target=_run_worker, args=(app, args, shared_sock), daemon=False)
+        process.start()
+        return process
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    try:
+        while not stopping:
+            now = time.monotonic()
+            for slot in slots:
+                process = slot.process
+                if process is not None and not process.is_alive():
+                    slot.crashes = slot.crashes + 1 if now - slot.started < MIN_UPTIME else 0
+                    if slot.crashes >= MAX_CRASHES:
+                        logger.error(
+                            f"Worker {process.pid} exited with {process.exitcode}; {MAX_CRASHES} in a row "
+                            f"died within {MIN_UPTIME:.0f}s of starting, shutting down"
+                        )
+                        stopping = failed = True
+                        break
+                    slot.process = None
+                    slot.respawn_at = now + _respawn_delay(slot.crashes)
+                    logger.warning(
+                        f"Worker {process.pid} exited with {process.exitcode}, "
+                        f"restarting in {slot.respawn_at - now:.1f}s"
+                    )
+                if slot.process is None and now >= slot.respawn_at and not stopping:
+                    slot.process = spawn()
+                    slot.started = time.monotonic()
+            if not stopping:
+                time.sleep(POLL_INTERVAL)
+    finally:
+        processes = [slot.process for slot in slots if slot.process is not None]
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+        for process in processes:
+            process.join(args.graceful_timeout)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        if shared_sock is not None:
+            shared_sock.close()
+    if failed:
+        raise SystemExit(1)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the gateway data plane.")
+    parser.add_argument("--host", default=get_bind_host())
+    parser.add_argument("--port", type=int, default=get_bind_port())
+    parser.add_argument("--workers", type=int, default=get_worker_count(os.cpu_count() or 1))
+    parser.add_argument("--loop", default=_pick_loop(), choices=["auto", "asyncio", "uvloop"])
+    parser.add_argument("--http", default=_pick_http(), choices=["auto", "h11", "httptools"])
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--keep-alive", type=int, default=5)
+    parser.add_argument("--graceful-timeout", type=float, default=30.0)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--access-log", action="store_true")
+    parser.add_argument(
+        "--no-reuse-port",
+        action="store_true",
+        help="Share one listening socket between workers instead of SO_REUSEPORT.",
+    )
+    args = parser.parse_args(argv)
+    args.workers = max(1, args.workers)
+    return args
+
+
+def main(argv: list[str] | None = None) -> None:
+    serve(parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
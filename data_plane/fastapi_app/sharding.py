@@ -0,0 +1,183 @@
+"""Rate-limit and usage counters sharded across Redis nodes.
+
+``ShardedRedis`` routes every key to one node of a consistent-hash ring
+(``HashRing``, 160 virtual points per node) by the key's *subject*: the
+tenant for ``quota:*`` rate-limit counters, tenant and API for ``usage:*``
+counters. All of a subject's counters (every level and window of a tenant's
+quotas) therefore live on the same node, where one script can check them
+together, and each node gets its own connection pool.
+
+Adding a node only moves the subjects whose ring segment it takes over
+(about ``1/n`` of them). Their counters are moved with::
+
+    python -m data_plane.fastapi_app.sharding --from redis://a redis://b --to redis://a redis://b redis://c
+
+which adds each moved counter onto the new owner (so counts the gateway
+already made there are kept) and carries its TTL over.
+"""
+import argparse
+import asyncio
+import bisect
+import hashlib
+import logging
+from urllib.parse import urlsplit
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+VIRTUAL_NODES = 160
+
+# Key prefix -> number of ``:``-separated parts that make up the subject.
+SUBJECT_PARTS = {
+    "quota": 2,
+    "usage": 3,
+    "connections": 3,
+}
+
+
+def subject_for_key(key: str) -> str:
+    parts = key.split(":")
+    count = SUBJECT_PARTS.get(parts[0])
+    return ":".join(parts[:count]) if count else key
+
+
+def node_name(url: str) -> str:
+    """Ring identity of a Redis URL: host, port and database, not credentials."""
+    parts = urlsplit(url)
+    return f"{parts.hostname}:{parts.port or 6379}{parts.path or '/0'}"
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, nodes=(), virtual_nodes: int = VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self._points: list[int] = []
+        self._owners: list[str] = []
+        for node in nodes:
+            self.add_node(node)
+
+    @property
+    def nodes(self) -> set[str]:
+        return set(self._owners)
+
+    def add_node(self, node: str) -> None:
+        for replica in range(self.virtual_nodes):
+            point = _hash(f"{node}#{replica}")
+            index = bisect.bisect_left(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove_node(self, node: str) -> None:
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def node_for(self, subject: str) -> str:
+        if not self._points:
+            raise LookupError("Hash ring has no nodes")
+        index = bisect.bisect(self._points, _hash(subject)) % len(self._points)
+        return self._owners[index]
+
+
+class ShardedRedis:
+    """The subset of the Redis client API the data plane uses, routed per key."""
+
+    def __init__(self, clients: dict[str, object]):
+        self.clients = dict(clients)
+        self.ring = HashRing(self.clients)
+
+    @classmethod
+    def from_urls(cls, urls: list[str], **kwargs) -> "ShardedRedis":
+        return cls({node_name(url): redis.from_url(url, **kwargs) for url in urls})
+
+    def add_node(self, name: str, client) -> None:
+        self.clients[name] = client
+        self.ring.add_node(name)
+
+    def node_name_for_key(self, key: str) -> str:
+        return self.ring.node_for(subject_for_key(key))
+
+    def node_for_key(self, key: str):
+        return self.clients[self.node_name_for_key(key)]
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        return await self.node_for_key(key).incr(key, amount)
+
+    async def decr(self, key: str, amount: int = 1) -> int:
+        return await self.node_for_key(key).decr(key, amount)
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        return await self.node_for_key(key).expire(key, seconds)
+
+    async def get(self, key: str):
+        return await self.node_for_key(key).get(key)
+
+    async def ping(self) -> bool:
+        await asyncio.gather(*(client.ping() for client in self.clients.values()))
+        return True
+
+    async def close(self) -> None:
+        for client in self.clients.values():
+            await client.aclose()
+
+
+async def rebalance(old: ShardedRedis, new: ShardedRedis, batch: int = 500) -> int:
+    """Move counters whose owner differs between ``old`` and ``new``; returns how many moved."""
+    moved = 0
+    for name, client in old.clients.items():
+        # Collect first: deleting keys mid-SCAN isn't safe on every server.
+        leaving = []
+        for prefix in SUBJECT_PARTS:
+            async for key in client.scan_iter(match=f"{prefix}:*", count=batch):
+                key = key.decode() if isinstance(key, bytes) else key
+                target_name = new.ring.node_for(subject_for_key(key))
+                if target_name != name:
+                    leaving.append((key, target_name))
+
+        for start in range(0, len(leaving), batch):
+            chunk = leaving[start:start + batch]
+            async with client.pipeline(transaction=True) as pipe:
+                for key, _ in chunk:
+                    pipe.pttl(key).getdel(key)
+                replies = await pipe.execute()
+
+            by_target: dict[str, list] = {}
+            for (key, target_name), ttl, value in zip(chunk, replies[::2], replies[1::2]):
+                if value is not None:
+                    by_target.setdefault(target_name, []).append((key, int(value), ttl))
+            for target_name, counters in by_target.items():
+                async with new.clients[target_name].pipeline(transaction=False) as pipe:
+                    for key, value, ttl in counters:
+                        pipe.incrby(key, value)
+                        if ttl and ttl > 0:
+                            pipe.pexpire(key, ttl)
+                    await pipe.execute()
+                moved += len(counters)
+    return moved
+
+
+async def _rebalance_urls(old_urls: list[str], new_urls: list[str]) -> None:
+    old, new = ShardedRedis.from_urls(old_urls), ShardedRedis.from_urls(new_urls)
+    try:
+        moved = await rebalance(old, new)
+        logger.info(f"Moved {moved} counters to their new nodes")
+    finally:
+        await old.close()
+        await new.close()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Move counters after the Redis node list changed.")
+    parser.add_argument("--from", dest="old_urls", nargs="+", required=True, help="Previous REDIS_URLS.")
+    parser.add_argument("--to", dest="new_urls", nargs="+", required=True, help="New REDIS_URLS.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_rebalance_urls(args.old_urls, args.new_urls))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,35 @@
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass
 
 import httpx
 from databases import Database
 
+from .bodies import BodyLimits
+from .concurrency import ConcurrencyControl
+from .config_cache import ConfigCache
+from .counters import Counters
+from .events import EventRecorder
+from .idempotency import IdempotencyStore
+from .metrics import Metrics
+from .profiling import Profiler
+from .routing import RoutingTable
+
 
 @dataclass
 class AppState:
     database: Database
     http_client: httpx.AsyncClient
     redis_client: object
+    counters: Counters
+    events: EventRecorder
+    metrics: Metrics
+    concurrency: ConcurrencyControl
+    body_limits: BodyLimits
+    upstream_retries: int
+    config_cache: ConfigCache
+    routes: RoutingTable
+    idempotency: IdempotencyStore
+    profiler: Profiler
+    ready: asyncio.Event
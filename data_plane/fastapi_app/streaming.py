@@ -0,0 +1,136 @@
+"""Long-lived connections and streamed responses.
+
+Every open event stream or WebSocket holds one of the plan's
+``max_connections`` slots, counted in Redis so the limit holds across workers.
+
+SSE responses are relayed without reading ahead of the client: the next chunk
+is pulled from the upstream only after the previous one was handed to the
+server, which waits for its write buffer to drain, so a slow client holds at
+most one network read of data in the gateway. Other responses are relayed
+the same way (without a connection slot) when their plan shapes them or they
+may be larger than the body spool threshold; smaller ones are read whole.
+"""
+import logging
+
+import anyio
+import httpx
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from .headers import forward_response_headers
+
+logger = logging.getLogger(__name__)
+
+CONNECTION_SLOT_TTL = 60 * 60 * 24
+
+
+async def acquire_connection_slot(counters, auth) -> str | None:
+    """Reserve one of the plan's concurrent connection slots.
+
+    Returns the counter key to pass to ``release_connection_slot``, or
+    ``None`` when the plan has no connection limit.
+    """
+    limit = auth.plan["max_connections"]
+    if limit is None:
+        return None
+
+    slot_key = f"connections:{auth.subject}"
+    # The TTL is refreshed on every open so a crashed worker's slots eventually expire.
+    count = await counters.incr(slot_key, ttl=CONNECTION_SLOT_TTL, policy=auth.plan["redis_failure_policy"])
+    if count is not None and count > limit:
+        await counters.incr(slot_key, -1)
+        raise HTTPException(status_code=429, detail="Connection limit exceeded")
+    return slot_key
+
+
+async def release_connection_slot(counters, slot_key: str | None) -> None:
+    if slot_key:
+        await counters.incr(slot_key, -1)
+
+
+def wants_event_stream(headers) -> bool:
+    return "text/event-stream" in headers.get("accept", "")
+
+
+def is_event_stream(upstream_response: httpx.Response) -> bool:
+    return upstream_response.headers.get("content-type", "").startswith("text/event-stream")
+
+
+def should_stream(upstream_response: httpx.Response, bucket, spool_threshold: int) -> bool:
+    """Whether to relay a (non-SSE) response as it arrives rather than read it whole."""
+    if bucket is not None:
+        return True
+    if upstream_response.status_code < 200 or upstream_response.status_code in (204, 304):
+        return False
+    length = upstream_response.headers.get("content-length")
+    return not (length and length.isdigit() and int(length) <= spool_threshold)
+
+
+async def relay_body(upstream_response: httpx.Response, meter=None, bucket=None, on_close=None, cleanup=None):
+    """Yield the upstream body chunk by chunk, shaped by ``bucket`` (a
+    ``TokenBucket``) and counted by ``meter`` (a ``ByteMeter``).
+
+    Closes the upstream response, awaits ``cleanup()`` and flushes ``meter``
+    once the body ends, then calls ``on_close`` with the number of bytes
+    relayed. An upstream error ends an event stream quietly but is raised for
+    other bodies, so the server aborts the response rather than end it short.
+    """
+    relayed = 0
+    try:
+        async for chunk in upstream_response.aiter_bytes():
+            if bucket is not None:
+                await bucket.consume(len(chunk))
+            relayed += len(chunk)
+            if meter is not None and meter.add("bytes_out", len(chunk)):
+                await meter.flush()
+            yield chunk
+    except httpx.RequestError as exc:
+        logger.warning(f"Upstream stream ended with error: {exc}")
+        if not is_event_stream(upstream_response):
+            raise
+    finally:
+        # Runs on client disconnect too, where the surrounding scope is
+        # already cancelled.
+        with anyio.CancelScope(shield=True):
+            await upstream_response.aclose()
+            if cleanup is not None:
+                await cleanup()
+            if meter is not None:
+                await meter.flush()
+        if on_close is not None:
+            on_close(relayed)
+
+
+def relay_upstream_response(
+    upstream_response: httpx.Response, meter=None, bucket=None, on_close=None
+) -> StreamingResponse:
+    """Relay an upstream response to the client as it arrives (see ``relay_body``)."""
+    response = StreamingResponse(
+        relay_body(upstream_response, meter, bucket, on_close),
+        status_code=upstream_response.status_code,
+    )
+    response.raw_headers.extend(forward_response_headers(upstream_response.headers.raw))
+    return response
+
+
+async def stream_upstream_response(
+    services, auth, upstream_response: httpx.Response, on_close=None, meter=None, bucket=None
+) -> StreamingResponse:
+    """Relay an open upstream event stream to the client chunk by chunk,
+    holding one of the plan's connection slots.
+
+    ``on_close`` is called with the number of bytes relayed once the stream ends.
+    """
+    counters = services.counters
+    try:
+        slot_key = await acquire_connection_slot(counters, auth)
+    except HTTPException:
+        await upstream_response.aclose()
+        raise
+
+    body = relay_body(
+        upstream_response, meter, bucket, on_close, cleanup=lambda: release_connection_slot(counters, slot_key)
+    )
+    response = StreamingResponse(body, status_code=upstream_response.status_code)
+    response.raw_headers.extend(forward_response_headers(upstream_response.headers.raw))
+    return response
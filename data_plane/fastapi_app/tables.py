@@ -1,4 +1,4 @@
-from sqlalchemy import MetaData, Table, Column, Integer, String, Boolean, ForeignKey
+from sqlalchemy import MetaData, Table, Column, BigInteger, Integer, String, Boolean, ForeignKey
 
 metadata = MetaData()
 
@@ -7,6 +7,8 @@ tenants_tenant = Table(
     metadata,
     Column("id", Integer, primary_key=True),
     Column("slug", String),
+    Column("requests_per_minute", Integer),
+    Column("requests_per_month", BigInteger),
     Column("is_active", Boolean),
 )
 
@@ -17,6 +19,10 @@ apis_api = Table(
     Column("tenant_id", Integer, ForeignKey("tenants_tenant.id")),
     Column("slug", String),
     Column("upstream_base_url", String),
+    Column("max_request_body_bytes", BigInteger),
+    Column("requests_per_minute", Integer),
+    Column("requests_per_month", BigInteger),
+    Column("idempotency_ttl", Integer),
     Column("is_active", Boolean),
 )
 
@@ -26,6 +32,15 @@ billing_plan = Table(
     Column("id", Integer, primary_key=True),
     Column("requests_per_minute", Integer),
     Column("requests_per_month", Integer),
+    Column("max_connections", Integer),
+    Column("scheduling_weight", Integer),
+    Column("max_request_body_bytes", BigInteger),
+    Column("redis_failure_policy", String),
+    Column("bytes_in_per_minute", BigInteger),
+    Column("bytes_in_per_month", BigInteger),
+    Column("bytes_out_per_minute", BigInteger),
+    Column("bytes_out_per_month", BigInteger),
+    Column("max_bytes_per_second", BigInteger),
     Column("is_active", Boolean),
 )
 
@@ -36,6 +51,7 @@ apis_client = Table(
     Column("tenant_id", Integer, ForeignKey("tenants_tenant.id")),
     Column("plan_id", Integer, ForeignKey("billing_plan.id")),
     Column("client_id", String),
+    Column("is_active", Boolean),
 )
 
 apis_apikey = Table(
@@ -47,3 +63,22 @@ apis_apikey = Table(
     Column("hashed_key", String),
     Column("is_active", Boolean),
 )
+
+apis_route = Table(
+    "apis_route",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("api_id", Integer, ForeignKey("apis_api.id")),
+    Column("host", String),
+    Column("path_prefix", String),
+    Column("strip_prefix", Boolean),
+    Column("is_active", Boolean),
+)
+
+apis_routehost = Table(
+    "apis_routehost",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("host", String),
+    Column("tenant_id", Integer, ForeignKey("tenants_tenant.id")),
+)
@@ -1,8 +1,8 @@
 import time
 
 
-async def record_usage(redis_client, tenant_id: int, api_id: int) -> None:
-    if not redis_client:
+async def record_usage(counters, tenant_id: int, api_id: int) -> None:
+    if not counters:
         return
     current_minute = int(time.time() // 60)
-    await redis_client.incr(f"usage:{tenant_id}:{api_id}:{current_minute}")
+    await counters.incr(f"usage:{tenant_id}:{api_id}:{current_minute}")
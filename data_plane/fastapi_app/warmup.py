@@ -0,0 +1,126 @@
+"""Warm a freshly started worker before it reports ready on ``/readyz``.
+
+Runs in the background after startup (``/healthz`` answers meanwhile):
+
+* Opens the database connection and loads the configuration of the hottest
+  API keys and clients into the ``ConfigCache``, ranked by this and the
+  previous minute's rate-limit counters in Redis. With
+  ``GATEWAY_WARMUP=all`` every active key, client and plan is loaded.
+  (Tenants and APIs are already in the routing table.)
+* Pre-opens ``connections`` keep-alive connections (resolving their DNS on
+  the way) to the upstreams of the ``top`` most-used APIs with ``OPTIONS``
+  requests; any response, or none, is fine. (Not ``HEAD``: an upstream that
+  wrongly answers it with a body would corrupt the pooled connection.)
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+
+import httpx
+from redis.exceptions import RedisError
+
+from .tables import apis_api, apis_apikey, apis_client, billing_plan
+
+logger = logging.getLogger(__name__)
+
+PRECONNECT_TIMEOUT = httpx.Timeout(5.0)
+
+
+# Per-minute counters of each kind; the ID before the minute is the key's,
+# the client's or the API's.
+HOT_PATTERNS = {"key": "quota:*:key:*", "client": "quota:*:client:*", "usage": "usage:*"}
+
+
+async def _hot_counters(services, minutes: list[int]) -> dict[str, Counter]:
+    """Sum this and last minute's counters per ID, by kind."""
+    hot = {kind: Counter() for kind in HOT_PATTERNS}
+    for name, client in services.redis_client.clients.items():
+        if not services.counters.is_up(name):
+            continue
+        try:
+            for kind, pattern in HOT_PATTERNS.items():
+                for minute in minutes:
+                    keys = [key async for key in client.scan_iter(match=f"{pattern}:{minute}", count=1000)]
+                    if not keys:
+                        continue
+                    for key, value in zip(keys, await client.mget(keys)):
+                        if value is not None:
+                            hot[kind][key.rsplit(":", 2)[1]] += int(value)
+        except (RedisError, OSError) as exc:
+            logger.warning(f"Reading hot counters from Redis node {name} failed: {exc!r}")
+    return hot
+
+
+def _top_ids(counter: Counter, top: int) -> list[int]:
+    return [int(subject) for subject, _ in counter.most_common(top) if subject.isdigit()]
+
+
+async def _load(services, mode: str, top: int) -> list:
+    """Fill the config cache; returns the hot APIs, most used first."""
+    database = services.database
+    cache = services.config_cache
+    await database.execute("SELECT 1")
+
+    if mode == "all":
+        keys = await database.fetch_all(apis_apikey.select().where(apis_apikey.c.is_active == True))
+        clients = await database.fetch_all(apis_client.select().where(apis_client.c.is_active == True))
+        apis = await database.fetch_all(apis_api.select().where(apis_api.c.is_active == True))
+        hot_apis = []
+    else:
+        current_minute = int(time.time() // 60)
+        hot = await _hot_counters(services, [current_minute, current_minute - 1])
+        key_ids = _top_ids(hot["key"], top)
+        client_ids = _top_ids(hot["client"], top)
+        hot_apis = _top_ids(hot["usage"], top)
+
+        keys = await database.fetch_all(
+            apis_apikey.select().where(apis_apikey.c.id.in_(key_ids) & (apis_apikey.c.is_active == True))
+        ) if key_ids else []
+        clients = await database.fetch_all(
+            apis_client.select().where(apis_client.c.id.in_(client_ids) & (apis_client.c.is_active == True))
+        ) if client_ids else []
+        apis = await database.fetch_all(
+            apis_api.select().where(apis_api.c.id.in_(hot_apis) & (apis_api.c.is_active == True))
+        ) if hot_apis else []
+
+    plan_users: dict[int, set[int]] = {}
+    for row in (*keys, *clients):
+        plan_users.setdefault(row["plan_id"], set()).add(row["tenant_id"])
+    plans = await database.fetch_all(
+        billing_plan.select().where(billing_plan.c.id.in_(plan_users))
+    ) if plan_users else []
+
+    for row in keys:
+        cache.put(("api_key", row["tenant_id"], row["hashed_key"]), row)
+    for row in clients:
+        cache.put(("client", row["tenant_id"], row["client_id"]), row)
+    for row in plans:
+        for tenant_id in plan_users[row["id"]]:
+            cache.put(("plan", tenant_id, row["id"]), row)
+    logger.info(
+        f"Warm-up loaded {len(keys)} keys, {len(clients)} clients and {len(plans)} plans"
+    )
+
+    by_id = {row["id"]: row for row in apis}
+    ranked = [by_id[api_id] for api_id in hot_apis if api_id in by_id]
+    return ranked + [row for row in apis if row["id"] not in hot_apis]
+
+
+async def _preconnect(http_client: httpx.AsyncClient, url: str, connections: int) -> None:
+    async def probe():
+        try:
+            await http_client.options(url, timeout=PRECONNECT_TIMEOUT)
+        except httpx.HTTPError as exc:
+            logger.warning(f"Pre-connecting to {url} failed: {exc!r}")
+
+    # Concurrent requests so each one opens its own connection.
+    await asyncio.gather(*(probe() for _ in range(connections)))
+
+
+async def warm_up(services, mode: str, top: int, connections: int) -> None:
+    apis = await _load(services, mode, top)
+    upstreams = list(dict.fromkeys(api["upstream_base_url"] for api in apis))[:top]
+    if connections > 0 and upstreams:
+        await asyncio.gather(*(_preconnect(services.http_client, url, connections) for url in upstreams))
+        logger.info(f"Warm-up opened connections to {len(upstreams)} upstreams")
@@ -0,0 +1,150 @@
+"""WebSocket proxying.
+
+Upgrades go through the same ``authorize`` path as ordinary requests (tenant,
+API, key, client, plan and rate limits) and hold a plan connection slot for
+their lifetime. Frames are relayed one at a time in each direction; the
+server- and upstream-side receive queues are capped at
+``GATEWAY_WS_MAX_QUEUE`` frames of at most ``GATEWAY_WS_MAX_SIZE`` bytes and
+sends wait for the peer to drain, so a slow side stalls the relay instead of
+growing gateway memory.
+"""
+import asyncio
+import logging
+import time
+
+import websockets
+from fastapi import APIRouter, HTTPException, WebSocket, status
+from fastapi.responses import JSONResponse
+from starlette.websockets import WebSocketDisconnect
+
+from .config import get_ws_max_queue, get_ws_max_size
+from .headers import forward_request_headers
+from .proxy import authorize, build_upstream_url, resolve_route
+from .streaming import acquire_connection_slot, release_connection_slot
+from .usage import record_usage
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Handshake headers the upstream client negotiates itself.
+WEBSOCKET_HANDSHAKE_HEADERS = {
+    b"sec-websocket-key",
+    b"sec-websocket-version",
+    b"sec-websocket-extensions",
+    b"sec-websocket-protocol",
+    b"sec-websocket-accept",
+}
+
+
+def _websocket_url(http_url: str) -> str:
+    if http_url.startswith("https://"):
+        return "wss://" + http_url[len("https://"):]
+    if http_url.startswith("http://"):
+        return "ws://" + http_url[len("http://"):]
+    return http_url
+
+
+async def _reject(websocket: WebSocket, exc: HTTPException) -> None:
+    # Prefer a real HTTP response to the handshake so WebSocket clients see the
+    # same status codes and bodies as plain requests.
+    if "websocket.http.response" in websocket.scope.get("extensions", {}):
+        await websocket.send_denial_response(
+            JSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers=exc.headers)
+        )
+    else:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=exc.detail)
+
+
+async def _client_to_upstream(websocket: WebSocket, upstream, transferred: dict) -> None:
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            await upstream.close(code=message.get("code") or 1000)
+            return
+        if message.get("text") is not None:
+            transferred["in"] += len(message["text"].encode())
+            await upstream.send(message["text"])
+        elif message.get("bytes") is not None:
+            transferred["in"] += len(message["bytes"])
+            await upstream.send(message["bytes"])
+
+
+async def _upstream_to_client(websocket: WebSocket, upstream, transferred: dict) -> None:
+    try:
+        async for message in upstream:
+            if isinstance(message, str):
+                transferred["out"] += len(message.encode())
+                await websocket.send_text(message)
+            else:
+                transferred["out"] += len(message)
+                await websocket.send_bytes(message)
+    except websockets.ConnectionClosed:
+        pass
+    await websocket.close(code=upstream.close_code or 1000, reason=upstream.close_reason or "")
+
+
+@router.websocket("/{path:path}")
+async def proxy_websocket(websocket: WebSocket):
+    services = websocket.app.state.services
+    counters = services.counters
+
+    started = time.perf_counter()
+    api_key = websocket.headers.get("X-API-Key")
+    try:
+        route, path = resolve_route(services, websocket.headers.get("host", ""), websocket.scope["path"])
+        if not api_key:
+            raise HTTPException(status_code=401, detail="Missing X-API-Key header")
+        auth = await authorize(services, route, api_key, websocket.headers.get("X-Client-ID"))
+        slot_key = await acquire_connection_slot(counters, auth)
+    except HTTPException as exc:
+        await _reject(websocket, exc)
+        return
+
+    try:
+        upstream_url = _websocket_url(build_upstream_url(auth.api, path, websocket.scope.get("query_string", b"")))
+        headers = [
+            (name.decode("latin-1"), value.decode("latin-1"))
+            for name, value in forward_request_headers(websocket.scope)
+            if name not in WEBSOCKET_HANDSHAKE_HEADERS
+        ]
+
+        try:
+            upstream = await websockets.connect(
+                upstream_url,
+                additional_headers=headers,
+                subprotocols=websocket.scope.get("subprotocols") or None,
+                user_agent_header=None,
+                compression=None,
+                max_size=get_ws_max_size(),
+                max_queue=get_ws_max_queue(),
+                proxy=None,
+            )
+        except (OSError, asyncio.TimeoutError, websockets.InvalidHandshake, websockets.InvalidURI) as exc:
+            logger.error(f"Upstream websocket failed: {exc}")
+            await _reject(websocket, HTTPException(status_code=502, detail="Upstream service unavailable"))
+            return
+
+        await websocket.accept(subprotocol=upstream.subprotocol)
+        await record_usage(counters, auth.tenant["id"], auth.api["id"])
+        latency = time.perf_counter() - started
+
+        transferred = {"in": 0, "out": 0}
+        tasks = [
+            asyncio.create_task(_client_to_upstream(websocket, upstream, transferred)),
+            asyncio.create_task(_upstream_to_client(websocket, upstream, transferred)),
+        ]
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                exc = task.exception()
+                if exc and not isinstance(exc, (websockets.ConnectionClosed, WebSocketDisconnect, RuntimeError)):
+                    logger.warning(f"Websocket relay failed: {exc!r}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await upstream.close()
+            services.events.record(auth, "GET", 101, latency, transferred["in"], transferred["out"])
+    finally:
+        await release_connection_slot(counters, slot_key)
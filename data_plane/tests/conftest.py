@@ -0,0 +1,128 @@
+"""Fixtures for the data-plane tests.
+
+``gateway`` runs the real app (lifespan included) in process against a fresh
+SQLite database holding one tenant, API, plan and key, with Redis replaced by
+fakeredis and the upstream by ``Upstream``, an httpx mock transport that
+records what reached it. Requests go through ``httpx.ASGITransport``.
+"""
+import asyncio
+import hashlib
+import inspect
+from dataclasses import dataclass
+
+import httpx
+import pytest
+import sqlalchemy
+
+from data_plane.fastapi_app.tables import apis_api, apis_apikey, billing_plan, metadata, tenants_tenant
+
+RAW_KEY = "test_key_12345"
+TENANT_SLUG = "acme"
+API_SLUG = "orders"
+UPSTREAM_URL = "http://upstream.test"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def seed_database(path, plan=None, api=None) -> str:
+    """A gateway database at ``path``; ``plan`` and ``api`` override columns
+    of the plan and the API. Returns its ``DATABASE_URL``."""
+    engine = sqlalchemy.create_engine(f"sqlite:///{path}")
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(tenants_tenant.insert().values(id=1, slug=TENANT_SLUG, is_active=True))
+        conn.execute(apis_api.insert().values(
+            id=1, tenant_id=1, slug=API_SLUG, upstream_base_url=UPSTREAM_URL, is_active=True, **(api or {})
+        ))
+        conn.execute(billing_plan.insert().values(
+            id=1, requests_per_minute=10**9, redis_failure_policy="local", is_active=True, **(plan or {})
+        ))
+        conn.execute(apis_apikey.insert().values(
+            id=1, tenant_id=1, plan_id=1, hashed_key=hashlib.sha256(RAW_KEY.encode()).hexdigest(), is_active=True
+        ))
+    engine.dispose()
+    return f"sqlite:///{path}"
+
+
+class Upstream:
+    """Answers with ``respond(request)`` (a response, or an awaitable of one;
+    200 ``ok`` by default) and keeps every request it was sent."""
+
+    def __init__(self):
+        self.requests: list[httpx.Request] = []
+        self.respond = lambda request: httpx.Response(200, content=b"ok")
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        self.requests.append(request)
+        response = self.respond(request)
+        if inspect.isawaitable(response):
+            response = await response
+        return response
+
+
+@dataclass
+class Gateway:
+    app: object
+    client: httpx.AsyncClient
+    upstream: Upstream
+
+    @property
+    def services(self):
+        return self.app.state.services
+
+    async def proxy(self, path: str = "/get", method: str = "GET", headers=None, **kwargs) -> httpx.Response:
+        headers = {"X-API-Key": RAW_KEY, **(headers or {})}
+        return await self.client.request(method, f"/{TENANT_SLUG}/{API_SLUG}{path}", headers=headers, **kwargs)
+
+
+@pytest.fixture(params=[False, True], ids=["router", "fast_path"])
+def fast_path(request):
+    return request.param
+
+
+@pytest.fixture
+def plan():
+    """Column overrides for the seeded plan; modules override this fixture."""
+    return {}
+
+
+@pytest.fixture
+def api():
+    """Column overrides for the seeded API; modules override this fixture."""
+    return {}
+
+
+@pytest.fixture
+def gateway_env(tmp_path, monkeypatch, fast_path, plan, api):
+    """Environment for ``gateway``; tests may change it before using that."""
+    monkeypatch.setenv("DATABASE_URL", seed_database(tmp_path / "db.sqlite3", plan=plan, api=api))
+    monkeypatch.setenv("REDIS_URL", "redis://127.0.0.1:1")
+    monkeypatch.setenv("GATEWAY_WARMUP", "off")
+    monkeypatch.setenv("GATEWAY_DNS_CACHE", "false")
+    monkeypatch.setenv("GATEWAY_EVENTS", "false")
+    monkeypatch.setenv("GATEWAY_FAST_PATH", "1" if fast_path else "0")
+    for name in ("REDIS_URLS", "GATEWAY_KEY_INDEX", "GATEWAY_ADMIN_TOKEN", "GATEWAY_WORKERS"):
+        monkeypatch.delenv(name, raising=False)
+    return tmp_path
+
+
+@pytest.fixture
+async def gateway(gateway_env):
+    from data_plane.fastapi_app.main import create_app
+
+    app = create_app()
+    upstream = Upstream()
+    async with app.router.lifespan_context(app):
+        services = app.state.services
+        await services.http_client.aclose()
+        services.http_client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway.test") as client:
+            yield Gateway(app, client, upstream)
+        await services.http_client.aclose()
+    # Let the lifespan's cancelled background tasks finish.
+    await asyncio.sleep(0)
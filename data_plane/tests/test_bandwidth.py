@@ -0,0 +1,75 @@
+import httpx
+import pytest
+
+from data_plane.fastapi_app import bandwidth
+from data_plane.fastapi_app.bandwidth import TokenBucket
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def plan():
+    return {"bytes_in_per_month": 10**9, "bytes_out_per_month": 10**9}
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+
+    async def sleep(seconds):
+        slept.append(seconds)
+
+    monkeypatch.setattr(bandwidth.asyncio, "sleep", sleep)
+    return slept
+
+
+async def test_bucket_passes_its_burst_without_waiting(sleeps):
+    bucket = TokenBucket(rate=1000)
+    assert bucket.burst == 100
+    await bucket.consume(60)
+    await bucket.consume(40)
+    assert sleeps == []
+
+
+async def test_bucket_waits_for_what_it_owes(sleeps, monkeypatch):
+    monkeypatch.setattr(bandwidth.time, "monotonic", lambda: 50.0)
+    bucket = TokenBucket(rate=1000, burst=100)
+    # A chunk larger than the burst goes through, putting the bucket in debt.
+    await bucket.consume(600)
+    assert sleeps == [pytest.approx(0.5)]
+    await bucket.consume(100)
+    assert sleeps[-1] == pytest.approx(0.6)
+
+    # Time refills it, up to the burst.
+    monkeypatch.setattr(bandwidth.time, "monotonic", lambda: 60.0)
+    await bucket.consume(100)
+    assert len(sleeps) == 2
+
+
+def test_bucket_only_for_shaped_plans():
+    assert TokenBucket.for_plan({"max_bytes_per_second": None}) is None
+    assert TokenBucket.for_plan({"max_bytes_per_second": 2048}).rate == 2048
+
+
+async def counted(gateway, direction):
+    redis = next(iter(gateway.services.redis_client.clients.values()))
+    keys = [key async for key in redis.scan_iter(f"quota:*:{direction}:month:*")]
+    return sum([int(await redis.get(key)) for key in keys])
+
+
+async def test_bytes_are_counted(gateway):
+    response = await gateway.proxy("/upload", method="POST", content=b"x" * 300)
+    assert response.status_code == 200
+    assert await counted(gateway, "bytes_in") == 300
+    assert await counted(gateway, "bytes_out") == 2
+
+
+async def test_bytes_in_are_counted_when_the_upstream_fails(gateway):
+    def refuse(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    gateway.upstream.respond = refuse
+    response = await gateway.proxy("/upload", method="POST", content=b"x" * 300)
+    assert response.status_code == 502
+    assert await counted(gateway, "bytes_in") == 300
+    assert await counted(gateway, "bytes_out") == 0
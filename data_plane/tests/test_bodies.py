@@ -0,0 +1,115 @@
+import pytest
+from fastapi import HTTPException
+from starlette.requests import ClientDisconnect
+
+from data_plane.fastapi_app import bodies
+from data_plane.fastapi_app.bodies import BodyLimits, read_body, receive_chunks
+
+pytestmark = pytest.mark.anyio
+
+
+def scope(content_length=None):
+    headers = [] if content_length is None else [(b"content-length", str(content_length).encode())]
+    return {"headers": headers}
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+async def collect(body):
+    return b"".join([chunk async for chunk in body])
+
+
+async def test_small_body_stays_in_memory():
+    body = await read_body(scope(6), chunks(b"abc", b"def"), limit=10, spool_threshold=1024)
+    assert body.in_memory
+    assert body.content == b"abcdef"
+    assert await collect(body) == b"abcdef"
+    body.close()
+
+
+async def test_large_body_spools_to_disk_off_the_loop(monkeypatch):
+    threaded = []
+    to_thread = bodies.asyncio.to_thread
+
+    async def record(func, *args):
+        threaded.append(func.__name__)
+        return await to_thread(func, *args)
+
+    monkeypatch.setattr(bodies.asyncio, "to_thread", record)
+    parts = [bytes([index]) * 100 for index in range(5)]
+    body = await read_body(scope(), chunks(*parts), limit=None, spool_threshold=150)
+    assert not body.in_memory
+    assert body.content is body
+    assert threaded == ["write"] * 4
+    # Each pass starts over, so a retry resends the whole body.
+    assert await collect(body) == b"".join(parts)
+    assert await collect(body) == b"".join(parts)
+    assert "read" in threaded
+    body.close()
+
+
+async def test_declared_length_over_limit_is_rejected_before_reading():
+    async def never():
+        raise AssertionError("the body was read")
+        yield b""
+
+    with pytest.raises(HTTPException) as raised:
+        await read_body(scope(11), never(), limit=10, spool_threshold=1024)
+    assert raised.value.status_code == 413
+
+
+async def test_streamed_body_over_limit_is_rejected():
+    with pytest.raises(HTTPException) as raised:
+        await read_body(scope(), chunks(b"x" * 6, b"x" * 6), limit=10, spool_threshold=4)
+    assert raised.value.status_code == 413
+
+
+async def test_body_shorter_than_declared_is_rejected():
+    with pytest.raises(HTTPException) as raised:
+        await read_body(scope(10), chunks(b"abc"), limit=None, spool_threshold=1024)
+    assert (raised.value.status_code, raised.value.detail) == (400, "Incomplete request body")
+
+
+async def test_receive_chunks_raises_on_disconnect():
+    messages = iter([
+        {"type": "http.request", "body": b"abc", "more_body": True},
+        {"type": "http.disconnect"},
+    ])
+
+    async def receive():
+        return next(messages)
+
+    with pytest.raises(ClientDisconnect):
+        await read_body(scope(), receive_chunks(receive), limit=None, spool_threshold=1024)
+
+
+def test_tightest_limit_wins():
+    class Auth:
+        plan = {"max_request_body_bytes": 500}
+        api = {"max_request_body_bytes": None}
+
+    assert BodyLimits(max_size=1000, spool_threshold=10).limit_for(Auth) == 500
+    Auth.api = {"max_request_body_bytes": 200}
+    assert BodyLimits(max_size=1000, spool_threshold=10).limit_for(Auth) == 200
+    Auth.plan = Auth.api = {"max_request_body_bytes": None}
+    assert BodyLimits(max_size=0, spool_threshold=10).limit_for(Auth) is None
+
+
+async def test_oversized_upload_is_413_through_the_gateway(gateway):
+    gateway.services.body_limits.max_size = 1000
+    response = await gateway.proxy("/upload", method="POST", content=b"x" * 1001)
+    assert (response.status_code, response.json()["detail"]) == (413, "Request body too large")
+    assert gateway.upstream.requests == []
+
+
+async def test_spooled_upload_reaches_upstream_whole(gateway):
+    gateway.services.body_limits.spool_threshold = 100
+    payload = bytes(range(256)) * 40
+    response = await gateway.proxy("/upload", method="POST", content=payload)
+    assert response.status_code == 200
+    (sent,) = gateway.upstream.requests
+    assert sent.content == payload
+    assert sent.headers["content-length"] == str(len(payload))
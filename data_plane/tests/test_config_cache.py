@@ -0,0 +1,44 @@
+import asyncio
+import json
+
+import pytest
+import sqlalchemy
+
+from data_plane.fastapi_app.config_cache import ConfigCache
+from data_plane.fastapi_app.tables import billing_plan
+
+pytestmark = pytest.mark.anyio
+
+
+def test_plans_are_evicted_per_tenant():
+    cache = ConfigCache(database=None)
+    cache.put(("plan", 1, 7), {"id": 7})
+    cache.put(("plan", 2, 7), {"id": 7})
+    cache.put(("api_key", 1, "hash"), {"id": 3})
+
+    assert cache.evict_tenant(1, ["plan"]) == 1
+    assert set(cache._entries) == {("plan", 2, 7), ("api_key", 1, "hash")}
+    assert cache.evict_tenant(2) == 1
+    assert cache.evict_tenant(1) == 1
+    assert len(cache) == 0
+
+
+async def test_plan_change_message_applies_at_once(gateway, gateway_env):
+    assert (await gateway.proxy()).status_code == 200
+
+    engine = sqlalchemy.create_engine(f"sqlite:///{gateway_env / 'db.sqlite3'}")
+    with engine.begin() as conn:
+        conn.execute(billing_plan.update().values(is_active=False))
+    engine.dispose()
+    # Still cached.
+    assert (await gateway.proxy()).status_code == 200
+
+    redis = next(iter(gateway.services.redis_client.clients.values()))
+    message = {"tenant_ids": [1], "change": "plan_changed", "kinds": ["plan"], "plan_id": 1}
+    await redis.publish("gateway:config", json.dumps(message))
+    for _ in range(50):
+        if ("plan", 1, 1) not in gateway.services.config_cache._entries:
+            break
+        await asyncio.sleep(0.01)
+    response = await gateway.proxy()
+    assert (response.status_code, response.json()["detail"]) == (403, "Plan invalid")
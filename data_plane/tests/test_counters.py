@@ -0,0 +1,64 @@
+import asyncio
+
+import fakeredis.aioredis
+import pytest
+from redis.exceptions import ConnectionError
+
+from data_plane.fastapi_app.counters import Counters
+from data_plane.fastapi_app.metrics import Metrics
+from data_plane.fastapi_app.sharding import ShardedRedis
+
+pytestmark = pytest.mark.anyio
+
+LIMITS = [("minute:key:1", 10, 60), ("month:key:1", 100, 3600)]
+
+
+@pytest.fixture
+def counters():
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    return Counters(ShardedRedis({"node": redis}), Metrics(), timeout=0.05, failure_threshold=1)
+
+
+async def stored(counters, key):
+    return int(await counters.redis.clients["node"].get(key) or 0)
+
+
+async def test_admit_counts_in_every_window(counters):
+    assert await counters.admit(LIMITS) is None
+    assert [await stored(counters, key) for key, _, _ in LIMITS] == [1, 1]
+
+
+async def test_admit_stops_at_the_first_full_window(counters):
+    await counters.redis.clients["node"].set("month:key:1", 100)
+    assert await counters.admit(LIMITS) == 1
+    assert await stored(counters, "minute:key:1") == 0
+
+
+async def test_late_answer_is_not_counted_again_locally(counters, monkeypatch):
+    admit = counters._redis_admit
+
+    async def slow_admit(name, limits):
+        result = await admit(name, limits)
+        await asyncio.sleep(1)
+        return result
+
+    monkeypatch.setattr(counters, "_redis_admit", slow_admit)
+    assert await counters.admit(LIMITS) is None
+    assert not counters.is_up("node")
+    assert len(counters.local) == 0
+
+    # Merged on recovery, the script's count is the only one.
+    await counters._try_recover("node", counters._health["node"])
+    assert await stored(counters, "minute:key:1") == 1
+
+
+async def test_failed_call_is_counted_locally(counters, monkeypatch):
+    async def failing_admit(name, limits):
+        raise ConnectionError("refused")
+
+    monkeypatch.setattr(counters, "_redis_admit", failing_admit)
+    assert await counters.admit(LIMITS) is None
+    assert counters.local.value("minute:key:1") == 1
+
+    await counters._try_recover("node", counters._health["node"])
+    assert await stored(counters, "minute:key:1") == 1
@@ -0,0 +1,64 @@
+from data_plane.fastapi_app.headers import forward_request_headers, forward_response_headers
+
+
+def scope(headers, client=("10.0.0.7", 50000), scheme="https"):
+    return {"headers": headers, "client": client, "scheme": scheme}
+
+
+def values(headers, name):
+    return [value for key, value in headers if key == name]
+
+
+def test_drops_hop_by_hop_and_gateway_headers():
+    headers = forward_request_headers(scope([
+        (b"host", b"api.example.com"),
+        (b"connection", b"keep-alive, x-trace"),
+        (b"x-trace", b"1"),
+        (b"keep-alive", b"timeout=5"),
+        (b"content-length", b"3"),
+        (b"x-api-key", b"secret"),
+        (b"accept", b"text/html"),
+        (b"accept", b"application/json"),
+    ]))
+    names = {name for name, _ in headers}
+    assert not names & {b"host", b"connection", b"x-trace", b"keep-alive", b"content-length", b"x-api-key"}
+    assert values(headers, b"accept") == [b"text/html", b"application/json"]
+
+
+def test_extends_forwarded_for_chain():
+    headers = forward_request_headers(scope([
+        (b"host", b"api.example.com"),
+        (b"x-forwarded-for", b"1.1.1.1"),
+        (b"x-forwarded-for", b"2.2.2.2"),
+        (b"forwarded", b"for=1.1.1.1"),
+    ]))
+    assert values(headers, b"x-forwarded-for") == [b"1.1.1.1, 2.2.2.2, 10.0.0.7"]
+    assert values(headers, b"forwarded") == [b'for=1.1.1.1, for=10.0.0.7;proto=https;host="api.example.com"']
+
+
+def test_replaces_client_proto_and_host():
+    headers = forward_request_headers(scope([
+        (b"host", b"api.example.com"),
+        (b"x-forwarded-proto", b"gopher"),
+        (b"x-forwarded-host", b"evil.example"),
+    ]))
+    assert values(headers, b"x-forwarded-proto") == [b"https"]
+    assert values(headers, b"x-forwarded-host") == [b"api.example.com"]
+
+
+def test_ipv6_client_is_bracketed_in_forwarded():
+    headers = forward_request_headers(scope([], client=("::1", 1), scheme="http"))
+    assert values(headers, b"forwarded") == [b'for="[::1]";proto=http']
+    assert values(headers, b"x-forwarded-host") == []
+
+
+def test_response_headers_keep_repeats_and_lowercase():
+    headers = forward_response_headers([
+        (b"Set-Cookie", b"a=1"),
+        (b"Set-Cookie", b"b=2"),
+        (b"Content-Length", b"10"),
+        (b"Content-Encoding", b"gzip"),
+        (b"Transfer-Encoding", b"chunked"),
+        (b"Content-Type", b"text/plain"),
+    ])
+    assert headers == [(b"set-cookie", b"a=1"), (b"set-cookie", b"b=2"), (b"content-type", b"text/plain")]
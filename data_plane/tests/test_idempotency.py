@@ -0,0 +1,88 @@
+import asyncio
+
+import httpx
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def api():
+    return {"idempotency_ttl": 3600}
+
+
+def created(request):
+    return httpx.Response(201, headers={"X-Order": "42"}, content=b'{"id": 42}')
+
+
+async def post(gateway, key, content=b'{"item": 1}', path="/orders"):
+    return await gateway.proxy(path, method="POST", content=content, headers={"Idempotency-Key": key})
+
+
+async def test_retry_is_replayed(gateway):
+    gateway.upstream.respond = created
+    first = await post(gateway, "order-1")
+    second = await post(gateway, "order-1")
+
+    assert len(gateway.upstream.requests) == 1
+    assert (first.status_code, second.status_code) == (201, 201)
+    assert second.content == first.content == b'{"id": 42}'
+    assert second.headers["x-order"] == "42"
+    assert second.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+
+
+async def test_key_reused_for_another_request_is_422(gateway):
+    await post(gateway, "order-1")
+    for response in (
+        await post(gateway, "order-1", content=b'{"item": 2}'),
+        await post(gateway, "order-1", path="/orders?dry_run=1"),
+    ):
+        assert (response.status_code, response.json()["detail"]) == (
+            422, "Idempotency-Key was used for a different request"
+        )
+    assert len(gateway.upstream.requests) == 1
+
+
+async def test_duplicate_waits_for_the_first_then_replays(gateway):
+    async def slow(request):
+        await asyncio.sleep(0.1)
+        return created(request)
+
+    gateway.upstream.respond = slow
+    first, second = await asyncio.gather(post(gateway, "order-1"), post(gateway, "order-1"))
+    assert len(gateway.upstream.requests) == 1
+    assert {first.headers.get("idempotent-replayed"), second.headers.get("idempotent-replayed")} == {None, "true"}
+
+
+async def test_duplicate_in_progress_too_long_is_409(gateway):
+    async def slow(request):
+        await asyncio.sleep(0.3)
+        return created(request)
+
+    gateway.upstream.respond = slow
+    gateway.services.idempotency.wait = 0.05
+    first, second = await asyncio.gather(post(gateway, "order-1"), post(gateway, "order-1"))
+    assert sorted([first.status_code, second.status_code]) == [201, 409]
+    conflict = first if first.status_code == 409 else second
+    assert conflict.headers["retry-after"] == "1"
+    assert len(gateway.upstream.requests) == 1
+
+
+async def test_server_errors_are_not_replayed(gateway):
+    gateway.upstream.respond = lambda request: httpx.Response(503, content=b"busy")
+    assert (await post(gateway, "order-1")).status_code == 503
+    gateway.upstream.respond = created
+    response = await post(gateway, "order-1")
+    assert response.status_code == 201
+    assert "idempotent-replayed" not in response.headers
+    assert len(gateway.upstream.requests) == 2
+
+
+async def test_safe_methods_and_requests_without_a_key_are_not_deduplicated(gateway):
+    headers = {"Idempotency-Key": "read-1"}
+    await gateway.proxy("/orders", headers=headers)
+    await gateway.proxy("/orders", headers=headers)
+    await gateway.proxy("/orders", method="POST", content=b"{}")
+    await gateway.proxy("/orders", method="POST", content=b"{}")
+    assert len(gateway.upstream.requests) == 4
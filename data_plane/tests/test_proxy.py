@@ -0,0 +1,41 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_raw_query_string_is_forwarded(gateway):
+    response = await gateway.proxy("/search?tag=a&tag=b&q=%20x%2By&empty=")
+    assert response.status_code == 200
+    (sent,) = gateway.upstream.requests
+    assert sent.url.path == "/search"
+    assert sent.url.query == b"tag=a&tag=b&q=%20x%2By&empty="
+
+
+async def test_forwarded_request(gateway):
+    response = await gateway.proxy(
+        "/items/7", method="PUT", content=b"payload", headers={"X-Trace": "abc", "Connection": "x-trace"}
+    )
+    assert (response.status_code, response.content) == (200, b"ok")
+    (sent,) = gateway.upstream.requests
+    assert (sent.method, str(sent.url)) == ("PUT", "http://upstream.test/items/7")
+    assert sent.content == b"payload"
+    assert "x-api-key" not in sent.headers
+    assert "x-trace" not in sent.headers
+    assert sent.headers["x-forwarded-host"] == "gateway.test"
+
+
+async def test_truncated_body_is_not_forwarded(gateway):
+    async def short_body():
+        yield b"only part"
+
+    response = await gateway.proxy(
+        "/upload", method="POST", content=short_body(), headers={"Content-Length": "100"}
+    )
+    assert (response.status_code, response.json()["detail"]) == (400, "Incomplete request body")
+    assert gateway.upstream.requests == []
+
+
+async def test_invalid_key_is_403(gateway):
+    response = await gateway.proxy(headers={"X-API-Key": "wrong"})
+    assert (response.status_code, response.json()["detail"]) == (403, "Invalid or inactive API Key")
+    assert gateway.upstream.requests == []
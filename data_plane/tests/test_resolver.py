@@ -0,0 +1,108 @@
+import dns.message
+import dns.name
+import dns.rdataclass
+import dns.rdatatype
+import dns.resolver
+import dns.rrset
+import pytest
+
+from data_plane.fastapi_app.metrics import Metrics
+from data_plane.fastapi_app.resolver import DNSCache
+
+pytestmark = pytest.mark.anyio
+
+
+def answer(host: str, rdtype: str, ttl: int, *addresses: str) -> dns.resolver.Answer:
+    qname = dns.name.from_text(host)
+    rdtype = dns.rdatatype.from_text(rdtype)
+    response = dns.message.make_response(dns.message.make_query(qname, rdtype))
+    rrset = response.find_rrset(response.answer, qname, dns.rdataclass.IN, rdtype, create=True)
+    for rdata in dns.rrset.from_text(qname, ttl, "IN", rdtype, *addresses):
+        rrset.add(rdata, ttl)
+    return dns.resolver.Answer(qname, rdtype, dns.rdataclass.IN, response)
+
+
+class Resolver:
+    """Answers each ``(host, rdtype)`` with ``records``, raising exceptions."""
+
+    def __init__(self):
+        self.records = {}
+        self.queries = 0
+
+    async def resolve(self, host, rdtype, **kwargs):
+        self.queries += 1
+        result = self.records.get((host, rdtype), dns.resolver.NoAnswer())
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+
+@pytest.fixture
+def resolver():
+    return Resolver()
+
+
+@pytest.fixture
+def cache(resolver):
+    return DNSCache(resolver, Metrics(), min_ttl=5, max_ttl=300, stale_ttl=3600)
+
+
+def expire(cache, host, by):
+    cache._entries[host].fetched -= by
+
+
+async def test_addresses_are_cached_and_rotated(cache, resolver):
+    resolver.records[("api.test", "A")] = answer("api.test.", "A", 60, "10.0.0.1", "10.0.0.2")
+    resolver.records[("api.test", "AAAA")] = answer("api.test.", "AAAA", 60, "fd00::1")
+    assert await cache.resolve("api.test") == ["10.0.0.1", "10.0.0.2", "fd00::1"]
+    assert await cache.resolve("api.test") == ["10.0.0.2", "10.0.0.1", "fd00::1"]
+    assert resolver.queries == 2
+    assert await cache.resolve("10.1.2.3") == ["10.1.2.3"]
+
+
+@pytest.mark.parametrize("record_ttl, cached_ttl", [(1, 5), (60, 60), (86400, 300)])
+async def test_ttl_is_clamped(cache, resolver, record_ttl, cached_ttl):
+    resolver.records[("api.test", "A")] = answer("api.test.", "A", record_ttl, "10.0.0.1")
+    await cache.resolve("api.test")
+    assert cache._entries["api.test"].ttl == cached_ttl
+
+
+async def test_stale_addresses_are_served_while_dns_fails(cache, resolver):
+    resolver.records[("api.test", "A")] = answer("api.test.", "A", 60, "10.0.0.1")
+    await cache.resolve("api.test")
+    expire(cache, "api.test", 61)
+
+    resolver.records[("api.test", "A")] = dns.resolver.LifetimeTimeout(timeout=2.0, errors=[])
+    assert await cache.resolve("api.test") == ["10.0.0.1"]
+    assert cache._entries["api.test"].failed_at is not None
+
+    # Past the stale window the failure is reported.
+    expire(cache, "api.test", 3600)
+    with pytest.raises(OSError):
+        await cache.resolve("api.test")
+
+
+async def test_refresh_replaces_expired_entry(cache, resolver):
+    resolver.records[("api.test", "A")] = answer("api.test.", "A", 60, "10.0.0.1")
+    await cache.resolve("api.test")
+    expire(cache, "api.test", 61)
+    resolver.records[("api.test", "A")] = answer("api.test.", "A", 60, "10.0.0.9")
+    assert await cache.resolve("api.test") == ["10.0.0.9"]
+
+
+@pytest.mark.parametrize("failure", [
+    dns.resolver.NXDOMAIN(),
+    dns.resolver.NoNameservers(),
+    dns.resolver.LifetimeTimeout(timeout=2.0, errors=[]),
+    None,  # No A or AAAA records.
+], ids=["nxdomain", "no_nameservers", "timeout", "no_records"])
+async def test_unresolved_names_fall_back_to_system_resolver(cache, resolver, failure):
+    if failure is not None:
+        resolver.records[("localhost", "A")] = failure
+        resolver.records[("localhost", "AAAA")] = failure
+    assert "127.0.0.1" in await cache.resolve("localhost")
+
+
+async def test_failure_without_any_resolver_raises(cache):
+    with pytest.raises(OSError, match="system resolver"):
+        await cache.resolve("does-not-exist.invalid")
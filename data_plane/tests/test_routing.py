@@ -0,0 +1,81 @@
+import pytest
+
+from data_plane.fastapi_app.routing import RoutingTable, _Node
+
+pytestmark = pytest.mark.anyio
+
+ACME = {"id": 1, "slug": "acme"}
+GLOBEX = {"id": 2, "slug": "globex"}
+ORDERS = {"id": 10, "slug": "orders"}
+USERS = {"id": 11, "slug": "users"}
+ADMIN = {"id": 12, "slug": "admin"}
+
+
+def route_row(host, path_prefix="/", strip_prefix=True):
+    return {"host": host, "path_prefix": path_prefix, "strip_prefix": strip_prefix}
+
+
+@pytest.fixture
+def table():
+    hosts, slugs, owned = {}, _Node(), {}
+    RoutingTable._add(hosts, slugs, owned, ACME, ORDERS, [route_row("api.acme.example", "/v1")])
+    RoutingTable._add(hosts, slugs, owned, ACME, USERS, [route_row("api.acme.example", "/v1/users", False)])
+    RoutingTable._add(hosts, slugs, owned, ACME, ADMIN, [route_row("admin.acme.example")])
+    RoutingTable._add(hosts, slugs, owned, GLOBEX, ORDERS, [])
+    table = RoutingTable(database=None)
+    table._swap(hosts, slugs, owned)
+    return table
+
+
+def resolve(table, host, path):
+    resolved = table.resolve(host, path)
+    if resolved is None:
+        return None
+    route, upstream_path = resolved
+    return route.tenant["slug"], route.api["slug"], upstream_path
+
+
+def test_tenant_and_api_slugs_on_any_host(table):
+    assert resolve(table, "gateway.local", "/acme/orders/items/1") == ("acme", "orders", "items/1")
+    assert resolve(table, "gateway.local", "/globex/orders/") == ("globex", "orders", "")
+    assert resolve(table, "gateway.local", "/globex/users/x") is None
+    assert resolve(table, "gateway.local", "/nobody/orders/x") is None
+
+
+def test_longest_host_prefix_wins(table):
+    assert resolve(table, "api.acme.example", "/v1/items") == ("acme", "orders", "items")
+    # strip_prefix=False sends the whole path.
+    assert resolve(table, "api.acme.example", "/v1/users/7") == ("acme", "users", "v1/users/7")
+    assert resolve(table, "admin.acme.example", "/anything") == ("acme", "admin", "anything")
+
+
+def test_host_is_matched_case_and_port_insensitively(table):
+    assert resolve(table, "API.Acme.Example:8443", "/v1/items") == ("acme", "orders", "items")
+    assert resolve(table, "api.acme.example.", "/v1/items") == ("acme", "orders", "items")
+
+
+def test_unrouted_path_on_route_host_falls_back_to_slugs(table):
+    assert resolve(table, "api.acme.example", "/globex/orders/x") == ("globex", "orders", "x")
+    assert resolve(table, "api.acme.example", "/v2/items") is None
+
+
+def test_not_found_detail(table):
+    assert table.not_found_detail("gateway.local", "/nobody/orders/x") == "Tenant not found"
+    assert table.not_found_detail("gateway.local", "/acme/missing/x") == "API not found"
+    assert table.not_found_detail("api.acme.example", "/v2/items") == "API not found"
+    assert table.not_found_detail("gateway.local", "/favicon.ico") == "Not Found"
+    assert table.not_found_detail("gateway.local", "/") == "Not Found"
+
+
+async def test_unknown_path_is_404_without_api_key(gateway):
+    response = await gateway.client.get("/favicon.ico")
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Not Found"}
+    response = await gateway.client.get("/nobody/orders/x")
+    assert (response.status_code, response.json()["detail"]) == (404, "Tenant not found")
+    response = await gateway.client.get("/acme/missing/x")
+    assert (response.status_code, response.json()["detail"]) == (404, "API not found")
+
+    response = await gateway.client.get("/acme/orders/x")
+    assert (response.status_code, response.json()["detail"]) == (401, "Missing X-API-Key header")
+    assert (await gateway.proxy("/x")).status_code == 200